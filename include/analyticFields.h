@@ -305,30 +305,73 @@ public:
 };
 
 
+/**
+ * Differentiate formula symbolically
+ *
+ * Supports the arithmetic subset of the exprtk syntax: numbers, the variables x, y, z, t, the constant pi, the operators + - * / ^, parentheses,
+ * and the functions sin, cos, tan, exp, log, log10, sqrt, sinh, cosh, tanh, asin, acos, atan, abs, pow, and atan2
+ * (other functions are allowed if their arguments do not depend on the variable).
+ *
+ * @param formula Formula to differentiate
+ * @param variable Variable with respect to which the formula is differentiated
+ *
+ * @return Returns derivative as exprtk formula
+ *
+ * @throws std::runtime_error if formula contains unsupported syntax
+ */
+std::string DifferentiateFormula(const std::string &formula, const std::string &variable);
+
+
 /**
  * Class calculating magnetic field from user-defined formulas
  * 
- * Field gradients are calculated numerically with a five-point stencil method
+ * Field gradients are calculated from symbolic derivatives of the formulas if possible,
+ * or numerically with a five-point stencil method
  */
 class TCustomBField: public TField{
 private:
-	std::unique_ptr<double> tvar, xvar, yvar, zvar; ///< Variables used to evaluate formulas, they need to be pointers to make sure references stored in the exprtk expression do not get invalidated when copying
-	std::array<exprtk::expression<double>, 3> Bexpr; ///< Formula interpreters, one for each field component
+	/**
+	 * Compiled formulas and the variables used to evaluate them, each thread evaluating the field uses its own copy
+	 */
+	struct TFormulas{
+		double t = 0., x = 0., y = 0., z = 0.; ///< Variables used to evaluate formulas, referenced by the exprtk expressions
+		std::array<exprtk::expression<double>, 3> Bexpr; ///< Formula interpreters, one for each field component
+		std::array<std::array<exprtk::expression<double>, 3>, 3> dBexpr; ///< Formula interpreters for symbolic derivatives dBi/dxj
+
+		/**
+		 * Constructor, compiles formulas
+		 *
+		 * @param B Formulas of the field components
+		 * @param dB Formulas of the derivatives dBi/dxj, not compiled if empty
+		 *
+		 * @throws std::runtime_error if a formula cannot be compiled
+		 */
+		TFormulas(const std::array<std::string, 3> &B, const std::array<std::array<std::string, 3>, 3> &dB);
+
+		TFormulas(const TFormulas&) = delete;
+	};
+	std::array<std::string, 3> Bformulas; ///< Formulas of the field components
+	std::array<std::array<std::string, 3>, 3> dBformulas; ///< Symbolic derivatives dBi/dxj of the formulas, empty if derivatives are calculated numerically
+	bool symbolic; ///< true if derivatives are calculated from dBformulas
+	TThreadLocal<TFormulas> formulas; ///< Formula interpreters of each thread
 public:
 	/**
 	 * Constructor
 	 * 
+	 * If symbolic derivatives are requested but a formula contains syntax not supported by DifferentiateFormula, derivatives of all components are calculated numerically.
+	 *
 	 * @param _Bx String containing formula for x component of field
 	 * @param _By String containing formula for y component of field
 	 * @param _Bz String containing formula for z component of field
+	 * @param symbolicderivatives Differentiate formulas symbolically when constructing the field instead of numerically in every evaluation
 	 */
-	TCustomBField(const std::string &_Bx, const std::string &_By, const std::string &_Bz);
+	TCustomBField(const std::string &_Bx, const std::string &_By, const std::string &_Bz, const bool symbolicderivatives = false);
 
 
 	/**
 	 * Calculates B field B[3] and the derivatives dBidxj[3][3] for a given point x,y,z and time t
 	 * 
-	 * Spatial derivatives are calculated numerically using a five-point stencil method
+	 * Spatial derivatives are evaluated from symbolic derivatives or calculated numerically using a five-point stencil method
 	 *
 	 * @param x Cartesian x coordinate
 	 * @param y Cartesian y coordinate
@@ -0,0 +1,62 @@
+#ifndef PENTRACK_CHECKPOINT_H
+#define PENTRACK_CHECKPOINT_H
+
+#include <cstdint>
+#include <ios>
+#include <map>
+#include <set>
+#include <string>
+
+#include <boost/filesystem.hpp>
+
+#include "mc.h"
+
+/**
+ * State of a particle simulation after its last completed particle, written to a file so an interrupted simulation can be resumed.
+ *
+ * Particles are numbered from 1. Particles that were interrupted by a signal are not completed, they are simulated again when the simulation is resumed.
+ */
+struct TCheckpoint{
+    uint64_t seed = 0; ///< random seed of the simulation
+    bool parallel = false; ///< true if particles were simulated in several threads, each particle then uses its own random-number generator
+    int completed = 0; ///< particles 1 to completed have been simulated
+    std::set<int> done; ///< numbers of further particles that have been simulated, only used if particles were simulated in several threads
+    TMCGenerator mc; ///< state of random-number generator after the last completed particle, only used if particles were simulated in a single thread
+    std::map<std::string, std::map<int, int> > ID_counter; ///< numbers of completed particles with each stopID for each particle type
+    int ntotalsteps = 0; ///< total number of integration steps of completed particles
+    std::map<std::string, std::streamoff> logpositions; ///< size of each output file after the last completed particle, see TLogger::GetPositions
+
+    /**
+     * Mark particle as completed
+     *
+     * @param particle Number of particle
+     */
+    void Complete(const int particle);
+
+    /**
+     * Check if particle has been completed
+     *
+     * @param particle Number of particle
+     *
+     * @return Returns true if particle has been completed
+     */
+    bool Done(const int particle) const{ return particle <= completed or done.count(particle) > 0; }
+
+    /**
+     * Write checkpoint to file
+     *
+     * The checkpoint is first written to a temporary file which then replaces the checkpoint file, so an interruption never leaves an incomplete checkpoint.
+     *
+     * @param file Path of checkpoint file
+     */
+    void Write(const boost::filesystem::path &file) const;
+
+    /**
+     * Read checkpoint from file
+     *
+     * @param file Path of checkpoint file
+     */
+    void Read(const boost::filesystem::path &file);
+};
+
+#endif //PENTRACK_CHECKPOINT_H
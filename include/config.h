@@ -11,6 +11,7 @@
 
 #include <string>
 #include <map>
+#include <vector>
 #include <iosfwd>
 
 #include "exprtk.hpp"
@@ -109,6 +110,18 @@ public:
 	friend std::ostream& operator<<(std::ostream &str, const TConfig &conf);
 };
 
+/**
+ * Find formula with given name and compile it once, so it can be evaluated repeatedly with changing variables
+ *
+ * @param config TConfig containing configuration variables
+ * @param formulaname Name of the formula to be compiled
+ * @param symbols Symbol table containing all variables the formula may depend on
+ * @param variables If given, names of all variables used in the formula are appended to this list (in lower case)
+ *
+ * @return Returns compiled expression, which is bound to the variables in symbols
+ */
+exprtk::expression<double> CompileFormula(TConfig &config, const std::string &formulaname, exprtk::symbol_table<double> &symbols, std::vector<std::string> *variables = nullptr);
+
 /**
  * Find and evaluate formulate with given name using the list of variables
  * 
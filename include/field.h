@@ -8,11 +8,80 @@
 #define FIELD_H_
 
 #include <array>
+#include <limits>
 #include <memory>
+#include <mutex>
+#include <unordered_map>
+#include <utility>
 
 #include "exprtk.hpp"
 
 
+/**
+ * Keeps a separate instance of T for each thread, e.g. formula interpreters or caches that cannot be used by several threads at once
+ *
+ * Each thread's instance is created on first use and destroyed when the thread ends.
+ * Instances belonging to destroyed TThreadLocal objects are removed when the thread creates a new instance.
+ */
+template<class T> class TThreadLocal{
+private:
+	/**
+	 * Instance of T used by one thread
+	 */
+	struct TInstance{
+		std::weak_ptr<const char> owner; ///< TThreadLocal::token of the object the instance belongs to, expires when that object is destroyed
+		std::unique_ptr<T> instance; ///< Instance of T
+	};
+
+	/**
+	 * Get the instances used by the calling thread
+	 *
+	 * @return Returns instances of all TThreadLocal<T> objects, indexed by TThreadLocal::token
+	 */
+	static std::unordered_map<const char*, TInstance>& instances(){
+		thread_local std::unordered_map<const char*, TInstance> threadinstances;
+		return threadinstances;
+	}
+
+	std::shared_ptr<const char> token = std::make_shared<const char>(0); ///< Identifies this object in each thread's list of instances
+public:
+	/**
+	 * Constructor
+	 */
+	TThreadLocal() = default;
+
+	/**
+	 * Copy constructor, the copy creates its own instances
+	 */
+	TThreadLocal(const TThreadLocal&){ }
+
+	TThreadLocal& operator=(const TThreadLocal&) = delete;
+
+	/**
+	 * Get the calling thread's instance, create it if it does not exist yet
+	 *
+	 * @param args Arguments passed to the constructor of T when the instance is created
+	 *
+	 * @return Returns instance used by the calling thread
+	 */
+	template<class... Args> T& get(Args&&... args) const{
+		std::unordered_map<const char*, TInstance> &threadinstances = instances();
+		TInstance &i = threadinstances[token.get()];
+		if (not i.instance or i.owner.expired()){ // no instance yet or instance belongs to a destroyed object at the same address
+			for (auto it = threadinstances.begin(); it != threadinstances.end();){
+				if (it->first != token.get() and it->second.owner.expired())
+					it = threadinstances.erase(it);
+				else
+					++it;
+			}
+			i.owner = token;
+			i.instance.reset(new T(std::forward<Args>(args)...));
+		}
+		return *i.instance;
+	}
+};
+
+
 /**
  * Virtual base class for all field calculation methods
  */
@@ -53,11 +122,46 @@ public:
 
 /**
  * Class to calculate a time-dependent field-scaling factor based on a formula string
+ *
+ * Each thread compiles its own formula interpreter. Within each thread, all scalers with the same formula share the interpreter and the cached value of its last evaluation,
+ * so a formula used by several fields is only evaluated once per time value.
  */
 class TFieldScaler{
 private:
-	exprtk::expression<double> scaler; ///< formula interpreter for field scaling
-	std::unique_ptr<double> tvar; ///< time variable for use in scaling-formula parsers. It needs to be a pointer to make sure the reference in the exprtk expression will not be invalidated when copying
+	/**
+	 * Compiled scaling formula and its last evaluation in one thread
+	 */
+	struct TScalingFormula{
+		exprtk::expression<double> scaler; ///< formula interpreter for field scaling
+		double tvar = 0.; ///< time variable for use in scaling-formula parser
+		double lastt = std::numeric_limits<double>::quiet_NaN(); ///< time of last evaluation of scaling formula
+		double lastvalue = 0.; ///< scaling factor calculated in last evaluation, returned again if the scaler is evaluated at the same time
+
+		/**
+		 * Constructor, compiles formula
+		 *
+		 * @param scalingFormula String containing formula describing time-dependence of field
+		 *
+		 * @throws std::runtime_error if formula cannot be compiled
+		 */
+		TScalingFormula(const std::string &scalingFormula);
+
+		TScalingFormula(const TScalingFormula&) = delete;
+	};
+
+	/**
+	 * Get formula interpreters shared by all scalers with the same formula, create them if no such scaler exists
+	 *
+	 * @param scalingFormula String containing formula describing time-dependence of field
+	 *
+	 * @return Returns shared formula interpreters of all threads
+	 */
+	static std::shared_ptr<const TThreadLocal<TScalingFormula> > GetFormula(const std::string &scalingFormula);
+
+	std::string scalingformula; ///< formula describing time-dependence of field
+	std::shared_ptr<const TThreadLocal<TScalingFormula> > formula; ///< formula interpreters of all threads, shared with other scalers
+	bool constant; ///< true if scaling formula does not depend on time, its value is then stored in constantvalue
+	double constantvalue; ///< value of constant scaling formula
 public:
 	/**
 	 * Calculate time-dependent scaling factor from parsed formula
@@ -113,6 +217,16 @@ public:
 	 */
 	virtual bool hasBounds() const = 0;
 
+	/**
+	 * Return box enclosing the region in which the field can be non-zero
+	 *
+	 * @param min Returns lower x, y, and z limits of the box
+	 * @param max Returns upper x, y, and z limits of the box
+	 *
+	 * @return Returns false if the field is not bounded, min and max are left untouched then
+	 */
+	virtual bool boundingBox(double min[3], double max[3]) const = 0;
+
 	/**
 	 * Check if coordinates are within the boundaries
 	 * 
@@ -182,6 +296,16 @@ public:
 	 */
 	bool hasBounds() const override;
 
+	/**
+	 * Return boundary box
+	 *
+	 * @param min Returns xmin, ymin, and zmin
+	 * @param max Returns xmax, ymax, and zmax
+	 *
+	 * @return Returns false if no valid boundaries are set, min and max are left untouched then
+	 */
+	bool boundingBox(double min[3], double max[3]) const override;
+
 	/**
 	 * Check if coordinates are within the boundaries
 	 * 
@@ -280,6 +404,33 @@ public:
 	TFieldContainer(std::unique_ptr<TField> &&_field, const std::string &BScalingFormula = "1", const std::string &EScalingFormula = "1"):
 		TFieldContainer(std::move(_field), BScalingFormula, EScalingFormula, 0., 0., 0., 0., 0., 0., 0.) {}
 
+	/**
+	 * Return box enclosing the region in which the field can be non-zero
+	 *
+	 * @param min Returns lower x, y, and z limits of the box
+	 * @param max Returns upper x, y, and z limits of the box
+	 *
+	 * @return Returns false if the field has no boundary, min and max are left untouched then
+	 */
+	bool boundingBox(double min[3], double max[3]) const{ return boundary->boundingBox(min, max); }
+
+	/**
+	 * Get unscaled field
+	 *
+	 * @return Returns field without time-dependent scaling and boundary
+	 */
+	const TField& GetField() const{ return *field; }
+
+	/**
+	 * Replace field by an approximation which is only valid within a box, e.g. a tabulated copy of the field
+	 *
+	 * Scaling formulas and boundary are kept. If the container has no boundary, the box becomes its boundary.
+	 *
+	 * @param _field Class derived from TField
+	 * @param min Lower x, y, and z limits of the box
+	 * @param max Upper x, y, and z limits of the box
+	 */
+	void ReplaceField(std::unique_ptr<TField> &&_field, const double min[3], const double max[3]);
 
 	/**
 	 * Calculate magnetic field at coordinates x,y,z taking into account time-dependent scaling and boundary
@@ -10,6 +10,8 @@
 
 #include "field.h"
 
+#include <boost/filesystem.hpp>
+
 #include "interpolation.h"
 
 /**
@@ -51,6 +53,34 @@ class TabField: public TField{
 						alglib::real_1d_array BTabs[3], alglib::real_1d_array ETabs[3], alglib::real_1d_array &VTab);
 
 
+		/**
+		 * Read parsed table from a binary cache file written by TabField::WriteCache
+		 *
+		 * @param cachefile Path of cache file
+		 * @param rind Vector containing r-components of grid
+		 * @param zind Vector containing z-components of grid
+		 * @param BTabs Three vectors containing magnetic field components at each grid point
+		 * @param ETabs Three vectors containing electric field components at each grid point
+		 * @param VTab Vector containing electric potential at each grid point
+		 */
+		void ReadCache(const boost::filesystem::path &cachefile, alglib::real_1d_array &rind, alglib::real_1d_array &zind,
+						alglib::real_1d_array BTabs[3], alglib::real_1d_array ETabs[3], alglib::real_1d_array &VTab);
+
+
+		/**
+		 * Write parsed table to a binary cache file
+		 *
+		 * @param out Stream to write to
+		 * @param rind Vector containing r-components of grid
+		 * @param zind Vector containing z-components of grid
+		 * @param BTabs Three vectors containing magnetic field components at each grid point
+		 * @param ETabs Three vectors containing electric field components at each grid point
+		 * @param VTab Vector containing electric potential at each grid point
+		 */
+		void WriteCache(std::ostream &out, const alglib::real_1d_array &rind, const alglib::real_1d_array &zind,
+						const alglib::real_1d_array BTabs[3], const alglib::real_1d_array ETabs[3], const alglib::real_1d_array &VTab) const;
+
+
 		/**
 		 * Print some information for each table column
 		 *
@@ -72,8 +102,9 @@ class TabField: public TField{
 		 *
 		 * @param tabfile Path of table file
 		 * @param alengthconv Factor to convert length units in file to PENTrack units (default: expect cm (cgs), convert to m)
+		 * @param cachefile Binary cache file, read instead of the table file if it exists and written after reading the table file otherwise. No cache is used if empty.
 		 */
-		TabField(const std::string &tabfile, const double alengthconv);
+		TabField(const std::string &tabfile, const double alengthconv, const boost::filesystem::path &cachefile = boost::filesystem::path());
 
 		/**
 		 * Get magnetic field at a specific point.
@@ -113,9 +144,11 @@ class TabField: public TField{
  * Instantiate a 2D field map created with OPERA
  * 
  * @param params Parameter string read from config file.
+ * @param formulas List of formulas defined in config file
+ * @param fieldcache Value of fieldcache option in GLOBAL section of config file, see ::FieldCachePath
  * 
  * @return Returns created 2D field map.
  */
-TFieldContainer ReadOperaField2(const std::string &params, const std::map<std::string, std::string> &formulas);
+TFieldContainer ReadOperaField2(const std::string &params, const std::map<std::string, std::string> &formulas, const std::string &fieldcache = "0");
 
 #endif // FIELD_2D_H_
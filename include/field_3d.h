@@ -9,8 +9,13 @@
 #include "field.h"
 
 #include <vector>
+#include <list>
+#include <unordered_map>
+#include <memory>
 
 #include "boost/multi_array.hpp"
+#include <boost/filesystem.hpp>
+#include <boost/iostreams/device/mapped_file.hpp>
 
 /**
  * Class for tricubic field interpolation, create one for every table file you want to use.
@@ -18,16 +23,65 @@
  * This class loads a tabulated magnetic and electric field on a rectilinear, three-dimensional grid and
  * calculates tricubic interpolation coefficients (4x4x4 = 64 for each grid point) to allow fast evaluation of the fields at arbitrary points.
  *
+ * For large tables the coefficients can instead be calculated on demand: only field values and derivatives on grid points are stored
+ * (8 values per grid point, optionally in single precision) and coefficients of recently used grid cells are kept in a least-recently-used cache.
+ *
+ * The grid and the precalculated coefficients or grid-point values can be written to a binary cache file, which is memory-mapped
+ * when loaded again, so jobs running on the same node share the memory pages.
+ *
  */
 class TabField3: public TField{
 private:
         std::array<std::vector<double>, 3> xyz; ///< coordinates of points on interpolation grid
+        std::array<bool, 3> uniform; ///< true if grid points are equally spaced in the corresponding dimension, cell indices can then be calculated directly
+        std::array<double, 3> spacing; ///< average distance between grid points in each dimension
         typedef boost::multi_array<double, 3> array3D;
         typedef std::array<double, 64> tricubic_coeff; ///< interpolation coefficients for one grid cell
-        typedef boost::multi_array<tricubic_coeff, 3> field_type; ///< interpolation coefficients for all grid cells
-        std::array<field_type, 3> Bc; ///< interpolation coefficients for magnetix x,y, and z components
-        field_type Vc; ///< interpolation coefficients for electric potential
+        typedef boost::const_multi_array_ref<tricubic_coeff, 3> field_type; ///< interpolation coefficients for all grid cells
+        template<typename T> using node_type = boost::const_multi_array_ref<std::array<T, 8>, 3>; ///< field value and derivatives d/dx, d/dy, d/dz, d2/dxdy, d2/dxdz, d2/dydz, d3/dxdydz on each grid point
+        std::array<std::unique_ptr<field_type>, 4> coeffs; ///< precalculated interpolation coefficients for Bx, By, Bz, and V, null if component is missing or coefficients are calculated on demand
+        std::array<std::unique_ptr<node_type<double> >, 4> nodes; ///< values and derivatives of Bx, By, Bz, and V on grid points, if coefficients are calculated on demand in double precision
+        std::array<std::unique_ptr<node_type<float> >, 4> floatnodes; ///< values and derivatives of Bx, By, Bz, and V on grid points, if coefficients are calculated on demand in single precision
+        std::vector<double> storage; ///< Memory holding TabField3::coeffs, TabField3::nodes, or TabField3::floatnodes, if they were not loaded from a cache file
+        boost::iostreams::mapped_file_source cachemap; ///< Memory-mapped cache file holding TabField3::coeffs, TabField3::nodes, or TabField3::floatnodes
+        unsigned long cachesize; ///< Maximum number of grid cells kept in coefficient cache, 0 if all coefficients are precalculated
+        /**
+         * Least-recently-used cache of interpolation coefficients, each thread evaluating the field uses its own cache
+         */
+        struct TCoefficientCache{
+            std::list<std::pair<unsigned long, std::array<tricubic_coeff, 4> > > cells; ///< Coefficients of Bx, By, Bz, and V for each cached grid cell, most recently used first
+            std::unordered_map<unsigned long, decltype(cells)::iterator> lookup; ///< Find cached grid cell by its linear index
+        };
+        TThreadLocal<TCoefficientCache> cache; ///< Coefficient cache of each thread, only used if TabField3::cachesize is larger than 0
 private:
+		/**
+		 * Check if grid points are equally spaced in each dimension and set TabField3::uniform and TabField3::spacing
+		 */
+		void CheckGrid();
+
+
+		/**
+		 * Calculate size of memory block holding precalculated coefficients or grid-point values
+		 *
+		 * @param available Select which components (Bx, By, Bz, V) are stored in memory block
+		 * @param singleprecision Grid-point values are stored in single precision (only used if TabField3::cachesize is larger than 0)
+		 * @return Returns size of memory block in bytes
+		 */
+		std::size_t DataSize(const std::array<bool, 4> &available, const bool singleprecision) const;
+
+
+		/**
+		 * Create TabField3::coeffs, TabField3::nodes, or TabField3::floatnodes referring to a block of memory
+		 *
+		 * The block contains the data of all available components (Bx, By, Bz, V), one after the other
+		 *
+		 * @param data Pointer to memory block, its size is given by TabField3::DataSize
+		 * @param available Select which components are stored in memory block
+		 * @param singleprecision Grid-point values are stored in single precision (only used if TabField3::cachesize is larger than 0)
+		 */
+		void MapData(const char *data, const std::array<bool, 4> &available, const bool singleprecision);
+
+
 		/**
 		 * Print some information for each table column
 		 *
@@ -47,31 +101,77 @@ private:
         void CalcDerivs(const array3D &Tab, const unsigned long diff_dim, array3D &DiffTab) const;
 
 
+		/**
+		 * Calculate field values and their derivatives on all grid points
+		 *
+		 * Calls TabField3::CalcDerivs for each dimension and combination of dimensions
+		 *
+		 * @param Tab 3D array of field components on grid
+		 * @param node Returns field value and derivatives for each grid point
+		 */
+		template<typename T> void CalcNodes(const array3D &Tab, boost::multi_array_ref<std::array<T, 8>, 3> &node) const;
+
+
+		/**
+		 * Calculate tricubic interpolation coefficients of a single grid cell from values and derivatives on its corners with ::tricubic_get_coeff
+		 *
+		 * @param node Field values and derivatives on grid points, calculated by TabField3::CalcNodes
+		 * @param index Indices of grid cell
+		 * @param coeff Returns interpolation coefficients of grid cell
+		 */
+		template<typename T> void CalcCoefficients(const node_type<T> &node, const std::array<unsigned long, 3> &index, tricubic_coeff &coeff) const;
+
+
 		/**
 		 * Calculate tricubic interpolation coefficients for a table column
 		 *
-		 * Calls TabField3::CalcDerivs and determines the interpolation coefficients with ::tricubic_get_coeff
+		 * Calls TabField3::CalcNodes and determines the interpolation coefficients of each grid cell with TabField3::CalcCoefficients
 		 *
          * @param Tab 3D array of field components on grid
          * @param coeff Returns 3D array of tricubic interpolation coefficients for each grid cell
          */
-        void PreInterpol(const array3D &Tab, field_type &coeff) const;
+        void PreInterpol(const array3D &Tab, boost::multi_array_ref<tricubic_coeff, 3> &coeff) const;
 
 
 		/**
-		 * Interpolate field component at a specific point.
+		 * Get interpolation coefficients of a grid cell, either from precalculated tables or from the coefficient cache.
 		 *
-		 * Uses a binary search to find the grid cell that contains the point (x,y,z) and and calculates the tricubic interpolation using the coefficients belonging to the grid cell.
+		 * Coefficients missing from the calling thread's cache are calculated for all field components and the least recently used cell is dropped if the cache is full.
+		 * Coefficients taken from the cache remain valid until the calling thread calls GetCoefficients again.
 		 *
-		 * @param x X coordinate where the field shall be evaluated
-		 * @param y Y coordinate where the field shall be evaluated
-		 * @param z Z coordinate where the field shall be evaluated
-		 * @param coeffs 3D array of tricubic interpolation coefficients
-		 * @param F Returns interpolated field component
-		 * @param dFdxi Returns spatial derivatives of field component (can be null)
+		 * @param index Indices of grid cell, returned by TabField3::FindCell
+		 * @param components Select which components (Bx, By, Bz, V) are required
+		 * @return Returns pointers to interpolation coefficients of each component, null if component is not required or not available
+		 */
+		std::array<const double*, 4> GetCoefficients(const std::array<unsigned long, 3> &index, const std::array<bool, 4> &components) const;
+
+
+		/**
+		 * Find grid cell containing a specific point.
+		 * On uniform grids the cell index is calculated directly, otherwise it is found with a binary search.
+		 * @param x X coordinate
+		 * @param y Y coordinate
+		 * @param z Z coordinate
+		 * @param index Returns indices of grid cell
+		 * @param r Returns coordinates scaled to unit cube of grid cell
+		 * @param dist Returns size of grid cell
+		 * @return Returns false if point is outside of grid
 		 */
-		void Interpolate(const double x, const double y, const double z,
-                            const field_type& coeffs, double &F, double dFdxi[3]) const;
+		bool FindCell(const double x, const double y, const double z, std::array<unsigned long, 3> &index, std::array<double, 3> &r, std::array<double, 3> &dist) const;
+
+
+		/**
+		 * Interpolate several field components in one grid cell.
+		 * Powers of the scaled coordinates are calculated once and shared by all components.
+		 * @param r Coordinates scaled to unit cube, returned by TabField3::FindCell
+		 * @param dist Size of grid cell, returned by TabField3::FindCell
+		 * @param coeffs Interpolation coefficients of up to four field components in the grid cell, returned by TabField3::GetCoefficients. Null entries are skipped.
+		 * @param F Returns interpolated field components
+		 * @param dFdxi Returns spatial derivatives of field components
+		 * @param derivatives Only calculate derivatives if true
+		 */
+		void Interpolate(const std::array<double, 3> &r, const std::array<double, 3> &dist,
+		                 const std::array<const double*, 4> &coeffs, double F[4], double dFdxi[4][3], const bool derivatives) const;
 	public:
 		/**
 		 * Constructor.
@@ -81,15 +181,42 @@ private:
          * @param xyzTab Lists of x, y, and z coordinates of grid points
          * @param BTab Lists of Bx, By, and Bz magnetic field components on grid points
          * @param VTab List of electric potentials on grid points
+         * @param CacheSize If larger than 0, interpolation coefficients are calculated on demand and up to this many grid cells are cached
+         * @param SinglePrecision Store field values and derivatives on grid points in single precision (only if CacheSize is larger than 0)
+		 */
+        TabField3(const std::array<std::vector<double>, 3> &xyzTab, const std::array<std::vector<double>, 3> &BTab, const std::vector<double> &VTab,
+                  const unsigned long CacheSize = 0, const bool SinglePrecision = false);
+
+
+		/**
+		 * Constructor, loading grid and precalculated data from a cache file written by TabField3::WriteCache
+		 *
+		 * @param cachefile Path of cache file, it is memory-mapped and has to remain unchanged while the field is in use
+		 * @param CacheSize Number of grid cells kept in coefficient cache, has to be larger than 0 if cache file contains grid-point values instead of coefficients
 		 */
-        TabField3(const std::array<std::vector<double>, 3> &xyzTab, const std::array<std::vector<double>, 3> &BTab, const std::vector<double> &VTab);
+		TabField3(const boost::filesystem::path &cachefile, const unsigned long CacheSize);
+
+
+		/**
+		 * Write grid and precalculated coefficients or grid-point values to a binary cache file, which can be loaded with the corresponding constructor
+		 *
+		 * @param out Stream to write to
+		 */
+		void WriteCache(std::ostream &out) const;
+
+
+		/**
+		 * Get coordinates of grid points
+		 *
+		 * @return Returns sorted lists of x, y, and z coordinates of grid points
+		 */
+		const std::array<std::vector<double>, 3>& GetGrid() const{ return xyz; }
 
 
 		/**
 		 * Get magnetic field at a specific point.
 		 *
-		 * Searches the right interpolation coefficients by determining the indices from TabField3::x_mi, TabField3::xdist, TabField3::y_mi, TabField3::ydist, TabField3::z_mi, TabField3::zdist
-		 * and evaluates the interpolation polynom tricubic.h#tricubic_eval.
+		 * Finds the grid cell with TabField3::FindCell and evaluates the interpolation polynomials of all components with TabField3::Interpolate.
 		 *
 		 * @param x X coordinate where the field shall be evaluated
 		 * @param y Y coordinate where the field shall be evaluated
@@ -104,8 +231,7 @@ private:
 		/**
 		 * Get electric field at a specific point.
 		 *
-		 * Searches the right interpolation coefficients by determining the indices from TabField3::x_mi, TabField3::xdist, TabField3::y_mi, TabField3::ydist, TabField3::z_mi, TabField3::zdist
-		 * and evaluates the interpolation polynom tricubic.h#tricubic_eval.
+		 * Finds the grid cell with TabField3::FindCell and evaluates the interpolation polynomial of the potential with TabField3::Interpolate.
 		 *
 		 * @param x X coordinate where the field shall be evaluated
 		 * @param y Y coordinate where the field shall be evaluated
@@ -120,16 +246,39 @@ private:
 
 /**
  * Read 3D table file exported from OPERA
- * @param params String containing parameters defined in config.in. Should contain field type "3Dtable", file name, magnetic field scaling formula, electric field scaling formula, and boundary width
+ * @param params String containing parameters defined in config.in. Should contain field type "3Dtable", file name, magnetic field scaling formula, electric field scaling formula, and boundary width,
+ * optionally followed by size of coefficient cache and storage precision ("double" or "float")
+ * @param formulas List of formulas defined in config.in
+ * @param fieldcache Value of fieldcache option in GLOBAL section of config.in, see ::FieldCachePath
  * @return Pointer to created class, derived from TField
  */
-TFieldContainer ReadOperaField3(const std::string &params, const std::map<std::string, std::string> &formulas);
+TFieldContainer ReadOperaField3(const std::string &params, const std::map<std::string, std::string> &formulas, const std::string &fieldcache = "0");
 
 /**
 * Read generic file containing table of magnetic field mapped on list of points, e.g. exported from COMSOL
-* @param params String containing parameters defined in config.in. Should contain field type "COMSOL", file name, magnetic field scaling formula, and boundary width
+* @param params String containing parameters defined in config.in. Should contain field type "COMSOL", file name, magnetic field scaling formula, and boundary width,
+* optionally followed by size of coefficient cache and storage precision ("double" or "float")
+* @param formulas List of formulas defined in config.in
+* @param fieldcache Value of fieldcache option in GLOBAL section of config.in, see ::FieldCachePath
 * @return Pointer to created class, derived from TField
 */
-TFieldContainer ReadComsolField(const std::string &params, const std::map<std::string, std::string> &formulas);
+TFieldContainer ReadComsolField(const std::string &params, const std::map<std::string, std::string> &formulas, const std::string &fieldcache = "0");
+
+/**
+ * Sample a field on a regular grid and replace it by a tricubic interpolation
+ *
+ * Tabulating an analytic field that is expensive to evaluate trades accuracy for speed.
+ * The field is sampled at time 0, so its unscaled value must not depend on time.
+ * The maximum deviation between field and interpolation at random points within the grid is printed.
+ *
+ * @param field Field to tabulate
+ * @param min Lower x, y, and z limits of the grid
+ * @param max Upper x, y, and z limits of the grid
+ * @param n Number of grid points in x, y, and z direction
+ * @param cachefile Path of cache file, returned by ::GeneratedFieldCachePath. If it exists the table is loaded from it, otherwise it is written to it. Empty disables caching.
+ * @return Returns interpolated field, which is zero outside of the grid
+ */
+std::unique_ptr<TabField3> TabulateField(const TField &field, const std::array<double, 3> &min, const std::array<double, 3> &max, const std::array<unsigned long, 3> &n,
+                                         const boost::filesystem::path &cachefile = boost::filesystem::path());
 
 #endif // FIELD_3D_H_
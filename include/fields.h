@@ -7,6 +7,7 @@
 #define FIELDS_H_
 
 #include <vector>
+#include <array>
 
 #include "field.h"
 #include "config.h"
@@ -18,6 +19,42 @@
 class TFieldManager{
 private:
     std::vector< TFieldContainer > fields; ///< list of fields
+	std::array<std::vector<double>, 3> edges; ///< sorted x, y, and z coordinates of field bounding boxes, dividing space into cells
+	std::vector<std::size_t> celloffsets; ///< position of each cell's first entry in cellfields, with one additional entry marking the end of the last cell
+	std::vector<std::size_t> cellfields; ///< ascending indices of all fields whose bounding boxes overlap a cell, concatenated for all cells
+	std::vector<std::size_t> unboundedfields; ///< indices of fields without bounding box, which are the only ones evaluated outside all cells
+
+	/**
+	 * Build spatial index of fields.
+	 *
+	 * The bounding boxes of all fields divide space into a rectilinear grid of cells.
+	 * For each cell, store the list of fields that can contribute to the field inside that cell.
+	 * If this grid would become too large, neighbouring cells are merged.
+	 */
+	void BuildIndex();
+
+	/**
+	 * Find list of fields that have to be evaluated at a given position.
+	 *
+	 * @param x Cartesian x coordinate
+	 * @param y Cartesian y coordinate
+	 * @param z Cartesian z coordinate
+	 * @param begin Returns pointer to first field index
+	 * @param end Returns pointer behind last field index
+	 */
+	void FindFields(const double x, const double y, const double z, const std::size_t* &begin, const std::size_t* &end) const;
+
+	/**
+	 * Create field from its definition in the FIELDS section of the config file
+	 *
+	 * Definitions starting with "Tabulate", followed by a grid and another field definition, replace the field by a tricubic interpolation on that grid (see ::TabulateField).
+	 *
+	 * @param definition Field definition
+	 * @param conf Configuration containing GLOBAL and FORMULAS sections
+	 *
+	 * @return Returns created field
+	 */
+	static TFieldContainer ReadField(const std::string &definition, TConfig &conf);
 		
 public:
 	TFieldManager(const TFieldManager &f) = delete; ///< TFieldManager is not copyable
@@ -60,6 +97,19 @@ public:
 	 */
 	void EField(const double x, const double y, const double z, const double t,
 			double &V, double Ei[3]) const;
+
+
+	/**
+	 * Check if all fields are zero everywhere within a box
+	 *
+	 * Checks if the box overlaps the bounding box of any field. Fields without bounding box are non-zero everywhere.
+	 *
+	 * @param min Lower x, y, and z limits of the box
+	 * @param max Upper x, y, and z limits of the box
+	 *
+	 * @return Returns true if the box does not overlap any field
+	 */
+	bool IsFieldFree(const double min[3], const double max[3]) const;
 };
 
 #endif // FIELDS_H_
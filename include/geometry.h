@@ -81,9 +81,13 @@ std::ostream& operator<<(std::ostream &str, const solid &sld);
 struct TGeometry{
 	private:
 		std::vector<solid> solids; ///< solids list
+		std::vector<const solid*> solidtable; ///< pointers to solids in solids list and to defaultsolid, indexed by solid ID
 	public:
 		TTriangleMesh mesh; ///< kd-tree structure containing triangle meshes from STL-files
 		solid defaultsolid; ///< "vacuum", this solid's properties are used when the particle is not inside any other solid
+
+		TGeometry(const TGeometry &g) = delete; ///< TGeometry is not copyable, solidtable points to its members
+		TGeometry& operator=(const TGeometry &g) = delete; ///< TGeometry is not copyable, solidtable points to its members
 		
 		/**
 		 * Constructor, reads geometry configuration file, loads triangle meshes.
@@ -106,6 +110,31 @@ struct TGeometry{
 		};
 		
 
+		/**
+		 * Check if any surface intersects a box
+		 *
+		 * @param min Lower x, y, and z limits of the box
+		 * @param max Upper x, y, and z limits of the box
+		 *
+		 * @return Returns true if a surface intersects the box
+		 */
+		bool SurfaceInBox(const double min[3], const double max[3]) const{
+			return mesh.IntersectsBox(min, max);
+		};
+
+
+		/**
+		 * Get lower bound of distance between point and nearest surface, see TTriangleMesh::DistanceBound.
+		 *
+		 * @param p Point
+		 *
+		 * @return Returns distance in which no surface can be found, 0 if distance field is disabled
+		 */
+		double SafeDistance(const double p[3]) const{
+			return mesh.DistanceBound(p);
+		};
+
+
 		/**
 		 * Checks if line segment p1->p2 collides with a surface.
 		 *
@@ -142,7 +171,7 @@ struct TGeometry{
 		 *
 		 * @return Returns solid with highest priority, that was not ignored at time t
 		 */
-		solid GetSolid(const double t, const double p[3]) const;
+		const solid& GetSolid(const double t, const double p[3]) const;
 
 
 		/**
@@ -152,7 +181,7 @@ struct TGeometry{
 		 * 
 		 * @return Returns solid with given ID
 		 */
-		 solid GetSolid(const unsigned ID) const;
+		 const solid& GetSolid(const unsigned ID) const;
 };
 
 #endif /*GEOMETRY_H_*/
@@ -7,6 +7,8 @@
 #include <string>
 #include <iostream>
 #include <atomic>
+#include <cstdint>
+#include <functional>
 
 #include <boost/filesystem.hpp>
 
@@ -54,6 +56,7 @@ extern const long double gamma_n; ///< 2*::mu_nSI/::hquer gyromagnetic ratio of
 extern const long double gamma_hg; ///< from: http://www.sciencedirect.com/science/article/pii/S0370269314007692 [ 1/Ts ]
 extern const long double gamma_xe; ///< from: http://nmrwiki.org/wiki/index.php?title=Gyromagnetic_ratio [ 1/Ts ]
 
+extern uint64_t seed; ///< random seed used for random-number generator (read from command line parameters or generated from high-resolution clock)
 extern long long int jobnumber; ///< job number, read from command line paramters, used for parallel calculations
 extern boost::filesystem::path configpath; ///< path to configuration file, read from command line paramters
 extern boost::filesystem::path outpath; ///< path where the log file should be saved to, read from command line parameters
@@ -217,4 +220,42 @@ double MaxwellBoltzSpectrum (const double T, const double E);
  */
 std::string ResolveFormula(const std::string &formulaName, const std::map<std::string, std::string> &formulas);
 
+/**
+ * Determine name of binary cache file for a field table
+ *
+ * The name contains a hash of the table file's content and of all parameters that affect the cached data,
+ * so a changed table or changed parameters will never load an outdated cache file.
+ *
+ * @param fieldcache Value of fieldcache option in GLOBAL section of config file: "0" or empty disables caching, "1" puts cache files next to table files, any other value is the directory where cache files are stored
+ * @param table Path of table file
+ * @param parameters Parameters that affect the cached data, e.g. coordinate scaling
+ *
+ * @return Returns path of cache file, empty if caching is disabled
+ */
+boost::filesystem::path FieldCachePath(const std::string &fieldcache, const boost::filesystem::path &table, const std::string &parameters);
+
+/**
+ * Determine name of binary cache file for a field that is not read from a table file, e.g. a tabulated analytic field
+ *
+ * The name contains a hash of all parameters that define the cached data.
+ *
+ * @param fieldcache Value of fieldcache option in GLOBAL section of config file: "0" or empty disables caching, "1" puts cache files next to the config file, any other value is the directory where cache files are stored
+ * @param name Name of field, used as prefix of the file name
+ * @param parameters Parameters that define the cached data, e.g. field definition and grid
+ *
+ * @return Returns path of cache file, empty if caching is disabled
+ */
+boost::filesystem::path GeneratedFieldCachePath(const std::string &fieldcache, const std::string &name, const std::string &parameters);
+
+/**
+ * Write binary cache file for a field table
+ *
+ * Data is first written to a temporary file which then replaces the cache file, so jobs running in parallel never see an incomplete cache file.
+ * Failures are only reported, since the cache is not required to run the simulation.
+ *
+ * @param cachefile Path of cache file, returned by ::FieldCachePath
+ * @param write Function writing the data to the given stream
+ */
+void WriteFieldCache(const boost::filesystem::path &cachefile, const std::function<void(std::ostream&)> &write);
+
 #endif /*GLOBALS_H_*/
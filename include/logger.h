@@ -4,6 +4,9 @@
 #include <memory>
 #include <map>
 #include <fstream>
+#include <initializer_list>
+#include <mutex>
+#include <cstdio>
 
 #include "particle.h"
 #include "geometry.h"
@@ -14,23 +17,72 @@
 #include "TNtupleD.h"
 #endif
 
+static const std::size_t MAX_BUFFERED_VALUES = 1 << 20; ///< max. number of variables a TBufferedLogger keeps in memory, further rows are moved to a temporary file
 
 /**
  * Virtual base class printing particle states, track, spin
  */
 class TLogger {
+    friend class TBufferedLogger;
 protected:
     TConfig config; ///< configuration parameters read from config files
 
     /**
-     * Evaluates the logvars and corresponding filters and formulas set in the config file and calls DoLog
+     * Log variables and filter of one particle and log type, compiled on first use and reused for every following row
+     *
+     * Each Print function stores its variables in a fixed set of slots. The requested logvars and the logfilter are resolved to slot indices once,
+     * so Print functions can skip the calculation of expensive variables that are not used.
+     */
+    struct TLogFormat{
+        bool enabled; ///< True if this log type is enabled for the particle (<suffix>log)
+        double interval; ///< Log interval (<suffix>loginterval), zero if not set
+        std::vector<std::string> titles; ///< Names of logged variables
+        std::vector<double> variables; ///< Current values of all available variables, indexed by slot and referenced by symbols
+        std::vector<bool> used; ///< For each slot, true if it is referenced by logvars or logfilter
+        exprtk::symbol_table<double> symbols; ///< Symbol table binding variables to compiled formulas
+        bool hasfilter; ///< True if a logfilter was set
+        exprtk::expression<double> filter; ///< Compiled logfilter formula
+        std::vector<int> slots; ///< For each logged variable, index of its slot or -1 if it is a formula
+        std::vector<exprtk::expression<double> > formulas; ///< For each logged variable, compiled formula (only used if corresponding slot is -1)
+        std::vector<double> row; ///< Buffer holding the logged values passed to DoLog
+
+        /**
+         * Check if any of the given slots is used by logvars or logfilter
+         *
+         * @param s List of slot indices
+         *
+         * @return Returns true if at least one of the slots is used
+         */
+        bool Uses(std::initializer_list<int> s) const{
+            for (int i: s){
+                if (used[i])
+                    return true;
+            }
+            return false;
+        }
+    };
+    std::map<std::string, TLogFormat> logformats; ///< List of compiled log formats, one for each combination of particle name and log type
+
+    /**
+     * Return compiled log format for given particle and log type, reads configuration and compiles formulas on first call
+     *
+     * @param particlename Name of particle being logged
+     * @param suffix Indicates logging type (e.g. "end", "snapshot", "track", "spin")
+     * @param names Names of all variables available for logvars and logfilter, in order of their slots
+     * @param default_titles Default variables to be logged in case none are given in the config
+     *
+     * @return Returns reference to compiled log format
+     */
+    TLogFormat& GetLogFormat(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &names, const std::vector<std::string> &default_titles);
+
+    /**
+     * Evaluates the filter and logged formulas of a log format with its current variables and calls DoLog
      * 
      * @param particlename Name of particle being logged
      * @param suffix Indicates logging type (e.g. "end", "snapshot", "track", "spin")
-     * @param variables Maps of variable names and their values used to evaluate logvars
-     * @param default_titles Optional parameter containing default variables to be logged in case none are given in the config
+     * @param format Compiled log format whose variable slots have been filled by the caller
      */
-    void Log(const std::string &particlename, const std::string &suffix, const std::map<std::string, double> &variables, const std::vector<std::string> &default_titles = {});
+    void Log(const std::string &particlename, const std::string &suffix, TLogFormat &format);
 
     /**
      * Virtual function actually doing the logging. Must be implemented in all derived classes
@@ -43,6 +95,28 @@ protected:
     virtual void DoLog(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles, const std::vector<double> &vars) = 0;
 public:
     virtual ~TLogger(){ }; ///< Virtual desctructor (empty)
+
+    /**
+     * Get size of all opened output files, including rows that have not been written to disk yet
+     *
+     * Used to record the state of the output in a checkpoint. Loggers that do not support checkpoints throw an exception.
+     *
+     * @param sync Write buffered rows to disk first, so the files contain all rows up to the returned sizes even if the program is killed
+     *
+     * @return Returns size of each output file in bytes, identified by particle name and log type
+     */
+    virtual std::map<std::string, std::streamoff> GetPositions(const bool sync);
+
+    /**
+     * Continue writing to the output files of an interrupted simulation
+     *
+     * The files are truncated to the sizes recorded by GetPositions, so rows logged after the checkpoint are removed, and new rows are appended.
+     * Loggers that do not support checkpoints throw an exception.
+     *
+     * @param positions Size of each output file, returned by GetPositions
+     */
+    virtual void Resume(const std::map<std::string, std::streamoff> &positions);
+
     /**
      * Print start and current states of a particle
      *
@@ -126,6 +200,21 @@ public:
     void PrintSpin(const std::unique_ptr<TParticle>& p, const value_type x, const dense_stepper_type& spinstepper,
                    const dense_stepper_type &trajectory_stepper, const TFieldManager &field);
 
+    /**
+     * Write spin state of particle
+     *
+     * Collects variables and passes them to the virtual Log function
+     *
+     * @param p Particle to be printed
+     * @param x1 Time of previous spin step
+     * @param x Time to print the spin state at
+     * @param spin Spin state at time x
+     * @param trajectory_stepper Trajectory integrator used to calculate spin-precession axis at time t
+     * @param field TFieldManager containing all electromagnetic fields
+     */
+    void PrintSpin(const std::unique_ptr<TParticle>& p, const value_type x1, const value_type x, const state_type &spin,
+                   const dense_stepper_type &trajectory_stepper, const TFieldManager &field);
+
 };
 
 /**
@@ -152,12 +241,176 @@ public:
      */
     TTextLogger(TConfig& aconfig){ config = aconfig; };
 
+    /**
+     * Get size of all opened output files
+     *
+     * @param sync Write buffered rows to disk first
+     *
+     * @return Returns size of each output file in bytes, identified by particle name and log type
+     */
+    std::map<std::string, std::streamoff> GetPositions(const bool sync) override;
+
+    /**
+     * Truncate output files to given sizes and open them to append new rows
+     *
+     * @param positions Size of each output file, returned by GetPositions
+     */
+    void Resume(const std::map<std::string, std::streamoff> &positions) override;
+
     /**
      * Destructor, closes all opened file streams
      */
     ~TTextLogger() final { for (auto &s: logstreams){ s.second.close(); } };
 };
 
+/**
+ * Class to print particle states to binary files
+ *
+ * Each file starts with a human-readable text header containing the column names, job number, random seed and all configuration variables.
+ * The header is padded to a multiple of 8 bytes and its total size is given in its second line ("headersize ...").
+ * It is followed by rows of native doubles, which can be read directly with e.g. numpy.memmap(filename, dtype='float64', offset=headersize).
+ */
+class TBinaryLogger: public TLogger {
+private:
+    /**
+     * Output file and buffer of not yet written rows
+     */
+    struct TBinaryLogStream{
+        std::ofstream file; ///< Binary file stream
+        std::vector<double> buffer; ///< Rows waiting to be written to file
+    };
+    std::map<std::string, TBinaryLogStream> logstreams; ///< List of file streams used for logging
+    std::size_t buffersize; ///< Number of doubles buffered for each file before writing to disk
+
+    /**
+     * Write header to newly opened binary file
+     *
+     * @param file File stream to write header to
+     * @param particlename Name of particle to be printed
+     * @param suffix Log type (e.g. "end", "snapshot", "track", "spin")
+     * @param titles List of variable names
+     */
+    void WriteHeader(std::ofstream &file, const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles) const;
+
+    /**
+     * Write buffered rows to file and clear buffer
+     *
+     * @param stream Stream to be flushed
+     */
+    void Flush(TBinaryLogStream &stream);
+
+    /**
+     * Logs given variables to selected binary file
+     *
+     * @param particlename Name of particle to be printed
+     * @param suffix Select file to log to (e.g. "end", "snapshot", "track", "spin")
+     * @param titles List of variable names
+     * @param vars List of variables to be logged
+     */
+    void DoLog(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles, const std::vector<double> &vars) override;
+public:
+    /**
+     * Constructor, reads relevant configuration parameters
+     *
+     * @param aconfig List of configuration parameters read from config file
+     */
+    TBinaryLogger(TConfig& aconfig);
+
+    /**
+     * Get size of all opened output files, including buffered rows
+     *
+     * @param sync Write buffered rows to disk first
+     *
+     * @return Returns size of each output file in bytes, identified by particle name and log type
+     */
+    std::map<std::string, std::streamoff> GetPositions(const bool sync) override;
+
+    /**
+     * Truncate output files to given sizes and open them to append new rows
+     *
+     * @param positions Size of each output file, returned by GetPositions
+     */
+    void Resume(const std::map<std::string, std::streamoff> &positions) override;
+
+    /**
+     * Destructor, writes remaining buffers and closes all opened file streams
+     */
+    ~TBinaryLogger() final;
+};
+
+/**
+ * Class collecting logged rows in memory, used by worker threads to pass complete particle histories to a shared logger
+ *
+ * Formulas and filters are evaluated by this logger, the buffered rows are then passed to the DoLog function of the shared logger.
+ * If more than MAX_BUFFERED_VALUES variables are buffered, e.g. when a long track log is recorded, they are moved to a temporary file,
+ * so memory usage stays bounded while the rows of each particle are still passed on together.
+ */
+class TBufferedLogger: public TLogger {
+private:
+    /**
+     * Log type of buffered rows
+     */
+    struct TBufferedFormat{
+        std::string particlename; ///< Name of logged particle
+        std::string suffix; ///< Log type
+        const std::vector<std::string> *titles; ///< List of variable names, stored in logformats
+    };
+
+    /**
+     * Description of one buffered row
+     */
+    struct TBufferedRow{
+        std::size_t format; ///< Index of log type in formats
+        std::size_t offset; ///< Position of first variable in data
+    };
+    std::vector<TBufferedFormat> formats; ///< List of log types of buffered rows
+    std::vector<TBufferedRow> rows; ///< List of buffered rows
+    std::vector<double> data; ///< Variables of all buffered rows
+    std::FILE *spillfile = nullptr; ///< Temporary file containing rows moved out of memory, created when first needed
+    std::size_t spilledrows = 0; ///< Number of rows in spillfile
+    TLogger &target; ///< Shared logger to pass buffered rows to
+    std::mutex &targetmutex; ///< Mutex protecting access to shared logger
+
+    /**
+     * Append given variables to buffer
+     *
+     * @param particlename Name of particle to be printed
+     * @param suffix Log type (e.g. "end", "snapshot", "track", "spin")
+     * @param titles List of variable names
+     * @param vars List of variables to be logged
+     */
+    void DoLog(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles, const std::vector<double> &vars) override;
+
+    /**
+     * Move rows buffered in memory to temporary file
+     */
+    void Spill();
+public:
+    /**
+     * Constructor
+     *
+     * @param aconfig List of configuration parameters read from config file
+     * @param atarget Shared logger to write buffered rows to
+     * @param amutex Mutex protecting access to shared logger
+     */
+    TBufferedLogger(TConfig &aconfig, TLogger &atarget, std::mutex &amutex): target(atarget), targetmutex(amutex){ config = aconfig; };
+
+    /**
+     * Pass all buffered rows to shared logger and clear buffer
+     */
+    void Flush();
+
+    /**
+     * Discard all buffered rows, e.g. of a particle whose simulation was interrupted
+     */
+    void Clear();
+
+    /**
+     * Destructor, flushes remaining rows
+     */
+    ~TBufferedLogger() final;
+};
+
 #ifdef USEROOT
 /**
  * Class to print particle states to ROOT trees. Only available if cmake found ROOT libraries.
@@ -199,5 +452,16 @@ public:
  */
 std::unique_ptr<TLogger> CreateLogger(TConfig& config);
 
+/**
+ * Write header of a binary output file (see out/readBinarylog.py), rows of doubles can be written to the file afterwards
+ *
+ * @param file Newly opened file stream to write header to
+ * @param titles List of column names
+ * @param entries Additional header entries (name and value)
+ * @param config Configuration variables appended to the header
+ */
+void WriteBinaryHeader(std::ostream &file, const std::vector<std::string> &titles, const std::vector<std::pair<std::string, std::string> > &entries,
+                       const TConfig &config);
+
 
 #endif //PENTRACK_LOGGER_H
@@ -8,6 +8,8 @@
 #ifndef INCLUDE_MICROROUGHNESS_H_
 #define INCLUDE_MICROROUGHNESS_H_
 
+#include <cstddef>
+
 namespace MR{
 	/**
 	 * Check if the MicroRoughness is model is applicable to the current interaction, see equations (17) and (18) in Steyerl's publication
@@ -66,6 +68,43 @@ namespace MR{
 	 * @return Returns maximal value of MicroRoughness model distribution in range (theta = 0..pi/2, phi = 0..2pi)
 	 */
 	double MRDistMax(const bool transmit, const double v[3], const double normal[3], const double Estep, const double RMSroughness, const double correlationLength);
+
+	/**
+	 * Probabilities and distribution maximum needed to simulate a MicroRoughness interaction
+	 */
+	struct TMRValues{
+		double reflprob; ///< total diffuse reflection probability, see MRProb
+		double transprob; ///< total diffuse transmission probability, see MRProb
+		double distmax; ///< maximum of diffuse transmission distribution, see MRDistMax
+	};
+
+	/**
+	 * Enable tables used by MRTabulated
+	 *
+	 * One table is created for each combination of potential step, roughness and correlation length, when it is used first.
+	 * Its nodes span normal and tangential kinetic energies from 0 to Emax and are only calculated when a neighbouring cell is needed.
+	 *
+	 * @param nodes Number of nodes along each energy axis, 0 disables tables
+	 * @param Emax Maximum normal and tangential kinetic energy covered by tables [eV]
+	 */
+	void SetMRTables(const std::size_t nodes, const double Emax);
+
+	/**
+	 * Interpolate total diffuse reflection and transmission probabilities and maximum of transmission distribution from tables
+	 *
+	 * When a table cell is used first, the interpolation in its center is compared to MRProb and MRDistMax.
+	 * If the relative difference is too large, the cell is never used and this function returns false.
+	 *
+	 * @param v velocity right before surface hit
+	 * @param normal Normal vector of hit surface
+	 * @param Estep potential step at the material boundary
+	 * @param RMSroughness root-mean-square roughness of the surface at the material boundary
+	 * @param correlationLength correlation length of the surface at the boundary
+	 * @param values Returns interpolated values
+	 *
+	 * @return Returns false if tables are disabled, velocity is outside of table, or interpolation is not accurate enough. Values have to be calculated with MRProb and MRDistMax then.
+	 */
+	bool MRTabulated(const double v[3], const double normal[3], const double Estep, const double RMSroughness, const double correlationLength, TMRValues &values);
 };
 
 
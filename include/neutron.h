@@ -92,9 +92,10 @@ protected:
 	 *
 	 * Refracts or scatters the neutron according to Micro Roughness model.
 	 * For parameter documentation see TNeutron::OnHit.
+	 * MRdistmax is the maximum of the MicroRoughness transmission distribution (see MR::MRDistMax), used to sample scattering angles.
 	 */
 	void TransmitMR(const value_type x1, const state_type &y1, value_type &x2, state_type &y2,
-			const double normal[3], const double Estep, const material &mat, TMCGenerator &mc) const;
+			const double normal[3], const double Estep, const material &mat, const double MRdistmax, TMCGenerator &mc) const;
 
 	/**
 	 * Transmit neutron through surface.
@@ -119,9 +120,10 @@ protected:
 	 *
 	 * Reflects or scatters the neutron according to Micro Roughness model.
 	 * For parameter documentation see TNeutron::OnHit.
+	 * MRdistmax is the maximum of the MicroRoughness transmission distribution (see MR::MRDistMax), used to sample scattering angles.
 	 */
 	void ReflectMR(const value_type x1, const state_type &y1, value_type &x2, state_type &y2,
-			const double normal[3], const double Estep, const material &mat, TMCGenerator &mc) const;
+			const double normal[3], const double Estep, const material &mat, const double MRdistmax, TMCGenerator &mc) const;
 
 	/**
 	 * Reflect neutron from surface.
@@ -16,17 +16,12 @@
 #include "geometry.h"
 #include "mc.h"
 #include "fields.h"
+#include "stepper.h"
 
 static const double MAX_TRACK_DEVIATION = 0.001; ///< max deviation of actual trajectory from straight line between start and end points of a step used for geometry-intersection test. If deviation is larger, the step will be split
 static const int STATE_VARIABLES = 9; ///< number of variables in trajectory integration (position, velocity, proper time, polarization, path length)
 static const int SPIN_STATE_VARIABLES = 5; ///< number of variables in spin integration (spin vector, time, total phase)
 
-typedef double value_type; ///< data type used for trajectory integration
-typedef std::vector<value_type> state_type; ///< type representing current particle state (position, velocity, proper time, and polarization) or spin state (x,y,z component)
-typedef boost::numeric::odeint::runge_kutta_dopri5<state_type, value_type> stepper_type; ///< basic integration stepper (5th-order Runge-Kutta)
-typedef boost::numeric::odeint::controlled_runge_kutta<stepper_type> controlled_stepper_type; ///< integration step length controller
-typedef boost::numeric::odeint::dense_output_runge_kutta<controlled_stepper_type> dense_stepper_type; ///< integration step interpolator
-//	typedef boost::numeric::odeint::bulirsch_stoer_dense_out<state_type, value_type> dense_stepper_type2; ///< alternative stepper type (Bulirsch-Stoer)
 
 /**
  * Basic particle class (virtual).
@@ -130,7 +125,7 @@ public:
 	 *
 	 * @return Initial state of particle
 	 */
-	state_type GetInitialState() const { return ystart; };
+	const state_type& GetInitialState() const { return ystart; };
 
 	/**
 	 * Return final state of particle (position, velocity, proper time, and polarization)
@@ -144,7 +139,7 @@ public:
 	 *
 	 * @return Initial spin vector of particle
 	 */
-	state_type GetInitialSpin() const { return spinstart; };
+	const state_type& GetInitialSpin() const { return spinstart; };
 
 	/**
 	 * Return final spin vector of particle
@@ -158,7 +153,7 @@ public:
 	 *
 	 * @return Solid in which particle was created
 	 */
-	solid GetInitialSolid() const { return solidstart; };
+	const solid& GetInitialSolid() const { return solidstart; };
 
 	/**
 	 * Return solid in which particle was stopped
@@ -0,0 +1,157 @@
+#ifndef PENTRACK_PROFILER_H
+#define PENTRACK_PROFILER_H
+
+#include <array>
+#include <chrono>
+#include <map>
+#include <string>
+
+#include <boost/filesystem.hpp>
+
+/**
+ * Call counts and accumulated wall time of the hot paths of the simulation, collected for one particle type.
+ *
+ * Counters are only collected if PENTrack was compiled with the BUILD_PROFILING option (which defines PENTRACK_PROFILING)
+ * and the profiling option in the GLOBAL section of the config file is set.
+ * Otherwise the PROFILE_* macros expand to nothing.
+ */
+struct TProfile{
+    /**
+     * Counted events
+     */
+    enum counter {PARTICLES, STEPS, BALLISTIC_STEPS, REJECTED_STEPS, DERIVATIVES, SUBSTEP_SPLITS, COLLISION_QUERIES, SKIPPED_COLLISION_QUERIES, SPIN_STEPS, LOG_ROWS, NCOUNTERS};
+
+    /**
+     * Timed phases, phases can be nested (e.g. field evaluations are part of integration steps)
+     */
+    enum phase {INTEGRATION, COLLISION_CHECK, SPIN_INTEGRATION, BFIELD, EFIELD, LOGGING, NPHASES};
+
+    static const std::array<std::string, NCOUNTERS> counternames; ///< names of counters printed in summary file
+    static const std::array<std::string, NPHASES> phasenames; ///< names of phases printed in summary file
+
+    std::array<unsigned long long, NCOUNTERS> counts{}; ///< number of counted events
+    std::array<unsigned long long, NPHASES> calls{}; ///< number of times each phase was entered
+    std::array<double, NPHASES> seconds{}; ///< wall time spent in each phase [s]
+
+    /**
+     * Add counters and timers of another profile
+     *
+     * @param p Profile to add
+     *
+     * @return Returns reference to this profile
+     */
+    TProfile& operator+=(const TProfile &p);
+};
+
+typedef std::map<std::string, TProfile> TProfiles; ///< profiles of each particle type
+
+/**
+ * Profile to which counters and timers in the current thread are added, nullptr if profiling is disabled.
+ *
+ * Set by TTracker::IntegrateParticle to the profile of the particle type that is currently simulated.
+ */
+extern thread_local TProfile *currentprofile;
+
+/**
+ * Sets profile of current thread from construction to destruction and restores previous profile afterwards
+ */
+class TProfileScope{
+private:
+    TProfile *previous; ///< profile that was active before construction
+public:
+    /**
+     * Constructor, sets profile of current thread
+     *
+     * @param profile Profile to which counters and timers are added, nullptr disables profiling
+     */
+    TProfileScope(TProfile *profile): previous(currentprofile){ currentprofile = profile; }
+
+    /**
+     * Destructor, restores previous profile
+     */
+    ~TProfileScope(){ currentprofile = previous; }
+};
+
+/**
+ * Measures wall time from construction to destruction and adds it to a phase of the current profile
+ */
+class TProfileTimer{
+private:
+    TProfile *profile; ///< profile to add time to, nullptr if profiling is disabled
+    TProfile::phase ph; ///< timed phase
+    std::chrono::steady_clock::time_point start; ///< time of construction
+public:
+    /**
+     * Constructor, starts timer if profiling is enabled
+     *
+     * @param aphase Phase to which time is added
+     */
+    TProfileTimer(const TProfile::phase aphase): profile(currentprofile), ph(aphase){
+        if (profile)
+            start = std::chrono::steady_clock::now();
+    }
+
+    /**
+     * Destructor, adds elapsed time to profile
+     */
+    ~TProfileTimer(){
+        if (profile){
+            profile->seconds[ph] += std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+            ++profile->calls[ph];
+        }
+    }
+};
+
+/**
+ * Counts one step of the trajectory integrator from construction to destruction.
+ *
+ * The Dormand-Prince stepper evaluates the derivatives six times for each attempted step (plus once after initialization),
+ * so the number of rejected steps can be inferred from the number of derivative evaluations.
+ */
+class TProfileStep{
+private:
+    TProfile *profile; ///< profile to add step to, nullptr if profiling is disabled
+    unsigned long long derivatives; ///< number of derivative evaluations at construction
+public:
+    /**
+     * Constructor, remembers number of derivative evaluations
+     */
+    TProfileStep(): profile(currentprofile), derivatives(profile ? profile->counts[TProfile::DERIVATIVES] : 0){ }
+
+    /**
+     * Destructor, adds step and rejected steps to profile
+     */
+    ~TProfileStep(){
+        if (profile){
+            unsigned long long attempts = (profile->counts[TProfile::DERIVATIVES] - derivatives)/6;
+            ++profile->counts[TProfile::STEPS];
+            if (attempts > 1)
+                profile->counts[TProfile::REJECTED_STEPS] += attempts - 1;
+        }
+    }
+};
+
+#ifdef PENTRACK_PROFILING
+#define PROFILE_SCOPE(profile) TProfileScope profilescope(profile) ///< add counters and timers to profile until end of current scope
+#define PROFILE_COUNT(counter, n) do{ if (currentprofile) currentprofile->counts[TProfile::counter] += (n); }while(false) ///< add n to counter of current profile
+#define PROFILE_TIMER(phase) TProfileTimer profiletimer(TProfile::phase) ///< time phase until end of current scope
+#define PROFILE_STEP() TProfileStep profilestep ///< count integrator step and rejected steps until end of current scope
+#else
+#define PROFILE_SCOPE(profile)
+#define PROFILE_COUNT(counter, n) do{ }while(false)
+#define PROFILE_TIMER(phase)
+#define PROFILE_STEP()
+#endif
+
+/**
+ * Write summary of profiles to file
+ *
+ * Lists call count, total and average wall time of each phase and the counters for each particle type and for all particles combined.
+ *
+ * @param outfile File to write to
+ * @param profiles Profiles of each particle type
+ * @param walltime Total wall time of simulation [s]
+ */
+void WriteProfile(const boost::filesystem::path &outfile, const TProfiles &profiles, const double walltime);
+
+#endif //PENTRACK_PROFILER_H
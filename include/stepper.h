@@ -0,0 +1,178 @@
+/**
+ * \file
+ * Trajectory stepper, integrating the equations of motion numerically or propagating particles on exact parabolas in field-free regions.
+ */
+
+#ifndef STEPPER_H_
+#define STEPPER_H_
+
+#include <vector>
+#include <array>
+#include <utility>
+#include <stdexcept>
+
+#include <boost/numeric/odeint.hpp>
+
+typedef double value_type; ///< data type used for trajectory integration
+typedef std::vector<value_type> state_type; ///< type representing current particle state (position, velocity, proper time, and polarization) or spin state (x,y,z component)
+typedef boost::numeric::odeint::runge_kutta_dopri5<state_type, value_type> stepper_type; ///< basic integration stepper (5th-order Runge-Kutta)
+typedef boost::numeric::odeint::controlled_runge_kutta<stepper_type> controlled_stepper_type; ///< integration step length controller
+typedef boost::numeric::odeint::dense_output_runge_kutta<controlled_stepper_type> odeint_dense_stepper_type; ///< integration step interpolator
+//	typedef boost::numeric::odeint::bulirsch_stoer_dense_out<state_type, value_type> dense_stepper_type2; ///< alternative stepper type (Bulirsch-Stoer)
+
+/**
+ * Integration step interpolator.
+ *
+ * Behaves like odeint's dense-output stepper, but can alternatively do ballistic steps,
+ * in which the particle moves with constant acceleration, e.g. where gravity is the only force acting on it.
+ * Positions, velocities, proper time and trajectory length are then calculated analytically.
+ * Relativistic corrections to the acceleration are neglected, so ballistic steps are only accurate for slow particles.
+ */
+class TDenseStepper{
+private:
+	odeint_dense_stepper_type odeint; ///< numerical stepper used if last step was not ballistic
+	bool ballistic = false; ///< true if last step was ballistic
+	value_type t0 = 0, t1 = 0; ///< start and end time of last ballistic step
+	state_type y0, y1; ///< state vectors at start and end of last ballistic step
+	std::array<double, 3> acceleration; ///< constant acceleration during last ballistic step
+public:
+	/**
+	 * Constructor
+	 *
+	 * @param stepper Numerical stepper, e.g. created by boost::numeric::odeint::make_dense_output
+	 */
+	TDenseStepper(const odeint_dense_stepper_type &stepper): odeint(stepper){ }
+
+	/**
+	 * (Re-)start numerical integration, required before the first numerical step and after ballistic steps
+	 *
+	 * @param y Initial state vector
+	 * @param t Initial time
+	 * @param dt Initial step size
+	 */
+	void initialize(const state_type &y, const value_type t, const value_type dt){
+		ballistic = false;
+		odeint.initialize(y, t, dt);
+	}
+
+	/**
+	 * Do one numerical integration step
+	 *
+	 * @param system Function calculating the derivatives of the state vector
+	 *
+	 * @return Returns start and end time of step
+	 */
+	template<class System> std::pair<value_type, value_type> do_step(System system){
+		if (ballistic)
+			throw std::runtime_error("Numerical integration has to be initialized after a ballistic step!");
+		return odeint.do_step(system);
+	}
+
+	/**
+	 * Do one step with constant acceleration
+	 *
+	 * @param y State vector at start of step
+	 * @param t Start time of step
+	 * @param dt Step size
+	 * @param a Acceleration
+	 */
+	void do_ballistic_step(const state_type &y, const value_type t, const value_type dt, const std::array<double, 3> &a);
+
+	/**
+	 * Check if last step was ballistic
+	 *
+	 * @return Returns true if last step was done with do_ballistic_step
+	 */
+	bool is_ballistic() const{ return ballistic; }
+
+	/**
+	 * Calculate state vector at time t within the last step
+	 *
+	 * @param t Time
+	 * @param y Returns state vector at time t
+	 */
+	void calc_state(const value_type t, state_type &y) const;
+
+	/**
+	 * Calculate box containing the trajectory between two times within the last ballistic step
+	 *
+	 * @param ta Start time
+	 * @param tb End time
+	 * @param min Returns lower x, y, and z limits of the box
+	 * @param max Returns upper x, y, and z limits of the box
+	 */
+	void calc_ballistic_box(const value_type ta, const value_type tb, double min[3], double max[3]) const;
+
+	/**
+	 * Calculate box containing the trajectory of a ballistic step before doing it
+	 *
+	 * @param y State vector at start of step
+	 * @param dt Step size
+	 * @param a Acceleration
+	 * @param min Returns lower x, y, and z limits of the box
+	 * @param max Returns upper x, y, and z limits of the box
+	 */
+	static void calc_ballistic_box(const state_type &y, const value_type dt, const std::array<double, 3> &a, double min[3], double max[3]);
+
+	/**
+	 * Find the first time at which the trajectory of the last ballistic step crosses a plane
+	 *
+	 * @param ta Start of time interval to search
+	 * @param tb End of time interval to search
+	 * @param normal Normal vector of plane
+	 * @param point Point on plane
+	 * @param t Returns time at which the trajectory crosses the plane
+	 *
+	 * @return Returns false if the trajectory does not cross the plane between ta and tb
+	 */
+	bool calc_ballistic_crossing(const value_type ta, const value_type tb, const double normal[3], const double point[3], value_type &t) const;
+
+	/**
+	 * Get maximum deviation of the trajectory of the last ballistic step from the straight line between its positions at two times
+	 *
+	 * @param ta Start time
+	 * @param tb End time
+	 *
+	 * @return Returns maximum distance between trajectory and straight line
+	 */
+	double calc_ballistic_deviation(const value_type ta, const value_type tb) const;
+
+	/**
+	 * Get state vector at end of last step
+	 *
+	 * @return Returns state vector
+	 */
+	const state_type& current_state() const{ return ballistic ? y1 : odeint.current_state(); }
+
+	/**
+	 * Get time at end of last step
+	 *
+	 * @return Returns time
+	 */
+	value_type current_time() const{ return ballistic ? t1 : odeint.current_time(); }
+
+	/**
+	 * Get state vector at start of last step
+	 *
+	 * @return Returns state vector
+	 */
+	const state_type& previous_state() const{ return ballistic ? y0 : odeint.previous_state(); }
+
+	/**
+	 * Get time at start of last step
+	 *
+	 * @return Returns time
+	 */
+	value_type previous_time() const{ return ballistic ? t0 : odeint.previous_time(); }
+
+	/**
+	 * Get size of next numerical step, or size of last ballistic step
+	 *
+	 * @return Returns step size
+	 */
+	value_type current_time_step() const{ return ballistic ? t1 - t0 : odeint.current_time_step(); }
+};
+
+typedef TDenseStepper dense_stepper_type; ///< integration step interpolator
+
+#endif // STEPPER_H_
@@ -3,12 +3,19 @@
 
 #include <string>
 #include <memory>
+#include <array>
 
 #include "mc.h"
 #include "geometry.h"
 #include "fields.h"
 #include "particle.h"
 #include "logger.h"
+#include "profiler.h"
+
+static const double SPIN_PROPAGATOR_TOLERANCE = 1e-12; ///< max. local error of spin vector in each step of the analytic spin propagator
+static const double MAX_BALLISTIC_STEP = 1; ///< max. duration of a ballistic step [s]
+static const double MAX_BALLISTIC_VELOCITY = 1e4; ///< particles faster than this are always integrated numerically, since ballistic steps neglect relativistic corrections [m/s]
+static const double SPIN_ADIABATICITY_LIMIT = 0.1; ///< analytic spin propagator hands over to ODE stepper if rate of change of precession axis divided by precession frequency exceeds this value
 
 
 /**
@@ -18,6 +25,10 @@ class TTracker {
 private:
     std::vector<std::pair<solid, bool> > currentsolids; ///< solids in which particle is currently inside
     std::unique_ptr<TLogger> logger; ///< class to log particle states
+    bool profiling = false; ///< collect profiles of each particle type, see TProfile
+    TProfiles profiles; ///< profiles of each particle type simulated by this tracker
+    std::array<double, 3> safecenter; ///< center of a sphere that does not contain any surface, see SegmentIsSafe()
+    double saferadius = 0; ///< radius of the sphere that does not contain any surface
 public:
     /**
      * Constructor.
@@ -28,6 +39,22 @@ public:
      */
     TTracker(TConfig& config);
 
+    /**
+     * Constructor.
+     *
+     * Uses the given logger instead of creating one from the configuration, e.g. to let several trackers in different threads share output files
+     *
+     * @param alogger Logger used to log particle states
+     */
+    TTracker(std::unique_ptr<TLogger> alogger): logger(std::move(alogger)){ };
+
+    /**
+     * Get logger used to log particle states
+     *
+     * @return Returns reference to logger
+     */
+    TLogger& GetLogger(){ return *logger; }
+
     /**
      * Integrate particle trajectory.
      *
@@ -45,6 +72,66 @@ public:
      */
     void IntegrateParticle(std::unique_ptr<TParticle>& p, const double tmax, std::map<std::string, std::string> &particleconf,
                            TMCGenerator &mc, const TGeometry &geom, const TFieldManager &field);
+
+    /**
+     * Enable or disable collection of profiles in IntegrateParticle, only has an effect if PENTrack was compiled with PENTRACK_PROFILING
+     *
+     * @param enable Collect profiles if true
+     */
+    void SetProfiling(const bool enable){ profiling = enable; }
+
+    /**
+     * Get profiles collected while integrating particles
+     *
+     * @return Returns profiles of each particle type
+     */
+    const TProfiles& GetProfiles() const{ return profiles; }
+
+    /**
+     * Simulate spin precession
+     *
+     * Integrates general BMT equation over one time step.
+     * If the conditions given by times and Bmax are not fulfilled, the spin vector will simply be rotated along the magnetic field, keeping the spin projection onto the magnetic field constant.
+     *
+     * @param p Particle
+     * @param spin Spin vector, returns new spin vector after step
+     * @param stepper Trajectory integrator containing last step
+     * @param x2 Time at end of step [s]
+     * @param y2 Particle state vector at end of step (position, velocity, proper time, and polarisation)
+     * @param times Absolute time intervals in between spin integration should be carried out [s]
+     * @param field TFieldManager to calculate electric and magnetic field
+     * @param interpolatefields If this is set to true, the magnetic and electric fields will be interpolated between the trajectory-step points. This will speed up spin tracking in high, static fields, but might break spin tracking in small, quickly varying fields (e.g. spin-flip pulses)
+     * @param Bmax Spin integration will only be carried out, if magnetic field is below this value [T]
+     * @param mc TMCGenerator random number generator
+     * @param flipspin If set to true, polarisation in y2 will be randomly set when magnetic field rises above Bmax, weighted by spin projection onto the magnetic field
+     * @param analyticspin If set to true, spin is propagated with PropagateSpin and the ODE stepper is only used where the field changes non-adiabatically
+     *
+     * @return Return probability of spin flip
+     */
+    void IntegrateSpin(const std::unique_ptr<TParticle>& p, state_type &spin, const dense_stepper_type &stepper,
+            const double x2, state_type &y2, const std::vector<double> &times, const TFieldManager &field,
+            const bool interpolatefields, const double Bmax, TMCGenerator &mc, const bool flipspin, const bool analyticspin) const;
+
+    /**
+     * Propagate spin analytically
+     *
+     * Rotates spin vector with fourth-order Magnus propagator (precession axis evaluated at start, middle, and end of each step) using Rodrigues' rotation formula.
+     * This is exact for a constant precession axis, so the step length is only limited by changes of the precession axis.
+     * Step length is adapted by comparing one step with two half steps until the local error is smaller than SPIN_PROPAGATOR_TOLERANCE.
+     * Stops early if the adiabaticity parameter (rate of change of precession axis divided by precession frequency) exceeds SPIN_ADIABATICITY_LIMIT.
+     *
+     * @param p Particle
+     * @param spin Spin state, returns new spin state at returned time
+     * @param stepper Trajectory integrator containing last step
+     * @param x1 Time at start of step [s]
+     * @param x2 Time at end of step [s]
+     * @param field TFieldManager to calculate electric and magnetic field
+     * @param omega_int Interpolated precession axis, precession axis is calculated directly if this is empty
+     *
+     * @return Return time up to which spin was propagated, smaller than x2 if field changes non-adiabatically [s]
+     */
+    double PropagateSpin(const std::unique_ptr<TParticle>& p, state_type &spin, const dense_stepper_type &stepper,
+            const double x1, const double x2, const TFieldManager &field, const std::vector<alglib::spline1dinterpolant> &omega_int) const;
 private:
     /**
      * Check if particle hit a material boundary
@@ -65,6 +152,34 @@ private:
     bool CheckHit(const std::unique_ptr<TParticle>& p, const value_type x1, const state_type &y1, value_type &x2, state_type &y2,
              const dense_stepper_type &stepper, TMCGenerator &mc, const TGeometry &geom, const TFieldManager &field);
 
+    /**
+     * Propagate particle on a parabola if it only feels gravity
+     *
+     * Tries a ballistic step of MAX_BALLISTIC_STEP (or until tmax) and halves it until the trajectory does not enter any field.
+     * Fails if the step becomes shorter than the initial step of the numerical integration.
+     *
+     * @param x Start time of step
+     * @param y Start state of step
+     * @param tmax Max. absolute time at which integration will be stopped
+     * @param stepper Trajectory stepper, is left untouched if the step fails
+     * @param field TFieldManager containing all electromagnetic fields
+     * @return Returns true if ballistic step was done
+     */
+    bool BallisticStep(const value_type x, const state_type &y, const value_type tmax, dense_stepper_type &stepper, const TFieldManager &field) const;
+
+    /**
+     * Check if a line segment cannot reach any surface
+     *
+     * The segment cannot collide with a surface if both ends are inside a sphere that does not contain any surface.
+     * If they are not inside the last found sphere, a new sphere around the start point is constructed from TGeometry::SafeDistance.
+     *
+     * @param y1 Start point of line segment
+     * @param y2 End point of line segment
+     * @param geom Geometry
+     * @return Returns true if line segment does not have to be checked for collisions
+     */
+    bool SegmentIsSafe(const state_type &y1, const state_type &y2, const TGeometry &geom);
+
     /**
      * Iterate collision point
      *
@@ -84,6 +199,23 @@ private:
                            const TCollision &coll, const dense_stepper_type &stepper, const TGeometry &geom,
                            const unsigned int iteration = 0);
 
+    /**
+     * Find collision point of a ballistic step analytically
+     *
+     * Calculates where the parabola crosses the plane of the hit surface and checks that a segment shorter than REFLECT_TOLERANCE around this point collides with it.
+     *
+     * @param x1 Start time of line segment, returns start time of segment around collision point
+     * @param y1 Start point of line segment, returns start point of segment around collision point
+     * @param x2 End time of line segment, returns end time of segment around collision point
+     * @param y2 End point of line segment, returns end point of segment around collision point
+     * @param coll Collision found in this segment
+     * @param stepper Trajectory stepper containing ballistic step
+     * @param geom Geometry
+     * @return Returns true if collision point was found, false if it has to be iterated with iterate_collision
+     */
+    bool find_ballistic_collision(value_type &x1, state_type &y1, value_type &x2, state_type &y2,
+                                  const TCollision &coll, const dense_stepper_type &stepper, const TGeometry &geom) const;
+
     /**
      * Call particle's OnStep function for particle-dependent physics processes on a step.
      *
@@ -127,30 +259,6 @@ private:
      */
     const solid& GetCurrentsolid() const;
 
-    /**
-     * Simulate spin precession
-     *
-     * Integrates general BMT equation over one time step.
-     * If the conditions given by times and Bmax are not fulfilled, the spin vector will simply be rotated along the magnetic field, keeping the spin projection onto the magnetic field constant.
-     *
-     * @param p Particle
-     * @param spin Spin vector, returns new spin vector after step
-     * @param stepper Trajectory integrator containing last step
-     * @param x2 Time at end of step [s]
-     * @param y2 Particle state vector at end of step (position, velocity, proper time, and polarisation)
-     * @param times Absolute time intervals in between spin integration should be carried out [s]
-     * @param field TFieldManager to calculate electric and magnetic field
-     * @param interpolatefields If this is set to true, the magnetic and electric fields will be interpolated between the trajectory-step points. This will speed up spin tracking in high, static fields, but might break spin tracking in small, quickly varying fields (e.g. spin-flip pulses)
-     * @param Bmax Spin integration will only be carried out, if magnetic field is below this value [T]
-     * @param mc TMCGenerator random number generator
-     * @param flipspin If set to true, polarisation in y2 will be randomly set when magnetic field rises above Bmax, weighted by spin projection onto the magnetic field
-     *
-     * @return Return probability of spin flip
-     */
-    void IntegrateSpin(const std::unique_ptr<TParticle>& p, state_type &spin, const dense_stepper_type &stepper,
-            const double x2, state_type &y2, const std::vector<double> &times, const TFieldManager &field,
-            const bool interpolatefields, const double Bmax, TMCGenerator &mc, const bool flipspin) const;
-
 
 
 };
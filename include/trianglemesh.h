@@ -23,6 +23,7 @@
 #define TRIANGLEMESH_H_
 
 #include <vector>
+#include <array>
 #include <memory>
 #include <random>
 
@@ -37,6 +38,9 @@
 #include <CGAL/Polygon_mesh_processing/compute_normal.h>
 
 static const double REFLECT_TOLERANCE = 1e-8;  ///< max distance of reflection point to actual surface collision point
+static const std::size_t MAX_VOXELS = 1 << 18; ///< max number of voxels used to classify points as inside or outside of each mesh
+static const std::size_t MAX_VOXELS_PER_AXIS = 1024; ///< max number of voxels along each axis
+static const std::size_t MAX_DISTANCE_NODES = 1 << 15; ///< max number of grid nodes at which the distance to the nearest surface is precalculated
 
 typedef CGAL::Simple_cartesian<double> CKernel; ///< Geometric Kernel used for CGAL types
 typedef CKernel::Segment_3 CSegment; ///< CGAL segment type
@@ -50,6 +54,11 @@ typedef CGAL::AABB_traits<CKernel, CPrimitive> CTraits; ///< CGAL triangle trait
 typedef CGAL::AABB_tree<CTraits> CTree; ///< CGAL AABB tree type containing CPrimitives
 typedef boost::optional< CTree::Intersection_and_primitive_id<CSegment>::Type > CIntersection; ///< CGAL segment-triangle intersection type
 
+typedef CGAL::AABB_face_graph_triangle_primitive<CMesh, CGAL::Default, CGAL::Tag_false> CScenePrimitive; ///< CGAL triangle type contained in AABB tree spanning several meshes, its ID also identifies the mesh
+typedef CGAL::AABB_traits<CKernel, CScenePrimitive> CSceneTraits; ///< CGAL triangle traits type for tree spanning several meshes
+typedef CGAL::AABB_tree<CSceneTraits> CSceneTree; ///< CGAL AABB tree type containing CScenePrimitives
+typedef boost::optional< CSceneTree::Intersection_and_primitive_id<CSegment>::Type > CSceneIntersection; ///< CGAL segment-triangle intersection type for tree spanning several meshes
+
 
 /**
  * Structure returned by TTriangleMesh::Collision.
@@ -105,9 +114,42 @@ private:
         std::unique_ptr<CTree> tree; ///< Axis-aligned bounding-box tree for fast intersection search
         int ID; ///< unique ID for each StL file
         std::discrete_distribution<size_t> triangle_sampler; ///< Probability distribution to randomly sample triangles from mesh weighted by their areas.
+        std::array<double, 3> voxelorigin; ///< lower corner of voxel grid
+        std::array<double, 3> voxelend; ///< upper corner of voxel grid
+        std::array<double, 3> voxelsize; ///< size of voxels along x, y, and z
+        std::array<std::size_t, 3> voxelcount; ///< number of voxels along x, y, and z
+        std::vector<signed char> voxels; ///< 1 for voxels inside the mesh, 0 for voxels outside, -1 for voxels crossed by the surface. Empty if mesh is not closed
     };
+
+	/**
+	 * Divide bounding box of mesh into voxels and classify each voxel as inside, outside or crossed by the surface
+	 *
+	 * @param m Mesh whose voxels should be set
+	 */
+	void BuildVoxelGrid(CTriangleMesh &m) const;
+
+	/**
+	 * Test if point is inside a mesh
+	 *
+	 * Looks up precalculated voxel and only casts a ray through the mesh if the voxel is crossed by its surface
+	 *
+	 * @param m Mesh
+	 * @param x X coordinate of point
+	 * @param y Y coordinate of point
+	 * @param z Z coordinate of point
+	 *
+	 * @return Returns true if point is inside the mesh
+	 */
+	bool InMesh(const CTriangleMesh &m, const double x, const double y, const double z) const;
+
 	std::vector<CTriangleMesh> meshes; ///< List of triangle meshes from all loaded StL files
 	std::discrete_distribution<size_t> mesh_sampler; ///< Probability distribution to randomly sample meshes weighted by their areas
+	std::unique_ptr<CSceneTree> scenetree; ///< Optional axis-aligned bounding-box tree containing triangles of all meshes, see BuildSceneTree()
+	CGAL::Bbox_3 scenebox; ///< Bounding box containing all meshes, segments outside are rejected before searching any tree
+	std::array<double, 3> distanceorigin; ///< lower corner of distance grid
+	std::array<double, 3> distancespacing; ///< distance between grid nodes along x, y, and z
+	std::array<std::size_t, 3> distancecount; ///< number of grid nodes along x, y, and z
+	std::vector<double> distances; ///< distance of each grid node to the nearest triangle of all meshes. Empty if BuildDistanceField() was not called
 
 public:
 	/**
@@ -120,6 +162,47 @@ public:
 	 */
 	std::string ReadFile(const std::string &filename, const int ID);
 
+	/**
+	 * Build a single AABB tree containing the triangles of all previously read files.
+	 *
+	 * Collision() then searches this tree instead of the trees of each file,
+	 * so its cost scales with the logarithm of the total number of triangles instead of the number of files.
+	 * Has to be called again if more files are read afterwards.
+	 */
+	void BuildSceneTree();
+
+	/**
+	 * Calculate distance to the nearest triangle of all previously read files on a regular grid spanning their bounding box.
+	 *
+	 * DistanceBound() then returns a lower bound of the distance to the nearest surface,
+	 * so segments that cannot reach any surface do not have to be tested with Collision().
+	 * Has to be called again if more files are read afterwards.
+	 */
+	void BuildDistanceField();
+
+	/**
+	 * Conservative lower bound of the distance between a point and the nearest triangle in previously read files.
+	 *
+	 * The distance to the surface changes at most by the distance between two points,
+	 * so the distance at each corner of the grid cell containing the point minus the distance to that corner is a lower bound.
+	 * Outside of the grid the distance to the grid is returned.
+	 *
+	 * @param p Point
+	 *
+	 * @return Returns lower bound of distance to nearest surface reduced by REFLECT_TOLERANCE, 0 if BuildDistanceField() was not called
+	 */
+	double DistanceBound(const double p[3]) const;
+
+	/**
+	 * Test if any triangle in previously read files intersects a box
+	 *
+	 * @param min Lower x, y, and z limits of the box
+	 * @param max Upper x, y, and z limits of the box
+	 *
+	 * @return Returns true if a triangle intersects the box
+	 */
+	bool IntersectsBox(const double min[3], const double max[3]) const;
+
 	/**
 	 * Test line segment p1->p2 for collision with all triangles in previously read files.
 	 *
@@ -128,7 +211,7 @@ public:
 	 *
 	 * @return Returns vector containing collisions
 	 */
-	std::vector<TCollision> Collision(const std::vector<double> &p1, const std::vector<double> &p2) const;
+	std::vector<TCollision> Collision(const double p1[3], const double p2[3]) const;
 
 	/**
 	 * Test if point is inside the mesh
@@ -180,11 +263,22 @@ public:
 	 */
     template<class Point> std::vector<unsigned> GetSolids(Point p) const{
         std::vector<unsigned> solids;
+        ForEachSolid(p[0], p[1], p[2], [&solids](const unsigned ID){ solids.push_back(ID); });
+        return solids;
+    }
+
+	/**
+	 * Call function for each solid the point is inside of
+	 * @param x X coordinate of point
+	 * @param y Y coordinate of point
+	 * @param z Z coordinate of point
+	 * @param f Function called with each solid ID
+	 */
+    template<class Function> void ForEachSolid(const double x, const double y, const double z, Function f) const{
         for (auto &m: meshes){
-            if (m.tree->number_of_intersected_primitives(CKernel::Ray_3(CPoint(p[0],p[1],p[2]), CVector(0., 0., 1.))) % 2 != 0)
-                solids.push_back(m.ID);
+            if (InMesh(m, x, y, z))
+                f(m.ID);
         }
-        return solids;
     }
 
 	/**
@@ -1,48 +1,111 @@
-import fileinput
 import ROOT
 import re
+import io
+import collections
 import numpy
 import multiprocessing
-import sys
+import argparse
 import os
 
-def ReadOutFile(fn):
+# Files are split into byte ranges of roughly this size, each range is parsed into one contiguous 2-D float64 array
+DEFAULT_CHUNK_SIZE = 16 # MB
+
+def ReadHeader(fn):
   match = re.match('(\d+)(\w+).out', os.path.basename(fn))
-  if match:
-    jobnumber = int(match.group(1))
-    logtype = match.group(2)
-    descriptor = ''
-    data = []
-    print('Reading ' + fn)
-    for line in fileinput.input(fn):
-      line = line.strip()
-      if fileinput.isfirstline():
-        descriptor = line.replace(' ', ':')
-      else:
-        vals = [float(v) for v in line.split()]
-        if len(vals) == len(descriptor.split(':')):
-          data.append(numpy.array(vals))
-        else:
-          print('Line is missing entries!')
-#    os.remove(fn)
-    return logtype, descriptor, data
-  else:
+  if not match:
     print('Invalid filename ' + fn)
+    return None
+  with open(fn, 'rb') as f:
+    header = f.readline()
+  return match.group(2), header.decode().strip().replace(' ', ':'), len(header)
+
+def SplitFile(fn, headersize, chunksize):
+  # split file into byte ranges following the header line, ranges are later aligned to line breaks by ReadChunk
+  size = os.path.getsize(fn)
+  start = headersize
+  while start < size:
+    end = min(start + chunksize, size)
+    yield fn, start, end
+    start = end
+
+def ParseLines(text, ncolumns):
+  try:
+    data = numpy.loadtxt(io.StringIO(text), dtype=numpy.float64, ndmin=2)
+    if data.shape[1] == ncolumns or data.size == 0:
+      return data
+  except ValueError:
+    pass
+  # fall back to line-by-line parsing if some lines are incomplete
+  rows = []
+  for line in text.splitlines():
+    vals = line.split()
+    if len(vals) == ncolumns:
+      rows.append(vals)
+    elif len(vals) > 0:
+      print('Line is missing entries!')
+  return numpy.array(rows, dtype=numpy.float64).reshape(-1, ncolumns)
+
+def ReadChunk(task):
+  # parse all lines that start inside the byte range [start, end)
+  fn, start, end, ncolumns = task
+  with open(fn, 'rb') as f:
+    if start > 0:
+      f.seek(start - 1)
+      if f.read(1) != b'\n':
+        f.readline() # skip line that started in previous chunk
+    if f.tell() >= end:
+      return fn, numpy.empty((0, ncolumns))
+    text = f.read(end - f.tell())
+    if not text.endswith(b'\n'):
+      text += f.readline() # complete last line of chunk
+  return fn, ParseLines(text.decode(), ncolumns)
+
+def FillTree(trees, logtype, result):
+  fn, data = result.get()
+  tree = trees[logtype]
+  for row in data:
+    tree.Fill(row)
+
+def Merge(filenames, outfile, chunksize, nprocs):
+  out = ROOT.TFile(outfile, 'RECREATE')
+  trees = {}
+  tasks = []
+  for fn in filenames:
+    header = ReadHeader(fn)
+    if header is None:
+      continue
+    logtype, descriptor, headersize = header
+    if logtype not in trees:
+      trees[logtype] = ROOT.TNtupleD(logtype, logtype, descriptor)
+      print('{0} has {1} columns'.format(logtype, len(descriptor.split(':'))))
+    elif trees[logtype].GetNvar() != len(descriptor.split(':')):
+      print('Number of columns in {0} does not match {1} tree, skipping file'.format(fn, logtype))
+      continue
+    tasks.extend((f, s, e, len(descriptor.split(':')), logtype) for f, s, e in SplitFile(fn, headersize, chunksize))
+
+  # keep only a few chunks in flight so that peak memory is independent of total input size
+  workers = multiprocessing.Pool(nprocs)
+  pending = collections.deque()
+  maxpending = 2*(nprocs or multiprocessing.cpu_count())
+  for task in tasks:
+    pending.append((task[4], workers.apply_async(ReadChunk, (task[:4],))))
+    while len(pending) >= maxpending:
+      FillTree(trees, *pending.popleft())
+  while pending:
+    FillTree(trees, *pending.popleft())
+  workers.close()
+  workers.join()
+
+  for t in trees:
+    print('{0} has {1} entries'.format(t, trees[t].GetEntries()))
+  out.Write()
+  out.Close()
 
-out = ROOT.TFile('out.root', 'RECREATE')
-trees = {}
-workers = multiprocessing.Pool()
-results = workers.imap_unordered(ReadOutFile, sys.argv[1:])
-
-for data in results:
-  logtype = data[0]
-  if logtype not in trees:
-    descriptor = data[1]
-    trees[logtype] = ROOT.TNtupleD(logtype, logtype, descriptor)
-    print('{0} has {1} columns'.format(logtype, len(descriptor.split(':'))))
-  for d in data[2]:
-    trees[logtype].Fill(d)
-
-for t in trees:
-  print('{0} has {1} entries'.format(t, trees[t].GetEntries()))
-out.Write()
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Merge PENTrack text output files into ROOT trees, one tree per particle and log type.')
+  parser.add_argument('files', nargs = '+', help = 'output files to merge')
+  parser.add_argument('-o', '--output', default = 'out.root', help = 'name of ROOT file to create (default: out.root)')
+  parser.add_argument('-c', '--chunksize', type = int, default = DEFAULT_CHUNK_SIZE, help = 'size of chunks (in MB) parsed by each worker (default: {0})'.format(DEFAULT_CHUNK_SIZE))
+  parser.add_argument('-j', '--jobs', type = int, default = None, help = 'number of worker processes (default: number of CPUs)')
+  args = parser.parse_args()
+  Merge(args.files, args.output, args.chunksize*1024*1024, args.jobs)
@@ -0,0 +1,43 @@
+# this is an example of how to read PENTrack output with the binarylog option enabled
+# run with
+# python readBinarylog.py *neutronend.bin
+
+import sys
+import numpy
+
+def ReadBinaryLog(fn):
+  # returns header (dictionary of header entries and config sections) and data (memory-mapped 2-D array with one row per logged entry)
+  header = {'config': {}}
+  with open(fn, 'rb') as f:
+    if f.readline() != b'PENTrack binary log\n':
+      raise ValueError('{0} is not a PENTrack binary log'.format(fn))
+    headersize = int(f.readline().split()[1])
+    section = None
+    for line in f.read(headersize - f.tell()).decode().splitlines():
+      line = line.strip()
+      if not line:
+        continue
+      if line.startswith('[') and line.endswith(']'):
+        section = line[1:-1]
+        header['config'][section] = {}
+        continue
+      key, _, value = line.partition(' ')
+      if section is None:
+        header[key] = value
+      else:
+        header['config'][section][key] = value
+  header['titles'] = header['titles'].split()
+  byteorder = '<' if header['byteorder'] == 'little' else '>'
+  data = numpy.memmap(fn, dtype = byteorder + 'f8', mode = 'r', offset = headersize)
+  return header, data.reshape(-1, int(header['columns']))
+
+if __name__ == '__main__':
+  for fn in sys.argv[1:]:
+    header, data = ReadBinaryLog(fn)
+    print('{0}: {1} {2}log entries from job {3} (seed {4})'.format(fn, data.shape[0], header['logtype'], header['jobnumber'], header['seed']))
+    if 'shape' in header:
+      print('  samples on grid of shape {0}'.format(tuple(int(n) for n in header['shape'].split())))
+    if 'stopID' in header['titles']:
+      stopID = data[:, header['titles'].index('stopID')]
+      for ID in numpy.unique(stopID):
+        print('  stopID {0:.0f}: {1}'.format(ID, numpy.count_nonzero(stopID == ID)))
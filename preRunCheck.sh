@@ -2,6 +2,7 @@
 #This script will perform some basic preliminary checks of the input files of PENTrack before launching
 #The script should be executed from PENTrack's main directory (ie one level higher than the /in and /out 
 #directory's default location
+#On machines without a queueing system, run the jobs with runJobs.py instead of submitting the generated batch file
 #Sanmeet Chahal
 #July 10, 2015
 
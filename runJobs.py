@@ -0,0 +1,263 @@
+# Run a range of PENTrack jobs on the local machine, e.g. on a workstation or a single large node without a queueing system.
+# Run from PENTrack's main directory with
+# python3 runJobs.py 1 100 -c in -o out
+#
+# Jobs run in as many parallel processes as there are cores. The output of each job is written to output.txt-<jobnumber> and error.txt-<jobnumber>
+# in the output directory, like with the batch script generated by preRunCheck.sh, so postRunCheck.sh can check them afterwards.
+# Jobs that fail or are stopped by a signal are retried, continuing from their last checkpoint if the checkpoint option is enabled.
+# Log files of each finished job are appended to merged log files while the remaining jobs are still running.
+# With --resume, jobs that finished in an earlier run are skipped and the remaining jobs are appended to the existing merged log files.
+
+import argparse
+import datetime
+import glob
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+STOPID_LINE = re.compile(r'^\s*(-?\d+):\s+(\d+)\s+(\S+)\(s\) (.*)$') # stopID summary printed by PENTrack at exit
+SIMULATION_TIME_LINE = re.compile(r'Simulation: ([\d.]+)s')
+KILLED_LINE = 'Simulation killed by signal!'
+FINISHED_LINE = 'Program PENTrack finished with exit code {0} at: {1}\n' # same format as batch script of preRunCheck.sh
+CRASH_SIGNALS = (signal.SIGABRT, signal.SIGSEGV, signal.SIGBUS, signal.SIGFPE, signal.SIGILL) # signals raised by errors in PENTrack itself, e.g. uncaught exceptions
+
+interrupted = threading.Event() # set when the runner is stopped, jobs are then neither started nor retried
+running = set() # PENTrack processes currently running
+lock = threading.RLock() # protects running and output of progress messages
+
+def Print(message):
+  with lock:
+    print(message, flush = True)
+
+def Stop(signum, frame):
+  # stop all running jobs, they write a checkpoint if the checkpoint option is enabled and can be resumed with the --resume option
+  if not interrupted.is_set():
+    Print('Stopping all jobs...')
+  interrupted.set()
+  with lock:
+    for process in running:
+      process.send_signal(signal.SIGTERM)
+
+def CheckpointFile(outdir, jobnumber):
+  return os.path.join(outdir, '{0:012d}checkpoint.out'.format(jobnumber))
+
+def LogFiles(outdir, jobnumber):
+  # text and binary log files written by a job, without checkpoint and profile
+  files = []
+  for fn in sorted(glob.glob(os.path.join(outdir, '{0:012d}*'.format(jobnumber)))):
+    match = re.match(r'\d{12}(\w+)\.(out|bin)$', os.path.basename(fn))
+    if match and match.group(1) not in ('checkpoint', 'profile'):
+      files.append((fn, match.group(1), match.group(2)))
+  return files
+
+def ReadSummary(fn):
+  # read numbers of particles with each stopID and simulation time from job output
+  summary = {}
+  descriptions = {}
+  simtime = None
+  killed = False
+  with open(fn, errors = 'replace') as f:
+    for line in f:
+      match = STOPID_LINE.match(line)
+      if match:
+        ID, count, particle = int(match.group(1)), int(match.group(2)), match.group(3)
+        summary.setdefault(particle, {})[ID] = count
+        descriptions[ID] = match.group(4).strip()
+        continue
+      match = SIMULATION_TIME_LINE.search(line)
+      if match:
+        simtime = float(match.group(1))
+      if line.strip() == KILLED_LINE:
+        killed = True
+  return summary, descriptions, simtime, killed
+
+def FinishedEarlier(fn):
+  # check if job output shows that the job finished in an earlier run
+  if not os.path.exists(fn):
+    return False
+  return LastLine(fn).startswith(FINISHED_LINE.format(0, '').strip()) and not ReadSummary(fn)[3]
+
+def ConfigThreads(config):
+  # read threads option from GLOBAL section of config file, used if the number of threads is not given on the command line
+  fn = os.path.join(config, 'config.in') if os.path.isdir(config) else config
+  if not os.path.exists(fn): # reported by the jobs themselves
+    return 1
+  section = None
+  with open(fn, errors = 'replace') as f:
+    for line in f:
+      line = line.split('#')[0].strip()
+      if line.startswith('['):
+        section = line
+      elif section == '[GLOBAL]' and line.split()[:1] == ['threads']:
+        return int(line.split()[1]) or multiprocessing.cpu_count()
+  return 1
+
+def LastLine(fn):
+  with open(fn, errors = 'replace') as f:
+    lines = [line.strip() for line in f if line.strip()]
+  return lines[-1] if lines else ''
+
+def RunJob(task):
+  # run one job, retry it if it fails or is stopped by a signal
+  jobnumber, options = task
+  result = {'job': jobnumber, 'attempts': 0, 'status': 'skipped', 'summary': {}, 'descriptions': {}, 'simtime': None}
+  outfile = os.path.join(options.output, 'output.txt-{0}'.format(jobnumber))
+  errfile = os.path.join(options.output, 'error.txt-{0}'.format(jobnumber))
+  if options.resume and FinishedEarlier(outfile):
+    result['status'] = 'done'
+    result['summary'], result['descriptions'], result['simtime'], _ = ReadSummary(outfile)
+    return result
+  while result['attempts'] <= options.retries and not interrupted.is_set():
+    result['attempts'] += 1
+    command = [options.executable]
+    if (result['attempts'] > 1 or options.resume) and os.path.exists(CheckpointFile(options.output, jobnumber)):
+      command.append('--resume')
+    seed = options.seed + jobnumber if options.seed != 0 else 0
+    command += [str(jobnumber), options.config, options.output, str(seed)]
+    if options.threads is not None: # otherwise threads option of config file is used, a checkpoint can only be resumed with the same option
+      command.append(str(options.threads))
+
+    start = time.time()
+    with lock: # jobs are started in their own session, so they are only stopped by Stop and not by a Ctrl-C on the terminal
+      if interrupted.is_set():
+        result['attempts'] -= 1
+        break
+      out, err = open(outfile, 'w'), open(errfile, 'w')
+      process = subprocess.Popen(command, stdout = out, stderr = err, stdin = subprocess.DEVNULL, start_new_session = True)
+      running.add(process)
+    returncode = process.wait()
+    with lock:
+      running.discard(process)
+    out.write(FINISHED_LINE.format(returncode, datetime.datetime.now().ctime()))
+    out.close()
+    err.close()
+
+    result['summary'], result['descriptions'], result['simtime'], killed = ReadSummary(outfile)
+    duration = time.time() - start
+    if returncode == 0 and not killed:
+      result['status'] = 'finished'
+      break
+    elif returncode < 0 and -returncode in CRASH_SIGNALS:
+      result['status'] = 'failed'
+      reason = 'crashed with {0}: {1}'.format(signal.Signals(-returncode).name, LastLine(errfile))
+    elif returncode < 0 or killed:
+      result['status'] = 'killed'
+      reason = 'was stopped by {0}'.format(signal.Signals(-returncode).name) if returncode < 0 else 'was stopped by a signal'
+    else:
+      result['status'] = 'failed'
+      reason = 'failed with exit code {0}: {1}'.format(returncode, LastLine(errfile))
+    retry = result['attempts'] <= options.retries and not interrupted.is_set()
+    Print('job {0} {1} after {2:.1f} s (attempt {3}){4}'.format(jobnumber, reason, duration, result['attempts'], ', retrying' if retry else ''))
+  return result
+
+def ReadHeader(f, extension):
+  # read header of a log file and return it with the lines describing its columns, leaves file positioned at start of data
+  if extension == 'bin':
+    f.readline()
+    headersize = int(f.readline().split()[1])
+    f.seek(0)
+    header = f.read(headersize)
+    titles = [line for line in header.splitlines() if line.startswith(b'titles ')]
+  else:
+    header = f.readline()
+    titles = [header]
+  return header, titles
+
+def MergeLogs(files, mergedir, merged, append):
+  # append log files of a finished job to merged log files, headers are only copied from the first job
+  # if append is set, merged files left by an earlier run are continued, otherwise they are replaced
+  for fn, logtype, extension in files:
+    with open(fn, 'rb') as f:
+      header, titles = ReadHeader(f, extension)
+      target = os.path.join(mergedir, logtype + '.' + extension)
+      if target not in merged and append and os.path.exists(target):
+        with open(target, 'rb') as existing:
+          merged[target] = ReadHeader(existing, extension)[1]
+      if target not in merged:
+        merged[target] = titles
+        with open(target, 'wb') as out:
+          out.write(header)
+          shutil.copyfileobj(f, out)
+      elif merged[target] != titles:
+        Print('Columns of {0} do not match {1}, skipping file'.format(fn, target))
+      else:
+        with open(target, 'ab') as out:
+          shutil.copyfileobj(f, out)
+
+def PrintSummary(totals, descriptions):
+  for particle in sorted(totals):
+    print('\nThe simulated {0}s suffered following fates:'.format(particle))
+    for ID in sorted(descriptions, reverse = True):
+      print('{0:4d}: {1:8d} {2:>10s}(s) {3}'.format(ID, totals[particle].get(ID, 0), particle, descriptions[ID]))
+
+def Main(options):
+  if shutil.which(options.executable) is None:
+    print('Could not find executable {0}'.format(options.executable))
+    return 1
+  jobs = list(range(options.first, options.last + 1))
+  threads = options.threads if options.threads is not None else ConfigThreads(options.config)
+  nprocs = options.jobs or max(multiprocessing.cpu_count()//max(threads, 1), 1)
+  mergedir = options.merge or os.path.join(options.output, 'merged')
+  os.makedirs(options.output, exist_ok = True)
+  os.makedirs(mergedir, exist_ok = True)
+  signal.signal(signal.SIGINT, Stop)
+  signal.signal(signal.SIGTERM, Stop)
+
+  print('Running {0} jobs in {1} processes, merging log files into {2}'.format(len(jobs), nprocs, mergedir), flush = True)
+  pool = multiprocessing.pool.ThreadPool(nprocs)
+  merged = {}
+  totals = {}
+  descriptions = {}
+  unfinished = []
+  start = time.time()
+  for n, result in enumerate(pool.imap_unordered(RunJob, [(job, options) for job in jobs]), 1):
+    if result['status'] not in ('finished', 'done'):
+      unfinished.append(result)
+      Print('[{0:{1}d}/{2}] job {3} {4}'.format(n, len(str(len(jobs))), len(jobs), result['job'], result['status']))
+      continue
+    if result['status'] == 'finished': # logs of jobs finished in an earlier run are already merged
+      MergeLogs(LogFiles(options.output, result['job']), mergedir, merged, options.resume)
+    counts = [] # stopID:count of each particle type
+    for particle in sorted(result['summary']):
+      counts.append(particle)
+      for ID, count in sorted(result['summary'][particle].items(), reverse = True):
+        totals.setdefault(particle, {})
+        totals[particle][ID] = totals[particle].get(ID, 0) + count
+        if count > 0:
+          counts.append('{0}:{1}'.format(ID, count))
+    descriptions.update(result['descriptions'])
+    simtime = ' in {0:.1f} s'.format(result['simtime']) if result['simtime'] is not None and result['status'] == 'finished' else ''
+    status = 'finished' if result['status'] == 'finished' else 'already finished'
+    Print('[{0:{1}d}/{2}] job {3} {4}{5}: {6}'.format(n, len(str(len(jobs))), len(jobs), result['job'], status, simtime, ' '.join(counts)))
+  pool.close()
+  pool.join()
+
+  PrintSummary(totals, descriptions)
+  print('\n{0} of {1} jobs finished in {2:.1f} s'.format(len(jobs) - len(unfinished), len(jobs), time.time() - start))
+  for result in sorted(unfinished, key = lambda r: r['job']):
+    print('job {0} {1} after {2} attempt(s)'.format(result['job'], result['status'], result['attempts']))
+  if interrupted.is_set():
+    print('Run again with --resume to complete skipped and stopped jobs')
+  return 0 if not unfinished else 1
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Run a range of PENTrack jobs in parallel on the local machine and merge their log files.')
+  parser.add_argument('first', type = int, help = 'first job number')
+  parser.add_argument('last', type = int, help = 'last job number')
+  parser.add_argument('-c', '--config', default = 'in', help = 'directory containing config.in, or path of config file (default: in)')
+  parser.add_argument('-o', '--output', default = 'out', help = 'directory where output files are written (default: out)')
+  parser.add_argument('-m', '--merge', default = None, help = 'directory where merged log files are written (default: merged/ in output directory)')
+  parser.add_argument('-e', '--executable', default = './PENTrack', help = 'PENTrack executable (default: ./PENTrack)')
+  parser.add_argument('-j', '--jobs', type = int, default = None, help = 'number of jobs running in parallel (default: number of CPUs divided by threads)')
+  parser.add_argument('-t', '--threads', type = int, default = None, help = 'number of threads used by each job (default: threads option of config file)')
+  parser.add_argument('-s', '--seed', type = int, default = 0, help = 'each job uses this seed plus its job number (default: 0 - random seed for each job)')
+  parser.add_argument('-r', '--retries', type = int, default = 2, help = 'number of times failed or stopped jobs are retried (default: 2)')
+  parser.add_argument('--resume', action = 'store_true', help = 'skip jobs that finished in an earlier run, resume the others from their checkpoints and append them to the existing merged log files')
+  sys.exit(Main(parser.parse_args()))
@@ -6,6 +6,17 @@
 
 #include "analyticFields.h"
 
+#include <algorithm>
+#include <cctype>
+#include <cmath>
+#include <cstdlib>
+#include <iomanip>
+#include <iostream>
+#include <sstream>
+#include <vector>
+
+#include "globals.h"
+
 using namespace std;
 
 //TExponentialBFieldX constructor
@@ -147,48 +158,416 @@ void TB0_XY::BField(const double x, const double y, const double z, const double
 }
 
 
-TCustomBField::TCustomBField(const std::string &_Bx, const std::string &_By, const std::string &_Bz){
-	tvar = unique_ptr<double>(new double(0.0));
-	xvar = unique_ptr<double>(new double(0.0));
-	yvar = unique_ptr<double>(new double(0.0));
-	zvar = unique_ptr<double>(new double(0.0));
+namespace{
+
+struct TFormulaNode;
+typedef std::shared_ptr<const TFormulaNode> TFormula; ///< expression tree of a formula
+
+/**
+ * Node of an expression tree, used to differentiate formulas symbolically
+ */
+struct TFormulaNode{
+	enum nodetype {NUMBER, VARIABLE, NEGATE, ADD, SUBTRACT, MULTIPLY, DIVIDE, POWER, FUNCTION};
+	nodetype type; ///< type of node
+	double value; ///< value of number
+	std::string name; ///< name of variable or function
+	std::vector<TFormula> args; ///< operands or function arguments
+};
+
+TFormula MakeNode(const TFormulaNode::nodetype type, const std::vector<TFormula> &args, const std::string &name = "", const double value = 0.){
+	return std::make_shared<TFormulaNode>(TFormulaNode{type, value, name, args});
+}
+
+bool IsNumber(const TFormula &f, const double value){
+	return f->type == TFormulaNode::NUMBER and f->value == value;
+}
+
+// the following functions create nodes and apply trivial simplifications, which keeps derivatives short
+
+TFormula Number(const double value){
+	return MakeNode(TFormulaNode::NUMBER, {}, "", value);
+}
+
+TFormula Negate(const TFormula &a){
+	if (a->type == TFormulaNode::NUMBER)
+		return Number(-a->value);
+	if (a->type == TFormulaNode::NEGATE)
+		return a->args[0];
+	return MakeNode(TFormulaNode::NEGATE, {a});
+}
+
+TFormula Add(const TFormula &a, const TFormula &b){
+	if (IsNumber(a, 0.))
+		return b;
+	if (IsNumber(b, 0.))
+		return a;
+	if (a->type == TFormulaNode::NUMBER and b->type == TFormulaNode::NUMBER)
+		return Number(a->value + b->value);
+	return MakeNode(TFormulaNode::ADD, {a, b});
+}
+
+TFormula Subtract(const TFormula &a, const TFormula &b){
+	if (IsNumber(b, 0.))
+		return a;
+	if (IsNumber(a, 0.))
+		return Negate(b);
+	if (a->type == TFormulaNode::NUMBER and b->type == TFormulaNode::NUMBER)
+		return Number(a->value - b->value);
+	return MakeNode(TFormulaNode::SUBTRACT, {a, b});
+}
+
+TFormula Multiply(const TFormula &a, const TFormula &b){
+	if (IsNumber(a, 0.) or IsNumber(b, 0.))
+		return Number(0.);
+	if (IsNumber(a, 1.))
+		return b;
+	if (IsNumber(b, 1.))
+		return a;
+	if (a->type == TFormulaNode::NUMBER and b->type == TFormulaNode::NUMBER)
+		return Number(a->value*b->value);
+	return MakeNode(TFormulaNode::MULTIPLY, {a, b});
+}
+
+TFormula Divide(const TFormula &a, const TFormula &b){
+	if (IsNumber(a, 0.))
+		return Number(0.);
+	if (IsNumber(b, 1.))
+		return a;
+	return MakeNode(TFormulaNode::DIVIDE, {a, b});
+}
+
+TFormula Power(const TFormula &a, const TFormula &b){
+	if (IsNumber(b, 0.))
+		return Number(1.);
+	if (IsNumber(b, 1.))
+		return a;
+	return MakeNode(TFormulaNode::POWER, {a, b});
+}
+
+TFormula Function(const std::string &name, const std::vector<TFormula> &args){
+	return MakeNode(TFormulaNode::FUNCTION, args, name);
+}
+
+
+/**
+ * Recursive-descent parser for the arithmetic subset of the exprtk syntax
+ *
+ * Supports numbers, the variables x, y, z, t, the constant pi, the operators + - * / ^, parentheses and function calls.
+ * Throws std::runtime_error for any other syntax (e.g. conditionals, comparisons, implicit multiplication or chained powers).
+ */
+class TFormulaParser{
+private:
+	const std::string &formula; ///< formula to parse
+	std::size_t pos; ///< current position in formula
+
+	char Peek(){
+		while (pos < formula.size() and std::isspace(static_cast<unsigned char>(formula[pos])))
+			++pos;
+		return pos < formula.size() ? formula[pos] : '\0';
+	}
+
+	bool Accept(const char c){
+		if (Peek() != c)
+			return false;
+		++pos;
+		return true;
+	}
+
+	[[noreturn]] void Unsupported(){
+		throw std::runtime_error("Unsupported syntax at position " + std::to_string(pos) + " of formula '" + formula + "'");
+	}
+
+	TFormula Sum(){
+		TFormula f = Product();
+		while (true){
+			if (Accept('+'))
+				f = MakeNode(TFormulaNode::ADD, {f, Product()});
+			else if (Accept('-'))
+				f = MakeNode(TFormulaNode::SUBTRACT, {f, Product()});
+			else
+				return f;
+		}
+	}
+
+	TFormula Product(){
+		TFormula f = Unary();
+		while (true){
+			if (Accept('*'))
+				f = MakeNode(TFormulaNode::MULTIPLY, {f, Unary()});
+			else if (Accept('/'))
+				f = MakeNode(TFormulaNode::DIVIDE, {f, Unary()});
+			else
+				return f;
+		}
+	}
+
+	TFormula Unary(){
+		if (Accept('-'))
+			return MakeNode(TFormulaNode::NEGATE, {Unary()});
+		if (Accept('+'))
+			return Unary();
+		TFormula base = Primary();
+		if (Accept('^')){
+			TFormula exponent = Peek() == '-' or Peek() == '+' ? Unary() : Primary();
+			if (Peek() == '^')
+				Unsupported(); // associativity of chained powers is ambiguous
+			return MakeNode(TFormulaNode::POWER, {base, exponent});
+		}
+		return base;
+	}
+
+	TFormula Primary(){
+		char c = Peek();
+		if (std::isdigit(static_cast<unsigned char>(c)) or c == '.'){
+			const char *start = formula.c_str() + pos;
+			char *end;
+			double value = std::strtod(start, &end);
+			if (end == start)
+				Unsupported();
+			pos += end - start;
+			return Number(value);
+		}
+		else if (std::isalpha(static_cast<unsigned char>(c)) or c == '_'){
+			std::size_t start = pos;
+			while (pos < formula.size() and (std::isalnum(static_cast<unsigned char>(formula[pos])) or formula[pos] == '_'))
+				++pos;
+			std::string name = formula.substr(start, pos - start);
+			if (Accept('(')){
+				std::vector<TFormula> args{Sum()};
+				while (Accept(','))
+					args.push_back(Sum());
+				if (not Accept(')'))
+					Unsupported();
+				return Function(name, args);
+			}
+			if (name == "x" or name == "y" or name == "z" or name == "t")
+				return MakeNode(TFormulaNode::VARIABLE, {}, name);
+			if (name == "pi")
+				return Number(pi);
+			Unsupported();
+		}
+		else if (Accept('(')){
+			TFormula f = Sum();
+			if (not Accept(')'))
+				Unsupported();
+			return f;
+		}
+		Unsupported();
+	}
+
+public:
+	/**
+	 * Constructor
+	 *
+	 * @param aformula Formula to parse
+	 */
+	TFormulaParser(const std::string &aformula): formula(aformula), pos(0){ }
+
+	/**
+	 * Parse formula
+	 *
+	 * @return Returns expression tree
+	 */
+	TFormula Parse(){
+		TFormula f = Sum();
+		if (Peek() != '\0')
+			Unsupported();
+		return f;
+	}
+};
+
+
+/**
+ * Print expression tree as fully parenthesized exprtk formula
+ */
+std::string Print(const TFormula &f){
+	switch (f->type){
+		case TFormulaNode::NUMBER:{
+			std::ostringstream s;
+			s << std::setprecision(17) << f->value;
+			return f->value < 0 ? "(" + s.str() + ")" : s.str();
+		}
+		case TFormulaNode::VARIABLE: return f->name;
+		case TFormulaNode::NEGATE: return "(-" + Print(f->args[0]) + ")";
+		case TFormulaNode::ADD: return "(" + Print(f->args[0]) + " + " + Print(f->args[1]) + ")";
+		case TFormulaNode::SUBTRACT: return "(" + Print(f->args[0]) + " - " + Print(f->args[1]) + ")";
+		case TFormulaNode::MULTIPLY: return "(" + Print(f->args[0]) + "*" + Print(f->args[1]) + ")";
+		case TFormulaNode::DIVIDE: return "(" + Print(f->args[0]) + "/" + Print(f->args[1]) + ")";
+		case TFormulaNode::POWER: return "(" + Print(f->args[0]) + "^" + Print(f->args[1]) + ")";
+		case TFormulaNode::FUNCTION:{
+			std::string s = f->name + "(";
+			for (std::size_t i = 0; i < f->args.size(); ++i)
+				s += (i > 0 ? ", " : "") + Print(f->args[i]);
+			return s + ")";
+		}
+	}
+	return "";
+}
+
+
+/**
+ * Differentiate expression tree with respect to variable
+ */
+TFormula Derivative(const TFormula &f, const std::string &var){
+	const std::vector<TFormula> &a = f->args;
+	switch (f->type){
+		case TFormulaNode::NUMBER: return Number(0.);
+		case TFormulaNode::VARIABLE: return Number(f->name == var ? 1. : 0.);
+		case TFormulaNode::NEGATE: return Negate(Derivative(a[0], var));
+		case TFormulaNode::ADD: return Add(Derivative(a[0], var), Derivative(a[1], var));
+		case TFormulaNode::SUBTRACT: return Subtract(Derivative(a[0], var), Derivative(a[1], var));
+		case TFormulaNode::MULTIPLY: return Add(Multiply(Derivative(a[0], var), a[1]), Multiply(a[0], Derivative(a[1], var)));
+		case TFormulaNode::DIVIDE: return Subtract(Divide(Derivative(a[0], var), a[1]), Divide(Multiply(a[0], Derivative(a[1], var)), Multiply(a[1], a[1])));
+		case TFormulaNode::POWER: break;
+		case TFormulaNode::FUNCTION: break;
+	}
+
+	std::vector<TFormula> da;
+	for (auto &arg: a)
+		da.push_back(Derivative(arg, var));
+	if (std::all_of(da.begin(), da.end(), [](const TFormula &d){ return IsNumber(d, 0.); }))
+		return Number(0.); // function does not depend on variable
+
+	std::string name = f->type == TFormulaNode::POWER ? "pow" : f->name;
+	if (name == "pow" and a.size() == 2){
+		if (IsNumber(da[1], 0.)) // u^c -> c*u^(c-1)*u'
+			return Multiply(Multiply(a[1], Power(a[0], Subtract(a[1], Number(1.)))), da[0]);
+		// u^v -> u^v*(v'*log(u) + v*u'/u)
+		return Multiply(Power(a[0], a[1]), Add(Multiply(da[1], Function("log", {a[0]})), Divide(Multiply(a[1], da[0]), a[0])));
+	}
+	if (name == "atan2" and a.size() == 2) // atan2(u, v) -> (v*u' - u*v')/(u^2 + v^2)
+		return Divide(Subtract(Multiply(a[1], da[0]), Multiply(a[0], da[1])), Add(Multiply(a[0], a[0]), Multiply(a[1], a[1])));
+	if (a.size() != 1)
+		throw std::runtime_error("Cannot differentiate function " + name);
+
+	const TFormula &u = a[0], &du = da[0];
+	TFormula outer; // derivative of function with respect to its argument
+	if (name == "sin")
+		outer = Function("cos", {u});
+	else if (name == "cos")
+		outer = Negate(Function("sin", {u}));
+	else if (name == "tan")
+		outer = Divide(Number(1.), Power(Function("cos", {u}), Number(2.)));
+	else if (name == "exp")
+		outer = Function("exp", {u});
+	else if (name == "log")
+		outer = Divide(Number(1.), u);
+	else if (name == "log10")
+		outer = Divide(Number(1.), Multiply(u, Number(std::log(10.))));
+	else if (name == "sqrt")
+		outer = Divide(Number(0.5), Function("sqrt", {u}));
+	else if (name == "sinh")
+		outer = Function("cosh", {u});
+	else if (name == "cosh")
+		outer = Function("sinh", {u});
+	else if (name == "tanh")
+		outer = Subtract(Number(1.), Power(Function("tanh", {u}), Number(2.)));
+	else if (name == "asin")
+		outer = Divide(Number(1.), Function("sqrt", {Subtract(Number(1.), Power(u, Number(2.)))}));
+	else if (name == "acos")
+		outer = Divide(Number(-1.), Function("sqrt", {Subtract(Number(1.), Power(u, Number(2.)))}));
+	else if (name == "atan")
+		outer = Divide(Number(1.), Add(Number(1.), Power(u, Number(2.))));
+	else if (name == "abs")
+		outer = Function("sgn", {u});
+	else
+		throw std::runtime_error("Cannot differentiate function " + name);
+	return Multiply(outer, du);
+}
+
+}
+
+
+std::string DifferentiateFormula(const std::string &formula, const std::string &variable){
+	return Print(Derivative(TFormulaParser(formula).Parse(), variable));
+}
+
+
+TCustomBField::TFormulas::TFormulas(const std::array<std::string, 3> &B, const std::array<std::array<std::string, 3>, 3> &dB){
 	exprtk::symbol_table<double> symbol_table;
-	symbol_table.add_variable("t",*tvar);
-	symbol_table.add_variable("x",*xvar);
-	symbol_table.add_variable("y",*yvar);
-	symbol_table.add_variable("z",*zvar);
+	symbol_table.add_variable("t",t);
+	symbol_table.add_variable("x",x);
+	symbol_table.add_variable("y",y);
+	symbol_table.add_variable("z",z);
 	symbol_table.add_constants();
 	exprtk::parser<double> parser;
 
-	std::array<std::string, 3> expr{_Bx, _By, _Bz};
 	for (int i = 0; i < 3; ++i){
 		Bexpr[i].register_symbol_table(symbol_table);
-		if (not parser.compile(expr[i], Bexpr[i])){
-			throw std::runtime_error(exprtk::parser_error::to_str(parser.get_error(0).mode) + " while parsing CustomBField formula '" + expr[i] + "': " + parser.get_error(0).diagnostic);
+		if (not parser.compile(B[i], Bexpr[i])){
+			throw std::runtime_error(exprtk::parser_error::to_str(parser.get_error(0).mode) + " while parsing CustomBField formula '" + B[i] + "': " + parser.get_error(0).diagnostic);
+		}
+		for (int j = 0; j < 3; ++j){
+			if (dB[i][j].empty())
+				continue;
+			dBexpr[i][j].register_symbol_table(symbol_table);
+			if (not parser.compile(dB[i][j], dBexpr[i][j]))
+				throw std::runtime_error("Could not compile derivative '" + dB[i][j] + "'");
+		}
+	}
+}
+
+
+TCustomBField::TCustomBField(const std::string &_Bx, const std::string &_By, const std::string &_Bz, const bool symbolicderivatives): Bformulas{{_Bx, _By, _Bz}}{
+	TFormulas B(Bformulas, dBformulas); // check that formulas can be compiled
+
+	symbolic = false;
+	if (symbolicderivatives){
+		try{
+			// check that formulas were parsed like exprtk does by comparing both at a few points
+			std::array<std::string, 3> parsedformulas;
+			for (int i = 0; i < 3; ++i)
+				parsedformulas[i] = Print(TFormulaParser(Bformulas[i]).Parse());
+			TFormulas parsed(parsedformulas, dBformulas);
+			for (int i = 0; i < 3; ++i){
+				for (double v: {-0.7, 0.3, 1.1}){
+					B.x = parsed.x = v; B.y = parsed.y = 0.5*v - 0.2; B.z = parsed.z = 0.9 - v; B.t = parsed.t = 2.*v + 1.;
+					double Bi = B.Bexpr[i].value(), Bparsed = parsed.Bexpr[i].value();
+					// parsing errors change values completely, but rounding errors can be large where terms cancel
+					if (std::abs(Bi - Bparsed) > 1e-9*std::abs(Bi) and not (std::isnan(Bi) and std::isnan(Bparsed)))
+						throw std::runtime_error("Formula '" + Bformulas[i] + "' was not parsed like exprtk does");
+				}
+
+				for (int j = 0; j < 3; ++j)
+					dBformulas[i][j] = DifferentiateFormula(Bformulas[i], std::string(1, "xyz"[j]));
+			}
+			TFormulas dB(Bformulas, dBformulas); // check that derivatives can be compiled
+			symbolic = true;
+		}
+		catch (std::runtime_error &e){
+			dBformulas = std::array<std::array<std::string, 3>, 3>();
+			std::cout << e.what() << ". Derivatives of CustomBField will be calculated numerically.\n";
 		}
 	}
 }
 
 void TCustomBField::BField(const double x, const double y, const double z, const double t, double B[3], double dBidxj[3][3]) const{
-	*xvar = x;
-	*yvar = y;
-	*zvar = z;
-	*tvar = t;
-	B[0] = Bexpr[0].value();
-	B[1] = Bexpr[1].value();
-	B[2] = Bexpr[2].value();
+	TFormulas &f = formulas.get(Bformulas, dBformulas);
+	f.x = x;
+	f.y = y;
+	f.z = z;
+	f.t = t;
+	B[0] = f.Bexpr[0].value();
+	B[1] = f.Bexpr[1].value();
+	B[2] = f.Bexpr[2].value();
 //	std::cout << B[0] << " " << B[1] << " " << B[2] << " ";
 	
-	if (dBidxj != nullptr){
-		dBidxj[0][0] = exprtk::derivative(Bexpr[0], *xvar);
-		dBidxj[0][1] = exprtk::derivative(Bexpr[0], *yvar);
-		dBidxj[0][2] = exprtk::derivative(Bexpr[0], *zvar);
-		dBidxj[1][0] = exprtk::derivative(Bexpr[1], *xvar);
-		dBidxj[1][1] = exprtk::derivative(Bexpr[1], *yvar);
-		dBidxj[1][2] = exprtk::derivative(Bexpr[1], *zvar);
-		dBidxj[2][0] = exprtk::derivative(Bexpr[2], *xvar);
-		dBidxj[2][1] = exprtk::derivative(Bexpr[2], *yvar);
-		dBidxj[2][2] = exprtk::derivative(Bexpr[2], *zvar);
+	if (dBidxj != nullptr and symbolic){
+		for (int i = 0; i < 3; ++i){
+			for (int j = 0; j < 3; ++j)
+				dBidxj[i][j] = f.dBexpr[i][j].value();
+		}
+	}
+	else if (dBidxj != nullptr){
+		dBidxj[0][0] = exprtk::derivative(f.Bexpr[0], f.x);
+		dBidxj[0][1] = exprtk::derivative(f.Bexpr[0], f.y);
+		dBidxj[0][2] = exprtk::derivative(f.Bexpr[0], f.z);
+		dBidxj[1][0] = exprtk::derivative(f.Bexpr[1], f.x);
+		dBidxj[1][1] = exprtk::derivative(f.Bexpr[1], f.y);
+		dBidxj[1][2] = exprtk::derivative(f.Bexpr[1], f.z);
+		dBidxj[2][0] = exprtk::derivative(f.Bexpr[2], f.x);
+		dBidxj[2][1] = exprtk::derivative(f.Bexpr[2], f.y);
+		dBidxj[2][2] = exprtk::derivative(f.Bexpr[2], f.z);
 //		std::cout << dBidxj[0][0] << " " << dBidxj[0][1] << " " << dBidxj[0][2] << std::endl;
 	}
 //	std::cout << std::endl;
@@ -0,0 +1,88 @@
+#include "checkpoint.h"
+
+#include <fstream>
+#include <sstream>
+#include <stdexcept>
+
+using namespace std;
+
+void TCheckpoint::Complete(const int particle){
+    done.insert(particle);
+    while (not done.empty() and *done.begin() == completed + 1){ // keep set of particles completed out of order small
+        ++completed;
+        done.erase(done.begin());
+    }
+}
+
+void TCheckpoint::Write(const boost::filesystem::path &file) const{
+    boost::filesystem::path tmpfile = file;
+    tmpfile += ".tmp";
+    {
+        ofstream out(tmpfile.native());
+        if (!out.is_open())
+            throw runtime_error("Could not open " + tmpfile.native());
+        out << "seed " << seed << '\n';
+        out << "parallel " << parallel << '\n';
+        out << "completed " << completed << '\n';
+        out << "done";
+        for (int particle: done)
+            out << ' ' << particle;
+        out << '\n';
+        out << "ntotalsteps " << ntotalsteps << '\n';
+        for (auto &particle: ID_counter){
+            for (auto &ID: particle.second)
+                out << "ID " << particle.first << ' ' << ID.first << ' ' << ID.second << '\n';
+        }
+        for (auto &position: logpositions)
+            out << "log " << position.first << ' ' << position.second << '\n';
+        out << "mc " << mc << '\n';
+        if (!out)
+            throw runtime_error("Could not write " + tmpfile.native());
+    }
+    boost::filesystem::rename(tmpfile, file);
+}
+
+void TCheckpoint::Read(const boost::filesystem::path &file){
+    ifstream in(file.native());
+    if (!in.is_open())
+        throw runtime_error("Could not open " + file.native());
+    *this = TCheckpoint();
+    string line;
+    while (getline(in, line)){
+        istringstream ss(line);
+        string key;
+        ss >> key;
+        if (key == "seed")
+            ss >> seed;
+        else if (key == "parallel")
+            ss >> parallel;
+        else if (key == "completed")
+            ss >> completed;
+        else if (key == "done"){
+            int particle;
+            while (ss >> particle)
+                done.insert(particle);
+            ss.clear();
+        }
+        else if (key == "ntotalsteps")
+            ss >> ntotalsteps;
+        else if (key == "ID"){
+            string name;
+            int ID, count;
+            ss >> name >> ID >> count;
+            ID_counter[name][ID] = count;
+        }
+        else if (key == "log"){
+            string name;
+            streamoff position;
+            ss >> name >> position;
+            logpositions[name] = position;
+        }
+        else if (key == "mc")
+            ss >> mc;
+        else
+            throw runtime_error("Unknown entry " + key + " in checkpoint " + file.native());
+        if (!ss)
+            throw runtime_error("Could not read entry " + key + " in checkpoint " + file.native());
+    }
+}
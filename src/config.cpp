@@ -6,6 +6,7 @@
 #include <fstream>
 #include <sstream>
 #include <algorithm>
+#include <array>
 
 #include <boost/format.hpp>
 #include <boost/filesystem.hpp>
@@ -192,20 +193,32 @@ std::ostream& operator<<(std::ostream &str, const TConfig &conf){
 	return str;
 }
 
-double EvalFormula(TConfig &config, const std::string formulaname, const std::map<std::string, double> &variables){
+exprtk::expression<double> CompileFormula(TConfig &config, const std::string &formulaname, exprtk::symbol_table<double> &symbols, std::vector<std::string> *variables){
     auto formula = config["FORMULAS"].lower_bound(formulaname);
     if (formula == config["FORMULAS"].end() or formula->first != formulaname)
         throw std::runtime_error("Formula " + formulaname + " not found in config file");
+    exprtk::parser<double> parser;
+    exprtk::expression<double> expr;
+    expr.register_symbol_table(symbols);
+    if (variables)
+        parser.dec().collect_variables() = true;
+    if (not parser.compile(formula->second, expr))
+        throw std::runtime_error("Could not evaluate formula " + formula->first + ": " + parser.error());
+    if (variables){
+        std::vector<exprtk::parser<double>::dependent_entity_collector::symbol_t> symbollist;
+        parser.dec().symbols(symbollist);
+        for (auto &symbol: symbollist)
+            variables->push_back(symbol.first);
+    }
+    return expr;
+}
+
+double EvalFormula(TConfig &config, const std::string formulaname, const std::map<std::string, double> &variables){
     exprtk::symbol_table<double> symbols;
     for (auto var: variables){
         if (not symbols.add_constant(var.first, var.second)){
 			throw std::runtime_error("Error parsing variable " + var.first);
 		}
     }
-    exprtk::parser<double> parser;
-    exprtk::expression<double> expr;
-    expr.register_symbol_table(symbols);
-    if (not parser.compile(formula->second, expr))
-        throw std::runtime_error("Could not evaluate formula " + formula->first + ": " + parser.error());
-    return expr.value();
+    return CompileFormula(config, formulaname, symbols).value();
 }
\ No newline at end of file
@@ -1,12 +1,22 @@
 #include <cmath>
+#include <limits>
+#include <map>
 
 #include "field.h"
 
 using namespace std;
 
 double TFieldScaler::scalingFactor(const double t) const{
-    *tvar = t;
-    return scaler.value();
+    if (constant){
+        return constantvalue;
+    }
+    TScalingFormula &f = formula->get(scalingformula);
+    if (t != f.lastt){ // all fields are usually evaluated several times per time step, only evaluate formula again if time changed
+        f.tvar = t;
+        f.lastvalue = f.scaler.value();
+        f.lastt = t;
+    }
+    return f.lastvalue;
 }
 
 void TFieldScaler::scaleScalarField(const double t, double &F, double dFdxi[3]) const{
@@ -21,21 +31,21 @@ void TFieldScaler::scaleScalarField(const double t, double &F, double dFdxi[3])
 
 
 void TFieldScaler::scaleVectorField(const double t, double F[3], double dFidxj[3][3]) const{
+    double scaling = scalingFactor(t);
     for (int i = 0; i < 3; ++i){
-        if (dFidxj == nullptr){
-            scaleScalarField(t, F[i], nullptr);
-        }
-        else{
-            scaleScalarField(t, F[i], dFidxj[i]);
+        F[i] *= scaling;
+        if (dFidxj != nullptr){
+            for (int j = 0; j < 3; ++j){
+                dFidxj[i][j] *= scaling;
+            }
         }
     }
 }
 
 
-TFieldScaler::TFieldScaler(const std::string &scalingFormula){
-    tvar = unique_ptr<double>(new double(0.0));
+TFieldScaler::TScalingFormula::TScalingFormula(const std::string &scalingFormula){
     exprtk::symbol_table<double> symbol_table;
-    symbol_table.add_variable("t",*tvar);
+    symbol_table.add_variable("t", tvar);
     symbol_table.add_constants();
     scaler.register_symbol_table(symbol_table);
     exprtk::parser<double> parser;
@@ -44,6 +54,25 @@ TFieldScaler::TFieldScaler(const std::string &scalingFormula){
     }
 }
 
+std::shared_ptr<const TThreadLocal<TFieldScaler::TScalingFormula> > TFieldScaler::GetFormula(const std::string &scalingFormula){
+    static std::map<std::string, std::weak_ptr<const TThreadLocal<TScalingFormula> > > formulas; // formulas of all existing scalers
+    static std::mutex formulasmutex;
+    std::lock_guard<std::mutex> lock(formulasmutex);
+    std::shared_ptr<const TThreadLocal<TScalingFormula> > formula = formulas[scalingFormula].lock();
+    if (not formula){
+        formula = std::make_shared<const TThreadLocal<TScalingFormula> >();
+        formulas[scalingFormula] = formula;
+    }
+    return formula;
+}
+
+TFieldScaler::TFieldScaler(const std::string &scalingFormula): scalingformula(scalingFormula){
+    formula = GetFormula(scalingFormula);
+    const TScalingFormula &f = formula->get(scalingformula); // compile formula in calling thread to check it
+    constant = exprtk::expression_helper<double>::is_constant(f.scaler);
+    constantvalue = constant ? f.scaler.value() : 0.;
+}
+
 
 double TFieldBoundaryBox::smthrStp(const double x) const{
     return ((6*x - 15)*x + 10)*x*x*x;
@@ -67,6 +96,19 @@ bool TFieldBoundaryBox::inBounds(const double x, const double y, const double z)
     }
 }
 
+bool TFieldBoundaryBox::boundingBox(double min[3], double max[3]) const{
+    if (not hasBounds()){
+        return false;
+    }
+    min[0] = xmin;
+    min[1] = ymin;
+    min[2] = zmin;
+    max[0] = xmax;
+    max[1] = ymax;
+    max[2] = zmax;
+    return true;
+}
+
 
 void TFieldBoundaryBox::scaleScalarFieldAtBounds(const double x, const double y, const double z, double &F, double dFdxi[3]) const{
     if (not hasBounds() or (F == 0 and dFdxi == nullptr) or (F == 0 and dFdxi[0] == 0 and dFdxi[1] == 0 and dFdxi[2] == 0)){ // skip if no boundary is set or field is zero
@@ -136,8 +178,15 @@ TFieldBoundaryBox::TFieldBoundaryBox(const double _xmax, const double _xmin, con
 
 }
 
+void TFieldContainer::ReplaceField(std::unique_ptr<TField> &&_field, const double min[3], const double max[3]){
+    field = std::move(_field);
+    double bmin[3], bmax[3];
+    if (not boundary->boundingBox(bmin, bmax))
+        boundary = std::unique_ptr<TFieldBoundary>(new TFieldBoundaryBox(max[0], min[0], max[1], min[1], max[2], min[2], 0.));
+}
+
 void TFieldContainer::BField(const double x, const double y, const double z, const double t, double B[3], double dBidxj[3][3]) const{
-    if (not boundary->inBounds(x, y, z) or BScaler.scalingFactor(t) == 0.){
+    if (not boundary->inBounds(x, y, z) or BScaler.scalingFactor(t) == 0.){ // scaling factor is cached, so calling it again in scaleVectorField is cheap
         for (int i = 0; i < 3; ++i){
             B[i] = 0.;
             if (dBidxj != nullptr){
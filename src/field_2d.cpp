@@ -34,7 +34,7 @@ void CylToCart(const double v_r, const double v_phi, const double phi, double &v
 }
 
 
-TFieldContainer ReadOperaField2(const std::string &params, const std::map<std::string, std::string> &formulas){
+TFieldContainer ReadOperaField2(const std::string &params, const std::map<std::string, std::string> &formulas, const std::string &fieldcache){
     std::istringstream ss(params);
     boost::filesystem::path ft;
     std::string fieldtype, Bscale, Escale;
@@ -58,7 +58,9 @@ TFieldContainer ReadOperaField2(const std::string &params, const std::map<std::s
         throw std::runtime_error((boost::format("Could not read all required parameters for field %1%!") % fieldtype).str());
     }
 
-    return TFieldContainer(std::unique_ptr<TabField>(new TabField(boost::filesystem::absolute(ft, configpath.parent_path()).string(), lengthconv)), Bscale, Escale);
+    ft = boost::filesystem::absolute(ft, configpath.parent_path());
+    boost::filesystem::path cachefile = FieldCachePath(fieldcache, ft, (boost::format("%1% %2$.17g") % fieldtype % lengthconv).str());
+    return TFieldContainer(std::unique_ptr<TabField>(new TabField(ft.string(), lengthconv, cachefile)), Bscale, Escale);
 }
 
 
@@ -192,6 +194,44 @@ void TabField::ReadTabFile(const std::string &tabfile, const double lengthconv,
 }
 
 
+/**
+ * Identifies cache files written by TabField::WriteCache, increase version number when format changes
+ */
+const string TabFieldCacheMagic = "PENTrack TabField cache 1\n";
+
+
+void TabField::ReadCache(const boost::filesystem::path &cachefile, alglib::real_1d_array &rind, alglib::real_1d_array &zind,
+		alglib::real_1d_array BTabs[3], alglib::real_1d_array ETabs[3], alglib::real_1d_array &VTab){
+	ifstream f(cachefile.string(), ifstream::in | ifstream::binary);
+	f.exceptions(ifstream::failbit | ifstream::badbit | ifstream::eofbit);
+	string magic(TabFieldCacheMagic.size(), ' ');
+	f.read(&magic[0], magic.size());
+	if (magic != TabFieldCacheMagic)
+		throw runtime_error("Invalid cache file");
+	alglib::real_1d_array *columns[] = {&rind, &zind, &BTabs[0], &BTabs[1], &BTabs[2], &ETabs[0], &ETabs[1], &ETabs[2], &VTab};
+	for (auto column: columns){
+		int64_t length;
+		f.read(reinterpret_cast<char*>(&length), sizeof(length));
+		column->setlength(length);
+		f.read(reinterpret_cast<char*>(column->getcontent()), length*sizeof(double));
+	}
+	m = rind.length();
+	n = zind.length();
+}
+
+
+void TabField::WriteCache(std::ostream &out, const alglib::real_1d_array &rind, const alglib::real_1d_array &zind,
+		const alglib::real_1d_array BTabs[3], const alglib::real_1d_array ETabs[3], const alglib::real_1d_array &VTab) const{
+	out.write(TabFieldCacheMagic.data(), TabFieldCacheMagic.size());
+	const alglib::real_1d_array *columns[] = {&rind, &zind, &BTabs[0], &BTabs[1], &BTabs[2], &ETabs[0], &ETabs[1], &ETabs[2], &VTab};
+	for (auto column: columns){
+		int64_t length = column->length();
+		out.write(reinterpret_cast<const char*>(&length), sizeof(length));
+		out.write(reinterpret_cast<const char*>(column->getcontent()), length*sizeof(double));
+	}
+}
+
+
 void TabField::CheckTab(const alglib::real_1d_array &rind, const alglib::real_1d_array &zind,
 		const alglib::real_1d_array BTabs[3], const alglib::real_1d_array ETabs[3], const alglib::real_1d_array &VTab){
 	//  calculate factors for conversion of coordinates to indexes  r = conv_rA + index * conv_rB
@@ -229,10 +269,25 @@ void TabField::CheckTab(const alglib::real_1d_array &rind, const alglib::real_1d
 	std::cout << "The input table file has values of magnetic field |B| from " << Babsmin << " to " << Babsmax << " and values of electric potential from " << Vmin << " to " << Vmax << "\n";
 }
 
-TabField::TabField(const std::string &tabfile, const double alengthconv){
+TabField::TabField(const std::string &tabfile, const double alengthconv, const boost::filesystem::path &cachefile){
 	alglib::real_1d_array rind, zind, BTabs[3], ETabs[3], VTab;
 
-	ReadTabFile(tabfile, alengthconv, rind, zind, BTabs, ETabs, VTab); // open tabfile and read values into arrays
+	bool cached = false;
+	if (not cachefile.empty() and boost::filesystem::exists(cachefile)){
+		try{
+			cout << "\nLoading field cache " << cachefile << "\n";
+			ReadCache(cachefile, rind, zind, BTabs, ETabs, VTab);
+			cached = true;
+		}
+		catch (std::exception &e){
+			cout << "Could not load field cache: " << e.what() << "\n";
+		}
+	}
+	if (not cached){
+		ReadTabFile(tabfile, alengthconv, rind, zind, BTabs, ETabs, VTab); // open tabfile and read values into arrays
+		if (not cachefile.empty())
+			WriteFieldCache(cachefile, [&](std::ostream &out){ WriteCache(out, rind, zind, BTabs, ETabs, VTab); });
+	}
 
 	CheckTab(rind, zind, BTabs, ETabs, VTab); // print some info
 
@@ -7,12 +7,13 @@
 #include "field_3d.h"
 
 #include <cmath>
+#include <cstring>
 #include <fstream>
 #include <iostream>
+#include <random>
 
 #include "interpolation.h"
 #include "boost/format.hpp"
-#include <boost/iterator/zip_iterator.hpp>
 #include <boost/algorithm/string.hpp>
 #include <boost/iostreams/filtering_stream.hpp>
 #include <boost/iostreams/filter/bzip2.hpp>
@@ -22,106 +23,79 @@
 #include "globals.h"
 
 /**
- * A faster implementation of the tricubic_eval function from libtricubic.
+ * Evaluate tricubic interpolation polynomial and its first derivatives at a point within a grid cell.
  * 
- * Uses Horner's scheme.
+ * The powers of the coordinates are passed in, so they can be shared by all field components in the same grid cell.
  * 
  * @param a Interpolation parameters (64 doubles)
- * @param x X coordinate of point field should be evaluated at
- * @param y Y coordinate
- * @param z Z coordinate
- * 
- * @return Interpolated value at point
+ * @param p Powers of the scaled coordinates x, y, and z (0th to 3rd power, in that order)
+ * @param dp Derivatives of the powers of the scaled coordinates x, y, and z
+ * @param F Returns interpolated value at point
+ * @param dFdxi Returns derivatives with respect to scaled coordinates x, y, and z (only calculated if not null)
  */
-inline double tricubic_eval_fast(double a[64], double x, double y, double z) {
-/*	double result = 0.0;
-	for (int i = 0; i < 4; ++i) {
-		for (int j = 0; j < 4; ++j) {
-			for (int k = 0; k < 4; ++k) {
-				result += a[i + 4 * j + 16 * k] * std::pow(x, i) * std::pow(y, j) * std::pow(z, k);
-			}
-		}
-	}
-    return result;
-*/
-	double rx = 0.;
-	for (int i = 3; i >= 0; --i){
-	    double ry = 0.;
-	    for (int j = 3; j >= 0; --j){
-	        double rz = 0.;
-	        for (int k = 3; k >= 0; --k){
-                rz += a[i + 4*j + 16*k];
-                if (k > 0) rz *= z;
-	        }
-	        ry += rz;
-	        if (j > 0) ry *= y;
-	    }
-	    rx += ry;
-	    if (i > 0) rx *= x;
-	}
-
-	return rx;
+inline void tricubic_eval_fast(const double a[64], const double p[3][4], const double dp[3][4], double &F, double dFdxi[3]) {
+    F = 0.;
+    if (dFdxi != nullptr){
+        dFdxi[0] = dFdxi[1] = dFdxi[2] = 0.;
+    }
+    for (int k = 0; k < 4; ++k){
+        for (int j = 0; j < 4; ++j){
+            const double *aa = &a[4*j + 16*k];
+            double yz = p[1][j]*p[2][k];
+            double rx = aa[0] + aa[1]*p[0][1] + aa[2]*p[0][2] + aa[3]*p[0][3]; // sum over powers of x
+            F += rx*yz;
+            if (dFdxi != nullptr){
+                dFdxi[0] += (aa[1] + aa[2]*dp[0][2] + aa[3]*dp[0][3])*yz;
+                dFdxi[1] += rx*dp[1][j]*p[2][k];
+                dFdxi[2] += rx*p[1][j]*dp[2][k];
+            }
+        }
+    }
 }
 
 
 /**
- * A faster implementation of the tricubic_eval function from libtricubic.
- * 
- * Uses Horner's scheme.
- * 
- * @param a Interpolation parameters (64 doubles)
- * @param x X coordinate of point field should be evaluated at
- * @param y Y coordinate
- * @param z Z coordinate
- * @param derx Return derx-th derivative with respect to x
- * @param dery Return dery-th derivative with respect to y
- * @param derz Return derz-th derivative with respect to z
- * 
- * @return Interpolated value at point
+ * Read optional storage parameters of 3D tables from end of field definition in config.in
+ *
+ * @param ss Stream containing field definition, positioned after required parameters
+ * @param cachesize Returns number of grid cells in coefficient cache, 0 if not given
+ * @param singleprecision Returns true if storage precision "float" was given
  */
-inline double tricubic_eval_fast(double a[64], double x, double y, double z, int derx, int dery, int derz) {
-	// fact[i][n] is the coefficient in front of the nth derivative of x^i.
-	// For instance, d2/dx2 x^3 = 6 x, so fact[3][2] = 6.
-	static double fact[4][4] {
-		{ 1.0, 0.0, 0.0, 0.0 },
-		{ 1.0, 1.0, 0.0, 0.0 },
-		{ 1.0, 2.0, 2.0, 0.0 },
-		{ 1.0, 3.0, 6.0, 6.0 },
-	};
-/*
-	double result = 0.0;
-	for (int i = derx; i <= 3; ++i) {
-		for (int j = dery; j <= 3; ++j) {
-			for (int k = derz; k <= 3; ++k) {
-				double deriv_factor = fact[i][derx] * fact[j][dery] * fact[k][derz];
-				double pow_factor = std::pow(x, i - derx) * std::pow(y, j - dery) * std::pow(z, k - derz);
-				result += a[i + 4 * j + 16 * k] * pow_factor * deriv_factor;
-			}
-		}
-	}
-    return result;
-*/
-    double rx = 0.;
-    for (int i = 3; i >= derx; --i){
-        double ry = 0.;
-        for (int j = 3; j >= dery; --j){
-            double rz = 0.;
-            for (int k = 3; k >= derz; --k){
-                rz += fact[k][derz] * a[i + 4*j + 16*k];
-                if (k > derz) rz *= z;
-            }
-            ry += fact[j][dery] * rz;
-            if (j > dery) ry *= y;
-        }
-        rx += fact[i][derx] * ry;
-        if (i > derx) rx *= x;
+void ReadStorageParameters(std::istream &ss, unsigned long &cachesize, bool &singleprecision){
+    cachesize = 0;
+    singleprecision = false;
+    std::string precision;
+    if (ss >> cachesize and ss >> precision){
+        if (precision == "float")
+            singleprecision = true;
+        else if (precision != "double")
+            throw std::runtime_error("Unknown storage precision " + precision + " for 3D field table!");
     }
+}
+
 
-	return rx;
+/**
+ * Load 3D field table from a binary cache file, if it exists
+ *
+ * @param cachefile Path of cache file, returned by ::FieldCachePath
+ * @param cachesize Number of grid cells in coefficient cache
+ * @return Returns field loaded from cache file, null if caching is disabled or cache file does not exist or could not be loaded
+ */
+std::unique_ptr<TabField3> LoadFieldCache(const boost::filesystem::path &cachefile, const unsigned long cachesize){
+    if (cachefile.empty() or not boost::filesystem::exists(cachefile))
+        return nullptr;
+    try{
+        std::cout << "\nLoading field cache " << cachefile << "\n";
+        return std::unique_ptr<TabField3>(new TabField3(cachefile, cachesize));
+    }
+    catch (std::exception &e){
+        std::cout << "Could not load field cache: " << e.what() << "\n";
+        return nullptr;
+    }
 }
 
 
-TFieldContainer ReadComsolField(const std::string &params, const std::map<std::string, std::string> &formulas){
+TFieldContainer ReadComsolField(const std::string &params, const std::map<std::string, std::string> &formulas, const std::string &fieldcache){
   std::istringstream ss(params);
   boost::filesystem::path ft;
   std::string fieldtype, Bscale;
@@ -131,58 +105,68 @@ TFieldContainer ReadComsolField(const std::string &params, const std::map<std::s
   if (!ss){
       throw std::runtime_error((boost::format("Could not read all required parameters for field %1%!") % fieldtype).str());
   }
+  unsigned long cachesize;
+  bool singleprecision;
+  ReadStorageParameters(ss, cachesize, singleprecision);
   ft = boost::filesystem::absolute(ft, configpath.parent_path());
 
-  std::string line;
-  std::vector<std::string> line_parts;
-  std::vector<double> x, y, z;
-  std::vector<double> bx, by, bz;
+  boost::filesystem::path cachefile = FieldCachePath(fieldcache, ft, (boost::format("%1% %2$.17g %3% %4%") % fieldtype % lengthconv % (cachesize > 0) % singleprecision).str());
+  std::unique_ptr<TabField3> field = LoadFieldCache(cachefile, cachesize);
+  if (not field){
+    std::string line;
+    std::vector<std::string> line_parts;
+    std::vector<double> x, y, z;
+    std::vector<double> bx, by, bz;
 
-  std::ifstream FINstream(ft.string(), std::ifstream::in);
-  boost::iostreams::filtering_istream FIN;
-  if (boost::filesystem::extension(ft) == ".bz2"){
-  	FIN.push(boost::iostreams::bzip2_decompressor());
-  }
-  else if (boost::filesystem::extension(ft) == ".gz"){
-  	FIN.push(boost::iostreams::gzip_decompressor());
-  }
-  FIN.push(FINstream);
-  if (!FINstream.is_open() or !FIN.is_complete()){
-    throw std::runtime_error("Could not open " + ft.string());
-  }
-  std::cout << "\nReading " << ft << "\n";
+    std::ifstream FINstream(ft.string(), std::ifstream::in);
+    boost::iostreams::filtering_istream FIN;
+    if (boost::filesystem::extension(ft) == ".bz2"){
+    	FIN.push(boost::iostreams::bzip2_decompressor());
+    }
+    else if (boost::filesystem::extension(ft) == ".gz"){
+    	FIN.push(boost::iostreams::gzip_decompressor());
+    }
+    FIN.push(FINstream);
+    if (!FINstream.is_open() or !FIN.is_complete()){
+      throw std::runtime_error("Could not open " + ft.string());
+    }
+    std::cout << "\nReading " << ft << "\n";
+
+    // Read in file data
+    int lineNum = 0;
 
-  // Read in file data
-  int lineNum = 0;
+    while (getline(FIN,line)){
+      lineNum++;
+      if (line.substr(0,1) == "%" || line.substr(0,1) == "#") continue;     // Skip commented lines
+      boost::split(line_parts, line, boost::is_any_of("\t, "), boost::token_compress_on); //Delineate tab, space, commas
 
-  while (getline(FIN,line)){
-    lineNum++;
-    if (line.substr(0,1) == "%" || line.substr(0,1) == "#") continue;     // Skip commented lines
-    boost::split(line_parts, line, boost::is_any_of("\t, "), boost::token_compress_on); //Delineate tab, space, commas
+      if (line_parts.size() != 6){
+        throw std::runtime_error((boost::format("Error reading line %1% of file %2%") % lineNum % ft.string()).str());
+      }
 
-    if (line_parts.size() != 6){
-      throw std::runtime_error((boost::format("Error reading line %1% of file %2%") % lineNum % ft.string()).str());
+      x.push_back( std::stod(line_parts[0], nullptr) * lengthconv);
+      y.push_back( std::stod(line_parts[1], nullptr) * lengthconv);
+      z.push_back( std::stod(line_parts[2], nullptr) * lengthconv);
+      bx.push_back( std::stod(line_parts[3], nullptr));
+      by.push_back( std::stod(line_parts[4], nullptr));
+      bz.push_back( std::stod(line_parts[5], nullptr));
     }
 
-    x.push_back( std::stod(line_parts[0], nullptr) * lengthconv);
-    y.push_back( std::stod(line_parts[1], nullptr) * lengthconv);
-    z.push_back( std::stod(line_parts[2], nullptr) * lengthconv);
-    bx.push_back( std::stod(line_parts[3], nullptr));
-    by.push_back( std::stod(line_parts[4], nullptr));
-    bz.push_back( std::stod(line_parts[5], nullptr));
-  }
+    if (x.empty() || y.empty() || z.empty() || bx.empty() || by.empty()|| bz.empty() ) {
+      throw std::runtime_error("No data read from " + ft.string());
+    }
 
-  if (x.empty() || y.empty() || z.empty() || bx.empty() || by.empty()|| bz.empty() ) {
-    throw std::runtime_error("No data read from " + ft.string());
+    field = std::unique_ptr<TabField3>(new TabField3({x,y,z}, {bx,by,bz}, std::vector<double>(), cachesize, singleprecision));
+    if (not cachefile.empty())
+      WriteFieldCache(cachefile, [&field](std::ostream &out){ field->WriteCache(out); });
   }
 
-  auto xminmax = std::minmax_element(x.begin(), x.end());
-  auto yminmax = std::minmax_element(y.begin(), y.end());
-  auto zminmax = std::minmax_element(z.begin(), z.end());
-  return TFieldContainer(std::unique_ptr<TabField3>(new TabField3({x,y,z}, {bx,by,bz}, std::vector<double>())), Bscale, "0", *xminmax.second, *xminmax.first, *yminmax.second, *yminmax.first, *zminmax.second, *zminmax.first, BoundaryWidth);
+  const std::array<std::vector<double>, 3> &grid = field->GetGrid();
+  double xmax = grid[0].back(), xmin = grid[0].front(), ymax = grid[1].back(), ymin = grid[1].front(), zmax = grid[2].back(), zmin = grid[2].front();
+  return TFieldContainer(std::move(field), Bscale, "0", xmax, xmin, ymax, ymin, zmax, zmin, BoundaryWidth);
 }
 
-TFieldContainer ReadOperaField3(const std::string &params, const std::map<std::string, std::string> &formulas){
+TFieldContainer ReadOperaField3(const std::string &params, const std::map<std::string, std::string> &formulas, const std::string &fieldcache){
     std::istringstream ss(params);
     boost::filesystem::path ft;
     std::string fieldtype, Bscale, Escale;
@@ -205,108 +189,118 @@ TFieldContainer ReadOperaField3(const std::string &params, const std::map<std::s
     if (!ss){
         throw std::runtime_error((boost::format("Could not read all required parameters for field %1%!") % fieldtype).str());
     }
+    unsigned long cachesize;
+    bool singleprecision;
+    ReadStorageParameters(ss, cachesize, singleprecision);
 
     ft = boost::filesystem::absolute(ft, configpath.parent_path());
-    std::ifstream FINstream(ft.string(), std::ifstream::in);
-    boost::iostreams::filtering_istream FIN;
-    if (boost::filesystem::extension(ft) == ".bz2"){
-        FIN.push(boost::iostreams::bzip2_decompressor());
-    }
-    else if (boost::filesystem::extension(ft) == ".gz"){
-        FIN.push(boost::iostreams::gzip_decompressor());
-    }
-    FIN.push(FINstream);
-    if (!FINstream.is_open() or !FIN.is_complete()){
-        throw std::runtime_error("Could not open " + ft.string());
-    }
-
-    std::cout << "\nReading " << ft << " ";
-	std::string line;
-    int xl, yl, zl;
-	FIN >> xl >> yl >> zl;
-
-	getline(FIN,line);
-	getline(FIN,line);
-	getline(FIN,line);
-	getline(FIN,line);
-	getline(FIN,line);
+    boost::filesystem::path cachefile = FieldCachePath(fieldcache, ft, (boost::format("%1% %2$.17g %3% %4%") % fieldtype % lengthconv % (cachesize > 0) % singleprecision).str());
+    std::unique_ptr<TabField3> field = LoadFieldCache(cachefile, cachesize);
+    if (not field){
+        std::ifstream FINstream(ft.string(), std::ifstream::in);
+        boost::iostreams::filtering_istream FIN;
+        if (boost::filesystem::extension(ft) == ".bz2"){
+            FIN.push(boost::iostreams::bzip2_decompressor());
+        }
+        else if (boost::filesystem::extension(ft) == ".gz"){
+            FIN.push(boost::iostreams::gzip_decompressor());
+        }
+        FIN.push(FINstream);
+        if (!FINstream.is_open() or !FIN.is_complete()){
+            throw std::runtime_error("Could not open " + ft.string());
+        }
 
-    std::array<std::vector<double>, 3> xyzTab, BTab;
-    std::vector<double> VTab;
-    for (auto &xi: xyzTab){
-        xi.resize(xl * yl * zl);
+        std::cout << "\nReading " << ft << " ";
+    	std::string line;
+        int xl, yl, zl;
+    	FIN >> xl >> yl >> zl;
+
+    	getline(FIN,line);
+    	getline(FIN,line);
+    	getline(FIN,line);
+    	getline(FIN,line);
+    	getline(FIN,line);
+
+        std::array<std::vector<double>, 3> xyzTab, BTab;
+        std::vector<double> VTab;
+        for (auto &xi: xyzTab){
+            xi.resize(xl * yl * zl);
+        }
+    	if (line.find("BX") != std::string::npos){
+            BTab[0].resize(xl*yl*zl);
+    		getline(FIN,line);
+    	}
+    	if (line.find("BY") != std::string::npos){
+            BTab[1].resize(xl*yl*zl);
+    		getline(FIN,line);
+    	}
+    	if (line.find("BZ") != std::string::npos){
+            BTab[2].resize(xl*yl*zl);
+    		getline(FIN,line);
+    	}
+
+    	if (line.find("V") != std::string::npos){	// file contains potential?
+    		VTab.resize(xl*yl*zl);
+    		getline(FIN,line);
+    	}
+
+    	if (!FIN || line.substr(0,2) != " 0"){
+            std::cout << ft << " not found or corrupt! Exiting...\n";
+    		exit(-1);
+    	}
+
+    	std::vector<double> xind(xl), yind(yl), zind(zl);
+    	progress_display progress(xl*yl*zl, std::cout);
+        int i = 0;
+    	while (FIN.good()){
+            double x, y, z, val;
+    		FIN >> x;
+    		FIN >> y;
+    		FIN >> z;
+    		if (!FIN) break;
+    		x *= lengthconv;
+    		y *= lengthconv;
+    		z *= lengthconv;
+
+    		// status if read is displayed
+    		++progress;
+
+            xyzTab[0][i] = x;
+            xyzTab[1][i] = y;
+            xyzTab[2][i] = z;
+            if (not BTab[0].empty()){
+    			FIN >> val;
+                BTab[0][i] = val;
+    		}
+            if (not BTab[1].empty()){
+    			FIN >> val;
+                BTab[1][i] = val;
+    		}
+            if (not BTab[2].empty()){
+    			FIN >> val;
+                BTab[2][i] = val;
+    		}
+    		if (not VTab.empty()){
+    			FIN >> val;
+                VTab[i] = val;
+    		}
+    		FIN >> std::ws;
+            ++i;
+    	}
+
+    	std::cout << "\n";
+        if (i != xl*yl*zl){
+            throw std::runtime_error((boost::format("The header says the size is %1%, actually it is %2%! Exiting...\n") % (xl*yl*zl) % i).str());
+    	}
+
+        field = std::unique_ptr<TabField3>(new TabField3(xyzTab, BTab, VTab, cachesize, singleprecision));
+        if (not cachefile.empty())
+            WriteFieldCache(cachefile, [&field](std::ostream &out){ field->WriteCache(out); });
     }
-	if (line.find("BX") != std::string::npos){
-        BTab[0].resize(xl*yl*zl);
-		getline(FIN,line);
-	}
-	if (line.find("BY") != std::string::npos){
-        BTab[1].resize(xl*yl*zl);
-		getline(FIN,line);
-	}
-	if (line.find("BZ") != std::string::npos){
-        BTab[2].resize(xl*yl*zl);
-		getline(FIN,line);
-	}
 
-	if (line.find("V") != std::string::npos){	// file contains potential?
-		VTab.resize(xl*yl*zl);
-		getline(FIN,line);
-	}
-
-	if (!FIN || line.substr(0,2) != " 0"){
-        std::cout << ft << " not found or corrupt! Exiting...\n";
-		exit(-1);
-	}
-
-	std::vector<double> xind(xl), yind(yl), zind(zl);
-	progress_display progress(xl*yl*zl, std::cout);
-    int i = 0;
-	while (FIN.good()){
-        double x, y, z, val;
-		FIN >> x;
-		FIN >> y;
-		FIN >> z;
-		if (!FIN) break;
-		x *= lengthconv;
-		y *= lengthconv;
-		z *= lengthconv;
-
-		// status if read is displayed
-		++progress;
-
-        xyzTab[0][i] = x;
-        xyzTab[1][i] = y;
-        xyzTab[2][i] = z;
-        if (not BTab[0].empty()){
-			FIN >> val;
-            BTab[0][i] = val;
-		}
-        if (not BTab[1].empty()){
-			FIN >> val;
-            BTab[1][i] = val;
-		}
-        if (not BTab[2].empty()){
-			FIN >> val;
-            BTab[2][i] = val;
-		}
-		if (not VTab.empty()){
-			FIN >> val;
-            VTab[i] = val;
-		}
-		FIN >> std::ws;
-        ++i;
-	}
-
-	std::cout << "\n";
-    if (i != xl*yl*zl){
-        throw std::runtime_error((boost::format("The header says the size is %1%, actually it is %2%! Exiting...\n") % (xl*yl*zl) % i).str());
-	}
-
-    auto xminmax = std::minmax_element(xyzTab[0].begin(), xyzTab[0].end());
-    auto yminmax = std::minmax_element(xyzTab[1].begin(), xyzTab[1].end());
-    auto zminmax = std::minmax_element(xyzTab[2].begin(), xyzTab[2].end());
-    return TFieldContainer(std::unique_ptr<TabField3>(new TabField3(xyzTab, BTab, VTab)), Bscale, Escale, *xminmax.second, *xminmax.first, *yminmax.second, *yminmax.first, *zminmax.second, *zminmax.first, BoundaryWidth);
+    const std::array<std::vector<double>, 3> &grid = field->GetGrid();
+    double xmax = grid[0].back(), xmin = grid[0].front(), ymax = grid[1].back(), ymin = grid[1].front(), zmax = grid[2].back(), zmin = grid[2].front();
+    return TFieldContainer(std::move(field), Bscale, Escale, xmax, xmin, ymax, ymin, zmax, zmin, BoundaryWidth);
 }
 
 
@@ -318,11 +312,14 @@ void TabField3::CheckTab(const std::array<std::vector<double>, 3> &B, const std:
     std::cout << "The y values go from " << xyz[1].front() << " to " << xyz[1].back() << "\n";
     std::cout << "The z values go from " << xyz[2].front() << " to " << xyz[2].back() << ".\n";
 
-    std::vector<double> Babs;
-    std::transform( boost::make_zip_iterator(boost::make_tuple(B[0].begin(), B[1].begin(), B[2].begin())),
-                    boost::make_zip_iterator(boost::make_tuple(B[0].end(), B[1].end(), B[2].end())), std::back_inserter(Babs),
-                    [](const boost::tuple<double,double,double> &Bs){ return std::sqrt(std::pow(Bs.get<0>(), 2) + std::pow(Bs.get<1>(), 2) + std::pow(Bs.get<2>(), 2)); });
-    std::cout << "The input table file has values of magnetic field |B| from " << *std::min_element(Babs.begin(), Babs.end()) << " to " << *std::max_element(Babs.begin(), Babs.end());
+    std::vector<double> Babs(std::max(B[0].size(), std::max(B[1].size(), B[2].size())), 0.);
+    for (auto &Bi: B){ // missing components are empty and do not contribute
+        for (unsigned long j = 0; j < Bi.size(); ++j)
+            Babs[j] += Bi[j]*Bi[j];
+    }
+    std::transform(Babs.begin(), Babs.end(), Babs.begin(), [](const double B2){ return std::sqrt(B2); });
+    if (not Babs.empty())
+        std::cout << "The input table file has values of magnetic field |B| from " << *std::min_element(Babs.begin(), Babs.end()) << " to " << *std::max_element(Babs.begin(), Babs.end());
     if (not V.empty())
         std::cout << " and values of electric potential from " << *std::min_element(V.begin(), V.end()) << " to " << *std::max_element(V.begin(), V.end());
     std::cout << std::endl;
@@ -364,57 +361,134 @@ void TabField3::CalcDerivs(const array3D &Tab, const unsigned long diff_dim, arr
 }
 
 
-void TabField3::PreInterpol(const array3D &Tab, field_type &coeff) const{
+template<typename T> void TabField3::CalcNodes(const array3D &Tab, boost::multi_array_ref<std::array<T, 8>, 3> &node) const{
+    std::array<array3D, 7> dF; // derivatives with respect to x, y, z, xy, xz, yz, xyz
+    CalcDerivs(Tab, 0, dF[0]); // dF/dx
+    CalcDerivs(Tab, 1, dF[1]); // dF/dy
+    CalcDerivs(Tab, 2, dF[2]); // dF/dz
+    CalcDerivs(dF[0], 1, dF[3]); // d2F/dxdy
+    CalcDerivs(dF[0], 2, dF[4]); // d2F/dxdz
+    CalcDerivs(dF[1], 2, dF[5]); // d2F/dydz
+    CalcDerivs(dF[3], 2, dF[6]); // d3F/dxdydz
+
+    for (unsigned long i = 0; i < node.num_elements(); ++i){
+        node.data()[i][0] = Tab.data()[i];
+        for (unsigned j = 0; j < 7; ++j)
+            node.data()[i][j + 1] = dF[j].data()[i];
+    }
+}
+
+
+template<typename T> void TabField3::CalcCoefficients(const node_type<T> &node, const std::array<unsigned long, 3> &index, tricubic_coeff &coeff) const{
+    unsigned long ix = index[0], iy = index[1], iz = index[2];
+    std::array<std::array<unsigned long, 3>, 8> indices;
+    indices[0] = {ix  ,iy  ,iz  }; // collect indices of corners of each grid cell
+    indices[1] = {ix+1,iy  ,iz  }; // order according to tricubic manual
+    indices[2] = {ix  ,iy+1,iz  };
+    indices[3] = {ix+1,iy+1,iz  };
+    indices[4] = {ix  ,iy  ,iz+1};
+    indices[5] = {ix+1,iy  ,iz+1};
+    indices[6] = {ix  ,iy+1,iz+1};
+    indices[7] = {ix+1,iy+1,iz+1};
+
+    double cellx = xyz[0][ix+1] - xyz[0][ix];
+    double celly = xyz[1][iy+1] - xyz[1][iy];
+    double cellz = xyz[2][iz+1] - xyz[2][iz];
+    std::array<double, 8> scale{1., cellx, celly, cellz, cellx*celly, cellx*cellz, celly*cellz, cellx*celly*cellz};
+    std::array<std::array<double, 8>, 8> yyy;
+    for (unsigned i = 0; i < 8; ++i){
+        for (unsigned j = 0; j < 8; ++j)
+            yyy[j][i] = node(indices[i])[j]*scale[j]; // get values and derivatives at each corner of grid cell
+    }
+    tricubic_get_coeff(&coeff[0], &yyy[0][0], &yyy[1][0], &yyy[2][0], &yyy[3][0], &yyy[4][0], &yyy[5][0], &yyy[6][0], &yyy[7][0]); // calculate tricubic interpolation coefficients and store in coeff
+}
+
+
+void TabField3::PreInterpol(const array3D &Tab, boost::multi_array_ref<tricubic_coeff, 3> &coeff) const{
     std::array<unsigned long, 3> len;
     for (unsigned long i = 0; i < 3; ++i){
         len[i] = xyz[i].size() - 1;
     }
-    coeff.resize(len);
-
-    array3D dFdx, dFdy, dFdz, dFdxdy, dFdxdz, dFdydz, dFdxdydz; // derivatives with respect to x, y, z, xy, xz, yz, xyz
-    CalcDerivs(Tab, 0, dFdx); // dF/dx
-    CalcDerivs(Tab, 1, dFdy); // dF/dy
-    CalcDerivs(Tab, 2, dFdz); // dF/dz
-    CalcDerivs(dFdx, 1, dFdxdy); // d2F/dxdy
-    CalcDerivs(dFdx, 2, dFdxdz); // d2F/dxdz
-    CalcDerivs(dFdy, 2, dFdydz); // d2F/dydz
-    CalcDerivs(dFdxdy, 2, dFdxdydz); // d3F/dxdydz
-
-    for (unsigned long ix = 0; ix < len[0]; ++ix){
-        for (unsigned long iy = 0; iy < len[1]; ++iy){
-            for (unsigned long iz = 0; iz < len[2]; ++iz){
-                std::array<std::array<unsigned long, 3>, 8> indices;
-                indices[0] = {ix  ,iy  ,iz  }; // collect indices of corners of each grid cell
-                indices[1] = {ix+1,iy  ,iz  }; // order according to tricubic manual
-                indices[2] = {ix  ,iy+1,iz  };
-                indices[3] = {ix+1,iy+1,iz  };
-                indices[4] = {ix  ,iy  ,iz+1};
-                indices[5] = {ix+1,iy  ,iz+1};
-                indices[6] = {ix  ,iy+1,iz+1};
-                indices[7] = {ix+1,iy+1,iz+1};
-
-                double cellx = xyz[0][ix+1] - xyz[0][ix];
-                double celly = xyz[1][iy+1] - xyz[1][iy];
-                double cellz = xyz[2][iz+1] - xyz[2][iz];
-                std::array<std::array<double, 8>, 8> yyy;
-                for (unsigned i = 0; i < 8; ++i){
-                    yyy[0][i] = Tab(indices[i]); // get values and derivatives at each corner of grid cell
-                    yyy[1][i] = dFdx(indices[i])*cellx;
-                    yyy[2][i] = dFdy(indices[i])*celly;
-                    yyy[3][i] = dFdz(indices[i])*cellz;
-                    yyy[4][i] = dFdxdy(indices[i])*cellx*celly;
-                    yyy[5][i] = dFdxdz(indices[i])*cellx*cellz;
-                    yyy[6][i] = dFdydz(indices[i])*celly*cellz;
-                    yyy[7][i] = dFdxdydz(indices[i])*cellx*celly*cellz;
-                }
-                tricubic_get_coeff(&coeff(indices[0])[0], &yyy[0][0], &yyy[1][0], &yyy[2][0], &yyy[3][0], &yyy[4][0], &yyy[5][0], &yyy[6][0], &yyy[7][0]); // calculate tricubic interpolation coefficients and store in coeff
+
+    boost::multi_array<std::array<double, 8>, 3> node(boost::extents[xyz[0].size()][xyz[1].size()][xyz[2].size()]);
+    CalcNodes(Tab, node);
+
+    std::array<unsigned long, 3> index;
+    for (index[0] = 0; index[0] < len[0]; ++index[0]){
+        for (index[1] = 0; index[1] < len[1]; ++index[1]){
+            for (index[2] = 0; index[2] < len[2]; ++index[2]){
+                CalcCoefficients<double>(node, index, coeff(index));
 			}
 		}
 	}
 }
 
 
-TabField3::TabField3(const std::array<std::vector<double>, 3> &xyzTab, const std::array<std::vector<double>, 3> &BTab, const std::vector<double> &VTab){
+/**
+ * Identifies cache files written by TabField3::WriteCache, increase version number when format changes
+ */
+const std::string TabField3CacheMagic = "PENTrack TabField3 cache 1\n";
+
+
+void TabField3::CheckGrid(){
+    for (unsigned i = 0; i < 3; ++i){
+        if (xyz[i].size() < 2)
+            throw std::runtime_error("Field table needs at least two grid points in each dimension!");
+        spacing[i] = (xyz[i].back() - xyz[i].front())/(xyz[i].size() - 1);
+        uniform[i] = true;
+        for (unsigned long j = 1; j < xyz[i].size(); ++j){ // check if all grid points are equally spaced
+            if (std::abs(xyz[i][j] - xyz[i][j - 1] - spacing[i]) > 1e-6*spacing[i]){
+                uniform[i] = false;
+                break;
+            }
+        }
+    }
+}
+
+
+std::size_t TabField3::DataSize(const std::array<bool, 4> &available, const bool singleprecision) const{
+    std::size_t size = 0;
+    for (unsigned i = 0; i < 4; ++i){
+        if (not available[i])
+            continue;
+        if (cachesize == 0)
+            size += (xyz[0].size() - 1)*(xyz[1].size() - 1)*(xyz[2].size() - 1)*sizeof(tricubic_coeff);
+        else if (singleprecision)
+            size += xyz[0].size()*xyz[1].size()*xyz[2].size()*sizeof(std::array<float, 8>);
+        else
+            size += xyz[0].size()*xyz[1].size()*xyz[2].size()*sizeof(std::array<double, 8>);
+    }
+    return size;
+}
+
+
+void TabField3::MapData(const char *data, const std::array<bool, 4> &available, const bool singleprecision){
+    std::array<unsigned long, 3> nodeshape{xyz[0].size(), xyz[1].size(), xyz[2].size()};
+    std::array<unsigned long, 3> cellshape{xyz[0].size() - 1, xyz[1].size() - 1, xyz[2].size() - 1};
+    const char *block = data;
+    for (unsigned i = 0; i < 4; ++i){
+        if (not available[i])
+            continue;
+        if (cachesize == 0){
+            coeffs[i] = std::unique_ptr<field_type>(new field_type(reinterpret_cast<const tricubic_coeff*>(block), cellshape));
+            block += coeffs[i]->num_elements()*sizeof(tricubic_coeff);
+        }
+        else if (singleprecision){
+            floatnodes[i] = std::unique_ptr<node_type<float> >(new node_type<float>(reinterpret_cast<const std::array<float, 8>*>(block), nodeshape));
+            block += floatnodes[i]->num_elements()*sizeof(std::array<float, 8>);
+        }
+        else{
+            nodes[i] = std::unique_ptr<node_type<double> >(new node_type<double>(reinterpret_cast<const std::array<double, 8>*>(block), nodeshape));
+            block += nodes[i]->num_elements()*sizeof(std::array<double, 8>);
+        }
+    }
+}
+
+
+TabField3::TabField3(const std::array<std::vector<double>, 3> &xyzTab, const std::array<std::vector<double>, 3> &BTab, const std::vector<double> &VTab,
+                     const unsigned long CacheSize, const bool SinglePrecision): cachesize(CacheSize){
+    if (SinglePrecision and cachesize == 0)
+        throw std::runtime_error("Single-precision storage of 3D field tables requires a coefficient cache!");
 
     for (unsigned i = 0; i < 3; ++i){
         std::unique_copy(xyzTab[i].begin(), xyzTab[i].end(), std::back_inserter(xyz[i])); // get list of unique x, y, and z coordinates
@@ -422,6 +496,7 @@ TabField3::TabField3(const std::array<std::vector<double>, 3> &xyzTab, const std
         auto last = std::unique(xyz[i].begin(), xyz[i].end());
         xyz[i].erase(last, xyz[i].end());
 	}
+    CheckGrid();
     CheckTab(BTab,VTab); // print some info
 
 
@@ -454,76 +529,299 @@ TabField3::TabField3(const std::array<std::vector<double>, 3> &xyzTab, const std
             V(index) = VTab[i];
 	}
 
-	std::cout << "Starting Preinterpolation ... ";
-	float size = 0;
-    if (not BTab[0].empty()){
-		std::cout << "Bx ... ";
-		std::cout.flush();
-        PreInterpol(B[0], Bc[0]); // precalculate interpolation coefficients for B field
-        size += float(Bc[0].num_elements()*64*sizeof(double)/1024/1024);
-	}
-    if (not BTab[1].empty()){
-		std::cout << "By ... ";
-		std::cout.flush();
-        PreInterpol(B[1], Bc[1]);
-        size += float(Bc[1].num_elements()*64*sizeof(double)/1024/1024);
-	}
-    if (not BTab[2].empty()){
-		std::cout << "Bz ... ";
-		std::cout.flush();
-        PreInterpol(B[2], Bc[2]);
-        size += float(Bc[2].num_elements()*64*sizeof(double)/1024/1024);
-	}
-	if (not VTab.empty()){
-		std::cout << "V ... ";
-		std::cout.flush();
-        PreInterpol(V, Vc);
-        size += float(Vc.num_elements()*64*sizeof(double)/1024/1024);
-	}
-	std::cout << "Done (" << size << " MB)\n";
+    std::array<const array3D*, 4> F{&B[0], &B[1], &B[2], &V};
+    std::array<std::string, 4> names{"Bx", "By", "Bz", "V"};
+    std::array<bool, 4> available{not BTab[0].empty(), not BTab[1].empty(), not BTab[2].empty(), not VTab.empty()};
+    std::size_t size = DataSize(available, SinglePrecision);
+    storage.resize(size/sizeof(double));
+    MapData(reinterpret_cast<const char*>(storage.data()), available, SinglePrecision);
+
+    if (cachesize == 0)
+        std::cout << "Starting Preinterpolation ... ";
+    else
+        std::cout << "Calculating derivatives on grid points ... ";
+    for (unsigned i = 0; i < 4; ++i){
+        if (not available[i])
+            continue;
+        std::cout << names[i] << " ... ";
+        std::cout.flush();
+        if (coeffs[i]){
+            boost::multi_array_ref<tricubic_coeff, 3> c(const_cast<tricubic_coeff*>(coeffs[i]->data()), boost::extents[xyz[0].size() - 1][xyz[1].size() - 1][xyz[2].size() - 1]);
+            PreInterpol(*F[i], c); // precalculate interpolation coefficients
+        }
+        else if (floatnodes[i]){
+            boost::multi_array_ref<std::array<float, 8>, 3> n(const_cast<std::array<float, 8>*>(floatnodes[i]->data()), boost::extents[xyz[0].size()][xyz[1].size()][xyz[2].size()]);
+            CalcNodes(*F[i], n);
+        }
+        else if (nodes[i]){
+            boost::multi_array_ref<std::array<double, 8>, 3> n(const_cast<std::array<double, 8>*>(nodes[i]->data()), boost::extents[xyz[0].size()][xyz[1].size()][xyz[2].size()]);
+            CalcNodes(*F[i], n);
+        }
+    }
+    if (cachesize > 0)
+        std::cout << "coefficients of up to " << cachesize << " grid cells are cached (" << float(cachesize*sizeof(std::array<tricubic_coeff, 4>)/1024./1024.) << " MB per thread) ... ";
+    std::cout << "Done (" << float(size/1024./1024.) << " MB)\n";
 }
 
 
-void TabField3::Interpolate(const double x, const double y, const double z,
-                            const field_type& coeffs, double &F, double dFdxi[3]) const {
-    std::array<double, 3> r = {x, y, z}, dist;
-	// get coordinate index
-    std::array<long, 3> index;
+TabField3::TabField3(const boost::filesystem::path &cachefile, const unsigned long CacheSize): cachesize(CacheSize){
+    cachemap.open(cachefile.string());
+    const char *data = cachemap.data();
+    const char *end = data + cachemap.size();
+    auto read = [&data, end](void *value, const std::size_t size){
+        if (data + size > end)
+            throw std::runtime_error("Unexpected end of cache file");
+        std::memcpy(value, data, size);
+        data += size;
+    };
+
+    std::string magic(TabField3CacheMagic.size(), ' ');
+    read(&magic[0], magic.size());
+    uint64_t byteorder, shape[3];
+    read(&byteorder, sizeof(byteorder));
+    if (magic != TabField3CacheMagic or byteorder != 0x0102030405060708ULL)
+        throw std::runtime_error("Invalid cache file");
+    read(shape, sizeof(shape));
+    uint8_t flags[8];
+    read(flags, sizeof(flags));
+    std::array<bool, 4> available{flags[0] != 0, flags[1] != 0, flags[2] != 0, flags[3] != 0};
+    bool singleprecision = flags[4] != 0;
+    if ((flags[5] != 0) != (cachesize > 0))
+        throw std::runtime_error("Cache file does not match requested coefficient storage");
     for (unsigned i = 0; i < 3; ++i){
-      auto it = std::upper_bound(xyz[i].begin(), xyz[i].end(), r[i]); // find first coordinate larger than x/y/z
-      if (it == xyz[i].end() || it == xyz[i].begin()){ // if x,y,z are outside bounds of field
-          return;
-      }
-      auto low = it - 1;
-      index[i] = std::distance(xyz[i].begin(), low);
-      dist[i] = *it - *low;
-      r[i] = (r[i] - *low)/dist[i]; // scale coordinates to unit cube
-    }
-
-    // tricubic interpolation
-    if (not coeffs.empty()){
-        double *coeff = const_cast<double*>(&coeffs(index)[0]);
-        F = tricubic_eval_fast(coeff, r[0], r[1], r[2]);
-        if (dFdxi != nullptr){
-            dFdxi[0] = tricubic_eval_fast(coeff, r[0], r[1], r[2], 1, 0, 0)/dist[0];
-            dFdxi[1] = tricubic_eval_fast(coeff, r[0], r[1], r[2], 0, 1, 0)/dist[1];
-            dFdxi[2] = tricubic_eval_fast(coeff, r[0], r[1], r[2], 0, 0, 1)/dist[2];
+        xyz[i].resize(shape[i]);
+        read(xyz[i].data(), shape[i]*sizeof(double));
+    }
+    data = cachemap.data() + (data - cachemap.data() + 63)/64*64; // data block is aligned to 64 bytes
+    CheckGrid();
+
+    std::size_t size = DataSize(available, singleprecision);
+    if (static_cast<std::size_t>(end - data) != size)
+        throw std::runtime_error("Size of cache file does not match its header");
+    MapData(data, available, singleprecision);
+    std::cout << "The arrays are " << xyz[0].size() << " by " << xyz[1].size() << " by " << xyz[2].size() << " (" << float(size/1024./1024.) << " MB)\n";
+}
+
+
+void TabField3::WriteCache(std::ostream &out) const{
+    std::array<bool, 4> available;
+    for (unsigned i = 0; i < 4; ++i)
+        available[i] = coeffs[i] or nodes[i] or floatnodes[i];
+    uint64_t byteorder = 0x0102030405060708ULL;
+    uint64_t shape[3] = {xyz[0].size(), xyz[1].size(), xyz[2].size()};
+    uint8_t flags[8] = {available[0], available[1], available[2], available[3], bool(floatnodes[0] or floatnodes[1] or floatnodes[2] or floatnodes[3]), cachesize > 0, 0, 0};
+
+    out.write(TabField3CacheMagic.data(), TabField3CacheMagic.size());
+    out.write(reinterpret_cast<const char*>(&byteorder), sizeof(byteorder));
+    out.write(reinterpret_cast<const char*>(shape), sizeof(shape));
+    out.write(reinterpret_cast<const char*>(flags), sizeof(flags));
+    for (unsigned i = 0; i < 3; ++i)
+        out.write(reinterpret_cast<const char*>(xyz[i].data()), xyz[i].size()*sizeof(double));
+    std::streamoff pos = TabField3CacheMagic.size() + sizeof(byteorder) + sizeof(shape) + sizeof(flags) + (shape[0] + shape[1] + shape[2])*sizeof(double);
+    std::string padding((pos + 63)/64*64 - pos, '\0'); // align data block to 64 bytes
+    out.write(padding.data(), padding.size());
+    out.write(reinterpret_cast<const char*>(storage.data()), storage.size()*sizeof(double));
+}
+
+
+bool TabField3::FindCell(const double x, const double y, const double z, std::array<unsigned long, 3> &index, std::array<double, 3> &r, std::array<double, 3> &dist) const{
+    r = {x, y, z};
+    for (unsigned i = 0; i < 3; ++i){
+        const std::vector<double> &xi = xyz[i];
+        if (not (r[i] >= xi.front() and r[i] < xi.back())) // if x,y,z are outside bounds of field
+            return false;
+        unsigned long low;
+        if (uniform[i]){ // calculate index directly and correct for rounding errors
+            low = std::min(static_cast<unsigned long>((r[i] - xi.front())/spacing[i]), xi.size() - 2);
+            if (r[i] < xi[low])
+                --low;
+            else if (r[i] >= xi[low + 1])
+                ++low;
+        }
+        else{
+            low = std::distance(xi.begin(), std::upper_bound(xi.begin(), xi.end(), r[i])) - 1; // find first coordinate larger than x/y/z
+        }
+        index[i] = low;
+        dist[i] = xi[low + 1] - xi[low];
+        r[i] = (r[i] - xi[low])/dist[i]; // scale coordinates to unit cube
+    }
+    return true;
+}
+
+
+std::array<const double*, 4> TabField3::GetCoefficients(const std::array<unsigned long, 3> &index, const std::array<bool, 4> &components) const{
+    std::array<const double*, 4> c{nullptr, nullptr, nullptr, nullptr};
+    if (cachesize == 0){
+        for (unsigned i = 0; i < 4; ++i){
+            if (components[i] and coeffs[i])
+                c[i] = &(*coeffs[i])(index)[0];
+        }
+        return c;
+    }
+
+    unsigned long key = (index[0]*(xyz[1].size() - 1) + index[1])*(xyz[2].size() - 1) + index[2]; // linear index of grid cell
+    TCoefficientCache &threadcache = cache.get();
+    auto found = threadcache.lookup.find(key);
+    if (found != threadcache.lookup.end()){
+        threadcache.cells.splice(threadcache.cells.begin(), threadcache.cells, found->second); // mark cell as most recently used
+    }
+    else{
+        if (threadcache.cells.size() >= cachesize){ // reuse least recently used cell
+            threadcache.lookup.erase(threadcache.cells.back().first);
+            threadcache.cells.splice(threadcache.cells.begin(), threadcache.cells, std::prev(threadcache.cells.end()));
+        }
+        else{
+            threadcache.cells.emplace_front();
+        }
+        threadcache.cells.front().first = key;
+        for (unsigned i = 0; i < 4; ++i){
+            if (nodes[i])
+                CalcCoefficients(*nodes[i], index, threadcache.cells.front().second[i]);
+            else if (floatnodes[i])
+                CalcCoefficients(*floatnodes[i], index, threadcache.cells.front().second[i]);
+        }
+        threadcache.lookup[key] = threadcache.cells.begin();
+    }
+
+    for (unsigned i = 0; i < 4; ++i){
+        if (components[i] and (nodes[i] or floatnodes[i]))
+            c[i] = &threadcache.cells.front().second[i][0]; // cell stays in the cache until this thread requests another cell
+    }
+    return c;
+}
+
+
+void TabField3::Interpolate(const std::array<double, 3> &r, const std::array<double, 3> &dist,
+                            const std::array<const double*, 4> &coeffs, double F[4], double dFdxi[4][3], const bool derivatives) const {
+    double p[3][4], dp[3][4];
+    for (unsigned i = 0; i < 3; ++i){
+        p[i][0] = 1.;
+        p[i][1] = r[i];
+        p[i][2] = r[i]*r[i];
+        p[i][3] = p[i][2]*r[i];
+        dp[i][0] = 0.;
+        dp[i][1] = 1.;
+        dp[i][2] = 2.*r[i];
+        dp[i][3] = 3.*p[i][2];
+    }
+
+    for (unsigned c = 0; c < 4; ++c){
+        if (coeffs[c] == nullptr)
+            continue;
+        tricubic_eval_fast(coeffs[c], p, dp, F[c], derivatives ? dFdxi[c] : nullptr);
+        if (derivatives){
+            for (unsigned i = 0; i < 3; ++i)
+                dFdxi[c][i] /= dist[i]; // scale derivatives from unit cube to grid cell
         }
     }
 }
 
 
 void TabField3::BField(const double x, const double y, const double z, const double t, double B[3], double dBidxj[3][3]) const{
+    std::array<unsigned long, 3> index;
+    std::array<double, 3> r, dist;
+    if (not FindCell(x, y, z, index, r, dist))
+        return;
+    auto coeffs = GetCoefficients(index, {true, true, true, false});
+    double F[4], dFdxi[4][3];
+    Interpolate(r, dist, coeffs, F, dFdxi, dBidxj != nullptr);
     for (unsigned i = 0; i < 3; ++i){
-        Interpolate(x, y, z, Bc[i], B[i], dBidxj == nullptr ? nullptr : dBidxj[i]);
+        if (coeffs[i] == nullptr)
+            continue;
+        B[i] = F[i];
+        if (dBidxj != nullptr){
+            for (unsigned j = 0; j < 3; ++j)
+                dBidxj[i][j] = dFdxi[i][j];
+        }
     }
 }
 
 void TabField3::EField(const double x, const double y, const double z, const double t,
 		double &V, double Ei[3]) const{
-    double dVdxi[3];
-    Interpolate(x, y, z, Vc, V, dVdxi);
+    std::array<unsigned long, 3> index;
+    std::array<double, 3> r, dist;
+    if (not FindCell(x, y, z, index, r, dist))
+        return;
+    auto coeffs = GetCoefficients(index, {false, false, false, true});
+    if (coeffs[3] == nullptr)
+        return;
+    double F[4], dFdxi[4][3];
+    Interpolate(r, dist, coeffs, F, dFdxi, true);
+    V = F[3];
     for (int i = 0; i < 3; i++){
-        Ei[i] = -dVdxi[i]; // Ei = -dV/dxi
+        Ei[i] = -dFdxi[3][i]; // Ei = -dV/dxi
+    }
+}
+
+
+std::unique_ptr<TabField3> TabulateField(const TField &field, const std::array<double, 3> &min, const std::array<double, 3> &max, const std::array<unsigned long, 3> &n,
+                                         const boost::filesystem::path &cachefile){
+    for (unsigned i = 0; i < 3; ++i){
+        if (n[i] < 2 or min[i] >= max[i])
+            throw std::runtime_error("Invalid grid for tabulated field! Each dimension needs a positive size and at least two grid points.");
+    }
+
+    std::unique_ptr<TabField3> table = LoadFieldCache(cachefile, 0);
+    if (not table){
+        std::cout << "\nTabulating field on " << n[0] << "x" << n[1] << "x" << n[2] << " grid\n";
+        std::array<std::vector<double>, 3> xyzTab, BTab;
+        std::vector<double> VTab;
+        bool hasB = false, hasV = false, hasE = false;
+        for (unsigned long i = 0; i < n[0]; ++i){
+            for (unsigned long j = 0; j < n[1]; ++j){
+                for (unsigned long k = 0; k < n[2]; ++k){
+                    std::array<double, 3> r{min[0] + (max[0] - min[0])*i/(n[0] - 1), min[1] + (max[1] - min[1])*j/(n[1] - 1), min[2] + (max[2] - min[2])*k/(n[2] - 1)};
+                    double B[3] = {0., 0., 0.}, dBidxj[3][3], V = 0., Ei[3] = {0., 0., 0.};
+                    field.BField(r[0], r[1], r[2], 0., B, dBidxj); // not all fields accept null pointer for derivatives
+                    field.EField(r[0], r[1], r[2], 0., V, Ei);
+                    for (unsigned l = 0; l < 3; ++l){
+                        xyzTab[l].push_back(r[l]);
+                        BTab[l].push_back(B[l]);
+                        hasB = hasB or B[l] != 0.;
+                        hasE = hasE or Ei[l] != 0.;
+                    }
+                    VTab.push_back(V);
+                    hasV = hasV or V != 0.;
+                }
+            }
+        }
+        if (hasE and not hasV)
+            throw std::runtime_error("Cannot tabulate electric field that is not defined by a potential!");
+        if (not hasB){
+            for (auto &b: BTab)
+                b.clear();
+        }
+        if (not hasV)
+            VTab.clear();
+        table = std::unique_ptr<TabField3>(new TabField3(xyzTab, BTab, VTab));
+        if (not cachefile.empty())
+            WriteFieldCache(cachefile, [&table](std::ostream &out){ table->WriteCache(out); });
+    }
+
+    const int samples = 1000;
+    std::mt19937 rng;
+    double Bmax = 0., Berr = 0., dBerr = 0., Emax = 0., Eerr = 0.;
+    for (int i = 0; i < samples; ++i){
+        std::array<double, 3> r;
+        for (unsigned j = 0; j < 3; ++j)
+            r[j] = std::uniform_real_distribution<double>(min[j], max[j])(rng);
+        double B1[3] = {0., 0., 0.}, dB1[3][3] = {}, V1 = 0., E1[3] = {0., 0., 0.};
+        double B2[3] = {0., 0., 0.}, dB2[3][3] = {}, V2 = 0., E2[3] = {0., 0., 0.};
+        field.BField(r[0], r[1], r[2], 0., B1, dB1);
+        field.EField(r[0], r[1], r[2], 0., V1, E1);
+        table->BField(r[0], r[1], r[2], 0., B2, dB2);
+        table->EField(r[0], r[1], r[2], 0., V2, E2);
+        for (unsigned j = 0; j < 3; ++j){
+            Bmax = std::max(Bmax, std::abs(B1[j]));
+            Berr = std::max(Berr, std::abs(B1[j] - B2[j]));
+            Emax = std::max(Emax, std::abs(E1[j]));
+            Eerr = std::max(Eerr, std::abs(E1[j] - E2[j]));
+            for (unsigned k = 0; k < 3; ++k)
+                dBerr = std::max(dBerr, std::abs(dB1[j][k] - dB2[j][k]));
+        }
     }
+    std::cout << "Maximum deviation of tabulated field at " << samples << " random points: "
+              << "B " << Berr << " T (maximum field " << Bmax << " T), dB/dx " << dBerr << " T/m, "
+              << "E " << Eerr << " V/m (maximum field " << Emax << " V/m)\n";
+    return table;
 }
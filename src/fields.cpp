@@ -8,113 +8,247 @@
 #include <string>
 #include <iostream>
 #include <vector>
+#include <algorithm>
+#include <iomanip>
 #include "field_2d.h"
 #include "field_3d.h"
 #include "conductor.h"
 #include "edmfields.h"
 #include "harmonicfields.h"
 #include "analyticFields.h"
+#include "profiler.h"
 
 
 TFieldManager::TFieldManager(TConfig &conf){
 	for (const auto &i: conf["FIELDS"]){
-		std::string type;
-		boost::filesystem::path ft;
-		double Ibar, p1, p2, p3, p4, p5, p6, p7;
-		double bW, xma, xmi, yma, ymi, zma, zmi;
-		double axis_x, axis_y, axis_z, angle, G0, G1, G2, G3, G4, G5, G6, G7, G8, G9, G10, G11, G12, G13, G14, G15, G16, G17, G18, G19, G20, G21, G22, G23;
-		std::string Bscale, Escale, Bx, By, Bz;
-		std::istringstream ss(i.second);
-		ss >> type;
-
-        if (type == "OPERA2D" or type == "2Dtable"){
-            fields.emplace_back(ReadOperaField2(i.second, conf["FORMULAS"]));
-		}
-        else if (type == "OPERA3D" or type == "3Dtable"){
-            fields.emplace_back(ReadOperaField3(i.second, conf["FORMULAS"]));
-		}
-        else if (type == "COMSOL"){
-            fields.emplace_back(ReadComsolField(i.second, conf["FORMULAS"]));
-		}
-        else if ((type == "Conductor") && (ss >> Ibar >> p1 >> p2 >> p3 >> p4 >> p5 >> p6 >> Bscale)){
-			std::unique_ptr<TField> f(new TConductorField(p1, p2, p3, p4, p5, p6, Ibar));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-            fields.emplace_back(TFieldContainer(std::move(f), Bscale));
-		}
-        else if ((type == "EDMStaticB0GradZField") && (ss >> p1 >> p2 >> p3 >> p4 >> p5 >> p6 >> p7 >> bW >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale)){
-			//conversion to radians
-			p4*=pi/180;
-			p5*=pi/180;
-			std::unique_ptr<TField> f(new TEDMStaticB0GradZField(p1, p2, p3, p4, p5, p6, p7));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-            fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, bW));
-		}
-		else if (type == "HarmonicExpandedBField" and
-				 ss >> p1 >> p2 >> p3 >> bW >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale >> axis_x >> axis_y >> axis_z >> angle and
-				 ss >> G0 >> G1 >> G2 >> G3 >> G4 >> G5 >> G6 >> G7 >> G8 >> G9 >> G10 >> G11 >> G12 >> G13 >> G14 >> G15 >> G16 >> G17 >> G18 >> G19 >> G20 >> G21 >> G22 >> G23){
-
-			//conversion to radians
-			p4*=pi/180;
-			p5*=pi/180;
-			std::unique_ptr<TField> f(new HarmonicExpandedBField(p1, p2, p3, axis_x, axis_y, axis_z, angle, G0, G1, G2, G3, G4, G5, G6, G7, G8, G9, G10, G11, G12, G13, G14, G15, G16, G17, G18, G19, G20, G21, G22, G23));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, bW));
-		}
-        else if ((type == "EDMStaticEField") and (ss >> p1 >> p2 >> p3 >> Bscale)){
-			std::unique_ptr<TField> f(new TEDMStaticEField (p1, p2, p3));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-            fields.emplace_back(TFieldContainer(std::move(f), Bscale));
-		}
-		else if (type == "ExponentialFieldX" and ss >> p1 >> p2 >> p3 >> p4 >> p5 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
-			std::unique_ptr<TField> f( new TExponentialFieldX(p1, p2, p3, p4, p5));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.));
-		}
+		fields.emplace_back(ReadField(i.second, conf));
+	}
+	BuildIndex();
+	std::cout << "\n";
+}
 
-		else if (type == "LinearFieldZ" and	ss >> p1 >> p2 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
-			std::unique_ptr<TField> f( new TLinearFieldZ(p1, p2));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.));
-		}
 
-		else if (type == "B0GradZ" and ss >> p1 >> p2 >> p3 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
-			std::unique_ptr<TField> f(new TB0GradZ(p1, p2, p3));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.));
-		}
+TFieldContainer TFieldManager::ReadField(const std::string &definition, TConfig &conf){
+	auto fieldcache = [&conf](){ // cache option is only read if field tables are used or fields are tabulated
+		std::string fieldcache = "0";
+		std::istringstream(conf["GLOBAL"]["fieldcache"]) >> fieldcache;
+		return fieldcache;
+	};
+	std::string type;
+	boost::filesystem::path ft;
+	double Ibar, p1, p2, p3, p4, p5, p6, p7;
+	double bW, xma, xmi, yma, ymi, zma, zmi;
+	double axis_x, axis_y, axis_z, angle, G0, G1, G2, G3, G4, G5, G6, G7, G8, G9, G10, G11, G12, G13, G14, G15, G16, G17, G18, G19, G20, G21, G22, G23;
+	std::string Bscale, Escale, Bx, By, Bz;
+	std::istringstream ss(definition);
+	ss >> type;
 
-		else if (type == "B0GradX2" and ss >> p1 >> p2 >> p3 >> p4 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
-			std::unique_ptr<TField> f( new TB0GradX2(p1, p2, p3, p4));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.));
+	std::array<unsigned long, 3> n;
+	if (type == "Tabulate" and ss >> xma >> xmi >> yma >> ymi >> zma >> zmi >> n[0] >> n[1] >> n[2]){
+		std::string field;
+		std::getline(ss >> std::ws, field);
+		std::string fieldtype = field.substr(0, field.find_first_of(" \t"));
+		if (fieldtype == "OPERA2D" or fieldtype == "2Dtable" or fieldtype == "OPERA3D" or fieldtype == "3Dtable" or fieldtype == "COMSOL" or fieldtype == "Tabulate")
+			throw std::runtime_error("Field " + fieldtype + " cannot be tabulated, only analytic fields can!");
+		TFieldContainer container = ReadField(field, conf);
+		const double min[3] = {xmi, ymi, zmi}, max[3] = {xma, yma, zma};
+		double bmin[3], bmax[3];
+		if (container.boundingBox(bmin, bmax)){ // field outside of grid would be cut off at the grid edges without smoothing
+			for (int i = 0; i < 3; ++i){
+				if (bmin[i] < min[i] or bmax[i] > max[i])
+					throw std::runtime_error("Boundary of field " + fieldtype + " extends past the tabulation grid. Extend the grid or reduce the field's boundary!");
+			}
 		}
 
-		else if (type == "B0GradXY" and ss >> p1 >> p2 >> p3 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
-			std::unique_ptr<TField> f(new TB0GradXY(p1, p2, p3));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.));
+		std::ostringstream parameters; // cached table depends on grid, field definition, and formulas used in field definition
+		parameters << std::setprecision(17) << xma << " " << xmi << " " << yma << " " << ymi << " " << zma << " " << zmi << " " << n[0] << " " << n[1] << " " << n[2] << " " << field;
+		for (const auto &formula: conf["FORMULAS"])
+			parameters << "\n" << formula.first << " " << formula.second;
+		boost::filesystem::path cachefile = GeneratedFieldCachePath(fieldcache(), fieldtype, parameters.str());
+
+		container.ReplaceField(TabulateField(container.GetField(), {xmi, ymi, zmi}, {xma, yma, zma}, n, cachefile), min, max);
+		return container;
+	}
+    else if (type == "OPERA2D" or type == "2Dtable"){
+        return ReadOperaField2(definition, conf["FORMULAS"], fieldcache());
+	}
+    else if (type == "OPERA3D" or type == "3Dtable"){
+        return ReadOperaField3(definition, conf["FORMULAS"], fieldcache());
+	}
+    else if (type == "COMSOL"){
+        return ReadComsolField(definition, conf["FORMULAS"], fieldcache());
+	}
+    else if ((type == "Conductor") && (ss >> Ibar >> p1 >> p2 >> p3 >> p4 >> p5 >> p6 >> Bscale)){
+		std::unique_ptr<TField> f(new TConductorField(p1, p2, p3, p4, p5, p6, Ibar));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+        return TFieldContainer(std::move(f), Bscale);
+	}
+    else if ((type == "EDMStaticB0GradZField") && (ss >> p1 >> p2 >> p3 >> p4 >> p5 >> p6 >> p7 >> bW >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale)){
+		//conversion to radians
+		p4*=pi/180;
+		p5*=pi/180;
+		std::unique_ptr<TField> f(new TEDMStaticB0GradZField(p1, p2, p3, p4, p5, p6, p7));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+        return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, bW);
+	}
+	else if (type == "HarmonicExpandedBField" and
+			 ss >> p1 >> p2 >> p3 >> bW >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale >> axis_x >> axis_y >> axis_z >> angle and
+			 ss >> G0 >> G1 >> G2 >> G3 >> G4 >> G5 >> G6 >> G7 >> G8 >> G9 >> G10 >> G11 >> G12 >> G13 >> G14 >> G15 >> G16 >> G17 >> G18 >> G19 >> G20 >> G21 >> G22 >> G23){
+
+		//conversion to radians
+		p4*=pi/180;
+		p5*=pi/180;
+		std::unique_ptr<TField> f(new HarmonicExpandedBField(p1, p2, p3, axis_x, axis_y, axis_z, angle, G0, G1, G2, G3, G4, G5, G6, G7, G8, G9, G10, G11, G12, G13, G14, G15, G16, G17, G18, G19, G20, G21, G22, G23));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, bW);
+	}
+    else if ((type == "EDMStaticEField") and (ss >> p1 >> p2 >> p3 >> Bscale)){
+		std::unique_ptr<TField> f(new TEDMStaticEField (p1, p2, p3));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+        return TFieldContainer(std::move(f), Bscale);
+	}
+	else if (type == "ExponentialFieldX" and ss >> p1 >> p2 >> p3 >> p4 >> p5 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
+		std::unique_ptr<TField> f( new TExponentialFieldX(p1, p2, p3, p4, p5));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.);
+	}
+
+	else if (type == "LinearFieldZ" and	ss >> p1 >> p2 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
+		std::unique_ptr<TField> f( new TLinearFieldZ(p1, p2));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.);
+	}
+
+	else if (type == "B0GradZ" and ss >> p1 >> p2 >> p3 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
+		std::unique_ptr<TField> f(new TB0GradZ(p1, p2, p3));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.);
+	}
+
+	else if (type == "B0GradX2" and ss >> p1 >> p2 >> p3 >> p4 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
+		std::unique_ptr<TField> f( new TB0GradX2(p1, p2, p3, p4));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.);
+	}
+
+	else if (type == "B0GradXY" and ss >> p1 >> p2 >> p3 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
+		std::unique_ptr<TField> f(new TB0GradXY(p1, p2, p3));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.);
+	}
+
+	else if (type == "B0_XY" and ss >> p1 >> p2 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
+		std::unique_ptr<TField> f(new TB0_XY(p1, p2));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.);
+	}
+
+	else if (type == "CustomBField" and ss >> Bx >> By >> Bz >> xma >> xmi >> yma >> ymi >> zma >> zmi >> bW >> Bscale){
+		bool symbolicderivatives = false;
+		std::istringstream(conf["GLOBAL"]["symbolicderivatives"]) >> symbolicderivatives;
+		std::unique_ptr<TField> f(new TCustomBField(conf["FORMULAS"][Bx], conf["FORMULAS"][By], conf["FORMULAS"][Bz], symbolicderivatives));
+		Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
+		return TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, bW);
+	}
+	else{
+        throw std::runtime_error("Could not load field """ + type + """! Check config file for invalid field type or parameters.");
+	}
+}
+
+
+void TFieldManager::BuildIndex(){
+	const std::size_t maxcells = 1 << 20; // limit memory used by index
+	std::vector<std::array<double, 6> > boxes(fields.size());
+	std::vector<bool> bounded(fields.size());
+	for (std::size_t i = 0; i < fields.size(); ++i){
+		bounded[i] = fields[i].boundingBox(&boxes[i][0], &boxes[i][3]);
+		if (bounded[i]){
+			for (int j = 0; j < 3; ++j){
+				edges[j].push_back(boxes[i][j]);
+				edges[j].push_back(boxes[i][j + 3]);
+			}
 		}
+		else
+			unboundedfields.push_back(i);
+	}
+	if (unboundedfields.size() == fields.size()) // no bounded fields, all fields have to be evaluated everywhere
+		return;
 
-		else if (type == "B0_XY" and ss >> p1 >> p2 >> xma >> xmi >> yma >> ymi >> zma >> zmi >> Bscale){
-			std::unique_ptr<TField> f(new TB0_XY(p1, p2));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, 0.));
+	for (auto &e: edges){
+		std::sort(e.begin(), e.end());
+		e.erase(std::unique(e.begin(), e.end()), e.end());
+	}
+	auto cellcount = [this](){ return (edges[0].size() - 1)*(edges[1].size() - 1)*(edges[2].size() - 1); };
+	while (cellcount() > maxcells){ // drop every other edge along the axis with most edges, cells then contain all fields overlapping them
+		auto &e = *std::max_element(edges.begin(), edges.end(), [](const std::vector<double> &a, const std::vector<double> &b){ return a.size() < b.size(); });
+		std::vector<double> coarse;
+		for (std::size_t k = 0; k < e.size(); k += 2)
+			coarse.push_back(e[k]);
+		if (coarse.back() != e.back())
+			coarse.push_back(e.back());
+		e = coarse;
+	}
+
+	// range of cells along each axis overlapped by each field
+	std::vector<std::array<std::size_t, 6> > ranges(fields.size());
+	for (std::size_t i = 0; i < fields.size(); ++i){
+		if (not bounded[i])
+			continue;
+		for (int j = 0; j < 3; ++j){
+			ranges[i][j] = std::upper_bound(edges[j].begin(), edges[j].end(), boxes[i][j]) - edges[j].begin() - 1;
+			ranges[i][j + 3] = std::lower_bound(edges[j].begin(), edges[j].end(), boxes[i][j + 3]) - edges[j].begin();
 		}
+	}
 
-		else if (type == "CustomBField" and ss >> Bx >> By >> Bz >> xma >> xmi >> yma >> ymi >> zma >> zmi >> bW >> Bscale){
-			std::unique_ptr<TField> f(new TCustomBField(conf["FORMULAS"][Bx], conf["FORMULAS"][By], conf["FORMULAS"][Bz]));
-			Bscale = ResolveFormula(Bscale, conf["FORMULAS"]);
-			fields.emplace_back(TFieldContainer(std::move(f), Bscale, "0", xma, xmi, yma, ymi, zma, zmi, bW));
+	celloffsets.reserve(cellcount() + 1);
+	celloffsets.push_back(0);
+	std::array<std::size_t, 3> c;
+	for (c[0] = 0; c[0] < edges[0].size() - 1; ++c[0]){
+		for (c[1] = 0; c[1] < edges[1].size() - 1; ++c[1]){
+			for (c[2] = 0; c[2] < edges[2].size() - 1; ++c[2]){
+				for (std::size_t i = 0; i < fields.size(); ++i){
+					if (not bounded[i] or (ranges[i][0] <= c[0] and c[0] < ranges[i][3] and ranges[i][1] <= c[1] and c[1] < ranges[i][4] and ranges[i][2] <= c[2] and c[2] < ranges[i][5]))
+						cellfields.push_back(i);
+				}
+				celloffsets.push_back(cellfields.size());
+			}
 		}
-		else{
-            throw std::runtime_error("Could not load field """ + type + """! Check config file for invalid field type or parameters.");
+	}
+	std::cout << "Sorted " << fields.size() - unboundedfields.size() << " bounded fields into " << cellcount() << " cells\n";
+}
+
+
+void TFieldManager::FindFields(const double x, const double y, const double z, const std::size_t* &begin, const std::size_t* &end) const{
+	const double r[3] = {x, y, z};
+	std::size_t cell = 0;
+	for (int i = 0; i < 3; ++i){
+		auto e = std::upper_bound(edges[i].begin(), edges[i].end(), r[i]);
+		if (e == edges[i].begin() or e == edges[i].end()){ // position is outside all bounding boxes
+			begin = unboundedfields.data();
+			end = begin + unboundedfields.size();
+			return;
 		}
+		cell = cell*(edges[i].size() - 1) + (e - edges[i].begin() - 1);
 	}
-	std::cout << "\n";
+	begin = cellfields.data() + celloffsets[cell];
+	end = cellfields.data() + celloffsets[cell + 1];
+}
+
+
+bool TFieldManager::IsFieldFree(const double min[3], const double max[3]) const{
+	for (auto &f: fields){
+		double fmin[3], fmax[3];
+		if (not f.boundingBox(fmin, fmax))
+			return false;
+		if (fmin[0] <= max[0] and min[0] <= fmax[0] and fmin[1] <= max[1] and min[1] <= fmax[1] and fmin[2] <= max[2] and min[2] <= fmax[2])
+			return false;
+	}
+	return true;
 }
 
 
 void TFieldManager::BField(const double x, const double y, const double z, const double t, double B[3], double dBidxj[3][3]) const{
+	PROFILE_TIMER(BFIELD);
 	for (int i = 0; i < 3; i++){
 		B[i] = 0;
 		if (dBidxj != nullptr){
@@ -123,13 +257,19 @@ void TFieldManager::BField(const double x, const double y, const double z, const
 		}
 	}
 
-    for (const auto &it: fields){
+	const std::size_t *begin, *end;
+	FindFields(x, y, z, begin, end);
+	if (begin == end)
+		return;
+
+	fields[*begin].BField(x, y, z, t, B, dBidxj); // first field can write its result directly
+	for (auto it = begin + 1; it != end; ++it){
 		double Btmp[3] = {0,0,0};
 		double dBtmp[3][3] = {{0,0,0},{0,0,0},{0,0,0}};
 		if (dBidxj != nullptr)
-            it.BField(x, y, z, t, Btmp, dBtmp);
+            fields[*it].BField(x, y, z, t, Btmp, dBtmp);
 		else
-            it.BField(x, y, z, t, Btmp, nullptr);
+            fields[*it].BField(x, y, z, t, Btmp, nullptr);
 
 		for (int i = 0; i < 3; i++){
 			B[i] += Btmp[i];
@@ -144,17 +284,25 @@ void TFieldManager::BField(const double x, const double y, const double z, const
 
 void TFieldManager::EField(const double x, const double y, const double z, const double t,
 		double &V, double Ei[3]) const{
+	PROFILE_TIMER(EFIELD);
 	V = 0;
 	for (int i = 0; i < 3; i++){
 		Ei[i] = 0;
 	}
-    for (const auto &it: fields){
+
+	const std::size_t *begin, *end;
+	FindFields(x, y, z, begin, end);
+	if (begin == end)
+		return;
+
+	fields[*begin].EField(x, y, z, t, V, Ei); // first field can write its result directly
+	for (auto it = begin + 1; it != end; ++it){
 		double Vtmp = 0, Etmp[3] = {0,0,0};
 
-        it.EField(x, y, z, t, Vtmp, Etmp);
+		fields[*it].EField(x, y, z, t, Vtmp, Etmp);
 
-			V += Vtmp;
-			for (int i = 0; i < 3; i++)
-				Ei[i] += Etmp[i];
-		}
+		V += Vtmp;
+		for (int i = 0; i < 3; i++)
+			Ei[i] += Etmp[i];
+	}
 }
@@ -134,13 +134,32 @@ TGeometry::TGeometry(TConfig &geometryin){
 
 	if (std::unique(solids.begin(), solids.end(), [](const solid s1, const solid s2){ return s1.ID == s2.ID; }) != solids.end()) // check if IDs of each solid are unique
 		throw std::runtime_error("You defined solids with identical ID! IDs have to be unique!");
+
+	for (const solid &sld: solids){
+		if (sld.ID >= solidtable.size())
+			solidtable.resize(sld.ID + 1, nullptr);
+		solidtable[sld.ID] = &sld;
+	}
+	if (defaultsolid.ID >= solidtable.size())
+		solidtable.resize(defaultsolid.ID + 1, nullptr);
+	solidtable[defaultsolid.ID] = &defaultsolid;
+
+	int scenetree = 1;
+	istringstream(geometryin["GLOBAL"]["scenetree"]) >> scenetree;
+	if (scenetree != 0)
+		mesh.BuildSceneTree();
+
+	int distancefield = 1;
+	istringstream(geometryin["GLOBAL"]["distancefield"]) >> distancefield;
+	if (distancefield != 0)
+		mesh.BuildDistanceField();
 }
 
 bool TGeometry::GetCollisions(const double x1, const double p1[3], const double x2, const double p2[3], multimap<TCollision, bool> &colls) const{
-	vector<TCollision> c = mesh.Collision(std::vector<double>{p1[0], p1[1], p1[2]}, std::vector<double>{p2[0], p2[1], p2[2]});
+	vector<TCollision> c = mesh.Collision(p1, p2);
 	colls.clear();
 	for (auto it: c){
-		solid sld = GetSolid(it.ID);
+		const solid &sld = GetSolid(it.ID);
 		double t = x1 + (x2 - x1)*it.s;
 		colls.emplace(it, sld.is_ignored(t));
 	}
@@ -150,26 +169,26 @@ bool TGeometry::GetCollisions(const double x1, const double p1[3], const double
 
 std::vector<std::pair<solid, bool> > TGeometry::GetSolids(const double t, const double p[3]) const{
 	std::vector<std::pair<solid, bool> > currentsolids = { std::make_pair(defaultsolid, false) };
-	for (unsigned ID: mesh.GetSolids(std::array<double, 3>({p[0], p[1], p[2]}))) {
-	    solid sld = GetSolid(ID);
+	mesh.ForEachSolid(p[0], p[1], p[2], [this, t, &currentsolids](const unsigned ID){
+	    const solid &sld = GetSolid(ID);
         currentsolids.push_back(std::make_pair(sld, sld.is_ignored(t)));
-    }
+    });
 	return currentsolids;
 }
 
-solid TGeometry::GetSolid(const double t, const double p[3]) const{
-	// find first (highest-priority) solid that's not being ignored
-	auto currentsolids = GetSolids(t, p);
-//	for (auto s: currentsolids)
-//		std::cout << s.first.name << " " << s.second << std::endl;
-	auto sld = std::max_element(currentsolids.begin(), currentsolids.end(), [](const std::pair<solid, bool> s1, const std::pair<solid, bool> s2){ return s1.second || (!s2.second && s1.first.ID < s2.first.ID); });
-//	std::cout << sld->first.name << " " << sld->second << std::endl;
-	return sld->first;
+const solid& TGeometry::GetSolid(const double t, const double p[3]) const{
+	// find first (highest-priority) solid that's not being ignored, without copying the list of solids
+	const solid *sld = &defaultsolid;
+	mesh.ForEachSolid(p[0], p[1], p[2], [this, t, &sld](const unsigned ID){
+	    const solid &s = GetSolid(ID);
+	    if (not s.is_ignored(t) and s.ID > sld->ID)
+	        sld = &s;
+	});
+	return *sld;
 }
 
-solid TGeometry::GetSolid(const unsigned ID) const{
-	auto sld = std::find_if(solids.begin(), solids.end(), [&ID](const solid &s){ return s.ID == ID; });
-	if (sld == solids.end())
+const solid& TGeometry::GetSolid(const unsigned ID) const{
+	if (ID >= solidtable.size() or solidtable[ID] == nullptr)
 		throw std::runtime_error((boost::format("Could not find solid with ID %s") % ID).str());
-	return *sld;
+	return *solidtable[ID];
 }
@@ -31,6 +31,7 @@ const long double gamma_n = -1.83247185e8L; ///< 2*::mu_nSI/::hquer gyromagnetic
 const long double gamma_hg = 4.76901003e7L; ///< from: http://www.sciencedirect.com/science/article/pii/S0370269314007692 [ 1/Ts ]
 const long double gamma_xe = -7.399707336e7L; ///< from: http://nmrwiki.org/wiki/index.php?title=Gyromagnetic_ratio [ 1/Ts ]
 
+uint64_t seed = 0; ///< random seed used for random-number generator (read from command line parameters or generated from high-resolution clock)
 long long int jobnumber = 0; ///< job number, read from command line paramters, used for parallel calculations
 boost::filesystem::path configpath = boost::filesystem::current_path() / "in/config.in"; ///< path to configuration files, read from command line paramters
 boost::filesystem::path outpath = boost::filesystem::current_path() / "out/"; ///< path where the log file should be saved to, read from command line parameters
@@ -117,4 +118,64 @@ std::string ResolveFormula(const std::string &formulaName, const std::map<std::s
 	else{
 		return i->second;
 	}
-}
\ No newline at end of file
+}
+
+
+boost::filesystem::path FieldCachePath(const std::string &fieldcache, const boost::filesystem::path &table, const std::string &parameters){
+	if (fieldcache.empty() or fieldcache == "0")
+		return boost::filesystem::path();
+
+	std::ifstream f(table.string(), std::ifstream::in | std::ifstream::binary);
+	if (!f.is_open())
+		throw std::runtime_error("Could not open " + table.string());
+	uint64_t hash = 14695981039346656037ULL; // 64-bit FNV-1a hash of file content and parameters
+	std::vector<char> buffer(1 << 20);
+	while (f){
+		f.read(buffer.data(), buffer.size());
+		for (std::streamsize i = 0; i < f.gcount(); ++i)
+			hash = (hash ^ static_cast<unsigned char>(buffer[i]))*1099511628211ULL;
+	}
+	for (auto c: parameters)
+		hash = (hash ^ static_cast<unsigned char>(c))*1099511628211ULL;
+
+	boost::filesystem::path dir = table.parent_path();
+	if (fieldcache != "1")
+		dir = boost::filesystem::absolute(fieldcache, configpath.parent_path());
+	return dir / (boost::format("%1%.%2$016x.cache") % table.filename().string() % hash).str();
+}
+
+
+boost::filesystem::path GeneratedFieldCachePath(const std::string &fieldcache, const std::string &name, const std::string &parameters){
+	if (fieldcache.empty() or fieldcache == "0")
+		return boost::filesystem::path();
+
+	uint64_t hash = 14695981039346656037ULL; // 64-bit FNV-1a hash of parameters
+	for (auto c: parameters)
+		hash = (hash ^ static_cast<unsigned char>(c))*1099511628211ULL;
+
+	boost::filesystem::path dir = configpath.parent_path();
+	if (fieldcache != "1")
+		dir = boost::filesystem::absolute(fieldcache, configpath.parent_path());
+	return dir / (boost::format("%1%.%2$016x.cache") % name % hash).str();
+}
+
+
+void WriteFieldCache(const boost::filesystem::path &cachefile, const std::function<void(std::ostream&)> &write){
+	boost::filesystem::path tmpfile = cachefile;
+	tmpfile += boost::filesystem::unique_path(".%%%%-%%%%-%%%%.tmp");
+	try{
+		boost::filesystem::create_directories(cachefile.parent_path());
+		{
+			std::ofstream f(tmpfile.string(), std::ofstream::out | std::ofstream::binary);
+			f.exceptions(std::ofstream::failbit | std::ofstream::badbit);
+			write(f);
+		}
+		boost::filesystem::rename(tmpfile, cachefile);
+		std::cout << "Wrote field cache " << cachefile << "\n";
+	}
+	catch (std::exception &e){
+		std::cout << "Could not write field cache " << cachefile << ": " << e.what() << "\n";
+		boost::system::error_code ec;
+		boost::filesystem::remove(tmpfile, ec);
+	}
+}
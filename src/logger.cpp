@@ -1,14 +1,20 @@
 #include "logger.h"
+#include "profiler.h"
 
 #include <sstream>
 #include <algorithm>
 #include <iterator>
 
+#include <boost/algorithm/string/case_conv.hpp>
+
 using namespace std;
 
 std::unique_ptr<TLogger> CreateLogger(TConfig& config){
-    bool ROOTlog = false;
+    bool ROOTlog = false, binarylog = false;
     istringstream(config["GLOBAL"]["ROOTlog"]) >> ROOTlog;
+    istringstream(config["GLOBAL"]["binarylog"]) >> binarylog;
+    if (ROOTlog and binarylog)
+        throw runtime_error("ROOTlog and binarylog cannot be enabled at the same time!");
     if (ROOTlog){
         #ifdef USEROOT
             return std::unique_ptr<TLogger>(new TROOTLogger(config));
@@ -16,102 +22,175 @@ std::unique_ptr<TLogger> CreateLogger(TConfig& config){
             throw runtime_error("ROOTlog is set but PENTrack was compiled without ROOT support!");
         #endif
     }
+    else if (binarylog)
+        return std::unique_ptr<TLogger>(new TBinaryLogger(config));
     else
 	    return std::unique_ptr<TLogger>(new TTextLogger(config));
 }
 
 
+namespace{
+
+/**
+ * Variables available in endlog and snapshotlog
+ */
+namespace EndLog{
+    enum variable {jobnumber, particle, m, q, mu,
+                   tstart, xstart, ystart, zstart, vxstart, vystart, vzstart, polstart,
+                   Sxstart, Systart, Szstart, Hstart, Estart, Bstart, Ustart, solidstart,
+                   tend, xend, yend, zend, vxend, vyend, vzend, polend,
+                   Sxend, Syend, Szend, Hend, Eend, Bend, Uend,
+                   solidend, stopID, Nspinflip, spinflipprob, Nhit, Nstep, propert, trajlength, Hmax, wL};
+
+    const vector<string> names = {"jobnumber", "particle", "m", "q", "mu",
+                                  "tstart", "xstart", "ystart", "zstart", "vxstart", "vystart", "vzstart", "polstart",
+                                  "Sxstart", "Systart", "Szstart", "Hstart", "Estart", "Bstart", "Ustart", "solidstart",
+                                  "tend", "xend", "yend", "zend", "vxend", "vyend", "vzend", "polend",
+                                  "Sxend", "Syend", "Szend", "Hend", "Eend", "Bend", "Uend",
+                                  "solidend", "stopID", "Nspinflip", "spinflipprob", "Nhit", "Nstep", "propert", "trajlength", "Hmax", "wL"};
+
+    const vector<string> default_titles = {"jobnumber", "particle",
+                                           "tstart", "xstart", "ystart", "zstart", "vxstart", "vystart", "vzstart", "polstart",
+                                           "Sxstart", "Systart", "Szstart", "Hstart", "Estart", "Bstart", "Ustart", "solidstart",
+                                           "tend", "xend", "yend", "zend", "vxend", "vyend", "vzend", "polend",
+                                           "Sxend", "Syend", "Szend", "Hend", "Eend", "Bend", "Uend",
+                                           "solidend", "stopID", "Nspinflip", "spinflipprob", "Nhit", "Nstep", "propert", "trajlength", "Hmax", "wL"};
+}
+
+/**
+ * Variables available in tracklog
+ */
+namespace TrackLog{
+    enum variable {jobnumber, particle, polarisation, t, x, y, z, vx, vy, vz, H, E,
+                   Bx, dBxdx, dBxdy, dBxdz, By, dBydx, dBydy, dBydz, Bz, dBzdx, dBzdy, dBzdz,
+                   Ex, Ey, Ez, V};
+
+    const vector<string> names = {"jobnumber", "particle",
+                                  "polarisation", "t", "x", "y", "z", "vx", "vy", "vz", "H", "E",
+                                  "Bx", "dBxdx", "dBxdy", "dBxdz", "By", "dBydx", "dBydy", "dBydz", "Bz", "dBzdx", "dBzdy", "dBzdz",
+                                  "Ex", "Ey", "Ez", "V"};
+
+    const vector<string> &default_titles = names;
+}
+
+/**
+ * Variables available in hitlog
+ */
+namespace HitLog{
+    enum variable {jobnumber, particle, t, x, y, z,
+                   v1x, v1y, v1z, pol1, v2x, v2y, v2z, pol2,
+                   nx, ny, nz, solid1, solid2};
+
+    const vector<string> names = {"jobnumber", "particle",
+                                  "t", "x", "y", "z",
+                                  "v1x", "v1y", "v1z", "pol1", "v2x", "v2y", "v2z", "pol2",
+                                  "nx", "ny", "nz", "solid1", "solid2"};
+
+    const vector<string> &default_titles = names;
+}
+
+/**
+ * Variables available in spinlog
+ */
+namespace SpinLog{
+    enum variable {jobnumber, particle, t, x, y, z,
+                   Sx, Sy, Sz, Wx, Wy, Wz, Bx, By, Bz};
+
+    const vector<string> names = {"jobnumber", "particle",
+                                  "t", "x", "y", "z",
+                                  "Sx", "Sy", "Sz", "Wx", "Wy", "Wz", "Bx", "By", "Bz"};
+
+    const vector<string> &default_titles = names;
+}
+
+}
+
+
 void TLogger::Print(const std::unique_ptr<TParticle>& p, const value_type x, const state_type &y, const state_type &spin,
         const TGeometry &geom, const TFieldManager &field, const std::string suffix){
-    bool log = false;
-    istringstream(config[p->GetName()][suffix + "log"]) >> log;
-    if (not log)
+    using namespace EndLog;
+    TLogFormat &format = GetLogFormat(p->GetName(), suffix, names, default_titles);
+    if (not format.enabled)
         return;
 
-    value_type E = p->GetKineticEnergy(&y[3]);
-    double Bstart[3], Eistart[3], Vstart;
-
-    value_type tstart = p->GetInitialTime();
-    state_type ystart = p->GetInitialState();
-    state_type spinstart = p->GetInitialSpin();
-    field.BField(ystart[0], ystart[1], ystart[2], tstart, Bstart);
-    field.EField(ystart[0], ystart[1], ystart[2], tstart, Vstart, Eistart);
-
-    double H;
-    solid sld = geom.GetSolid(x, &y[0]);
-    H = E + p->GetPotentialEnergy(x, y, field, sld);
-
-    double B[3], Ei[3], V;
-    field.BField(y[0], y[1], y[2], x, B);
-    field.EField(y[0], y[1], y[2], x, V, Ei);
-
-    double wL = 0;
-    if (spin[3] > 0)
-        wL = spin[4]/spin[3];
-
-    map<string, double> variables = {{"jobnumber", static_cast<double>(jobnumber)},
-                                     {"particle", static_cast<double>(p->GetParticleNumber())},
-                                     {"m", p->GetMass()},
-                                     {"q", p->GetCharge()},
-                                     {"mu", p->GetMagneticMoment()},
-                                     {"tstart", tstart},
-                                     {"xstart", ystart[0]},
-                                     {"ystart", ystart[1]},
-                                     {"zstart", ystart[2]},
-                                     {"vxstart", ystart[3]},
-                                     {"vystart", ystart[4]},
-                                     {"vzstart", ystart[5]},
-                                     {"polstart", ystart[7]},
-                                     {"Sxstart", spinstart[0]},
-                                     {"Systart", spinstart[1]},
-                                     {"Szstart", spinstart[2]},
-                                     {"Hstart", p->GetInitialTotalEnergy(geom, field)},
-                                     {"Estart", p->GetInitialKineticEnergy()},
-                                     {"Bstart", sqrt(Bstart[0]*Bstart[0] + Bstart[1]*Bstart[1] + Bstart[2]*Bstart[2])},
-                                     {"Ustart", Vstart},
-                                     {"solidstart", static_cast<double>(p->GetInitialSolid().ID)},
-                                     {"tend", x},
-                                     {"xend", y[0]},
-                                     {"yend", y[1]},
-                                     {"zend", y[2]},
-                                     {"vxend", y[3]},
-                                     {"vyend", y[4]},
-                                     {"vzend", y[5]},
-                                     {"polend", y[7]},
-                                     {"Sxend", spin[0]},
-                                     {"Syend", spin[1]},
-                                     {"Szend", spin[2]},
-                                     {"Hend", H},
-                                     {"Eend", E},
-                                     {"Bend", sqrt(B[0]*B[0] + B[1]*B[1] + B[2]*B[2])},
-                                     {"Uend", V},
-                                     {"solidend", static_cast<double>(sld.ID)},
-                                     {"stopID", static_cast<double>(p->GetStopID())},
-                                     {"Nspinflip", static_cast<double>(p->GetNumberOfSpinflips())},
-                                     {"spinflipprob", 1 - p->GetNoSpinFlipProbability()},
-                                     {"Nhit", static_cast<double>(p->GetNumberOfHits())},
-                                     {"Nstep", static_cast<double>(p->GetNumberOfSteps())},
-                                     {"propert", y[6]},
-                                     {"trajlength", y[8]},
-                                     {"Hmax", p->GetMaxTotalEnergy()},
-                                     {"wL", wL}
-                                    };
-
-    vector<string> default_titles = {"jobnumber", "particle",
-                                     "tstart", "xstart", "ystart", "zstart", "vxstart", "vystart", "vzstart", "polstart",
-                                     "Sxstart", "Systart", "Szstart", "Hstart", "Estart", "Bstart", "Ustart", "solidstart",
-                                     "tend", "xend", "yend", "zend", "vxend", "vyend", "vzend", "polend",
-                                     "Sxend", "Syend", "Szend", "Hend", "Eend", "Bend", "Uend", 
-                                     "solidend", "stopID", "Nspinflip", "spinflipprob", "Nhit", "Nstep", "propert", "trajlength", "Hmax", "wL"};
-
-    Log(p->GetName(), suffix, variables, default_titles);
+    vector<double> &v = format.variables;
+    value_type tst = p->GetInitialTime();
+    const state_type &yst = p->GetInitialState();
+    const state_type &spinst = p->GetInitialSpin();
+
+    v[EndLog::jobnumber] = static_cast<double>(::jobnumber);
+    v[particle] = static_cast<double>(p->GetParticleNumber());
+    v[m] = p->GetMass();
+    v[q] = p->GetCharge();
+    v[mu] = p->GetMagneticMoment();
+    v[tstart] = tst;
+    v[xstart] = yst[0];
+    v[ystart] = yst[1];
+    v[zstart] = yst[2];
+    v[vxstart] = yst[3];
+    v[vystart] = yst[4];
+    v[vzstart] = yst[5];
+    v[polstart] = yst[7];
+    v[Sxstart] = spinst[0];
+    v[Systart] = spinst[1];
+    v[Szstart] = spinst[2];
+    if (format.Uses({Hstart}))
+        v[Hstart] = p->GetInitialTotalEnergy(geom, field);
+    v[Estart] = p->GetInitialKineticEnergy();
+    if (format.Uses({Bstart})){
+        double B[3];
+        field.BField(yst[0], yst[1], yst[2], tst, B);
+        v[Bstart] = sqrt(B[0]*B[0] + B[1]*B[1] + B[2]*B[2]);
+    }
+    if (format.Uses({Ustart})){
+        double Ei[3];
+        field.EField(yst[0], yst[1], yst[2], tst, v[Ustart], Ei);
+    }
+    v[solidstart] = static_cast<double>(p->GetInitialSolid().ID);
+
+    v[tend] = x;
+    v[xend] = y[0];
+    v[yend] = y[1];
+    v[zend] = y[2];
+    v[vxend] = y[3];
+    v[vyend] = y[4];
+    v[vzend] = y[5];
+    v[polend] = y[7];
+    v[Sxend] = spin[0];
+    v[Syend] = spin[1];
+    v[Szend] = spin[2];
+    v[Eend] = p->GetKineticEnergy(&y[3]);
+    if (format.Uses({Hend, solidend})){
+        const solid &sld = geom.GetSolid(x, &y[0]);
+        v[solidend] = static_cast<double>(sld.ID);
+        if (format.Uses({Hend}))
+            v[Hend] = v[Eend] + p->GetPotentialEnergy(x, y, field, sld);
+    }
+    if (format.Uses({Bend})){
+        double B[3];
+        field.BField(y[0], y[1], y[2], x, B);
+        v[Bend] = sqrt(B[0]*B[0] + B[1]*B[1] + B[2]*B[2]);
+    }
+    if (format.Uses({Uend})){
+        double Ei[3];
+        field.EField(y[0], y[1], y[2], x, v[Uend], Ei);
+    }
+    v[EndLog::stopID] = static_cast<double>(p->GetStopID());
+    v[Nspinflip] = static_cast<double>(p->GetNumberOfSpinflips());
+    v[spinflipprob] = 1 - p->GetNoSpinFlipProbability();
+    v[Nhit] = static_cast<double>(p->GetNumberOfHits());
+    v[Nstep] = static_cast<double>(p->GetNumberOfSteps());
+    v[propert] = y[6];
+    v[trajlength] = y[8];
+    v[Hmax] = p->GetMaxTotalEnergy();
+    v[wL] = spin[3] > 0 ? spin[4]/spin[3] : 0;
+
+    Log(p->GetName(), suffix, format);
 }
 
 void TLogger::PrintSnapshot(const std::unique_ptr<TParticle>& p, const value_type x1, const state_type &y1, const value_type x2, const state_type &y2,
                    const state_type &spin, const dense_stepper_type& stepper, const TGeometry &geom, const TFieldManager &field){
-    bool log = false;
-    istringstream(config[p->GetName()]["snapshotlog"]) >> log;
-    if (not log)
+    if (not GetLogFormat(p->GetName(), "snapshot", EndLog::names, EndLog::default_titles).enabled)
         return;
     istringstream snapshottimes(config[p->GetName()]["snapshots"]);
     auto tsnap = find_if(istream_iterator<double>(snapshottimes), istream_iterator<double>(), [&](const double& tsnapshot){ return x1 <= tsnapshot and tsnapshot < x2; });
@@ -124,155 +203,156 @@ void TLogger::PrintSnapshot(const std::unique_ptr<TParticle>& p, const value_typ
 
 void TLogger::PrintTrack(const std::unique_ptr<TParticle>& p, const value_type x1, const state_type &y1, const value_type x, const state_type& y,
                 const state_type &spin, const solid &sld, const TFieldManager &field){
-    bool log = false;
-    double interval = 0.;
-    istringstream(config[p->GetName()]["tracklog"]) >> log;
-    istringstream(config[p->GetName()]["trackloginterval"]) >> interval;
-    if (not log or interval <= 0)
+    using namespace TrackLog;
+    TLogFormat &format = GetLogFormat(p->GetName(), "track", names, default_titles);
+    if (not format.enabled or format.interval <= 0)
         return;
 
-    if (y[8] > 0 and int(y1[8]/interval) == int(y[8]/interval)) // if this is the first point or tracklength did cross an integer multiple of trackloginterval
+    if (y[8] > 0 and int(y1[8]/format.interval) == int(y[8]/format.interval)) // if this is the first point or tracklength did cross an integer multiple of trackloginterval
         return;
 
-    double B[3] = {0,0,0};
-    double dBidxj[3][3] = {{0,0,0},{0,0,0},{0,0,0}};
-    double E[3] = {0,0,0};
-    double V = 0;
-    field.BField(y[0],y[1],y[2],x,B, dBidxj);
-    field.EField(y[0],y[1],y[2],x,V,E);
-    value_type Ek = p->GetKineticEnergy(&y[3]);
-    value_type H = Ek + p->GetPotentialEnergy(x, y, field, sld);
-
-    map<string, double> variables = {{"jobnumber", static_cast<double>(jobnumber)},
-                                     {"particle", static_cast<double>(p->GetParticleNumber())},
-                                     {"polarisation", y[7]},
-                                     {"t", x},
-                                     {"x", y[0]},
-                                     {"y", y[1]},
-                                     {"z", y[2]},
-                                     {"vx", y[3]},
-                                     {"vy", y[4]},
-                                     {"vz", y[5]},
-                                     {"H", H},
-                                     {"E", Ek},
-                                     {"Bx", B[0]},
-                                     {"dBxdx", dBidxj[0][0]},
-                                     {"dBxdy", dBidxj[0][1]},
-                                     {"dBxdz", dBidxj[0][2]},
-                                     {"By", B[1]},
-                                     {"dBydx", dBidxj[1][0]},
-                                     {"dBydy", dBidxj[1][1]},
-                                     {"dBydz", dBidxj[1][2]},
-                                     {"Bz", B[2]},
-                                     {"dBzdx", dBidxj[2][0]},
-                                     {"dBzdy", dBidxj[2][1]},
-                                     {"dBzdz", dBidxj[2][2]},
-                                     {"Ex", E[0]},
-                                     {"Ey", E[1]},
-                                     {"Ez", E[2]},
-                                     {"V", V}
-                                    };
-
-    vector<string> default_titles = {"jobnumber", "particle",
-                                     "polarisation", "t", "x", "y", "z", "vx", "vy", "vz", "H", "E",
-                                     "Bx", "dBxdx", "dBxdy", "dBxdz", "By", "dBydx", "dBydy", "dBydz", "Bz", "dBzdx", "dBzdy", "dBzdz",
-                                     "Ex", "Ey", "Ez", "V"};
-
-    Log(p->GetName(), "track", variables, default_titles);
+    vector<double> &v = format.variables;
+    v[TrackLog::jobnumber] = static_cast<double>(::jobnumber);
+    v[particle] = static_cast<double>(p->GetParticleNumber());
+    v[polarisation] = y[7];
+    v[t] = x;
+    v[TrackLog::x] = y[0];
+    v[TrackLog::y] = y[1];
+    v[z] = y[2];
+    v[vx] = y[3];
+    v[vy] = y[4];
+    v[vz] = y[5];
+    v[E] = p->GetKineticEnergy(&y[3]);
+    if (format.Uses({H}))
+        v[H] = v[E] + p->GetPotentialEnergy(x, y, field, sld);
+    if (format.Uses({Bx, dBxdx, dBxdy, dBxdz, By, dBydx, dBydy, dBydz, Bz, dBzdx, dBzdy, dBzdz})){
+        double B[3] = {0,0,0};
+        double dBidxj[3][3] = {{0,0,0},{0,0,0},{0,0,0}};
+        field.BField(y[0],y[1],y[2],x,B, dBidxj);
+        for (int i = 0; i < 3; ++i){
+            v[Bx + 4*i] = B[i];
+            for (int j = 0; j < 3; ++j)
+                v[Bx + 4*i + 1 + j] = dBidxj[i][j];
+        }
+    }
+    if (format.Uses({Ex, Ey, Ez, V})){
+        double Ei[3] = {0,0,0};
+        field.EField(y[0],y[1],y[2],x,v[V],Ei);
+        v[Ex] = Ei[0];
+        v[Ey] = Ei[1];
+        v[Ez] = Ei[2];
+    }
+
+    Log(p->GetName(), "track", format);
 }
 
 void TLogger::PrintHit(const std::unique_ptr<TParticle>& p, const value_type x, const state_type &y1, const state_type &y2, const double *normal, const solid &leaving, const solid &entering){
-    bool log = false;
-    istringstream(config[p->GetName()]["hitlog"]) >> log;
-    if (not log)
+    using namespace HitLog;
+    TLogFormat &format = GetLogFormat(p->GetName(), "hit", names, default_titles);
+    if (not format.enabled)
         return;
 
-    map<string, double> variables = {{"jobnumber", static_cast<double>(jobnumber)},
-                                     {"particle", static_cast<double>(p->GetParticleNumber())},
-                                     {"t", x},
-                                     {"x", y1[0]},
-                                     {"y", y1[1]},
-                                     {"z", y1[2]},
-                                     {"v1x", y1[3]},
-                                     {"v1y", y1[4]},
-                                     {"v1z", y1[5]},
-                                     {"pol1", y1[7]},
-                                     {"v2x", y2[3]},
-                                     {"v2y", y2[4]},
-                                     {"v2z", y2[5]},
-                                     {"pol2", y2[7]},
-                                     {"nx", normal[0]},
-                                     {"ny", normal[1]},
-                                     {"nz", normal[2]},
-                                     {"solid1", static_cast<double>(leaving.ID)},
-                                     {"solid2", static_cast<double>(entering.ID)}
-                                    };
-
-    vector<string> default_titles = {"jobnumber", "particle",
-                                     "t", "x", "y", "z",
-                                     "v1x", "v1y", "v1z", "pol1", "v2x", "v2y", "v2z", "pol2",
-                                     "nx", "ny", "nz", "solid1", "solid2"};
-
-    Log(p->GetName(), "hit", variables, default_titles);
+    vector<double> &v = format.variables;
+    v[HitLog::jobnumber] = static_cast<double>(::jobnumber);
+    v[particle] = static_cast<double>(p->GetParticleNumber());
+    v[t] = x;
+    v[HitLog::x] = y1[0];
+    v[y] = y1[1];
+    v[z] = y1[2];
+    v[v1x] = y1[3];
+    v[v1y] = y1[4];
+    v[v1z] = y1[5];
+    v[pol1] = y1[7];
+    v[v2x] = y2[3];
+    v[v2y] = y2[4];
+    v[v2z] = y2[5];
+    v[pol2] = y2[7];
+    v[nx] = normal[0];
+    v[ny] = normal[1];
+    v[nz] = normal[2];
+    v[solid1] = static_cast<double>(leaving.ID);
+    v[solid2] = static_cast<double>(entering.ID);
+
+    Log(p->GetName(), "hit", format);
 }
 
 void TLogger::PrintSpin(const std::unique_ptr<TParticle>& p, const value_type x, const dense_stepper_type& spinstepper,
                const dense_stepper_type &trajectory_stepper, const TFieldManager &field) {
-    bool log = false;
-    double interval = 0.;
-    istringstream(config[p->GetName()]["spinlog"]) >> log;
-    istringstream(config[p->GetName()]["spinloginterval"]) >> interval;
-    if (not log or interval <= 0)
+    const state_type &spin = spinstepper.current_state();
+    if (x < spinstepper.current_time()){
+        state_type spinx(spin.size());
+        spinstepper.calc_state(x, spinx);
+        PrintSpin(p, spinstepper.previous_time(), x, spinx, trajectory_stepper, field);
+    }
+    else
+        PrintSpin(p, spinstepper.previous_time(), x, spin, trajectory_stepper, field);
+}
+
+void TLogger::PrintSpin(const std::unique_ptr<TParticle>& p, const value_type x1, const value_type x, const state_type &spin,
+               const dense_stepper_type &trajectory_stepper, const TFieldManager &field) {
+    using namespace SpinLog;
+    TLogFormat &format = GetLogFormat(p->GetName(), "spin", names, default_titles);
+    if (not format.enabled or format.interval <= 0)
         return;
 
-    double x1 = spinstepper.previous_time();
-    if (x > x1 and int(x1 / interval) == int(x / interval)) // if time crossed an integer multiple of spinloginterval
+    if (x > x1 and int(x1 / format.interval) == int(x / format.interval)) // if time crossed an integer multiple of spinloginterval
         return;
 
-    double B[3] = {0,0,0};
-    state_type y(STATE_VARIABLES);
-    trajectory_stepper.calc_state(x, y);
-    field.BField(y[0],y[1],y[2],x,B);
-    double Omega[3];
-    p->SpinPrecessionAxis(x, trajectory_stepper, field, Omega[0], Omega[1], Omega[2]);
+    vector<double> &v = format.variables;
+    v[SpinLog::jobnumber] = static_cast<double>(::jobnumber);
+    v[particle] = static_cast<double>(p->GetParticleNumber());
+    v[t] = x;
+    if (format.Uses({SpinLog::x, y, z, Bx, By, Bz})){
+        state_type ypos(STATE_VARIABLES);
+        trajectory_stepper.calc_state(x, ypos);
+        v[SpinLog::x] = ypos[0];
+        v[y] = ypos[1];
+        v[z] = ypos[2];
+        if (format.Uses({Bx, By, Bz})){
+            double B[3] = {0,0,0};
+            field.BField(ypos[0],ypos[1],ypos[2],x,B);
+            v[Bx] = B[0];
+            v[By] = B[1];
+            v[Bz] = B[2];
+        }
+    }
+    if (format.Uses({Wx, Wy, Wz}))
+        p->SpinPrecessionAxis(x, trajectory_stepper, field, v[Wx], v[Wy], v[Wz]);
+
+    if (format.Uses({Sx, Sy, Sz}))
+        copy(spin.begin(), spin.begin() + 3, v.begin() + Sx);
 
-    state_type spin(spinstepper.current_state());
-    if (x < spinstepper.current_time()){
-        spinstepper.calc_state(x, spin);
+    Log(p->GetName(), "spin", format);
+}
+
+TLogger::TLogFormat& TLogger::GetLogFormat(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &names, const std::vector<std::string> &default_titles){
+    auto f = logformats.find(particlename + suffix);
+    if (f != logformats.end())
+        return f->second;
+
+    TLogFormat &format = logformats[particlename + suffix];
+    format.enabled = false;
+    format.interval = 0.;
+    format.hasfilter = false;
+    istringstream(config[particlename][suffix + "log"]) >> format.enabled;
+    istringstream(config[particlename][suffix + "loginterval"]) >> format.interval;
+    if (not format.enabled)
+        return format;
+
+    format.variables.resize(names.size(), 0.);
+    format.used.resize(names.size(), false);
+    for (std::size_t i = 0; i < names.size(); ++i){
+        if (not format.symbols.add_variable(names[i], format.variables[i]))
+            throw std::runtime_error("Error parsing variable " + names[i]);
     }
 
-    map<string, double> variables = {{"jobnumber", static_cast<double>(jobnumber)},
-                                     {"particle", static_cast<double>(p->GetParticleNumber())},
-                                     {"t", x},
-                                     {"x", y[0]},
-                                     {"y", y[1]},
-                                     {"z", y[2]},
-                                     {"Sx", spin[0]},
-                                     {"Sy", spin[1]},
-                                     {"Sz", spin[2]},
-                                     {"Wx", Omega[0]},
-                                     {"Wy", Omega[1]},
-                                     {"Wz", Omega[2]},
-                                     {"Bx", B[0]},
-                                     {"By", B[1]},
-                                     {"Bz", B[2]}
-                                    };
-
-    vector<string> default_titles = {"jobnumber", "particle",
-                                     "t", "x", "y", "z",
-                                     "Sx", "Sy", "Sz", "Wx", "Wy", "Wz", "Bx", "By", "Bz"};
-
-    Log(p->GetName(), "spin", variables, default_titles);
-}
-
-void TLogger::Log(const std::string &particlename, const std::string &suffix, const std::map<std::string, double> &variables, const std::vector<std::string> &default_titles){
-    vector<string> titles;
-    vector<double> vars;
+    vector<string> formulavars; // variables used in formulas, in lower case
     string filter;
     istringstream(config[particlename][suffix + "logfilter"]) >> filter;
-    if (filter != "" and not EvalFormula(config, filter, variables)){
-        return;
-    }
+    format.hasfilter = filter != "";
+    if (format.hasfilter)
+        format.filter = CompileFormula(config, filter, format.symbols, &formulavars);
+
     if (config[particlename][suffix + "logvars"] == ""){
         cout << suffix << "log for " << particlename << " is enabled but " << suffix << "logvars is empty. I will default to backward compatible output.\nSee example config on how to use the new logvars and logfilter options.\n";
         ostringstream os;
@@ -281,24 +361,111 @@ void TLogger::Log(const std::string &particlename, const std::string &suffix, co
     }
     istringstream varstr(config[particlename][suffix + "logvars"]);
     for (istream_iterator<string> var(varstr); var != istream_iterator<string>(); ++var){
-        titles.push_back(*var);
-        auto val = variables.find(*var);
-        if (val != variables.end())
-            vars.push_back(val->second);
+        format.titles.push_back(*var);
+        auto slot = find(names.begin(), names.end(), *var);
+        if (slot != names.end()){
+            format.slots.push_back(slot - names.begin());
+            format.used[slot - names.begin()] = true;
+            format.formulas.emplace_back();
+        }
+        else{
+            format.slots.push_back(-1);
+            format.formulas.push_back(CompileFormula(config, *var, format.symbols, &formulavars));
+        }
+    }
+
+    for (std::size_t i = 0; i < names.size(); ++i){ // exprtk variable names are case-insensitive
+        string name = boost::algorithm::to_lower_copy(names[i]);
+        if (find(formulavars.begin(), formulavars.end(), name) != formulavars.end())
+            format.used[i] = true;
+    }
+
+    format.row.resize(format.titles.size());
+    return format;
+}
+
+void TLogger::Log(const std::string &particlename, const std::string &suffix, TLogFormat &format){
+    if (format.hasfilter and not format.filter.value()){
+        return;
+    }
+    PROFILE_TIMER(LOGGING);
+    PROFILE_COUNT(LOG_ROWS, 1);
+    for (std::size_t i = 0; i < format.row.size(); ++i){
+        if (format.slots[i] >= 0)
+            format.row[i] = format.variables[format.slots[i]];
         else
-            vars.push_back(EvalFormula(config, *var, variables));
+            format.row[i] = format.formulas[i].value();
     }
 
-    DoLog(particlename, suffix, titles, vars);
+    DoLog(particlename, suffix, format.titles, format.row);
+}
+
+
+std::map<std::string, std::streamoff> TLogger::GetPositions(const bool sync){
+    throw std::runtime_error("Checkpoints are not supported by the selected output format!");
 }
 
+void TLogger::Resume(const std::map<std::string, std::streamoff> &positions){
+    throw std::runtime_error("Checkpoints are not supported by the selected output format!");
+}
+
+namespace{
+
+/**
+ * Get path of output file
+ *
+ * @param name Particle name and log type
+ * @param extension File extension
+ *
+ * @return Returns path of output file in output directory, prefixed with job number
+ */
+boost::filesystem::path LogFilePath(const std::string &name, const std::string &extension){
+    std::ostringstream filename;
+    filename << std::setw(12) << std::setfill('0') << jobnumber << std::setw(0) << name << extension;
+    return outpath / filename.str();
+}
+
+/**
+ * Truncate output file to given size and open it to append new rows
+ *
+ * @param file File stream to open
+ * @param name Particle name and log type
+ * @param extension File extension
+ * @param position Size of file
+ * @param mode Mode used to open file
+ */
+void ResumeLogFile(std::ofstream &file, const std::string &name, const std::string &extension, const std::streamoff position, const ios::openmode mode){
+    boost::filesystem::path outfile = LogFilePath(name, extension);
+    if (not boost::filesystem::exists(outfile) or static_cast<std::streamoff>(boost::filesystem::file_size(outfile)) < position)
+        throw std::runtime_error("Cannot resume writing to " + outfile.native() + ", it is missing or shorter than recorded in checkpoint!");
+    boost::filesystem::resize_file(outfile, position);
+    file.open(outfile.c_str(), mode | ios::app);
+    if (!file.is_open())
+        throw std::runtime_error("Could not open " + outfile.native());
+    file << std::setprecision(std::numeric_limits<double>::digits10);
+}
+
+}
+
+std::map<std::string, std::streamoff> TTextLogger::GetPositions(const bool sync){
+    std::map<std::string, std::streamoff> positions;
+    for (auto &s: logstreams){
+        if (sync)
+            s.second.flush();
+        positions[s.first] = s.second.tellp();
+    }
+    return positions;
+}
+
+void TTextLogger::Resume(const std::map<std::string, std::streamoff> &positions){
+    for (auto &p: positions)
+        ResumeLogFile(logstreams[p.first], p.first, ".out", p.second, ios::out);
+}
 
 void TTextLogger::DoLog(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles, const std::vector<double> &vars){
     ofstream &file = logstreams[particlename + suffix];
     if (!file.is_open()){
-        std::ostringstream filename;
-        filename << std::setw(12) << std::setfill('0') << jobnumber << std::setw(0) << particlename << suffix << ".out";
-        boost::filesystem::path outfile = outpath / filename.str();
+        boost::filesystem::path outfile = LogFilePath(particlename + suffix, ".out");
 //		std::cout << "Creating " << outfile << '\n';
         file.open(outfile.c_str());
         if(!file.is_open())
@@ -315,6 +482,154 @@ void TTextLogger::DoLog(const std::string &particlename, const std::string &suff
     file << '\n';
 }
 
+TBinaryLogger::TBinaryLogger(TConfig& aconfig): buffersize(1 << 17){
+    config = aconfig;
+}
+
+void TBinaryLogger::WriteHeader(std::ofstream &file, const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles) const{
+    WriteBinaryHeader(file, titles, {{"jobnumber", to_string(jobnumber)}, {"seed", to_string(seed)}, {"particle", particlename}, {"logtype", suffix}}, config);
+}
+
+void WriteBinaryHeader(std::ostream &file, const std::vector<std::string> &titles, const std::vector<std::pair<std::string, std::string> > &entries,
+                       const TConfig &config){
+    ostringstream header;
+    header << "columns " << titles.size() << '\n';
+    header << "titles";
+    for (auto &title: titles)
+        header << ' ' << title;
+    header << '\n';
+    const uint16_t endiancheck = 1;
+    header << "byteorder " << (*reinterpret_cast<const char*>(&endiancheck) == 1 ? "little" : "big") << '\n';
+    for (auto &entry: entries)
+        header << entry.first << ' ' << entry.second << '\n';
+    header << config; // append configuration in the same format as the config file
+
+    const string magic = "PENTrack binary log\n";
+    const int sizewidth = 12;
+    std::size_t headersize = magic.size() + string("headersize \n").size() + sizewidth + header.str().size() + 1; // header is terminated by newline
+    headersize = (headersize + 7)/8*8; // pad header so data is aligned to doubles
+    file << magic << "headersize " << setw(sizewidth) << setfill('0') << headersize << '\n' << header.str();
+    file << string(headersize - static_cast<std::size_t>(file.tellp()) - 1, ' ') << '\n';
+}
+
+void TBinaryLogger::Flush(TBinaryLogStream &stream){
+    stream.file.write(reinterpret_cast<const char*>(stream.buffer.data()), stream.buffer.size()*sizeof(double));
+    stream.buffer.clear();
+}
+
+std::map<std::string, std::streamoff> TBinaryLogger::GetPositions(const bool sync){
+    std::map<std::string, std::streamoff> positions;
+    for (auto &s: logstreams){
+        if (sync){
+            Flush(s.second);
+            s.second.file.flush();
+        }
+        positions[s.first] = static_cast<std::streamoff>(s.second.file.tellp()) + s.second.buffer.size()*sizeof(double);
+    }
+    return positions;
+}
+
+void TBinaryLogger::Resume(const std::map<std::string, std::streamoff> &positions){
+    for (auto &p: positions){
+        TBinaryLogStream &stream = logstreams[p.first];
+        ResumeLogFile(stream.file, p.first, ".bin", p.second, ios::out | ios::binary);
+        stream.buffer.reserve(buffersize);
+    }
+}
+
+void TBinaryLogger::DoLog(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles, const std::vector<double> &vars){
+    TBinaryLogStream &stream = logstreams[particlename + suffix];
+    if (!stream.file.is_open()){
+        boost::filesystem::path outfile = LogFilePath(particlename + suffix, ".bin");
+        stream.file.open(outfile.c_str(), ios::out | ios::binary);
+        if(!stream.file.is_open())
+        {
+            throw std::runtime_error("Could not open " + outfile.native());
+        }
+        WriteHeader(stream.file, particlename, suffix, titles);
+        stream.buffer.reserve(buffersize + vars.size());
+    }
+
+    stream.buffer.insert(stream.buffer.end(), vars.begin(), vars.end());
+    if (stream.buffer.size() >= buffersize)
+        Flush(stream);
+}
+
+TBinaryLogger::~TBinaryLogger(){
+    for (auto &s: logstreams){
+        Flush(s.second);
+        s.second.file.close();
+    }
+}
+
+void TBufferedLogger::DoLog(const std::string &particlename, const std::string &suffix, const std::vector<std::string> &titles, const std::vector<double> &vars){
+    auto format = std::find_if(formats.begin(), formats.end(), [&titles](const TBufferedFormat &f){ return f.titles == &titles; });
+    if (format == formats.end())
+        format = formats.insert(formats.end(), {particlename, suffix, &titles});
+    rows.push_back({static_cast<std::size_t>(std::distance(formats.begin(), format)), data.size()});
+    data.insert(data.end(), vars.begin(), vars.end());
+    if (data.size() > MAX_BUFFERED_VALUES)
+        Spill();
+}
+
+void TBufferedLogger::Spill(){
+    if (spillfile == nullptr){
+        spillfile = std::tmpfile();
+        if (spillfile == nullptr)
+            throw std::runtime_error("Could not create temporary file to buffer log");
+    }
+    for (auto &row: rows){
+        std::size_t n = formats[row.format].titles->size();
+        if (std::fwrite(&row.format, sizeof(row.format), 1, spillfile) != 1 or std::fwrite(&data[row.offset], sizeof(double), n, spillfile) != n)
+            throw std::runtime_error("Could not write log buffer to temporary file");
+    }
+    spilledrows += rows.size();
+    rows.clear();
+    data.clear();
+}
+
+void TBufferedLogger::Flush(){
+    if (rows.empty() and spilledrows == 0)
+        return;
+    std::lock_guard<std::mutex> lock(targetmutex);
+    vector<double> vars;
+    if (spilledrows > 0){ // pass on rows moved to temporary file first, they were logged before the rows in memory
+        std::rewind(spillfile);
+        for (std::size_t i = 0; i < spilledrows; ++i){
+            std::size_t format;
+            if (std::fread(&format, sizeof(format), 1, spillfile) != 1)
+                throw std::runtime_error("Could not read log buffer from temporary file");
+            vars.resize(formats[format].titles->size());
+            if (std::fread(vars.data(), sizeof(double), vars.size(), spillfile) != vars.size())
+                throw std::runtime_error("Could not read log buffer from temporary file");
+            target.DoLog(formats[format].particlename, formats[format].suffix, *formats[format].titles, vars);
+        }
+        std::rewind(spillfile); // following rows overwrite the file
+        spilledrows = 0;
+    }
+    for (auto &row: rows){
+        auto &format = formats[row.format];
+        vars.assign(data.begin() + row.offset, data.begin() + row.offset + format.titles->size());
+        target.DoLog(format.particlename, format.suffix, *format.titles, vars);
+    }
+    rows.clear();
+    data.clear();
+}
+
+void TBufferedLogger::Clear(){
+    rows.clear();
+    data.clear();
+    if (spillfile != nullptr)
+        std::rewind(spillfile);
+    spilledrows = 0;
+}
+
+TBufferedLogger::~TBufferedLogger(){
+    Flush();
+    if (spillfile != nullptr)
+        std::fclose(spillfile);
+}
+
 #ifdef USEROOT
 
 #include "TObjString.h"
@@ -15,6 +15,10 @@
 #include <iomanip>
 #include <chrono>
 #include <memory>
+#include <thread>
+#include <mutex>
+#include <atomic>
+#include <functional>
 #include <boost/format.hpp>
 
 #include "tracking.h"
@@ -25,23 +29,38 @@
 #include "source.h"
 #include "mc.h" 
 #include "microroughness.h"
+#include "logger.h"
+#include "profiler.h"
+#include "checkpoint.h"
 
 using namespace std;
 
 TConfig ConfigInit(int argc, char **argv); // read config.in
 void OutputCodes(const map<string, map<int, int> > &ID_counter); // print simulation summary at program exit
-void PrintBFieldCut(TConfig &config, const boost::filesystem::path &outfile, const TFieldManager &field); // evaluate fields on given plane and write to outfile
-void PrintBField(const boost::filesystem::path &outfile, const TFieldManager &field);
+void PrintBFieldCut(TConfig &config, const boost::filesystem::path &outfile, const TFieldManager &field); // evaluate fields on given plane or volume and write to outfile
+void PrintBField(TConfig &config, const boost::filesystem::path &outfile, const TFieldManager &field);
+void PrintTable(std::ostream &out, const bool binary, const std::size_t rows, const std::size_t columns,
+		const std::function<void(const std::size_t, double*)> &row); // calculate rows of a table in several threads and write them to out
+ofstream OpenTable(TConfig &config, boost::filesystem::path &outfile, const vector<string> &titles,
+		const vector<pair<string, string> > &entries, bool &binary); // open file for PrintTable and write header
 void PrintGeometry(const boost::filesystem::path &outfile, TGeometry &geom); // do many random collisionchecks and write all collisions to outfile
 void PrintMROutAngle(TConfig &config, const boost::filesystem::path &outpath); // produce a 3d table of the MR-DRP for each outgoing solid angle
 void PrintMRThetaIEnergy(TConfig &config, const boost::filesystem::path &outpath); // produce a 3d table of the total (integrated) MR-DRP for a given incident angle and energy
+void SimulateParticlesParallel(TConfig &config, TParticleSource &source, TGeometry &geom, const TFieldManager &field,
+		map<string, map<int, int> > &ID_counter, int &ntotalsteps, TProfiles &profiles, TCheckpoint &checkpoint); // simulate particles in several worker threads
+boost::filesystem::path CheckpointPath(); // path of checkpoint file of current job
+void CompleteParticle(TCheckpoint &checkpoint, const int particle, const map<string, map<int, int> > &ID_counter, const int ntotalsteps,
+		TLogger &logger); // record completed particle in checkpoint and write checkpoint periodically
 
 
 double SimTime = 1500.; ///< max. simulation time
 int simcount = 1; ///< number of particles for MC simulation (read from config)
 simType simtype = PARTICLE; ///< type of particle which shall be simulated (read from config)
 int secondaries = 1; ///< should secondary particles be simulated? (read from config)
-uint64_t seed = 0; ///< random seed used for random-number generator (generated from high-resolution clock)
+unsigned int nthreads = 1; ///< number of worker threads used to simulate particles, 0 uses all available cores (read from config or command line)
+bool profiling = false; ///< collect profiling counters and timers and write them to a summary file (read from config)
+double checkpointinterval = 0; ///< minimum time between checkpoints written during the simulation [s], 0 disables checkpoints (read from config)
+bool resume = false; ///< resume simulation from checkpoint (read from command line)
 
 /**
  * Catch signals.
@@ -61,15 +80,22 @@ void catch_alarm (int sig){
  * main function.
  *
  * @param argc Number of parameters passed via the command line
- * @param argv Array of parameters passed via the command line (./Track [jobnumber [configpath [outputpath [seed]]]])
+ * @param argv Array of parameters passed via the command line (./Track [--resume] [jobnumber [configpath [outputpath [seed [threads]]]]])
  * @return Return 0 on success, value !=0 on failure
  *
  */
 int main(int argc, char **argv){
 	if ((argc > 1) && (strcmp(argv[1], "-h") == 0)){
-		cout << "Usage:\nPENTrack [jobnumber [location/of/config.in [path/to/out/files [seed]]]]" << endl;
+		cout << "Usage:\nPENTrack [--resume] [jobnumber [location/of/config.in [path/to/out/files [seed [threads]]]]]" << endl;
 		return 0;
 	}
+	vector<char*> args; // command-line parameters without the resume flag, all remaining parameters are positional
+	for (int i = 0; i < argc; ++i){
+		if (strcmp(argv[i], "--resume") == 0)
+			resume = true;
+		else
+			args.push_back(argv[i]);
+	}
 
 	cout <<
 	" #######################################################################\n"
@@ -86,7 +112,9 @@ int main(int argc, char **argv){
 	signal (SIGXCPU, catch_alarm);
 	
 	// read config
-	TConfig configin = ConfigInit(argc, argv);
+	TConfig configin = ConfigInit(args.size(), args.data());
+	if (resume and simtype != PARTICLE)
+		throw runtime_error("Only particle simulations (simtype 1) can be resumed!");
 
 	if (simtype == MR_THETA_OUT_ANGLE){
 		PrintMROutAngle(configin, outpath);
@@ -103,7 +131,7 @@ int main(int argc, char **argv){
 	TFieldManager field(configin);
 
 	if (simtype == BF_ONLY){
-		PrintBField(outpath / "BF.out", field); // estimate ramp heating
+		PrintBField(configin, outpath / "BF.out", field); // estimate ramp heating
 		return 0;
 	}
 	else if (simtype == BF_CUT){
@@ -122,6 +150,15 @@ int main(int argc, char **argv){
 		return 0;
 	}
 	
+	TCheckpoint checkpoint; // state of simulation after last completed particle
+	if (resume){
+		checkpoint.Read(CheckpointPath());
+		if (checkpoint.parallel != (nthreads != 1))
+			throw runtime_error("Checkpoint was written by a simulation using " + string(checkpoint.parallel ? "several threads" : "a single thread") + ", resume it with the same threads option!");
+		seed = checkpoint.seed;
+		cout << "Resuming simulation from checkpoint " << CheckpointPath() << " after " << checkpoint.completed + checkpoint.done.size() << " particles\n";
+	}
+
 	cout << "Loading random number generator...\n";
 	// load random number generator
 	TMCGenerator mc;
@@ -136,6 +173,8 @@ int main(int argc, char **argv){
 	cout << "Loading source...\n";
 	// load source configuration from geometry.in
 	unique_ptr<TParticleSource> source(CreateParticleSource(configin, geom));
+	checkpoint.seed = seed;
+	checkpoint.parallel = nthreads != 1;
 
 	int ntotalsteps = 0;     // counters to determine average steps per integrator call
 	float InitTime = (1.*clock())/CLOCKS_PER_SEC; // time statistics
@@ -144,13 +183,31 @@ int main(int argc, char **argv){
 	chrono::time_point<chrono::steady_clock> simstart = chrono::steady_clock::now();
 
 	cout << "\n";
-	map<string, map<int, int> > ID_counter; // 2D map to store number of each ID for each particle type
+	map<string, map<int, int> > ID_counter = checkpoint.ID_counter; // 2D map to store number of each ID for each particle type
+	ntotalsteps = checkpoint.ntotalsteps;
+	TProfiles profiles; // profiling counters and timers for each particle type
 
-	if (simtype == PARTICLE){ // if proton or neutron shall be simulated
+	if (simtype == PARTICLE and nthreads != 1){
+		SimulateParticlesParallel(configin, *source, geom, field, ID_counter, ntotalsteps, profiles, checkpoint);
+	}
+	else if (simtype == PARTICLE){ // if proton or neutron shall be simulated
 	    cout << "Simulating " << simcount << " " << source->GetParticleName() << "s...\n";
         progress_display progress(simcount);
 		TTracker t(configin);
-		for (int iMC = 1; iMC <= simcount; iMC++)
+		t.SetProfiling(profiling);
+		if (resume){
+			{ // let the source do any lazy initialization with the generator state at the start of the interrupted simulation
+				TMCGenerator initmc(seed);
+				unique_ptr<TParticle> p(source->CreateParticle(initmc, geom, field));
+			}
+			source->ParticleCounter = checkpoint.completed;
+			mc = checkpoint.mc;
+			t.GetLogger().Resume(checkpoint.logpositions);
+			progress += min(checkpoint.completed, simcount);
+		}
+		if (checkpointinterval > 0)
+			checkpoint.logpositions = t.GetLogger().GetPositions(false); // check that logger supports checkpoints
+		for (int iMC = checkpoint.completed + 1; iMC <= simcount; iMC++)
 		{
             if (quit.load())
                 break;
@@ -171,8 +228,13 @@ int main(int argc, char **argv){
 				}
 			}
 
+			if (checkpointinterval > 0 and not quit.load()){ // particles interrupted by a signal are simulated again when the simulation is resumed
+				checkpoint.mc = mc;
+				CompleteParticle(checkpoint, iMC, ID_counter, ntotalsteps, t.GetLogger());
+			}
             ++progress;
 		}
+		profiles = t.GetProfiles();
 	}
 	else{
 		printf("\nDon't know simtype %i! Exiting...\n",simtype);
@@ -180,6 +242,11 @@ int main(int argc, char **argv){
 	}
 	cout << '\n';
 
+	if (checkpointinterval > 0){
+		checkpoint.Write(CheckpointPath());
+		cout << "Checkpoint written to " << CheckpointPath() << "\n";
+	}
+
 	OutputCodes(ID_counter); // print particle IDs
 	
 	// print statistics
@@ -188,6 +255,12 @@ int main(int argc, char **argv){
 	float SimulationTime = chrono::duration_cast<chrono::milliseconds>(simend - simstart).count()/1000.;
 	printf("Init: %.2fs, Simulation: %.2fs\n",
 			InitTime, SimulationTime);
+	if (profiling){
+		std::ostringstream filename;
+		filename << std::setw(12) << std::setfill('0') << jobnumber << "profile.out";
+		WriteProfile(outpath / filename.str(), profiles, SimulationTime);
+		cout << "Profile written to " << outpath / filename.str() << "\n";
+	}
 	if (quit.load())
 	    cout << "Simulation killed by signal!\n";
 	else
@@ -213,6 +286,7 @@ TConfig ConfigInit(int argc, char **argv){
 	seed = 0;
 	simtype = PARTICLE;
 	simcount = 1;
+	nthreads = 1;
 	/*end default values*/
 
 	if(argc>1) // if user supplied at least 1 arg (jobnumber)
@@ -237,6 +311,21 @@ TConfig ConfigInit(int argc, char **argv){
 	istringstream(config["GLOBAL"]["simcount"])		>> simcount;
 	istringstream(config["GLOBAL"]["simtime"])		>> SimTime;
 	istringstream(config["GLOBAL"]["secondaries"])	>> secondaries;
+	istringstream(config["GLOBAL"]["threads"])		>> nthreads;
+	istringstream(config["GLOBAL"]["profiling"])	>> profiling;
+	istringstream(config["GLOBAL"]["checkpoint"])	>> checkpointinterval;
+#ifndef PENTRACK_PROFILING
+	if (profiling){
+		cout << "profiling is enabled but PENTrack was compiled without BUILD_PROFILING option. No profile will be written.\n";
+		profiling = false;
+	}
+#endif
+	if (argc>5) // if user supplied 5 or more args (jobnumber, configpath, outpath, seed, threads), command line overrides config
+		istringstream(argv[5]) >> nthreads;
+	std::size_t MRtablenodes = 0;
+	double MRtableEmax = 0;
+	istringstream(config["GLOBAL"]["MRtable"]) >> MRtablenodes >> MRtableEmax;
+	MR::SetMRTables(MRtablenodes, MRtableEmax*1e-9);
 	
 	// add default parameters from PARTICLES section to each individual particle's parameters
 	for (auto i = config["PARTICLES"].begin(); i != config["PARTICLES"].end(); ++i){
@@ -251,10 +340,54 @@ TConfig ConfigInit(int argc, char **argv){
 }
 
 
+/**
+ * Read list of (RMS roughness, correlation length) pairs for which MicroRoughness tables should be printed
+ *
+ * @param config TConfig class containing additional pairs in MRRoughnessParameters option
+ * @param b RMS roughness given in table parameters [m]
+ * @param w Correlation length given in table parameters [m]
+ *
+ * @return Returns pair (b, w) followed by additional pairs
+ */
+vector<pair<double, double> > MRRoughnessParameters(TConfig &config, const double b, const double w){
+	vector<pair<double, double> > parameters = {{b, w}};
+	istringstream ss(config["GLOBAL"]["MRRoughnessParameters"]);
+	double bi, wi;
+	while (ss >> bi >> wi)
+		parameters.push_back({bi, wi});
+	if (not ss.eof())
+		throw std::runtime_error("MRRoughnessParameters has to contain pairs of RMS roughness and correlation length!");
+	return parameters;
+}
+
+
+/**
+ * Read number of steps along both axes of a MicroRoughness table
+ *
+ * @param config TConfig class containing parameters
+ * @param option Name of option containing number of steps
+ *
+ * @return Returns number of steps along both axes, defaults to 100
+ */
+array<std::size_t, 2> MRTableSteps(TConfig &config, const std::string &option){
+	array<std::size_t, 2> steps = {100, 100};
+	if (not config["GLOBAL"][option].empty()){
+		istringstream ss(config["GLOBAL"][option]);
+		ss >> steps[0] >> steps[1];
+		if (not ss or steps[0] == 0 or steps[1] == 0)
+			throw std::runtime_error("Invalid number of steps in " + option + "!");
+	}
+	return steps;
+}
+
+
 /**
  * 
  * Output a table containing the MR diffuse reflection probability for the specified range of solid angles from the config.in file
  *
+ * One table is printed for the RMS roughness and correlation length given in MRSolidAngleDRP and one for each pair in MRRoughnessParameters.
+ * Number of steps in phi_out and theta_out are given by MRSolidAngleDRPSteps.
+ *
  * @param config TConfig class containing parameters
  * @param outpath The file name of the file to which results will be printed
  *  
@@ -266,19 +399,7 @@ void PrintMROutAngle(TConfig &config, const boost::filesystem::path &outpath) {
 	copy(istream_iterator<double>(ss), istream_iterator<double>(), back_inserter(MRSolidAngleDRPParams));
 	if (MRSolidAngleDRPParams.size() != 5)
 		throw std::runtime_error("Incorrect number of parameters to print micro-roughness distribution!");
-	
-	ostringstream oss;
-	oss << "MR-SldAngDRP" << "-F" << MRSolidAngleDRPParams[0] << "-En" << MRSolidAngleDRPParams[1] << "-b" << MRSolidAngleDRPParams[2] << "-w" << MRSolidAngleDRPParams[3] << "-th" << MRSolidAngleDRPParams[4] << ".out"; 
- 	boost::filesystem::path fileName = outpath / oss.str();
-	
-	cout << "\nGenerating table of MR diffuse reflection probability for all solid angles in " << fileName << "...\n";	
-	
-	ofstream mrproboutfile(fileName.c_str());
-	if (!mrproboutfile)
-		throw ((boost::format("Could not open %1%!") % fileName.c_str()).str());
-
-	//print file header
-	mrproboutfile << "phi_out theta_out mrdrp\n";
+	array<std::size_t, 2> steps = MRTableSteps(config, "MRSolidAngleDRPSteps"); // number of steps in phi and theta
 	double theta_inc = MRSolidAngleDRPParams[4];
 	
 	//determine neutron velocity corresponding to the energy and create a state_type vector from it
@@ -286,27 +407,42 @@ void PrintMROutAngle(TConfig &config, const boost::filesystem::path &outpath) {
 	double v[3] = {0, vabs*sin(theta_inc), -vabs*cos(theta_inc)};
 	double norm[] = { 0, 0, 1 };
 
-	//write the mrprob values to the output file
-	for (double phi=-pi; phi<pi; phi+=(2*pi)/100) {
-		
-		for (double theta=0; theta<pi/2; theta+=(pi/2)/100) {
-			//the sin(theta) factor is needed to normalize for different size of surface elements in spherical coordinates
-			double mrprob = MR::MRDist(false, false, v, norm, MRSolidAngleDRPParams[0], MRSolidAngleDRPParams[2], MRSolidAngleDRPParams[3], theta, phi)*sin(theta);
-			mrproboutfile << phi << ' ' << theta << ' ' << mrprob << '\n';
-		}
-		for (double theta=0; theta<pi/2; theta+=(pi/2)/100) {
+	for (auto &roughness: MRRoughnessParameters(config, MRSolidAngleDRPParams[2], MRSolidAngleDRPParams[3])){
+		if (quit.load())
+			break;
+
+		ostringstream oss;
+		oss << "MR-SldAngDRP" << "-F" << MRSolidAngleDRPParams[0] << "-En" << MRSolidAngleDRPParams[1] << "-b" << roughness.first << "-w" << roughness.second << "-th" << MRSolidAngleDRPParams[4] << ".out";
+		boost::filesystem::path fileName = outpath / oss.str();
+		bool binary;
+		ofstream mrproboutfile = OpenTable(config, fileName, {"phi_out", "theta_out", "mrdrp"},
+				{{"jobnumber", to_string(jobnumber)}, {"seed", to_string(seed)}, {"logtype", "MR-SldAngDRP"},
+				 {"shape", (boost::format("%1% %2%") % steps[0] % (2*steps[1])).str()}}, binary);
+
+		cout << "\nGenerating table of MR diffuse reflection probability for all solid angles in " << fileName << "...\n";
+
+		//write the mrprob values to the output file, for each phi first reflection then transmission into theta
+		PrintTable(mrproboutfile, binary, steps[0]*2*steps[1], 3, [&](const std::size_t n, double *row){
+			double phi = -pi + (n/(2*steps[1]))*2*pi/steps[0];
+			std::size_t i = n % (2*steps[1]);
+			bool transmit = i >= steps[1];
+			double theta = (transmit ? i - steps[1] : i)*(pi/2)/steps[1];
 			//the sin(theta) factor is needed to normalize for different size of surface elements in spherical coordinates
-			double mrprob = MR::MRDist(true, false, v, norm, MRSolidAngleDRPParams[0], MRSolidAngleDRPParams[2], MRSolidAngleDRPParams[3], theta, phi)*sin(theta);
-			mrproboutfile << phi << ' ' << pi - theta << ' ' << mrprob << '\n';
-		}
+			row[0] = phi;
+			row[1] = transmit ? pi - theta : theta;
+			row[2] = MR::MRDist(transmit, false, v, norm, MRSolidAngleDRPParams[0], roughness.first, roughness.second, theta, phi)*sin(theta);
+		});
 	}
-} // end PrintMRThetaIEnergy
+} // end PrintMROutAngle
 
 
 /**
  * 
  * Output a table in root format giving the total MR DRP for a set of incident theta angles and neutron energy. 
  *
+ * One table is printed for the RMS roughness and correlation length given in MRThetaIEnergy and one for each pair in MRRoughnessParameters.
+ * Number of steps in theta_i and energy are given by MRThetaIEnergySteps.
+ *
  * @param config TConfig class containing parameters
  * @param outpath The file name to which the results will be printed
 */
@@ -316,45 +452,194 @@ void PrintMRThetaIEnergy(TConfig &config, const boost::filesystem::path &outpath
 	copy(istream_iterator<double>(ss), istream_iterator<double>(), back_inserter(MRThetaIEnergyParams));
 	if (MRThetaIEnergyParams.size() != 7)
 		throw std::runtime_error("Incorrect number of parameters to print total micro-roughness-scattering probability!");
+	array<std::size_t, 2> steps = MRTableSteps(config, "MRThetaIEnergySteps"); // number of steps in theta and energy
 
-
-	ostringstream oss;
-	oss << "MR-Tot-DRP" << "-F" << MRThetaIEnergyParams[0] << "-b" << MRThetaIEnergyParams[1] << "-w" << MRThetaIEnergyParams[2] << ".out"; 
- 	boost::filesystem::path fileName = outpath / oss.str();	
-	
-	cout << "\nGenerating table of integrated MR diffuse reflection probability for different incident angle and energy in " << fileName << "...\n";	
-
-	ofstream mroutfile(fileName.c_str());
-	if (!mroutfile)
-		throw ((boost::format("Could not open %1%!") % fileName).str());
-
-	mroutfile << "theta_i neut_en totmrdrp\n"; //print the header
-	
-	//define the min and max values of the following for loop
+	//define the min and max values of the table
 	double theta_start = MRThetaIEnergyParams[3];
 	double theta_end = MRThetaIEnergyParams[4];
 	double neute_start = MRThetaIEnergyParams[5];
 	double neute_end = MRThetaIEnergyParams[6];
 	double norm[] = { 0, 0, 1 };
- 	//write the integrated mrprob values to the output file
- 	progress_display progress(100);
-	for (double theta = theta_start; theta<theta_end; theta += (theta_end-theta_start)/100) {
-		//since this part can be slow it is helpful to monitor the progress
-        progress += 100*(theta - theta_start)/(theta_end - theta_start) - progress.count();
 
-		for (double energy = neute_start; energy<neute_end; energy += (neute_end-neute_start)/100) {
+	for (auto &roughness: MRRoughnessParameters(config, MRThetaIEnergyParams[1], MRThetaIEnergyParams[2])){
+		if (quit.load())
+			break;
+
+		ostringstream oss;
+		oss << "MR-Tot-DRP" << "-F" << MRThetaIEnergyParams[0] << "-b" << roughness.first << "-w" << roughness.second << ".out";
+		boost::filesystem::path fileName = outpath / oss.str();
+		bool binary;
+		ofstream mroutfile = OpenTable(config, fileName, {"theta_i", "neut_en", "totmrdrp"},
+				{{"jobnumber", to_string(jobnumber)}, {"seed", to_string(seed)}, {"logtype", "MR-Tot-DRP"},
+				 {"shape", (boost::format("%1% %2%") % steps[0] % steps[1]).str()}}, binary);
+
+		cout << "\nGenerating table of integrated MR diffuse reflection probability for different incident angle and energy in " << fileName << "...\n";
+
+		//write the integrated mrprob values to the output file
+		PrintTable(mroutfile, binary, steps[0]*steps[1], 3, [&](const std::size_t n, double *row){
+			double theta = theta_start + (n/steps[1])*(theta_end - theta_start)/steps[0];
+			double energy = neute_start + (n % steps[1])*(neute_end - neute_start)/steps[1];
 			//determine neutron velocity corresponding to the energy and create a state_type vector from it
 			double vabs = sqrt(2*energy*1e-9/m_n);
 			double v[3] = {0, vabs*sin(theta), -vabs*cos(theta)};
-			//the sin(theta) factor is needed to noramlize for different sizes of surface elements in spherical coordinates
-			double totmrprob = MR::MRProb(false, v, norm, MRThetaIEnergyParams[0], MRThetaIEnergyParams[1], MRThetaIEnergyParams[2]);
-			mroutfile << theta << ' ' << energy << ' ' << totmrprob << '\n';
-		}
+			row[0] = theta;
+			row[1] = energy;
+			row[2] = MR::MRProb(false, v, norm, MRThetaIEnergyParams[0], roughness.first, roughness.second);
+		});
 	}
-	cout << '\n';
 } // end PrintMRThetaIEnergy
 
 
+/**
+ * Simulate particles in several worker threads.
+ *
+ * Geometry and fields are shared by all threads. Each thread has its own TTracker and a TBufferedLogger,
+ * which passes the complete log of each particle to a logger shared by all threads.
+ * Each particle is created with its own random-number generator seeded from the global seed and the particle number,
+ * so the results for each particle do not depend on the number of threads or the order in which particles are simulated.
+ * They differ from the serial simulation with threads = 1, which draws all particles from the single global generator.
+ *
+ * @param config TConfig class containing parameters
+ * @param source Particle source
+ * @param geom Geometry of the simulation
+ * @param field TFieldManager containing all electromagnetic fields
+ * @param ID_counter Returns numbers of particles with each stopID for each particle type
+ * @param ntotalsteps Returns total number of integration steps
+ * @param profiles Returns profiling counters and timers of each particle type, summed over all threads
+ * @param checkpoint Particles completed in this checkpoint are skipped, completed particles are added to it
+ */
+void SimulateParticlesParallel(TConfig &config, TParticleSource &source, TGeometry &geom, const TFieldManager &field,
+		map<string, map<int, int> > &ID_counter, int &ntotalsteps, TProfiles &profiles, TCheckpoint &checkpoint){
+	if (nthreads == 0)
+		nthreads = max(thread::hardware_concurrency(), 1u);
+	cout << "Simulating " << simcount << " " << source.GetParticleName() << "s in " << nthreads << " threads...\n";
+
+	// seed the random-number generator of each particle from the global seed and the particle number
+	auto ParticleGenerator = [](const int iMC){
+		seed_seq seq{static_cast<uint32_t>(seed), static_cast<uint32_t>(seed >> 32), static_cast<uint32_t>(iMC)};
+		return TMCGenerator(seq);
+	};
+
+	{ // let the source do any lazy initialization with a fixed generator, so it does not depend on the order in which threads create particles
+		TMCGenerator mc = ParticleGenerator(0);
+		unique_ptr<TParticle> p(source.CreateParticle(mc, geom, field));
+		source.ParticleCounter = 0;
+	}
+
+	unique_ptr<TLogger> logger = CreateLogger(config);
+	mutex loggermutex, sourcemutex, countermutex;
+	atomic<int> nextparticle(1);
+	progress_display progress(simcount);
+	const TCheckpoint resumed = checkpoint; // particles completed before the simulation was resumed
+	if (resume){
+		logger->Resume(checkpoint.logpositions);
+		progress += min(checkpoint.completed + static_cast<int>(checkpoint.done.size()), simcount);
+	}
+	if (checkpointinterval > 0)
+		checkpoint.logpositions = logger->GetPositions(false); // check that logger supports checkpoints
+
+	auto worker = [&](){
+		TConfig threadconfig = config; // particle sections might get modified when reading non-existent parameters
+		TBufferedLogger *logbuffer = new TBufferedLogger(threadconfig, *logger, loggermutex);
+		TTracker t{unique_ptr<TLogger>(logbuffer)};
+		t.SetProfiling(profiling);
+		for (int iMC = nextparticle++; iMC <= simcount; iMC = nextparticle++){
+			if (quit.load())
+				break;
+			if (resumed.Done(iMC))
+				continue;
+
+			TMCGenerator mc = ParticleGenerator(iMC);
+			unique_ptr<TParticle> p;
+			{
+				lock_guard<mutex> lock(sourcemutex);
+				source.ParticleCounter = iMC - 1; // particle number is given by its position in the sequence, not by order of creation
+				p.reset(source.CreateParticle(mc, geom, field));
+			}
+			t.IntegrateParticle(p, SimTime, threadconfig[p->GetName()], mc, geom, field);
+			map<string, map<int, int> > particle_ID_counter;
+			particle_ID_counter[p->GetName()][p->GetStopID()]++;
+			int particlesteps = p->GetNumberOfSteps();
+
+			if (secondaries == 1){
+				for (auto& i: p->GetSecondaryParticles()){
+					if (quit.load())
+						break;
+
+					t.IntegrateParticle(i, SimTime, threadconfig[i->GetName()], mc, geom, field);
+					particle_ID_counter[i->GetName()][i->GetStopID()]++;
+					particlesteps += i->GetNumberOfSteps();
+				}
+			}
+
+			if (checkpointinterval > 0 and quit.load()){ // particle was interrupted by a signal, it is simulated again when the simulation is resumed
+				logbuffer->Clear();
+				break;
+			}
+
+			lock_guard<mutex> lock(countermutex); // particle log and counters are updated together, so checkpoints are consistent
+			logbuffer->Flush();
+			for (auto &particle: particle_ID_counter){
+				for (auto &ID: particle.second)
+					ID_counter[particle.first][ID.first] += ID.second;
+			}
+			ntotalsteps += particlesteps;
+			if (checkpointinterval > 0){
+				lock_guard<mutex> loglock(loggermutex);
+				CompleteParticle(checkpoint, iMC, ID_counter, ntotalsteps, *logger);
+			}
+			++progress;
+		}
+
+		lock_guard<mutex> lock(countermutex);
+		for (auto &profile: t.GetProfiles())
+			profiles[profile.first] += profile.second;
+	};
+
+	vector<thread> threads;
+	for (unsigned int i = 0; i < nthreads; ++i)
+		threads.emplace_back(worker);
+	for (auto &t: threads)
+		t.join();
+}
+
+
+/**
+ * Get path of checkpoint file of current job
+ *
+ * @return Returns path of checkpoint file in output directory
+ */
+boost::filesystem::path CheckpointPath(){
+	ostringstream filename;
+	filename << setw(12) << setfill('0') << jobnumber << "checkpoint.out";
+	return outpath / filename.str();
+}
+
+
+/**
+ * Record completed particle in checkpoint and write checkpoint to file if the checkpoint interval has passed since it was last written
+ *
+ * @param checkpoint Checkpoint to update
+ * @param particle Number of completed particle
+ * @param ID_counter Numbers of completed particles with each stopID for each particle type
+ * @param ntotalsteps Total number of integration steps of completed particles
+ * @param logger Logger whose output files are recorded in the checkpoint
+ */
+void CompleteParticle(TCheckpoint &checkpoint, const int particle, const map<string, map<int, int> > &ID_counter, const int ntotalsteps,
+		TLogger &logger){
+	static chrono::steady_clock::time_point lastwrite = chrono::steady_clock::now();
+	checkpoint.Complete(particle);
+	checkpoint.ID_counter = ID_counter;
+	checkpoint.ntotalsteps = ntotalsteps;
+	bool write = chrono::steady_clock::now() - lastwrite > chrono::duration<double>(checkpointinterval);
+	checkpoint.logpositions = logger.GetPositions(write); // output files have to contain all rows recorded in a checkpoint file, even if the program is killed
+	if (write){
+		checkpoint.Write(CheckpointPath());
+		lastwrite = chrono::steady_clock::now();
+	}
+}
+
+
 /**
  * Print final particles statistics.
  *
@@ -381,68 +666,162 @@ void OutputCodes(const map<string, map<int, int> > &ID_counter){
 
 
 /**
- * Print planar slice of fields into a file.
+ * Calculate rows of a table in several threads and write them to a file.
+ *
+ * Rows are calculated in chunks by nthreads worker threads and written in order of their index,
+ * either as text lines with space-separated columns or as binary doubles.
+ *
+ * @param out Stream to write rows to
+ * @param binary Write rows as binary doubles instead of text
+ * @param rows Number of rows
+ * @param columns Number of columns
+ * @param row Function filling the row with given index, called by several threads at the same time
+ */
+void PrintTable(std::ostream &out, const bool binary, const std::size_t rows, const std::size_t columns,
+		const std::function<void(const std::size_t, double*)> &row){
+	const unsigned int threads = nthreads == 0 ? max(thread::hardware_concurrency(), 1u) : nthreads;
+	const std::size_t chunksize = max<std::size_t>(1, min<std::size_t>(1024, rows/threads/16)); // number of rows calculated by a thread at once
+	const std::size_t chunks = (rows + chunksize - 1)/chunksize;
+	const std::size_t batchsize = 64*threads; // number of chunks kept in memory before writing them to file
+	progress_display progress(chunks);
+	for (std::size_t batchstart = 0; batchstart < chunks and not quit.load(); batchstart += batchsize){
+		const std::size_t batchend = min(batchstart + batchsize, chunks);
+		vector<string> output(batchend - batchstart);
+		atomic<std::size_t> nextchunk(batchstart);
+		auto worker = [&](){
+			vector<double> values(chunksize*columns);
+			for (std::size_t c = nextchunk++; c < batchend; c = nextchunk++){
+				std::size_t first = c*chunksize, last = min(first + chunksize, rows);
+				for (std::size_t i = first; i < last; ++i)
+					row(i, &values[(i - first)*columns]);
+				if (binary)
+					output[c - batchstart].assign(reinterpret_cast<const char*>(values.data()), (last - first)*columns*sizeof(double));
+				else{
+					ostringstream text;
+					for (std::size_t i = 0; i < (last - first)*columns; ++i)
+						text << values[i] << ((i + 1) % columns == 0 ? '\n' : ' ');
+					output[c - batchstart] = text.str();
+				}
+			}
+		};
+
+		vector<thread> workers;
+		for (unsigned int i = 1; i < threads; ++i)
+			workers.emplace_back(worker);
+		worker();
+		for (auto &w: workers)
+			w.join();
+		for (auto &o: output)
+			out.write(o.data(), o.size());
+		progress += batchend - batchstart;
+	}
+}
+
+
+/**
+ * Open output file for PrintTable and write its header
+ *
+ * @param config TConfig class containing binarylog option and configuration written to binary headers
+ * @param outfile Filename of text file, returns filename with extension .bin if binarylog option is set
+ * @param titles List of column names
+ * @param entries Additional entries written to header of binary file
+ * @param binary Returns true if binarylog option is set
+ */
+ofstream OpenTable(TConfig &config, boost::filesystem::path &outfile, const vector<string> &titles,
+		const vector<pair<string, string> > &entries, bool &binary){
+	binary = false;
+	istringstream(config["GLOBAL"]["binarylog"]) >> binary;
+	if (binary)
+		outfile.replace_extension(".bin");
+
+	ofstream file(outfile.c_str(), binary ? ios::out | ios::binary : ios::out);
+	if (!file){
+		std::cout << "Could not open " << outfile << "!\n";
+		exit(-1);
+	}
+	if (binary)
+		WriteBinaryHeader(file, titles, entries, config);
+	else{
+		for (std::size_t i = 0; i < titles.size(); ++i)
+			file << titles[i] << (i + 1 < titles.size() ? ' ' : '\n');
+	}
+	return file;
+}
+
+
+/**
+ * Print planar slice or volume grid of fields into a file.
  *
- * The slice plane is given by three points BCutPlayPoint[0..8] on the plane
+ * The slice plane is given by three points BCutPlanePoint[0..8] on the plane.
+ * If BCutVolume is given, fields are sampled on a volume grid spanned by its first point and the three edges to the following points instead.
+ * With binarylog enabled, the grid is written to a binary file with header entry "shape" giving the number of samples along each edge.
  *
  * @param config TConfig class containing cut parameters
  * @param outfile filename of result file
  * @param field TFieldManager structure which should be evaluated
  */
 void PrintBFieldCut(TConfig &config, const boost::filesystem::path &outfile, const TFieldManager &field){
-	double BCutPlanePoint[9]; ///< 3 points on plane for field slice (read from config)
-	int BCutPlaneSampleCount1; ///< number of field samples in BCutPlanePoint[3..5]-BCutPlanePoint[0..2] direction (read from config)
-	int BCutPlaneSampleCount2; ///< number of field samples in BCutPlanePoint[6..8]-BCutPlanePoint[0..2] direction (read from config)
+	double BCutPoint[12] = {0,0,0, 0,0,0, 0,0,0, 0,0,0}; ///< first point and end points of edges spanning the grid (read from config)
+	std::size_t BCutSampleCount[3] = {1, 1, 1}; ///< number of field samples along each edge (read from config)
 	double BCutTime;
-	istringstream str(config["GLOBAL"]["BCutPlane"]);
-	str	>> BCutPlanePoint[0] >> BCutPlanePoint[1] >> BCutPlanePoint[2]
-		>> BCutPlanePoint[3] >> BCutPlanePoint[4] >> BCutPlanePoint[5]
-		>> BCutPlanePoint[6] >> BCutPlanePoint[7] >> BCutPlanePoint[8]
-		>> BCutPlaneSampleCount1 >> BCutPlaneSampleCount2 >> BCutTime;
-	if (not str){
-		throw std::runtime_error("Missing config parameters for BCutPlane. 12 are expected");
-	}
-
-	// get directional vectors from points on plane by u = p2-p1, v = p3-p1
-	double u[3] = {BCutPlanePoint[3] - BCutPlanePoint[0], BCutPlanePoint[4] - BCutPlanePoint[1], BCutPlanePoint[5] - BCutPlanePoint[2]};
-	double v[3] = {BCutPlanePoint[6] - BCutPlanePoint[0], BCutPlanePoint[7] - BCutPlanePoint[1], BCutPlanePoint[8] - BCutPlanePoint[2]};
-	
-	// open output file
-	ofstream cutfile(outfile.c_str());
-	if (!cutfile){
-		std::cout << "Could not open " << outfile << "!\n";
-		exit(-1);
+	if (not config["GLOBAL"]["BCutVolume"].empty()){
+		istringstream str(config["GLOBAL"]["BCutVolume"]);
+		for (int i = 0; i < 12; ++i)
+			str >> BCutPoint[i];
+		str >> BCutSampleCount[0] >> BCutSampleCount[1] >> BCutSampleCount[2] >> BCutTime;
+		if (not str)
+			throw std::runtime_error("Missing config parameters for BCutVolume. 16 are expected");
 	}
-	// print file header
-	cutfile << "x y z Bx dBxdx dBxdy dBxdz By dBydx dBydy dBydz Bz dBzdx dBzdy dBzdz Ex Ey Ez V\n";
-	
-	double Pp[3];
-	double B[3], dBidxj[3][3],Ei[3],V;
-	float start = clock(); // do some time statistics
-	// sample field BCutPlaneSmapleCount1 times in u-direction and BCutPlaneSampleCount2 time in v-direction
-	for (int i = 0; i < BCutPlaneSampleCount1; i++) {
-		for (int j = 0; j < BCutPlaneSampleCount2; j++){
-			for (int k = 0; k < 3; k++)
-				Pp[k] = BCutPlanePoint[k] + i*u[k]/BCutPlaneSampleCount1 + j*v[k]/BCutPlaneSampleCount2;
-			// print B-/E-Field to file
-         			cutfile << Pp[0] << " " << Pp[1] << " " << Pp[2] << " ";
-			
-			field.BField(Pp[0], Pp[1], Pp[2], BCutTime, B, dBidxj);
-			for (int k = 0; k < 3; k++){
-				cutfile << B[k] << " ";
-				for (int l = 0; l < 3; l++)
-					cutfile << dBidxj[k][l] << " ";
-			}
-
-			field.EField(Pp[0], Pp[1], Pp[2], BCutTime, V, Ei);
-			cutfile << Ei[0] << " " << Ei[1] << " " << Ei[2] << " " << V << "\n";
+	else{
+		istringstream str(config["GLOBAL"]["BCutPlane"]);
+		for (int i = 0; i < 9; ++i)
+			str >> BCutPoint[i];
+		str >> BCutSampleCount[0] >> BCutSampleCount[1] >> BCutTime;
+		if (not str){
+			throw std::runtime_error("Missing config parameters for BCutPlane. 12 are expected");
 		}
+		std::copy(BCutPoint, BCutPoint + 3, BCutPoint + 9); // third edge has zero length
 	}
-	start = (clock() - start)/CLOCKS_PER_SEC;
+
+	// get directional vectors from points on grid by u = p2-p1, v = p3-p1, w = p4-p1
+	double u[3] = {BCutPoint[3] - BCutPoint[0], BCutPoint[4] - BCutPoint[1], BCutPoint[5] - BCutPoint[2]};
+	double v[3] = {BCutPoint[6] - BCutPoint[0], BCutPoint[7] - BCutPoint[1], BCutPoint[8] - BCutPoint[2]};
+	double w[3] = {BCutPoint[9] - BCutPoint[0], BCutPoint[10] - BCutPoint[1], BCutPoint[11] - BCutPoint[2]};
+	const std::size_t count = BCutSampleCount[0]*BCutSampleCount[1]*BCutSampleCount[2];
+
+	// open output file and print file header
+	bool binary;
+	boost::filesystem::path filename = outfile;
+	ofstream cutfile = OpenTable(config, filename, {"x", "y", "z", "Bx", "dBxdx", "dBxdy", "dBxdz", "By", "dBydx", "dBydy", "dBydz", "Bz", "dBzdx", "dBzdy", "dBzdz", "Ex", "Ey", "Ez", "V"},
+			{{"jobnumber", to_string(jobnumber)}, {"seed", to_string(seed)}, {"logtype", "BFCut"},
+			 {"shape", (boost::format("%1% %2% %3%") % BCutSampleCount[0] % BCutSampleCount[1] % BCutSampleCount[2]).str()}}, binary);
+
+	chrono::time_point<chrono::steady_clock> start = chrono::steady_clock::now(); // do some time statistics
+	// sample field BCutSampleCount[0] times in u-direction, BCutSampleCount[1] times in v-direction, and BCutSampleCount[2] times in w-direction
+	PrintTable(cutfile, binary, count, 19, [&](const std::size_t n, double *row){
+		std::size_t i = n/BCutSampleCount[2]/BCutSampleCount[1], j = n/BCutSampleCount[2] % BCutSampleCount[1], k = n % BCutSampleCount[2];
+		for (int l = 0; l < 3; l++)
+			row[l] = BCutPoint[l] + i*u[l]/BCutSampleCount[0] + j*v[l]/BCutSampleCount[1] + k*w[l]/BCutSampleCount[2];
+
+		double B[3], dBidxj[3][3], Ei[3], V;
+		field.BField(row[0], row[1], row[2], BCutTime, B, dBidxj);
+		for (int l = 0; l < 3; l++){
+			row[3 + 4*l] = B[l];
+			for (int m = 0; m < 3; m++)
+				row[4 + 4*l + m] = dBidxj[l][m];
+		}
+
+		field.EField(row[0], row[1], row[2], BCutTime, V, Ei);
+		row[15] = Ei[0];
+		row[16] = Ei[1];
+		row[17] = Ei[2];
+		row[18] = V;
+	});
+	float duration = chrono::duration_cast<chrono::milliseconds>(chrono::steady_clock::now() - start).count()/1000.;
 	//close file
 	cutfile.close();
 	// print time statistics
-	printf("\nWrote magnetic and electric fields %u times into %s in %fs (%fms per call)\n",BCutPlaneSampleCount1*BCutPlaneSampleCount2, outfile.c_str(), start, start/BCutPlaneSampleCount1/BCutPlaneSampleCount2*1000);
+	printf("\nWrote magnetic and electric fields %lu times into %s in %fs (%fms per call)\n", static_cast<unsigned long>(count), filename.c_str(), duration, duration/count*1000);
 }
 
 
@@ -452,18 +831,11 @@ void PrintBFieldCut(TConfig &config, const boost::filesystem::path &outfile, con
  * "Count" phase space for each energy bin and calculate "heating" of the neutrons due to
  * phase space compression by magnetic field ramping
  *
+ * @param config TConfig class containing binarylog option
  * @param outfile Filename of output file
  * @param field TField structure which should be evaluated
  */
-void PrintBField(const boost::filesystem::path &outfile, const TFieldManager &field){
-	// print BField to file
-	ofstream bfile(outfile.c_str());
-	if (!bfile){
-		std::cout << "Could not open " << outfile << "!\n";
-		exit(-1);
-	}
-
-	bfile << "r phi z Bx By Bz 0 0 Babs\n";
+void PrintBField(TConfig &config, const boost::filesystem::path &outfile, const TFieldManager &field){
 	double rmin = 0.12, rmax = 0.5, zmin = 0, zmax = 1.2;
 	int E;
 	const int Emax = 108;
@@ -471,28 +843,46 @@ void PrintBField(const boost::filesystem::path &outfile, const TFieldManager &fi
 	double VolumeB[Emax + 1];
 	for (E = 0; E <= Emax; E++) VolumeB[E] = 0;
 	
-	double EnTest;
-	double B[3];
 	// sample space in cylindrical pattern
+	vector<array<double, 2> > points;
 	for (double r = rmin; r <= rmax; r += dr){
-		for (double z = zmin; z <= zmax; z += dz){
-			field.BField(r, 0, z, 500.0, B); // evaluate field
-			double Babs = sqrt(B[0]*B[0] + B[1]*B[1] + B[2]*B[2]);
-			// print field values
-			bfile << r << " " << 0.0 << " " << z << " " << B[0] << " " << B[1] << " " << B[2] << " " << 0.0 << " " << 0.0 << " " << Babs << "\n";
-			std::cout << "r=" << r << ", z=" << z << ", Br=" << B[0] << " T, Bz=" << B[2] << " T\n";
+		for (double z = zmin; z <= zmax; z += dz)
+			points.push_back({r, z});
+	}
+
+	// print BField to file
+	bool binary;
+	boost::filesystem::path filename = outfile;
+	ofstream bfile = OpenTable(config, filename, {"r", "phi", "z", "Bx", "By", "Bz", "0", "0", "Babs"},
+			{{"jobnumber", to_string(jobnumber)}, {"seed", to_string(seed)}, {"logtype", "BF"}}, binary);
+	vector<array<double, 3> > Bfield(points.size());
+	PrintTable(bfile, binary, points.size(), 9, [&](const std::size_t n, double *row){
+		double r = points[n][0], z = points[n][1];
+		double *B = Bfield[n].data();
+		field.BField(r, 0, z, 500.0, B); // evaluate field
+		double Babs = sqrt(B[0]*B[0] + B[1]*B[1] + B[2]*B[2]);
+		// print field values
+		double values[9] = {r, 0.0, z, B[0], B[1], B[2], 0.0, 0.0, Babs};
+		std::copy(values, values + 9, row);
+	});
+	bfile.close();
+
+	double EnTest;
+	for (std::size_t n = 0; n < points.size(); ++n){
+		double r = points[n][0], z = points[n][1];
+		const double *B = Bfield[n].data();
+		double Babs = sqrt(B[0]*B[0] + B[1]*B[1] + B[2]*B[2]);
+		std::cout << "r=" << r << ", z=" << z << ", Br=" << B[0] << " T, Bz=" << B[2] << " T\n";
 			
-			// Ramp Heating Analysis
-			for (E = 0; E <= Emax; E++){
-				EnTest = E*1.0e-9 - m_n*gravconst*z - mu_nSI/ele_e * Babs;
-				if (EnTest >= 0){
-					// add the volume segment to the volume that is accessible to a neutron with energy Energie
-					VolumeB[E] = VolumeB[E] + pi * dz * ((r+0.5*dr)*(r+0.5*dr) - (r-0.5*dr)*(r-0.5*dr));
-				}
+		// Ramp Heating Analysis
+		for (E = 0; E <= Emax; E++){
+			EnTest = E*1.0e-9 - m_n*gravconst*z - mu_nSI/ele_e * Babs;
+			if (EnTest >= 0){
+				// add the volume segment to the volume that is accessible to a neutron with energy Energie
+				VolumeB[E] = VolumeB[E] + pi * dz * ((r+0.5*dr)*(r+0.5*dr) - (r-0.5*dr)*(r-0.5*dr));
 			}
 		}
 	}
-	bfile.close();
 
 	// for investigating ramp heating of neutrons, volume accessible to neutrons with and
 	// without B-field is calculated and the heating approximated by thermodynamical means
@@ -1,6 +1,13 @@
 #include "microroughness.h"
 
 #include <complex>
+#include <array>
+#include <vector>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <atomic>
+#include <thread>
 
 #include "optimization.h"
 #include "specialfunctions.h"
@@ -131,4 +138,171 @@ double MRDistMax(const bool transmit, const double v[3], const double normal[3],
 	return MRDist(transmit, false, v, normal, Estep, RMSroughness, correlationLength, theta[0], 0);
 }
 
+
+static const double MR_TABLE_TOLERANCE = 1e-2; ///< max. relative difference between interpolated and exact values in center of table cells
+
+/**
+ * Table of MicroRoughness probabilities and distribution maxima for one combination of potential step, roughness and correlation length
+ *
+ * Nodes are arranged on a grid of normal and tangential kinetic energies and calculated lazily.
+ * Threads claim nodes and cells with atomic flags, so calculating a cell only blocks threads that need the same nodes.
+ */
+class TMRTable{
+private:
+	const double Estep; ///< potential step
+	const double RMSroughness; ///< RMS roughness of surface
+	const double correlationLength; ///< correlation length of surface
+	const std::size_t n; ///< number of nodes along each axis
+	const double h; ///< distance between nodes [eV]
+	std::vector<std::array<double, 3> > nodes; ///< reflection probability, transmission probability, and maximum of transmission distribution at each node
+	std::vector<std::atomic<signed char> > nodestate; ///< 0 if node has not been calculated yet, 2 while it is calculated, 1 when it is done
+	std::vector<std::atomic<signed char> > cellstate; ///< 0 if cell has not been used yet, 2 while it is checked, 1 if interpolation is accurate, -1 if not
+
+	/**
+	 * Calculate exact values at given normal and tangential kinetic energies
+	 */
+	TMRValues Exact(const double Enormal, const double Etangential) const{
+		double normal[3] = {0., 0., 1.};
+		double v[3] = {static_cast<double>(std::sqrt(2*Etangential/m_n)), 0., -static_cast<double>(std::sqrt(2*Enormal/m_n))};
+		return {MRProb(false, v, normal, Estep, RMSroughness, correlationLength),
+				MRProb(true, v, normal, Estep, RMSroughness, correlationLength),
+				MRDistMax(true, v, normal, Estep, RMSroughness, correlationLength)};
+	}
+
+	/**
+	 * Return node, calculate it if necessary. Waits if another thread is calculating the same node.
+	 */
+	const std::array<double, 3>& Node(const std::size_t i, const std::size_t j){
+		std::size_t index = i*n + j;
+		signed char state = 0;
+		if (nodestate[index].compare_exchange_strong(state, 2, std::memory_order_acquire)){
+			TMRValues exact = Exact(std::max(i*h, 1e-6*h), std::max(j*h, 1e-6*h)); // avoid zero velocity components, where distributions are not defined
+			nodes[index] = {exact.reflprob, exact.transprob, exact.distmax};
+			nodestate[index].store(1, std::memory_order_release);
+		}
+		else{
+			while (nodestate[index].load(std::memory_order_acquire) != 1)
+				std::this_thread::yield();
+		}
+		return nodes[index];
+	}
+
+	/**
+	 * Calculate nodes of a cell and compare interpolation in cell center to exact values
+	 *
+	 * Cells crossed by the transmission threshold E = Estep are never accurate, since the transmission probability is zero on one side of it.
+	 * They are recognized by nodes that disagree on whether the transmission probability is zero.
+	 *
+	 * @return Returns 1 if interpolation is accurate, -1 otherwise
+	 */
+	signed char CheckCell(const std::size_t i, const std::size_t j){
+		bool transmitting = Node(i, j)[1] > 0;
+		if ((Node(i + 1, j)[1] > 0) != transmitting or (Node(i, j + 1)[1] > 0) != transmitting or (Node(i + 1, j + 1)[1] > 0) != transmitting)
+			return -1;
+
+		std::array<double, 3> interpolated;
+		for (int k = 0; k < 3; ++k)
+			interpolated[k] = (Node(i, j)[k] + Node(i + 1, j)[k] + Node(i, j + 1)[k] + Node(i + 1, j + 1)[k])/4;
+		TMRValues exact = Exact((i + 0.5)*h, (j + 0.5)*h);
+		std::array<double, 3> e = {exact.reflprob, exact.transprob, exact.distmax};
+		for (int k = 0; k < 3; ++k){
+			if (not (std::abs(interpolated[k] - e[k]) <= MR_TABLE_TOLERANCE*std::abs(e[k]))) // also fails if any value is NaN
+				return -1;
+		}
+		return 1;
+	}
+public:
+	/**
+	 * Constructor, does not calculate any nodes yet
+	 *
+	 * @param aEstep Potential step
+	 * @param aRMSroughness RMS roughness of surface
+	 * @param acorrelationLength Correlation length of surface
+	 * @param nodecount Number of nodes along each axis
+	 * @param Emax Maximum normal and tangential kinetic energy covered by table
+	 */
+	TMRTable(const double aEstep, const double aRMSroughness, const double acorrelationLength, const std::size_t nodecount, const double Emax):
+		Estep(aEstep), RMSroughness(aRMSroughness), correlationLength(acorrelationLength), n(nodecount), h(Emax/(nodecount - 1)),
+		nodes(nodecount*nodecount), nodestate(nodecount*nodecount), cellstate((nodecount - 1)*(nodecount - 1)){
+		for (auto &s: nodestate)
+			s.store(0);
+		for (auto &c: cellstate)
+			c.store(0);
+	}
+
+	/**
+	 * Interpolate values at given normal and tangential kinetic energies
+	 *
+	 * @return Returns false if energies are outside of table, interpolation is not accurate enough, or another thread is still checking the cell
+	 */
+	bool Interpolate(const double Enormal, const double Etangential, TMRValues &values){
+		double u = Enormal/h, w = Etangential/h;
+		if (not (u >= 0 and u < n - 1 and w >= 0 and w < n - 1))
+			return false;
+		std::size_t i = static_cast<std::size_t>(u), j = static_cast<std::size_t>(w);
+		std::atomic<signed char> &state = cellstate[i*(n - 1) + j];
+		signed char s = state.load(std::memory_order_acquire);
+		if (s == 0 and state.compare_exchange_strong(s, 2, std::memory_order_acquire)){
+			s = CheckCell(i, j);
+			state.store(s, std::memory_order_release);
+		}
+		if (s != 1) // cell is inaccurate or another thread is still checking it, caller falls back to exact calculation
+			return false;
+
+		u -= i;
+		w -= j;
+		const auto &n00 = nodes[i*n + j], &n10 = nodes[(i + 1)*n + j], &n01 = nodes[i*n + j + 1], &n11 = nodes[(i + 1)*n + j + 1];
+		std::array<double, 3> result;
+		for (int k = 0; k < 3; ++k)
+			result[k] = (1 - u)*(1 - w)*n00[k] + u*(1 - w)*n10[k] + (1 - u)*w*n01[k] + u*w*n11[k];
+		values = {result[0], result[1], result[2]};
+		return true;
+	}
+};
+
+static std::size_t MRTableNodes = 0; ///< number of nodes along each axis of MicroRoughness tables, 0 disables them
+static double MRTableEmax = 0; ///< maximum energy covered by MicroRoughness tables
+static std::map<std::array<double, 3>, std::unique_ptr<TMRTable> > MRTables; ///< MicroRoughness tables for each combination of potential step, roughness and correlation length
+static std::mutex MRTablesMutex; ///< protects MRTables
+static std::atomic<std::size_t> MRTablesGeneration(0); ///< incremented whenever MRTables are reset, invalidates each thread's cached table pointers
+
+void SetMRTables(const std::size_t nodes, const double Emax){
+	std::lock_guard<std::mutex> lock(MRTablesMutex);
+	if (nodes == 1 or (nodes > 0 and Emax <= 0))
+		throw std::runtime_error("MicroRoughness tables need at least two nodes and a positive maximum energy!");
+	MRTableNodes = nodes;
+	MRTableEmax = Emax;
+	MRTables.clear();
+	++MRTablesGeneration;
+}
+
+bool MRTabulated(const double v[3], const double normal[3], const double Estep, const double RMSroughness, const double correlationLength, TMRValues &values){
+	thread_local std::map<std::array<double, 3>, TMRTable*> threadtables; // tables already used by this thread, nullptr if tables are disabled
+	thread_local std::size_t threadgeneration = 0;
+	std::size_t generation = MRTablesGeneration.load(std::memory_order_acquire);
+	if (threadgeneration != generation){
+		threadtables.clear();
+		threadgeneration = generation;
+	}
+	auto it = threadtables.find({Estep, RMSroughness, correlationLength});
+	if (it == threadtables.end()){ // only look up shared tables when a thread hits a material for the first time
+		std::lock_guard<std::mutex> lock(MRTablesMutex);
+		TMRTable *table = nullptr;
+		if (MRTableNodes > 0){
+			auto &t = MRTables[{Estep, RMSroughness, correlationLength}];
+			if (not t)
+				t.reset(new TMRTable(Estep, RMSroughness, correlationLength, MRTableNodes, MRTableEmax));
+			table = t.get();
+		}
+		it = threadtables.insert({{Estep, RMSroughness, correlationLength}, table}).first;
+	}
+	TMRTable *table = it->second;
+	if (not table)
+		return false;
+	double vnormal = v[0]*normal[0] + v[1]*normal[1] + v[2]*normal[2];
+	double Enormal = 0.5*m_n*vnormal*vnormal;
+	double Etangential = 0.5*m_n*(v[0]*v[0] + v[1]*v[1] + v[2]*v[2]) - Enormal;
+	return table->Interpolate(Enormal, std::max(Etangential, 0.), values);
+}
+
 }
@@ -36,14 +36,14 @@ void TNeutron::Transmit(const value_type x1, const state_type &y1, value_type &x
 
 
 void TNeutron::TransmitMR(const value_type x1, const state_type &y1, value_type &x2, state_type &y2,
-		const double normal[3], const double Estep, const material &mat, TMCGenerator &mc) const{
+		const double normal[3], const double Estep, const material &mat, const double MRdistmax, TMCGenerator &mc) const{
 
 	if (!MR::MRValid(&y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength)){ // check if MicroRoughness model should be applied
 		throw runtime_error("Tried to use micro-roughness model in invalid energy regime. That should not happen!");
 	}
 	
 	double theta_t, phi_t;
-	std::uniform_real_distribution<double> MRprobdist(0, 1.5 * MR::MRDistMax(true, &y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength)); // scale up maximum to make sure it lies above all values of scattering distribution
+	std::uniform_real_distribution<double> MRprobdist(0, 1.5 * MRdistmax); // scale up maximum to make sure it lies above all values of scattering distribution
 	std::uniform_real_distribution<double> phidist(0, 2.*pi);
 	std::sin_distribution<double> sindist(0, pi/2.);
 	do{
@@ -116,13 +116,13 @@ void TNeutron::Reflect(const value_type x1, const state_type &y1, value_type &x2
 
 
 void TNeutron::ReflectMR(const value_type x1, const state_type &y1, value_type &x2, state_type &y2,
-		const double normal[3], const double Estep, const material &mat, TMCGenerator &mc) const{
+		const double normal[3], const double Estep, const material &mat, const double MRdistmax, TMCGenerator &mc) const{
 	if (!MR::MRValid(&y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength)){
 		throw runtime_error("Tried to use micro-roughness model in invalid energy regime. That should not happen!");
 	}
 
 	double phi_r, theta_r;
-	std::uniform_real_distribution<double> MRprobdist(0, 1.5 * MR::MRDistMax(true, &y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength)); // scale up maximum to make sure it lies above all values of scattering distribution
+	std::uniform_real_distribution<double> MRprobdist(0, 1.5 * MRdistmax); // scale up maximum to make sure it lies above all values of scattering distribution
 //			cout << "max: " << MRmax << '\n';
 	std::uniform_real_distribution<double> unidist(0, 2.*pi);
 	std::sin_distribution<double> sindist(0, pi/2.);
@@ -202,17 +202,25 @@ void TNeutron::OnHit(const value_type x1, const state_type &y1, value_type &x2,
 
     bool UseMRModel = MR::MRValid(&y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength);
 	double MRreflprob = 0, MRtransprob = 0;
-	if (UseMRModel){ 	// handle MicroRoughness reflection/transmission separately
+	MR::TMRValues MRtable;
+	bool MRtabulated = UseMRModel and MR::MRTabulated(&y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength, MRtable);
+	if (MRtabulated){ // use interpolated MicroRoughness probabilities if available
+		MRreflprob = MRtable.reflprob;
+		if (GetKineticEnergy(&y1[3]) > Estep)
+			MRtransprob = MRtable.transprob;
+	}
+	else if (UseMRModel){ 	// handle MicroRoughness reflection/transmission separately
 		MRreflprob = MR::MRProb(false, &y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength);
 		if (GetKineticEnergy(&y1[3]) > Estep) // MicroRoughness transmission can happen if neutron energy > potential step
 			MRtransprob = MR::MRProb(true, &y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength);
 	}
+	auto MRdistmax = [&](){ return MRtabulated ? MRtable.distmax : MR::MRDistMax(true, &y1[3], normal, Estep, mat.RMSRoughness, mat.CorrelLength); };
 	double prob = unidist(mc);
 	if (UseMRModel && prob < MRreflprob){
-		ReflectMR(x1, y1, x2, y2, normal, Estep, mat, mc);
+		ReflectMR(x1, y1, x2, y2, normal, Estep, mat, MRdistmax(), mc);
 	}
 	else if (UseMRModel && prob < MRreflprob + MRtransprob){
-		TransmitMR(x1, y1, x2, y2, normal, Estep, mat, mc);
+		TransmitMR(x1, y1, x2, y2, normal, Estep, mat, MRdistmax(), mc);
 	}
 
 	else{
@@ -11,6 +11,7 @@
 #include <boost/math/tools/roots.hpp>
 
 #include "particle.h"
+#include "profiler.h"
 
 using namespace std;
 
@@ -95,6 +96,7 @@ TParticle::TParticle(const char *aname, const  double qq, const long double mm,
 
 
 void TParticle::derivs(const state_type &y, state_type &dydx, const value_type x, const TFieldManager *field) const{
+	PROFILE_COUNT(DERIVATIVES, 1);
 	double B[3], dBidxj[3][3], E[3], V; // magnetic/electric field and electric potential in lab frame
 	if (q != 0 || (mu != 0 && y[7] != 0)) // if particle has charge or magnetic moment, calculate magnetic field
 		field->BField(y[0],y[1],y[2], x, B, dBidxj);
@@ -0,0 +1,256 @@
+/**
+ * \file
+ * Python extension module to evaluate PENTrack fields on NumPy arrays.
+ *
+ * Loads the [FIELDS] section of a config file into a TFieldManager once and evaluates it on arrays of points, e.g.
+ *
+ *     import pentrack
+ *     field = pentrack.FieldManager('in/config.in')
+ *     B, dBidxj = field.BField(points, t) # points: (N,3) array, t: scalar or (N,) array
+ *     V, E = field.EField(points, t)
+ *
+ * The GIL is released during field evaluation, so several threads can evaluate fields at the same time.
+ * A FieldManager therefore cannot be initialized again with another config file while other threads might be using its fields.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+#include <numpy/arrayobject.h>
+
+#include <string>
+#include <stdexcept>
+
+#include <boost/filesystem.hpp>
+
+#include "config.h"
+#include "fields.h"
+#include "globals.h"
+
+/**
+ * Python object wrapping a TFieldManager
+ */
+struct PyFieldManager{
+	PyObject_HEAD
+	TFieldManager *field; ///< fields loaded from config file
+};
+
+static void FieldManager_dealloc(PyFieldManager *self){
+	delete self->field;
+	Py_TYPE(self)->tp_free(reinterpret_cast<PyObject*>(self));
+}
+
+static int FieldManager_init(PyFieldManager *self, PyObject *args, PyObject *kwds){
+	const char *path;
+	static const char *kwlist[] = {"config", nullptr};
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "s", const_cast<char**>(kwlist), &path))
+		return -1;
+	if (self->field != nullptr){ // other threads might be evaluating the loaded fields with the GIL released
+		PyErr_SetString(PyExc_RuntimeError, "FieldManager is already initialized, create a new FieldManager to load another config file");
+		return -1;
+	}
+
+	try{
+		configpath = boost::filesystem::absolute(path); // field tables are given relative to config file
+		if (boost::filesystem::is_directory(configpath))
+			configpath /= "config.in";
+		TConfig config(configpath.native());
+		self->field = new TFieldManager(config);
+	}
+	catch (std::exception &e){
+		PyErr_SetString(PyExc_RuntimeError, e.what());
+		return -1;
+	}
+	return 0;
+}
+
+/**
+ * Check that fields are loaded and convert arguments to C-contiguous arrays of points with shape (N,3) and times with shape () or (N,)
+ *
+ * @return Returns false and sets Python exception if arguments are invalid
+ */
+static bool ParsePointsAndTimes(const PyFieldManager *self, PyObject *pointsarg, PyObject *targ, PyArrayObject *&points, PyArrayObject *&times){
+	if (self->field == nullptr){
+		PyErr_SetString(PyExc_RuntimeError, "FieldManager was not initialized");
+		return false;
+	}
+	points = reinterpret_cast<PyArrayObject*>(PyArray_FROMANY(pointsarg, NPY_DOUBLE, 2, 2, NPY_ARRAY_IN_ARRAY));
+	if (points == nullptr)
+		return false;
+	if (PyArray_DIM(points, 1) != 3){
+		PyErr_SetString(PyExc_ValueError, "points must have shape (N,3)");
+		Py_DECREF(points);
+		return false;
+	}
+
+	times = reinterpret_cast<PyArrayObject*>(PyArray_FROMANY(targ, NPY_DOUBLE, 0, 1, NPY_ARRAY_IN_ARRAY));
+	if (times == nullptr){
+		Py_DECREF(points);
+		return false;
+	}
+	if (PyArray_SIZE(times) != 1 && PyArray_SIZE(times) != PyArray_DIM(points, 0)){
+		PyErr_SetString(PyExc_ValueError, "t must be a scalar or have shape (N,)");
+		Py_DECREF(points);
+		Py_DECREF(times);
+		return false;
+	}
+	return true;
+}
+
+static PyObject* FieldManager_BField(PyFieldManager *self, PyObject *args, PyObject *kwds){
+	PyObject *pointsarg, *targ = nullptr;
+	int gradient = 1;
+	static const char *kwlist[] = {"points", "t", "gradient", nullptr};
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|Op", const_cast<char**>(kwlist), &pointsarg, &targ, &gradient))
+		return nullptr;
+
+	PyObject *zero = PyFloat_FromDouble(0.);
+	PyArrayObject *points, *times;
+	bool valid = ParsePointsAndTimes(self, pointsarg, targ ? targ : zero, points, times);
+	Py_DECREF(zero);
+	if (!valid)
+		return nullptr;
+
+	npy_intp N = PyArray_DIM(points, 0);
+	npy_intp Bdims[2] = {N, 3}, dBdims[3] = {N, 3, 3};
+	PyArrayObject *B = reinterpret_cast<PyArrayObject*>(PyArray_SimpleNew(2, Bdims, NPY_DOUBLE));
+	PyArrayObject *dB = gradient ? reinterpret_cast<PyArrayObject*>(PyArray_SimpleNew(3, dBdims, NPY_DOUBLE)) : nullptr;
+	if (B == nullptr || (gradient && dB == nullptr)){
+		Py_DECREF(points);
+		Py_DECREF(times);
+		Py_XDECREF(B);
+		Py_XDECREF(dB);
+		return nullptr;
+	}
+
+	const double *x = static_cast<const double*>(PyArray_DATA(points));
+	const double *t = static_cast<const double*>(PyArray_DATA(times));
+	npy_intp tstride = PyArray_SIZE(times) > 1 ? 1 : 0;
+	double *Bdata = static_cast<double*>(PyArray_DATA(B));
+	double (*dBdata)[3][3] = gradient ? static_cast<double(*)[3][3]>(PyArray_DATA(dB)) : nullptr;
+	std::string error;
+	Py_BEGIN_ALLOW_THREADS
+	try{
+		for (npy_intp i = 0; i < N; ++i)
+			self->field->BField(x[3*i], x[3*i + 1], x[3*i + 2], t[i*tstride], &Bdata[3*i], dBdata ? dBdata[i] : nullptr);
+	}
+	catch (std::exception &e){
+		error = e.what();
+	}
+	Py_END_ALLOW_THREADS
+
+	Py_DECREF(points);
+	Py_DECREF(times);
+	if (!error.empty()){
+		Py_DECREF(B);
+		Py_XDECREF(dB);
+		PyErr_SetString(PyExc_RuntimeError, error.c_str());
+		return nullptr;
+	}
+	if (dB == nullptr){
+		Py_INCREF(Py_None);
+		dB = reinterpret_cast<PyArrayObject*>(Py_None);
+	}
+	return Py_BuildValue("NN", B, dB);
+}
+
+static PyObject* FieldManager_EField(PyFieldManager *self, PyObject *args, PyObject *kwds){
+	PyObject *pointsarg, *targ = nullptr;
+	static const char *kwlist[] = {"points", "t", nullptr};
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", const_cast<char**>(kwlist), &pointsarg, &targ))
+		return nullptr;
+
+	PyObject *zero = PyFloat_FromDouble(0.);
+	PyArrayObject *points, *times;
+	bool valid = ParsePointsAndTimes(self, pointsarg, targ ? targ : zero, points, times);
+	Py_DECREF(zero);
+	if (!valid)
+		return nullptr;
+
+	npy_intp N = PyArray_DIM(points, 0);
+	npy_intp Edims[2] = {N, 3};
+	PyArrayObject *V = reinterpret_cast<PyArrayObject*>(PyArray_SimpleNew(1, &N, NPY_DOUBLE));
+	PyArrayObject *E = reinterpret_cast<PyArrayObject*>(PyArray_SimpleNew(2, Edims, NPY_DOUBLE));
+	if (V == nullptr || E == nullptr){
+		Py_DECREF(points);
+		Py_DECREF(times);
+		Py_XDECREF(V);
+		Py_XDECREF(E);
+		return nullptr;
+	}
+
+	const double *x = static_cast<const double*>(PyArray_DATA(points));
+	const double *t = static_cast<const double*>(PyArray_DATA(times));
+	npy_intp tstride = PyArray_SIZE(times) > 1 ? 1 : 0;
+	double *Vdata = static_cast<double*>(PyArray_DATA(V));
+	double *Edata = static_cast<double*>(PyArray_DATA(E));
+	std::string error;
+	Py_BEGIN_ALLOW_THREADS
+	try{
+		for (npy_intp i = 0; i < N; ++i)
+			self->field->EField(x[3*i], x[3*i + 1], x[3*i + 2], t[i*tstride], Vdata[i], &Edata[3*i]);
+	}
+	catch (std::exception &e){
+		error = e.what();
+	}
+	Py_END_ALLOW_THREADS
+
+	Py_DECREF(points);
+	Py_DECREF(times);
+	if (!error.empty()){
+		Py_DECREF(V);
+		Py_DECREF(E);
+		PyErr_SetString(PyExc_RuntimeError, error.c_str());
+		return nullptr;
+	}
+	return Py_BuildValue("NN", V, E);
+}
+
+static PyMethodDef FieldManager_methods[] = {
+	{"BField", reinterpret_cast<PyCFunction>(reinterpret_cast<void(*)()>(FieldManager_BField)), METH_VARARGS | METH_KEYWORDS,
+			"BField(points, t=0, gradient=True)\n\n"
+			"Calculate magnetic field at points (array of shape (N,3)) [m] and time t (scalar or array of shape (N,)) [s].\n"
+			"Returns magnetic field B (N,3) [T] and its spatial derivatives dBidxj (N,3,3) [T/m], or None if gradient is False."},
+	{"EField", reinterpret_cast<PyCFunction>(reinterpret_cast<void(*)()>(FieldManager_EField)), METH_VARARGS | METH_KEYWORDS,
+			"EField(points, t=0)\n\n"
+			"Calculate electric potential and field at points (array of shape (N,3)) [m] and time t (scalar or array of shape (N,)) [s].\n"
+			"Returns electric potential V (N,) [V] and electric field E (N,3) [V/m]."},
+	{nullptr, nullptr, 0, nullptr}
+};
+
+static PyTypeObject FieldManagerType = {
+	PyVarObject_HEAD_INIT(nullptr, 0)
+	"pentrack.FieldManager", // tp_name
+	sizeof(PyFieldManager), // tp_basicsize
+};
+
+static PyModuleDef pentrackmodule = {
+	PyModuleDef_HEAD_INIT,
+	"pentrack", // m_name
+	"Evaluate PENTrack fields on NumPy arrays", // m_doc
+	-1, // m_size
+};
+
+PyMODINIT_FUNC PyInit_pentrack(){
+	import_array();
+
+	FieldManagerType.tp_dealloc = reinterpret_cast<destructor>(FieldManager_dealloc);
+	FieldManagerType.tp_flags = Py_TPFLAGS_DEFAULT;
+	FieldManagerType.tp_doc = "FieldManager(config)\n\nLoad all fields from [FIELDS] section of config file (or config.in in given directory).";
+	FieldManagerType.tp_methods = FieldManager_methods;
+	FieldManagerType.tp_init = reinterpret_cast<initproc>(FieldManager_init);
+	FieldManagerType.tp_new = PyType_GenericNew;
+	if (PyType_Ready(&FieldManagerType) < 0)
+		return nullptr;
+
+	PyObject *m = PyModule_Create(&pentrackmodule);
+	if (m == nullptr)
+		return nullptr;
+	Py_INCREF(&FieldManagerType);
+	if (PyModule_AddObject(m, "FieldManager", reinterpret_cast<PyObject*>(&FieldManagerType)) < 0){
+		Py_DECREF(&FieldManagerType);
+		Py_DECREF(m);
+		return nullptr;
+	}
+	return m;
+}
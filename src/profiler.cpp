@@ -0,0 +1,56 @@
+#include "profiler.h"
+
+#include <fstream>
+#include <iomanip>
+#include <stdexcept>
+
+using namespace std;
+
+const std::array<std::string, TProfile::NCOUNTERS> TProfile::counternames = {{"particles", "steps", "ballistic_steps", "rejected_steps", "derivative_evaluations",
+                                                                               "substep_splits", "collision_queries",
+                                                                               "skipped_collision_queries", "spin_steps", "log_rows"}};
+const std::array<std::string, TProfile::NPHASES> TProfile::phasenames = {{"integration", "collision_check", "spin_integration",
+                                                                           "bfield", "efield", "logging"}};
+
+thread_local TProfile *currentprofile = nullptr;
+
+TProfile& TProfile::operator+=(const TProfile &p){
+    for (int i = 0; i < NCOUNTERS; ++i)
+        counts[i] += p.counts[i];
+    for (int i = 0; i < NPHASES; ++i){
+        calls[i] += p.calls[i];
+        seconds[i] += p.seconds[i];
+    }
+    return *this;
+}
+
+void WriteProfile(const boost::filesystem::path &outfile, const TProfiles &profiles, const double walltime){
+    ofstream out(outfile.native());
+    if (!out.is_open())
+        throw runtime_error("Could not open " + outfile.native());
+
+    TProfile total;
+    for (auto &p: profiles)
+        total += p.second;
+    TProfiles all(profiles);
+    all["all"] = total;
+
+    out << "# wall time of simulation: " << walltime << " s\n";
+    out << "# times are summed over all threads, phases can be nested (e.g. field evaluations are part of integration steps and spin integration)\n";
+    out << "particle phase calls seconds seconds_per_call fraction_of_walltime\n";
+    for (auto &p: all){
+        for (int i = 0; i < TProfile::NPHASES; ++i){
+            const TProfile &prof = p.second;
+            out << p.first << ' ' << TProfile::phasenames[i] << ' ' << prof.calls[i] << ' ' << prof.seconds[i] << ' '
+                << (prof.calls[i] > 0 ? prof.seconds[i]/prof.calls[i] : 0.) << ' ' << (walltime > 0 ? prof.seconds[i]/walltime : 0.) << '\n';
+        }
+    }
+    out << "\nparticle counter count per_particle\n";
+    for (auto &p: all){
+        for (int i = 0; i < TProfile::NCOUNTERS; ++i){
+            const TProfile &prof = p.second;
+            out << p.first << ' ' << TProfile::counternames[i] << ' ' << prof.counts[i] << ' '
+                << (prof.counts[TProfile::PARTICLES] > 0 ? static_cast<double>(prof.counts[i])/prof.counts[TProfile::PARTICLES] : 0.) << '\n';
+        }
+    }
+}
@@ -0,0 +1,127 @@
+#include "stepper.h"
+
+#include <cmath>
+#include <algorithm>
+#include <limits>
+
+#include "globals.h"
+
+using namespace std;
+
+namespace{
+
+/**
+ * Length of trajectory with constant acceleration
+ *
+ * @param v Initial velocity
+ * @param a Acceleration
+ * @param tau Duration
+ *
+ * @return Returns integral of |v + a*t| from 0 to tau
+ */
+double ArcLength(const double v[3], const array<double, 3> &a, const double tau){
+	double A = a[0]*a[0] + a[1]*a[1] + a[2]*a[2];
+	double vabs = sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2]);
+	if (A == 0)
+		return vabs*tau;
+	double sqrtA = sqrt(A);
+	// |v + a*t| = sqrt(A)*sqrt(u^2 + k^2) with u = t + v.a/A and k = |v x a|/A
+	double k = sqrt(pow(v[1]*a[2] - v[2]*a[1], 2) + pow(v[2]*a[0] - v[0]*a[2], 2) + pow(v[0]*a[1] - v[1]*a[0], 2))/A;
+	auto F = [k](const double u){ return k > 0 ? u*sqrt(u*u + k*k) + k*k*asinh(u/k) : u*abs(u); }; // antiderivative of 2*sqrt(u^2 + k^2)
+	double u0 = (v[0]*a[0] + v[1]*a[1] + v[2]*a[2])/A;
+	return 0.5*sqrtA*(F(u0 + tau) - F(u0));
+}
+
+}
+
+
+void TDenseStepper::do_ballistic_step(const state_type &y, const value_type t, const value_type dt, const array<double, 3> &a){
+	ballistic = true;
+	t0 = t;
+	t1 = t + dt;
+	y0 = y;
+	acceleration = a;
+	y1.resize(y.size());
+	calc_state(t1, y1);
+}
+
+
+void TDenseStepper::calc_state(const value_type t, state_type &y) const{
+	if (not ballistic){
+		odeint.calc_state(t, y);
+		return;
+	}
+	double tau = t - t0;
+	const double *v = &y0[3];
+	const array<double, 3> &a = acceleration;
+	y = y0;
+	for (int i = 0; i < 3; ++i){
+		y[i] = y0[i] + v[i]*tau + 0.5*a[i]*tau*tau;
+		y[i + 3] = v[i] + a[i]*tau;
+	}
+	// proper time is integral of sqrt(1 - v^2/c^2), expanded to first order in v^2/c^2
+	double v2integral = (v[0]*v[0] + v[1]*v[1] + v[2]*v[2])*tau + (v[0]*a[0] + v[1]*a[1] + v[2]*a[2])*tau*tau + (a[0]*a[0] + a[1]*a[1] + a[2]*a[2])*tau*tau*tau/3.;
+	y[6] = y0[6] + tau - 0.5*v2integral/c_0/c_0;
+	y[8] = y0[8] + ArcLength(v, a, tau);
+}
+
+
+void TDenseStepper::calc_ballistic_box(const value_type ta, const value_type tb, double min[3], double max[3]) const{
+	state_type ya(y0.size());
+	calc_state(ta, ya);
+	calc_ballistic_box(ya, tb - ta, acceleration, min, max);
+}
+
+
+void TDenseStepper::calc_ballistic_box(const state_type &y, const value_type dt, const array<double, 3> &a, double min[3], double max[3]){
+	for (int i = 0; i < 3; ++i){
+		double end = y[i] + y[i + 3]*dt + 0.5*a[i]*dt*dt;
+		min[i] = std::min(y[i], end);
+		max[i] = std::max(y[i], end);
+		if (a[i] != 0){
+			double tturn = -y[i + 3]/a[i]; // time at which velocity component changes sign
+			if (0 < tturn and tturn < dt){
+				double turn = y[i] + 0.5*y[i + 3]*tturn;
+				min[i] = std::min(min[i], turn);
+				max[i] = std::max(max[i], turn);
+			}
+		}
+	}
+}
+
+
+bool TDenseStepper::calc_ballistic_crossing(const value_type ta, const value_type tb, const double normal[3], const double point[3], value_type &t) const{
+	// solve c + b*tau + a/2*tau^2 = 0 for distance to plane along normal
+	double a = 0, b = 0, c = 0;
+	for (int i = 0; i < 3; ++i){
+		a += normal[i]*acceleration[i];
+		b += normal[i]*y0[i + 3];
+		c += normal[i]*(y0[i] - point[i]);
+	}
+	vector<double> roots;
+	if (a == 0){
+		if (b != 0)
+			roots.push_back(-c/b);
+	}
+	else{
+		double discriminant = b*b - 2*a*c;
+		if (discriminant < 0)
+			return false;
+		double q = -(b + copysign(sqrt(discriminant), b)); // numerically stable solution of quadratic equation
+		roots.push_back(q/a);
+		if (q != 0)
+			roots.push_back(2*c/q);
+	}
+	t = numeric_limits<value_type>::infinity();
+	for (double tau: roots){
+		if (ta <= t0 + tau and t0 + tau <= tb)
+			t = std::min(t, t0 + tau);
+	}
+	return t <= tb;
+}
+
+
+double TDenseStepper::calc_ballistic_deviation(const value_type ta, const value_type tb) const{
+	double a = sqrt(acceleration[0]*acceleration[0] + acceleration[1]*acceleration[1] + acceleration[2]*acceleration[2]);
+	return 0.125*a*(tb - ta)*(tb - ta); // parabola deviates at most by a*T^2/8 from its chord
+}
@@ -16,6 +16,9 @@ TTracker::TTracker(TConfig& config){
 
 void TTracker::IntegrateParticle(std::unique_ptr<TParticle>& p, const double tmax, std::map<std::string, std::string> &particleconf,
         TMCGenerator &mc, const TGeometry &geom, const TFieldManager &field){
+    PROFILE_SCOPE(profiling ? &profiles[p->GetName()] : nullptr);
+    PROFILE_COUNT(PARTICLES, 1);
+
     double tau = 0;
     istringstream(particleconf["tau"]) >> tau;
     if (tau > 0){
@@ -48,6 +51,12 @@ void TTracker::IntegrateParticle(std::unique_ptr<TParticle>& p, const double tma
     bool spininterpolatefields = false;
     istringstream(particleconf["interpolatefields"]) >> spininterpolatefields;
 
+    bool analyticspin = false;
+    istringstream(particleconf["analyticspin"]) >> analyticspin;
+
+    bool ballistic = false;
+    istringstream(particleconf["ballistic"]) >> ballistic;
+
     double SpinBmax = 0;
     vector<double> SpinTimes;
     istringstream(particleconf["Bmax"]) >> SpinBmax;
@@ -66,22 +75,36 @@ void TTracker::IntegrateParticle(std::unique_ptr<TParticle>& p, const double tma
 //	progress_display progress(100, cout, ' ' + to_string(particlenumber) + ' ');
 
     currentsolids = geom.GetSolids(x, &y[0]);
+    saferadius = 0; // sphere might have been found in a different geometry
     p->SetStopID(ID_UNKNOWN);
 
     while (p->GetStopID() == ID_UNKNOWN){ // integrate as long as nothing happened to particle
-        if (resetintegration){
-            stepper.initialize(y, x, stepper.current_time_step()); // (re-)start integration with last step size
-        }
         value_type x1 = x; // save point before next step
         state_type y1 = y;
 
-        try{
-            stepper.do_step(std::bind(&TParticle::derivs, p.get(), std::placeholders::_1, std::placeholders::_2, std::placeholders::_3, &field));
+        if (ballistic and BallisticStep(x, y, tmax, stepper, field)){
+            PROFILE_COUNT(BALLISTIC_STEPS, 1);
             x = stepper.current_time();
             y = stepper.current_state();
         }
-        catch(...){ // catch Exceptions thrown by odeint
-            p->SetStopID(ID_ODEINT_ERROR);
+        else{
+            if (stepper.is_ballistic()){
+                stepper.initialize(y, x, 10.*MAX_TRACK_DEVIATION/sqrt(y[3]*y[3] + y[4]*y[4] + y[5]*y[5])); // particle entered a field, hand back to numerical integration
+            }
+            else if (resetintegration){
+                stepper.initialize(y, x, stepper.current_time_step()); // (re-)start integration with last step size
+            }
+
+            try{
+                PROFILE_TIMER(INTEGRATION);
+                PROFILE_STEP();
+                stepper.do_step(std::bind(&TParticle::derivs, p.get(), std::placeholders::_1, std::placeholders::_2, std::placeholders::_3, &field));
+                x = stepper.current_time();
+                y = stepper.current_state();
+            }
+            catch(...){ // catch Exceptions thrown by odeint
+                p->SetStopID(ID_ODEINT_ERROR);
+            }
         }
 
         if (tau > 0 && y[6] > tau){ // if proper time is larger than lifetime
@@ -102,9 +125,23 @@ void TTracker::IntegrateParticle(std::unique_ptr<TParticle>& p, const double tma
             double dev2 = 0.25*(l2 - d2); // max. possible squared deviation of real path from straight line
             value_type x2 = x;
             state_type y2 = y;
-            if (dev2 > MAX_TRACK_DEVIATION*MAX_TRACK_DEVIATION){ // if deviation is larger than MAX_TRACK_DEVIATION
+            if (stepper.is_ballistic()){
+                // halve parabola until it is close to a straight line or no surface is close to it
+                double min[3], max[3];
+                while (stepper.calc_ballistic_deviation(x1, x2) > MAX_TRACK_DEVIATION){
+                    stepper.calc_ballistic_box(x1, x2, min, max);
+                    if (not geom.SurfaceInBox(min, max))
+                        break;
+                    x2 = x1 + 0.5*(x2 - x1);
+                    PROFILE_COUNT(SUBSTEP_SPLITS, 1);
+                }
+                if (x2 < x)
+                    stepper.calc_state(x2, y2);
+            }
+            else if (dev2 > MAX_TRACK_DEVIATION*MAX_TRACK_DEVIATION){ // if deviation is larger than MAX_TRACK_DEVIATION
 //				cout << "split " << x - x1 << " " << sqrt(l2) << " " << sqrt(d2) << " " << sqrt(dev2) << "\n";
                 x2 = x1 + (x - x1)/ceil(sqrt(dev2)/MAX_TRACK_DEVIATION); // split step to reduce deviation
+                PROFILE_COUNT(SUBSTEP_SPLITS, 1);
                 stepper.calc_state(x2, y2);
                 assert(x2 <= x);
             }
@@ -112,7 +149,10 @@ void TTracker::IntegrateParticle(std::unique_ptr<TParticle>& p, const double tma
 //			d2 = pow(y2[0] - y1[0], 2) + pow(y2[1] - y1[1], 2) + pow(y2[2] - y1[2], 2);
 //			cout << x2 - x1 << " " << sqrt(l2) << " " << sqrt(d2) << " " << 0.5*sqrt(l2 - d2) << "\n";
 
-            resetintegration = CheckHit(p, x1, y1, x2, y2, stepper, mc, geom, field); // check if particle hit a material boundary or was absorbed between y1 and y2
+            {
+                PROFILE_TIMER(COLLISION_CHECK);
+                resetintegration = CheckHit(p, x1, y1, x2, y2, stepper, mc, geom, field); // check if particle hit a material boundary or was absorbed between y1 and y2
+            }
             if (resetintegration){
                 x = x2; // if particle path was changed: reset integration end point
                 y = y2;
@@ -125,7 +165,10 @@ void TTracker::IntegrateParticle(std::unique_ptr<TParticle>& p, const double tma
         // take snapshots at certain times
         logger->PrintSnapshot(p, stepper.previous_time(), stepper.previous_state(), x, y, spin, stepper, geom, field);
 
-        IntegrateSpin(p, spin, stepper, x, y, SpinTimes, field, spininterpolatefields, SpinBmax, mc, flipspin); // calculate spin precession and spin-flip probability
+        {
+            PROFILE_TIMER(SPIN_INTEGRATION);
+            IntegrateSpin(p, spin, stepper, x, y, SpinTimes, field, spininterpolatefields, SpinBmax, mc, flipspin, analyticspin); // calculate spin precession and spin-flip probability
+        }
 
         logger->PrintTrack(p, stepper.previous_time(), stepper.previous_state(), x, y, spin, GetCurrentsolid(), field);
 
@@ -177,12 +220,17 @@ bool TTracker::CheckHit(const std::unique_ptr<TParticle>& p, const value_type x1
 
     multimap<TCollision, bool> colls;
     bool collfound = false;
-    try{
-        collfound = geom.GetCollisions(x1, &y1[0], x2, &y2[0], colls);
+    if (SegmentIsSafe(y1, y2, geom)){
+        PROFILE_COUNT(SKIPPED_COLLISION_QUERIES, 1);
     }
-    catch(...){
-        p->SetStopID(ID_CGAL_ERROR);
-        return true;
+    else{
+        try{
+            collfound = geom.GetCollisions(x1, &y1[0], x2, &y2[0], colls);
+        }
+        catch(...){
+            p->SetStopID(ID_CGAL_ERROR);
+            return true;
+        }
     }
 
     if (collfound){	// if there is a collision with a wall
@@ -190,7 +238,8 @@ bool TTracker::CheckHit(const std::unique_ptr<TParticle>& p, const value_type x1
 //    for (auto c: colls)
 //      cout << x1 << " " << x2 - x1 << " " << c.first.distnormal << " " << c.first.s << " " << c.first.ID << endl;
         state_type yc1 = y1, yc2 = y2;
-        if (iterate_collision(xc1, yc1, xc2, yc2, colls.begin()->first, stepper, geom)){
+        if ((stepper.is_ballistic() and find_ballistic_collision(xc1, yc1, xc2, yc2, colls.begin()->first, stepper, geom))
+                or iterate_collision(xc1, yc1, xc2, yc2, colls.begin()->first, stepper, geom)){
             if (xc1 > x1 && DoStep(p, x1, y1, xc1, yc1, stepper, currentsolid, mc, field)){
                 x2 = xc1;
                 y2 = yc1;
@@ -215,6 +264,61 @@ bool TTracker::CheckHit(const std::unique_ptr<TParticle>& p, const value_type x1
     return false;
 }
 
+bool TTracker::BallisticStep(const value_type x, const state_type &y, const value_type tmax, dense_stepper_type &stepper, const TFieldManager &field) const{
+    double v = sqrt(y[3]*y[3] + y[4]*y[4] + y[5]*y[5]);
+    if (v > MAX_BALLISTIC_VELOCITY)
+        return false;
+    const std::array<double, 3> gravity = {0., 0., -static_cast<double>(gravconst)};
+    double dtmin = 10.*MAX_TRACK_DEVIATION/v; // same as initial step of numerical integration
+    for (double dt = min(MAX_BALLISTIC_STEP, tmax - x); dt >= dtmin; dt *= 0.5){
+        double min[3], max[3];
+        dense_stepper_type::calc_ballistic_box(y, dt, gravity, min, max);
+        if (field.IsFieldFree(min, max)){
+            stepper.do_ballistic_step(y, x, dt, gravity);
+            return true;
+        }
+    }
+    return false;
+}
+
+bool TTracker::find_ballistic_collision(value_type &x1, state_type &y1, value_type &x2, state_type &y2,
+        const TCollision &coll, const dense_stepper_type &stepper, const TGeometry &geom) const{
+    double point[3]; // point where chord hit the surface
+    for (int i = 0; i < 3; ++i)
+        point[i] = y1[i] + coll.s*(y2[i] - y1[i]);
+    value_type xc;
+    if (not stepper.calc_ballistic_crossing(x1, x2, coll.normal, point, xc))
+        return false;
+    state_type yc(y1.size()), yc1(y1.size()), yc2(y1.size());
+    stepper.calc_state(xc, yc);
+    double dt = 0.25*REFLECT_TOLERANCE/sqrt(yc[3]*yc[3] + yc[4]*yc[4] + yc[5]*yc[5]); // segment around crossing point is shorter than REFLECT_TOLERANCE
+    value_type xc1 = std::max(x1, xc - dt), xc2 = std::min(x2, xc + dt);
+    stepper.calc_state(xc1, yc1);
+    stepper.calc_state(xc2, yc2);
+
+    multimap<TCollision, bool> colls;
+    if (not geom.GetCollisions(xc1, &yc1[0], xc2, &yc2[0], colls))
+        return false; // parabola crossed plane outside of surface
+    if (xc1 > x1 and geom.GetCollisions(x1, &y1[0], xc1, &yc1[0], colls))
+        return false; // trajectory might hit another surface first
+    x1 = xc1;
+    y1 = yc1;
+    x2 = xc2;
+    y2 = yc2;
+    return true;
+}
+
+bool TTracker::SegmentIsSafe(const state_type &y1, const state_type &y2, const TGeometry &geom){
+    auto insphere = [this](const state_type &y){
+        return pow(y[0] - safecenter[0], 2) + pow(y[1] - safecenter[1], 2) + pow(y[2] - safecenter[2], 2) < saferadius*saferadius;
+    };
+    if (insphere(y1) and insphere(y2)) // segment lies inside sphere found before
+        return true;
+    saferadius = geom.SafeDistance(&y1[0]);
+    safecenter = {y1[0], y1[1], y1[2]};
+    return insphere(y2);
+}
+
 bool TTracker::iterate_collision(value_type &x1, state_type &y1, value_type &x2, state_type &y2,
         const TCollision &coll, const dense_stepper_type &stepper, const TGeometry &geom, unsigned int iteration){
     if (pow(y2[0] - y1[0], 2) + pow(y2[1] - y1[1], 2) + pow(y2[2] - y1[2], 2) < REFLECT_TOLERANCE*REFLECT_TOLERANCE){
@@ -278,7 +382,7 @@ bool TTracker::DoHit(const std::unique_ptr<TParticle>& p, const value_type x1, c
     vector<pair<solid, bool> > newsolids = currentsolids;
     for (auto coll: colls){
 //    cout << x1 << " " << x2 - x1 << " " << coll.first.distnormal << " " << coll.first.s << " " << coll.first.ID << endl;
-        solid sld = geom.GetSolid(coll.first.ID);
+        const solid &sld = geom.GetSolid(coll.first.ID);
         auto foundsld = find_if(newsolids.begin(), newsolids.end(), [&sld](const std::pair<solid, bool> s){ return s.first.ID == sld.ID; });
         if (coll.first.distnormal < 0){ // if entering solid
             if (foundsld != newsolids.end()){ // if solid has been entered before (self-intersecting surface)
@@ -362,7 +466,7 @@ const solid& TTracker::GetCurrentsolid() const{
 
 void TTracker::IntegrateSpin(const std::unique_ptr<TParticle>& p, state_type &spin, const dense_stepper_type &stepper,
         const double x2, state_type &y2, const std::vector<double> &times, const TFieldManager &field,
-        const bool interpolatefields, const double Bmax, TMCGenerator &mc, const bool flipspin) const{
+        const bool interpolatefields, const double Bmax, TMCGenerator &mc, const bool flipspin, const bool analyticspin) const{
     value_type x1 = stepper.previous_time();
     if (p->GetGyromagneticRatio() == 0 || x1 == x2)
         return;
@@ -421,29 +525,39 @@ void TTracker::IntegrateSpin(const std::unique_ptr<TParticle>& p, state_type &sp
         }
 
 
-        dense_stepper_type spinstepper = boost::numeric::odeint::make_dense_output(1e-12, 1e-12, stepper_type());
-        spinstepper.initialize(spin, x1, std::abs(pi/p->GetGyromagneticRatio()/Babs1)); // initialize integrator with step size = half rotation
-        logger->PrintSpin(p, x1, spinstepper, stepper, field);
-        unsigned int steps = 0;
-        while (true){
-            if (quit.load())
-                return;
+        value_type xs = x1;
+        if (analyticspin){
+            logger->PrintSpin(p, x1, x1, spin, stepper, field);
+            xs = PropagateSpin(p, spin, stepper, x1, x2, field, omega_int); // propagate spin analytically as long as field changes adiabatically
+        }
 
-            // take an integration step, SpinDerivs contains right-hand side of equation of motion
-            spinstepper.do_step(std::bind(&TParticle::SpinDerivs, p.get(), std::placeholders::_1, std::placeholders::_2, std::placeholders::_3, stepper, &field, omega_int));
-            steps++;
-            double t = spinstepper.current_time();
-            if (t > x2){ // if stepper overshot, calculate end point and stop
-                t = x2;
-                spinstepper.calc_state(t, spin);
-            }
-            else
-                spin = spinstepper.current_state();
+        if (xs < x2){ // integrate remaining step with ODE stepper
+            dense_stepper_type spinstepper = boost::numeric::odeint::make_dense_output(1e-12, 1e-12, stepper_type());
+            spinstepper.initialize(spin, xs, std::abs(pi/p->GetGyromagneticRatio()/Babs1)); // initialize integrator with step size = half rotation
+            if (not analyticspin)
+                logger->PrintSpin(p, x1, spinstepper, stepper, field);
+            unsigned int steps = 0;
+            while (true){
+                if (quit.load())
+                    return;
+
+                // take an integration step, SpinDerivs contains right-hand side of equation of motion
+                spinstepper.do_step(std::bind(&TParticle::SpinDerivs, p.get(), std::placeholders::_1, std::placeholders::_2, std::placeholders::_3, stepper, &field, omega_int));
+                steps++;
+                PROFILE_COUNT(SPIN_STEPS, 1);
+                double t = spinstepper.current_time();
+                if (t > x2){ // if stepper overshot, calculate end point and stop
+                    t = x2;
+                    spinstepper.calc_state(t, spin);
+                }
+                else
+                    spin = spinstepper.current_state();
 
-            logger->PrintSpin(p, t, spinstepper, stepper, field);
+                logger->PrintSpin(p, t, spinstepper, stepper, field);
 
-            if (t >= x2)
-                break;
+                if (t >= x2)
+                    break;
+            }
         }
 
         // calculate new spin projection
@@ -472,3 +586,77 @@ void TTracker::IntegrateSpin(const std::unique_ptr<TParticle>& p, state_type &sp
         spin[2] = B2[2]*y2[7]/Babs2;
     }
 }
+
+double TTracker::PropagateSpin(const std::unique_ptr<TParticle>& p, state_type &spin, const dense_stepper_type &stepper,
+        const double x1, const double x2, const TFieldManager &field, const std::vector<alglib::spline1dinterpolant> &omega_int) const{
+    auto precessionaxis = [&](const double t, double W[3]){
+        if (omega_int.size() == 3){ // if interpolator exists, use it
+            for (int i = 0; i < 3; ++i)
+                W[i] = alglib::spline1dcalc(omega_int[i], t);
+        }
+        else
+            p->SpinPrecessionAxis(t, stepper, field, W[0], W[1], W[2]);
+    };
+
+    // rotate spin state S by one fourth-order Magnus step of length h, using precession axes W0, Wm, and W1 at start, middle, and end of step
+    // returns adiabaticity parameter (angle between precession axes at start and end of step relative to precession angle)
+    auto magnusstep = [](const double h, const double W0[3], const double Wm[3], const double W1[3], state_type &S){
+        double W0abs = sqrt(W0[0]*W0[0] + W0[1]*W0[1] + W0[2]*W0[2]);
+        double Wmabs = sqrt(Wm[0]*Wm[0] + Wm[1]*Wm[1] + Wm[2]*Wm[2]);
+        double W1abs = sqrt(W1[0]*W1[0] + W1[1]*W1[1] + W1[2]*W1[2]);
+        double C[3] = {W0[1]*W1[2] - W0[2]*W1[1], W0[2]*W1[0] - W0[0]*W1[2], W0[0]*W1[1] - W0[1]*W1[0]};
+
+        // rotation vector theta = h/6*(W0 + 4*Wm + W1) - h^2/12*(W0 x W1)
+        double theta[3];
+        for (int i = 0; i < 3; ++i)
+            theta[i] = h/6.*(W0[i] + 4.*Wm[i] + W1[i]) - h*h/12.*C[i];
+        double angle = sqrt(theta[0]*theta[0] + theta[1]*theta[1] + theta[2]*theta[2]);
+        if (angle > 0){ // Rodrigues' rotation formula
+            double k[3] = {theta[0]/angle, theta[1]/angle, theta[2]/angle};
+            double kS = k[0]*S[0] + k[1]*S[1] + k[2]*S[2];
+            double kxS[3] = {k[1]*S[2] - k[2]*S[1], k[2]*S[0] - k[0]*S[2], k[0]*S[1] - k[1]*S[0]};
+            double cosa = cos(angle), sina = sin(angle);
+            for (int i = 0; i < 3; ++i)
+                S[i] = S[i]*cosa + kxS[i]*sina + k[i]*kS*(1. - cosa);
+        }
+        S[3] += h; // time
+        S[4] += h/6.*(W0abs + 4.*Wmabs + W1abs); // precession phase
+
+        double Wmin = std::min(W0abs, W1abs);
+        if (Wmin == 0)
+            return W0abs == W1abs ? 0. : std::numeric_limits<double>::infinity();
+        return std::atan2(sqrt(C[0]*C[0] + C[1]*C[1] + C[2]*C[2]), W0[0]*W1[0] + W0[1]*W1[1] + W0[2]*W1[2])/h/Wmin;
+    };
+
+    value_type t = x1, h = x2 - x1;
+    double W0[3], Wq1[3], Wm[3], Wq3[3], W1[3];
+    precessionaxis(t, W0);
+    while (t < x2){
+        if (quit.load())
+            return t;
+
+        h = std::min(h, x2 - t);
+        value_type tend = h == x2 - t ? x2 : t + h;
+        precessionaxis(t + 0.5*h, Wm);
+        precessionaxis(tend, W1);
+        state_type S1 = spin, S2 = spin;
+        if (magnusstep(h, W0, Wm, W1, S1) > SPIN_ADIABATICITY_LIMIT) // one full step
+            return t; // leave non-adiabatic part of step to ODE stepper
+
+        precessionaxis(t + 0.25*h, Wq1);
+        precessionaxis(t + 0.75*h, Wq3);
+        magnusstep(0.5*h, W0, Wq1, Wm, S2); // two half steps
+        magnusstep(0.5*h, Wm, Wq3, W1, S2);
+        PROFILE_COUNT(SPIN_STEPS, 1);
+
+        double err = sqrt(pow(S2[0] - S1[0], 2) + pow(S2[1] - S1[1], 2) + pow(S2[2] - S1[2], 2))/15.; // Richardson estimate of local error
+        if (err <= SPIN_PROPAGATOR_TOLERANCE){
+            logger->PrintSpin(p, t, tend, S2, stepper, field);
+            t = tend;
+            spin = S2;
+            std::copy(W1, W1 + 3, W0);
+        }
+        h *= std::min(4., std::max(0.2, 0.9*pow(SPIN_PROPAGATOR_TOLERANCE/err, 0.2)));
+    }
+    return x2;
+}
@@ -1,7 +1,9 @@
 #include "trianglemesh.h"
+#include "profiler.h"
 
 #include <fstream>
 #include <random>
+#include <limits>
 #include <boost/format.hpp>
 #include <CGAL/Polygon_mesh_processing/polygon_soup_to_polygon_mesh.h>
 #include <CGAL/Polygon_mesh_processing/repair_polygon_soup.h>
@@ -118,35 +120,263 @@ std::string TTriangleMesh::ReadFile(const std::string &filename, const int ID){
     std::discrete_distribution<size_t> triangle_sampler(areas.begin(), areas.end());
 
     std::unique_ptr<CTree> tree(new CTree(mesh->faces_begin(), mesh->faces_end(), *mesh));
+    tree->build(); // build tree now instead of lazily on first query, so it can be shared by several threads
     tree->accelerate_distance_queries();
 
     std::vector<double> total_areas;
     std::transform(meshes.begin(), meshes.end(), std::back_inserter(total_areas), [](const CTriangleMesh &m){ return CGAL::Polygon_mesh_processing::area(*m.mesh); });
     mesh_sampler = std::discrete_distribution<size_t>(total_areas.begin(), total_areas.end());
 
+    scenebox += tree->bbox();
     meshes.push_back({std::move(mesh), std::move(tree), ID, triangle_sampler});
+    if (affected_components == 0) // voxels can only be classified consistently if the mesh is closed
+        BuildVoxelGrid(meshes.back());
+    scenetree.reset(); // scene tree would not contain new mesh
+    distances.clear(); // distance field would not contain new mesh
 
 	return sldname;
 }
 
 
+void TTriangleMesh::BuildVoxelGrid(CTriangleMesh &m) const{
+    CGAL::Bbox_3 box = m.tree->bbox();
+    std::array<double, 3> extent = {box.xmax() - box.xmin(), box.ymax() - box.ymin(), box.zmax() - box.zmin()};
+    double maxextent = *std::max_element(extent.begin(), extent.end());
+    double h = std::max(std::cbrt(extent[0]*extent[1]*extent[2]/MAX_VOXELS), maxextent/MAX_VOXELS_PER_AXIS); // edge length of cubic voxels
+    while (true){
+        for (int i = 0; i < 3; ++i)
+            m.voxelcount[i] = std::max<std::size_t>(1, std::ceil(extent[i]/h));
+        if (m.voxelcount[0]*m.voxelcount[1]*m.voxelcount[2] <= MAX_VOXELS)
+            break;
+        h *= 1.1; // flat meshes need larger voxels
+    }
+    m.voxelorigin = {box.xmin(), box.ymin(), box.zmin()};
+    m.voxelend = {box.xmax(), box.ymax(), box.zmax()};
+    for (int i = 0; i < 3; ++i)
+        m.voxelsize[i] = extent[i] > 0 ? extent[i]/m.voxelcount[i] : 1.;
+
+    const signed char unknown = 2;
+    m.voxels.assign(m.voxelcount[0]*m.voxelcount[1]*m.voxelcount[2], unknown);
+    auto index = [&m](const std::array<std::size_t, 3> &v){ return (v[0]*m.voxelcount[1] + v[1])*m.voxelcount[2] + v[2]; };
+    auto voxel = [&m](const double x, const int i){ return std::min(static_cast<std::size_t>(std::max(0., (x - m.voxelorigin[i])/m.voxelsize[i])), m.voxelcount[i] - 1); };
+
+    // mark all voxels touched by a triangle, voxels are enlarged slightly to make sure rounding errors do not miss any
+    double eps = 1e-9*maxextent;
+    for (auto f: m.mesh->faces()){
+        std::vector<CPoint> vertices;
+        for (auto v: m.mesh->vertices_around_face(m.mesh->halfedge(f)))
+            vertices.push_back(m.mesh->point(v));
+        CKernel::Triangle_3 triangle(vertices[0], vertices[1], vertices[2]);
+        CGAL::Bbox_3 tbox = triangle.bbox();
+        std::array<std::size_t, 3> lo = {voxel(tbox.xmin() - eps, 0), voxel(tbox.ymin() - eps, 1), voxel(tbox.zmin() - eps, 2)};
+        std::array<std::size_t, 3> hi = {voxel(tbox.xmax() + eps, 0), voxel(tbox.ymax() + eps, 1), voxel(tbox.zmax() + eps, 2)};
+        std::array<std::size_t, 3> v;
+        for (v[0] = lo[0]; v[0] <= hi[0]; ++v[0]){
+            for (v[1] = lo[1]; v[1] <= hi[1]; ++v[1]){
+                for (v[2] = lo[2]; v[2] <= hi[2]; ++v[2]){
+                    std::array<double, 3> vmin, vmax;
+                    for (int i = 0; i < 3; ++i){
+                        vmin[i] = m.voxelorigin[i] + v[i]*m.voxelsize[i] - eps;
+                        vmax[i] = m.voxelorigin[i] + (v[i] + 1)*m.voxelsize[i] + eps;
+                    }
+                    if (CGAL::do_intersect(triangle, CGAL::Bbox_3(vmin[0], vmin[1], vmin[2], vmax[0], vmax[1], vmax[2])))
+                        m.voxels[index(v)] = -1;
+                }
+            }
+        }
+    }
+
+    // count intersections of rays in +z and -z direction from a point in voxel v, slightly off its center to avoid rays hitting edges of axis-aligned triangles
+    // returns 1 if point is inside, 0 if it is outside, -1 if the rays do not agree
+    auto classify = [&m](const std::array<std::size_t, 3> &v){
+        const std::array<double, 3> offsets = {0.5 + 0.1234567, 0.5 - 0.0987654, 0.5 + 0.0456789};
+        CPoint p(m.voxelorigin[0] + (v[0] + offsets[0])*m.voxelsize[0], m.voxelorigin[1] + (v[1] + offsets[1])*m.voxelsize[1], m.voxelorigin[2] + (v[2] + offsets[2])*m.voxelsize[2]);
+        auto up = m.tree->number_of_intersected_primitives(CKernel::Ray_3(p, CVector(0., 0., 1.))) % 2;
+        auto down = m.tree->number_of_intersected_primitives(CKernel::Ray_3(p, CVector(0., 0., -1.))) % 2;
+        return static_cast<signed char>(up == down ? up : -1);
+    };
+
+    // all voxels in a connected region not touched by the surface are either inside or outside, so only one voxel in each region has to be tested
+    std::size_t regions = 0;
+    std::vector<std::array<std::size_t, 3> > stack;
+    std::array<std::size_t, 3> v;
+    for (v[0] = 0; v[0] < m.voxelcount[0]; ++v[0]){
+        for (v[1] = 0; v[1] < m.voxelcount[1]; ++v[1]){
+            for (v[2] = 0; v[2] < m.voxelcount[2]; ++v[2]){
+                if (m.voxels[index(v)] != unknown)
+                    continue;
+                signed char state = classify(v); // if classification is ambiguous the whole region falls back to exact tests
+                ++regions;
+                m.voxels[index(v)] = state;
+                stack.push_back(v);
+                while (not stack.empty()){
+                    auto n = stack.back();
+                    stack.pop_back();
+                    for (int i = 0; i < 3; ++i){
+                        for (int d = -1; d <= 1; d += 2){
+                            auto neighbour = n;
+                            neighbour[i] += d;
+                            if (neighbour[i] < m.voxelcount[i] and m.voxels[index(neighbour)] == unknown){ // index wraps around to large value if neighbour[i] < 0
+                                m.voxels[index(neighbour)] = state;
+                                stack.push_back(neighbour);
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+    std::cout << "Classified " << m.voxels.size() << " voxels in " << regions << " regions, "
+              << std::count(m.voxels.begin(), m.voxels.end(), -1) << " require exact tests\n";
+}
+
+
+bool TTriangleMesh::InMesh(const CTriangleMesh &m, const double x, const double y, const double z) const{
+    if (not m.voxels.empty()){
+        const double p[3] = {x, y, z};
+        std::size_t index = 0;
+        for (int i = 0; i < 3; ++i){
+            if (not (p[i] >= m.voxelorigin[i] and p[i] <= m.voxelend[i])) // point is outside of bounding box
+                return false;
+            double u = (p[i] - m.voxelorigin[i])/m.voxelsize[i]; // can be slightly larger than voxelcount on the upper faces of the bounding box
+            index = index*m.voxelcount[i] + std::min(static_cast<std::size_t>(u), m.voxelcount[i] - 1);
+        }
+        if (m.voxels[index] >= 0)
+            return m.voxels[index] == 1;
+    }
+    return m.tree->number_of_intersected_primitives(CKernel::Ray_3(CPoint(x,y,z), CVector(0.,0.,1.))) % 2 != 0;
+}
+
+
+void TTriangleMesh::BuildSceneTree(){
+    scenetree.reset(new CSceneTree());
+    for (auto &m: meshes)
+        scenetree->insert(faces(*m.mesh).first, faces(*m.mesh).second, *m.mesh);
+    scenetree->build(); // build tree now instead of lazily on first query, so it can be shared by several threads
+    std::cout << "Built scene tree containing " << scenetree->size() << " triangles from " << meshes.size() << " files\n";
+}
+
+
+void TTriangleMesh::BuildDistanceField(){
+    distances.clear();
+    if (meshes.empty())
+        return;
+    std::array<double, 3> extent = {scenebox.xmax() - scenebox.xmin(), scenebox.ymax() - scenebox.ymin(), scenebox.zmax() - scenebox.zmin()};
+    double maxextent = *std::max_element(extent.begin(), extent.end());
+    double h = std::max(std::cbrt(extent[0]*extent[1]*extent[2]/MAX_DISTANCE_NODES), maxextent/(MAX_DISTANCE_NODES - 1)); // spacing of grid nodes
+    while (true){
+        for (int i = 0; i < 3; ++i)
+            distancecount[i] = static_cast<std::size_t>(std::ceil(extent[i]/h)) + 1;
+        if (distancecount[0]*distancecount[1]*distancecount[2] <= MAX_DISTANCE_NODES)
+            break;
+        h *= 1.1; // flat meshes need larger spacing
+    }
+    distanceorigin = {scenebox.xmin(), scenebox.ymin(), scenebox.zmin()};
+    for (int i = 0; i < 3; ++i)
+        distancespacing[i] = distancecount[i] > 1 ? extent[i]/(distancecount[i] - 1) : 1.;
+
+    distances.resize(distancecount[0]*distancecount[1]*distancecount[2]);
+    std::size_t index = 0;
+    for (std::size_t i = 0; i < distancecount[0]; ++i){
+        for (std::size_t j = 0; j < distancecount[1]; ++j){
+            for (std::size_t k = 0; k < distancecount[2]; ++k){
+                CPoint p(distanceorigin[0] + i*distancespacing[0], distanceorigin[1] + j*distancespacing[1], distanceorigin[2] + k*distancespacing[2]);
+                double d2 = std::numeric_limits<double>::infinity();
+                for (auto &m: meshes)
+                    d2 = std::min(d2, m.tree->squared_distance(p));
+                distances[index++] = std::sqrt(d2);
+            }
+        }
+    }
+    std::cout << "Calculated distance to surfaces at " << distances.size() << " grid nodes with spacing " << h << "m\n";
+}
+
+
+double TTriangleMesh::DistanceBound(const double p[3]) const{
+    if (distances.empty())
+        return 0.;
+    std::array<std::size_t, 3> cell;
+    double outside2 = 0.; // squared distance of point to grid
+    for (int i = 0; i < 3; ++i){
+        double u = (p[i] - distanceorigin[i])/distancespacing[i];
+        if (not (u >= 0)){
+            outside2 += std::pow(distanceorigin[i] - p[i], 2);
+            cell[i] = 0;
+        }
+        else if (u > distancecount[i] - 1){
+            outside2 += std::pow(p[i] - distanceorigin[i] - (distancecount[i] - 1)*distancespacing[i], 2);
+            cell[i] = distancecount[i] - 1;
+        }
+        else
+            cell[i] = static_cast<std::size_t>(u);
+    }
+    if (outside2 > 0) // all surfaces are inside the grid
+        return std::max(0., std::sqrt(outside2) - REFLECT_TOLERANCE);
+
+    double bound = 0.;
+    for (int corner = 0; corner < 8; ++corner){
+        std::size_t index = 0;
+        double r2 = 0.;
+        for (int i = 0; i < 3; ++i){
+            std::size_t n = std::min(cell[i] + ((corner >> i) & 1), distancecount[i] - 1);
+            index = index*distancecount[i] + n;
+            r2 += std::pow(p[i] - distanceorigin[i] - n*distancespacing[i], 2);
+        }
+        bound = std::max(bound, distances[index] - std::sqrt(r2));
+    }
+    return std::max(0., bound - REFLECT_TOLERANCE);
+}
+
+
+bool TTriangleMesh::IntersectsBox(const double min[3], const double max[3]) const{
+	PROFILE_COUNT(COLLISION_QUERIES, 1);
+    CGAL::Bbox_3 box(min[0], min[1], min[2], max[0], max[1], max[2]);
+    if (not CGAL::do_overlap(box, scenebox))
+        return false;
+    if (scenetree)
+        return scenetree->do_intersect(box);
+    return std::any_of(meshes.begin(), meshes.end(), [&box](const CTriangleMesh &m){ return m.tree->do_intersect(box); });
+}
+
+
 // test segment p1->p2 for collision with triangles and return a list of all found collisions
-std::vector<TCollision> TTriangleMesh::Collision(const std::vector<double> &p1, const std::vector<double> &p2) const{
+std::vector<TCollision> TTriangleMesh::Collision(const double p1[3], const double p2[3]) const{
+	PROFILE_COUNT(COLLISION_QUERIES, 1);
 	CSegment segment(CPoint(p1[0], p1[1], p1[2]), CPoint(p2[0], p2[1], p2[2]));
 	std::vector<TCollision> colls;
-	for (auto &it: meshes) {
-        std::vector<CIntersection> out;
-        it.tree->all_intersections(segment, std::back_inserter(out)); // search intersections of segment with mesh
+	if (not CGAL::do_intersect(segment, scenebox)) // segment is outside of all meshes
+		return colls;
+
+	if (scenetree){
+        std::vector<CSceneIntersection> out;
+        scenetree->all_intersections(segment, std::back_inserter(out)); // search intersections of segment with all meshes
         for (auto &i: out){
             const CPoint *collp = boost::get<CPoint>(&(i->first));
             if (collp) { // if intersection is a point
-                CVector n = CGAL::Polygon_mesh_processing::compute_face_normal(i->second, *it.mesh);
-                colls.push_back(TCollision(segment, n, *collp, it.ID)); // add collision to list
+                const CMesh *mesh = i->second.second;
+                auto it = std::find_if(meshes.begin(), meshes.end(), [mesh](const CTriangleMesh &m){ return m.mesh.get() == mesh; });
+                CVector n = CGAL::Polygon_mesh_processing::compute_face_normal(i->second.first, *mesh);
+                colls.push_back(TCollision(segment, n, *collp, it->ID)); // add collision to list
             }
             else
                 throw std::runtime_error("Segment-triangle intersection happened to not be a point");
         }
-    }
+	}
+	else{
+        for (auto &it: meshes) {
+            std::vector<CIntersection> out;
+            it.tree->all_intersections(segment, std::back_inserter(out)); // search intersections of segment with mesh
+            for (auto &i: out){
+                const CPoint *collp = boost::get<CPoint>(&(i->first));
+                if (collp) { // if intersection is a point
+                    CVector n = CGAL::Polygon_mesh_processing::compute_face_normal(i->second, *it.mesh);
+                    colls.push_back(TCollision(segment, n, *collp, it.ID)); // add collision to list
+                }
+                else
+                    throw std::runtime_error("Segment-triangle intersection happened to not be a point");
+            }
+        }
+	}
 
 	std::sort(	colls.begin(),
 				colls.end(),
@@ -165,7 +395,5 @@ std::vector<TCollision> TTriangleMesh::Collision(const std::vector<double> &p1,
 
 
 bool TTriangleMesh::InSolid(const double x, const double y, const double z) const{
-    return std::any_of(meshes.begin(), meshes.end(), [x,y,z](const CTriangleMesh &mesh){
-        return mesh.tree->number_of_intersected_primitives(CKernel::Ray_3(CPoint(x,y,z), CVector(0.,0.,1.))) % 2 != 0;
-    });
+    return std::any_of(meshes.begin(), meshes.end(), [this,x,y,z](const CTriangleMesh &mesh){ return InMesh(mesh, x, y, z); });
 }
@@ -0,0 +1,442 @@
+/**
+ * \file
+ * Performance benchmarks
+ *
+ * Measures throughput of field evaluations, collision queries and logging on the test fixtures,
+ * and of complete simulations of the benchmark scenarios in in/GEANTbenchmark and in/STARUCNbenchmark.
+ * All random numbers are drawn from fixed seeds, so consecutive runs do exactly the same work.
+ * Results are written to a JSON file, which can be compared to earlier results with test/compareBenchmarks.py.
+ *
+ * Usage: runBenchmarks [results.json [particles [seed]]]
+ */
+
+#include <array>
+#include <iostream>
+#include <fstream>
+#include <sstream>
+#include <iomanip>
+#include <random>
+#include <chrono>
+#include <ctime>
+#include <functional>
+#include <map>
+#include <memory>
+#include <string>
+#include <tuple>
+#include <vector>
+
+#include <boost/filesystem.hpp>
+
+#include "config.h"
+#include "fields.h"
+#include "geometry.h"
+#include "globals.h"
+#include "logger.h"
+#include "mc.h"
+#include "particle.h"
+#include "source.h"
+#include "tracking.h"
+#include "trianglemesh.h"
+
+#ifndef PENTRACK_SOURCE_DIR
+#define PENTRACK_SOURCE_DIR "."
+#endif
+
+const double MIN_BENCHMARK_TIME = 1.; ///< each microbenchmark is repeated until it ran for at least this many seconds [s]
+const std::size_t BENCHMARK_SAMPLES = 10000; ///< number of random points or segments generated for each microbenchmark
+
+typedef std::map<std::string, std::string> TBenchmarkResult; ///< result values of a single benchmark, already formatted as JSON values
+typedef std::map<std::string, std::map<std::string, TBenchmarkResult> > TBenchmarkResults; ///< benchmark results grouped by category and name
+
+
+/**
+ * Format number as JSON value
+ *
+ * @param value Number to format
+ *
+ * @return Returns string representation of value
+ */
+std::string JSONNumber(const double value){
+    std::ostringstream s;
+    s << std::setprecision(10) << value;
+    return s.str();
+}
+
+
+/**
+ * Format string as JSON value
+ *
+ * @param value String to format
+ *
+ * @return Returns quoted and escaped string
+ */
+std::string JSONString(const std::string &value){
+    std::ostringstream s;
+    s << '"';
+    for (char c: value){
+        if (c == '"' or c == '\\')
+            s << '\\' << c;
+        else if (c == '\n')
+            s << "\\n";
+        else if (static_cast<unsigned char>(c) >= 0x20)
+            s << c;
+    }
+    s << '"';
+    return s.str();
+}
+
+
+/**
+ * Write benchmark results and information about the run to a JSON file
+ *
+ * @param out Stream to write to
+ * @param info List of general entries (e.g. date and seed), already formatted as JSON values
+ * @param results Benchmark results
+ */
+void WriteJSON(std::ostream &out, const TBenchmarkResult &info, const TBenchmarkResults &results){
+    out << "{\n";
+    for (auto &i: info)
+        out << "  " << JSONString(i.first) << ": " << i.second << ",\n";
+    for (auto category = results.begin(); category != results.end(); ++category){
+        out << "  " << JSONString(category->first) << ": {\n";
+        for (auto benchmark = category->second.begin(); benchmark != category->second.end(); ++benchmark){
+            out << "    " << JSONString(benchmark->first) << ": {";
+            for (auto value = benchmark->second.begin(); value != benchmark->second.end(); ++value)
+                out << (value == benchmark->second.begin() ? "" : ", ") << JSONString(value->first) << ": " << value->second;
+            out << (std::next(benchmark) == category->second.end() ? "}\n" : "},\n");
+        }
+        out << (std::next(category) == results.end() ? "  }\n" : "  },\n");
+    }
+    out << "}\n";
+}
+
+
+/**
+ * Repeatedly call function until it ran for at least MIN_BENCHMARK_TIME
+ *
+ * @param f Function doing a fixed amount of work and returning the number of operations it did
+ * @param operations Returns total number of operations
+ *
+ * @return Returns total run time [s]
+ */
+double Repeat(const std::function<std::size_t()> &f, std::size_t &operations){
+    operations = 0;
+    auto start = std::chrono::steady_clock::now();
+    double seconds;
+    do{
+        operations += f();
+        seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+    }while (seconds < MIN_BENCHMARK_TIME);
+    return seconds;
+}
+
+
+/**
+ * Measure how many field evaluations per second a field configuration achieves
+ *
+ * @param fieldline Field definition as it would appear in the FIELDS section of a config file
+ * @param box Field is evaluated at random points in this box (xmin, xmax, ymin, ymax, zmin, zmax)
+ * @param rng Random-number generator used to create points
+ * @param global Options in GLOBAL section of config
+ *
+ * @return Returns benchmark result
+ */
+TBenchmarkResult FieldBenchmark(const std::string &fieldline, const std::array<double, 6> &box, std::mt19937 &rng,
+                                const std::map<std::string, std::string> &global = {}){
+    TConfig config({{"GLOBAL", global}, {"FIELDS", {{"1", fieldline}}},
+                    {"FORMULAS", {{"Bx", "1e-3*sin(2*x)*exp(-y^2)*(1 + t)"}, {"By", "1e-3*x*y/(1 + z^2)"}, {"Bz", "1e-3*sqrt(1 + x^2 + y^2)*cos(z)"}}}});
+    TFieldManager field(config);
+
+    std::vector<std::array<double, 4> > points(BENCHMARK_SAMPLES);
+    for (auto &p: points){
+        for (int i = 0; i < 3; ++i)
+            p[i] = std::uniform_real_distribution<double>(box[2*i], box[2*i + 1])(rng);
+        p[3] = std::uniform_real_distribution<double>(0., 1.)(rng);
+    }
+
+    double checksum = 0.;
+    std::size_t evaluations;
+    double seconds = Repeat([&](){
+        double B[3], dBidxj[3][3], V, Ei[3];
+        for (auto &p: points){
+            field.BField(p[0], p[1], p[2], p[3], B, dBidxj);
+            field.EField(p[0], p[1], p[2], p[3], V, Ei);
+            checksum += B[0] + dBidxj[2][2] + V;
+        }
+        return points.size();
+    }, evaluations);
+
+    return {{"evaluations", JSONNumber(evaluations)}, {"seconds", JSONNumber(seconds)},
+            {"evaluations_per_second", JSONNumber(evaluations/seconds)}, {"checksum", JSONNumber(checksum/evaluations)}};
+}
+
+
+/**
+ * Measure how many collision queries per second TTriangleMesh::Collision achieves for an STL file
+ *
+ * Queries random segments, whose lengths are up to 10% of the size of the mesh's bounding box, uniformly distributed in the bounding box.
+ *
+ * @param STLfile STL file to load
+ * @param rng Random-number generator used to create segments
+ *
+ * @return Returns benchmark result
+ */
+TBenchmarkResult CollisionBenchmark(const boost::filesystem::path &STLfile, std::mt19937 &rng){
+    TTriangleMesh mesh;
+    mesh.ReadFile(STLfile.native(), 1);
+    mesh.BuildSceneTree();
+    CCuboid bbox = mesh.GetBoundingBox();
+
+    std::vector<std::array<double, 6> > segments(BENCHMARK_SAMPLES);
+    for (auto &s: segments){
+        for (int i = 0; i < 3; ++i){
+            s[i] = std::uniform_real_distribution<double>(bbox.min_coord(i), bbox.max_coord(i))(rng);
+            s[i + 3] = s[i] + 0.1*(bbox.max_coord(i) - bbox.min_coord(i))*std::uniform_real_distribution<double>(-1., 1.)(rng);
+        }
+    }
+
+    std::size_t queries, collisions = 0;
+    double seconds = Repeat([&](){
+        for (auto &s: segments)
+            collisions += mesh.Collision(&s[0], &s[3]).size();
+        return segments.size();
+    }, queries);
+
+    return {{"queries", JSONNumber(queries)}, {"seconds", JSONNumber(seconds)},
+            {"queries_per_second", JSONNumber(queries/seconds)}, {"collisions_per_query", JSONNumber(static_cast<double>(collisions)/queries)}};
+}
+
+
+/**
+ * Sum sizes of all files in a directory
+ *
+ * @param dir Directory
+ *
+ * @return Returns total size [bytes]
+ */
+std::size_t DirectorySize(const boost::filesystem::path &dir){
+    std::size_t size = 0;
+    for (boost::filesystem::directory_iterator it(dir); it != boost::filesystem::directory_iterator(); ++it){
+        if (boost::filesystem::is_regular_file(it->status()))
+            size += boost::filesystem::file_size(it->path());
+    }
+    return size;
+}
+
+
+/**
+ * Read config file of a benchmark scenario and add default parameters from PARTICLES section to each particle type, like PENTrack does
+ *
+ * @param scenario Directory containing config.in
+ *
+ * @return Returns configuration
+ */
+TConfig ReadScenario(const boost::filesystem::path &scenario){
+    configpath = scenario / "config.in";
+    std::map<std::string, std::map<std::string, std::string> > sections = {{"FORMULAS", {}}};
+    TConfig file(configpath.native());
+    for (auto &section: file)
+        sections[section.first] = section.second;
+    TConfig config(sections);
+    for (auto &i: config["PARTICLES"]){
+        for (auto particle: {"neutron", "proton", "electron", "mercury", "xenon"}){
+            try{
+                config[particle].insert(i);
+            }
+            catch (std::runtime_error &e){ } // particle section not present in config file
+        }
+    }
+    return config;
+}
+
+
+/**
+ * Simulate particles of a benchmark scenario, like PENTrack would do in a single thread
+ *
+ * If the fields of the scenario cannot be loaded (e.g. because large field tables are not distributed with PENTrack),
+ * particles are simulated without fields and the error is added to the result.
+ *
+ * @param scenario Directory containing config.in
+ * @param particles Number of particles to simulate, overrides simcount in config file
+ * @param tmpdir Directory to write log files to
+ *
+ * @return Returns benchmark result
+ */
+TBenchmarkResult ScenarioBenchmark(const boost::filesystem::path &scenario, const int particles, const boost::filesystem::path &tmpdir){
+    TConfig config = ReadScenario(scenario);
+    double simtime = 1500.;
+    std::istringstream(config["GLOBAL"]["simtime"]) >> simtime;
+
+    auto loadstart = std::chrono::steady_clock::now();
+    std::string fielderror;
+    std::unique_ptr<TFieldManager> fieldmanager;
+    try{
+        fieldmanager.reset(new TFieldManager(config));
+    }
+    catch (std::exception &e){
+        std::cout << "Could not load fields, simulating without fields: " << e.what() << "\n";
+        fielderror = e.what();
+        config["FIELDS"].clear();
+        fieldmanager.reset(new TFieldManager(config));
+    }
+    const TFieldManager &field = *fieldmanager;
+    TGeometry geom(config);
+    std::unique_ptr<TParticleSource> source(CreateParticleSource(config, geom));
+    double loadtime = std::chrono::duration<double>(std::chrono::steady_clock::now() - loadstart).count();
+
+    TMCGenerator mc;
+    mc.seed(seed);
+    outpath = tmpdir;
+    std::size_t steps = 0, hits = 0;
+    auto start = std::chrono::steady_clock::now();
+    {
+        TTracker t(config);
+        for (int iMC = 0; iMC < particles; ++iMC){
+            std::unique_ptr<TParticle> p(source->CreateParticle(mc, geom, field));
+            t.IntegrateParticle(p, simtime, config[p->GetName()], mc, geom, field);
+            steps += p->GetNumberOfSteps();
+            hits += p->GetNumberOfHits();
+        }
+    } // destroy tracker to close log files
+    double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+    std::size_t bytes = DirectorySize(tmpdir);
+
+    TBenchmarkResult result = {{"particles", JSONNumber(particles)}, {"steps", JSONNumber(steps)}, {"hits", JSONNumber(hits)},
+            {"load_seconds", JSONNumber(loadtime)}, {"seconds", JSONNumber(seconds)}, {"logged_bytes", JSONNumber(bytes)},
+            {"particles_per_second", JSONNumber(particles/seconds)}, {"steps_per_second", JSONNumber(steps/seconds)}};
+    if (not fielderror.empty())
+        result["field_error"] = JSONString(fielderror);
+    return result;
+}
+
+
+/**
+ * Measure how many bytes per second a logger writes when logging the end states of particles
+ *
+ * Particles are created from the source of the STARUCN benchmark scenario.
+ *
+ * @param binarylog Use binary logger instead of text logger
+ * @param tmpdir Directory to write log files to
+ *
+ * @return Returns benchmark result
+ */
+TBenchmarkResult LoggerBenchmark(const bool binarylog, const boost::filesystem::path &tmpdir){
+    TConfig config = ReadScenario(boost::filesystem::path(PENTRACK_SOURCE_DIR) / "in" / "STARUCNbenchmark");
+    config["GLOBAL"]["binarylog"] = binarylog ? "1" : "0";
+    config["FIELDS"].clear();
+    TFieldManager field(config);
+    TGeometry geom(config);
+    std::unique_ptr<TParticleSource> source(CreateParticleSource(config, geom));
+    TMCGenerator mc;
+    mc.seed(seed);
+    std::vector<std::unique_ptr<TParticle> > particles;
+    for (int i = 0; i < 100; ++i)
+        particles.emplace_back(source->CreateParticle(mc, geom, field));
+
+    outpath = tmpdir;
+    std::size_t rows;
+    double seconds;
+    {
+        std::unique_ptr<TLogger> logger = CreateLogger(config);
+        seconds = Repeat([&](){
+            for (auto &p: particles)
+                logger->Print(p, p->GetInitialTime(), p->GetInitialState(), p->GetInitialSpin(), geom, field);
+            return particles.size();
+        }, rows);
+        auto start = std::chrono::steady_clock::now();
+        logger.reset(); // include time to flush and close files
+        seconds += std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+    }
+    std::size_t bytes = DirectorySize(tmpdir);
+
+    return {{"rows", JSONNumber(rows)}, {"bytes", JSONNumber(bytes)}, {"seconds", JSONNumber(seconds)},
+            {"rows_per_second", JSONNumber(rows/seconds)}, {"bytes_per_second", JSONNumber(bytes/seconds)}};
+}
+
+
+/**
+ * Run a benchmark in an empty temporary directory, print and store its result
+ *
+ * @param results Result is added to this list
+ * @param category Category of benchmark
+ * @param name Name of benchmark
+ * @param benchmark Function running benchmark in given temporary directory
+ */
+void RunBenchmark(TBenchmarkResults &results, const std::string &category, const std::string &name,
+                  const std::function<TBenchmarkResult(const boost::filesystem::path&)> &benchmark){
+    std::cout << "Benchmarking " << category << " " << name << "...\n";
+    boost::filesystem::path tmpdir = boost::filesystem::temp_directory_path() / boost::filesystem::unique_path();
+    boost::filesystem::create_directories(tmpdir);
+    TBenchmarkResult result;
+    try{
+        result = benchmark(tmpdir);
+    }
+    catch (std::exception &e){
+        std::cout << "Benchmark failed: " << e.what() << "\n";
+        result = {{"error", JSONString(e.what())}};
+    }
+    boost::filesystem::remove_all(tmpdir);
+    for (auto &value: result)
+        std::cout << "  " << value.first << ": " << value.second << "\n";
+    results[category][name] = result;
+}
+
+
+int main(int argc, char **argv){
+    boost::filesystem::path resultfile = "benchmark.json";
+    int particles = 100;
+    seed = 1;
+    if (argc > 1)
+        resultfile = argv[1];
+    if (argc > 2)
+        std::istringstream(argv[2]) >> particles;
+    if (argc > 3)
+        std::istringstream(argv[3]) >> seed;
+
+    boost::filesystem::path source(PENTRACK_SOURCE_DIR);
+    TBenchmarkResults results;
+    std::mt19937 rng(seed);
+
+    configpath = source / "test" / "config.in"; // field tables are given relative to test directory
+    std::array<double, 6> cylinder{{-0.7, 0.7, -0.7, 0.7, 0., 1.}}, cube{{0., 1., 0., 1., 0., 1.}}, box{{-1., 1., -1., 1., -1., 1.}};
+    std::map<std::string, std::tuple<std::string, std::array<double, 6>, std::map<std::string, std::string> > > fields = {
+        {"TabField", std::make_tuple("OPERA2D CosineGradientField.tab 0.0001 1 0.01", cylinder, std::map<std::string, std::string>())},
+        {"TabField3", std::make_tuple("OPERA3D VerticalLinearGradientField3D.tab 0.0001 1 0 0.01", cube, std::map<std::string, std::string>())},
+        {"Conductor", std::make_tuple("Conductor 12500 0 0 -1 0 0 2 1", box, std::map<std::string, std::string>())},
+        {"HarmonicExpandedBField", std::make_tuple("HarmonicExpandedBField 0 0 0 0 1 -1 1 -1 1 -1 1 0 0 1 0 "
+                                                   "0 1e-6 0 0 0 1e-8 0 0 0 0 0 1e-10 0 0 0 0 0 0 0 1e-12 0 0 0 0", box, std::map<std::string, std::string>())},
+        {"HarmonicExpandedBField_tabulated", std::make_tuple("Tabulate 1 -1 1 -1 1 -1 21 21 21 HarmonicExpandedBField 0 0 0 0 1 -1 1 -1 1 -1 1 0 0 1 0 "
+                                                             "0 1e-6 0 0 0 1e-8 0 0 0 0 0 1e-10 0 0 0 0 0 0 0 1e-12 0 0 0 0", box, std::map<std::string, std::string>())},
+        {"CustomBField", std::make_tuple("CustomBField Bx By Bz 0 0 0 0 0 0 0 1", box, std::map<std::string, std::string>())},
+        {"CustomBField_symbolic", std::make_tuple("CustomBField Bx By Bz 0 0 0 0 0 0 0 1", box, std::map<std::string, std::string>{{"symbolicderivatives", "1"}})}
+    };
+    for (auto &f: fields){
+        RunBenchmark(results, "fields", f.first, [&](const boost::filesystem::path&){
+            return FieldBenchmark(std::get<0>(f.second), std::get<1>(f.second), rng, std::get<2>(f.second));
+        });
+    }
+
+    for (auto STLfile: {source / "test" / "HollowUnitCube.STL", source / "test" / "nEDMchamber_R200x100.STL",
+                        source / "in" / "STARUCNbenchmark" / "U.STL", source / "in" / "GEANTbenchmark" / "BenchmarkGeom-Tube-1.STL"}){
+        RunBenchmark(results, "collisions", STLfile.stem().native(), [&](const boost::filesystem::path&){
+            return CollisionBenchmark(STLfile, rng);
+        });
+    }
+
+    RunBenchmark(results, "logging", "text", [](const boost::filesystem::path &tmpdir){ return LoggerBenchmark(false, tmpdir); });
+    RunBenchmark(results, "logging", "binary", [](const boost::filesystem::path &tmpdir){ return LoggerBenchmark(true, tmpdir); });
+
+    for (auto scenario: {"GEANTbenchmark", "STARUCNbenchmark"}){
+        RunBenchmark(results, "scenarios", scenario, [&](const boost::filesystem::path &tmpdir){
+            return ScenarioBenchmark(source / "in" / scenario, particles, tmpdir);
+        });
+    }
+
+    std::time_t now = std::time(nullptr);
+    char date[32];
+    std::strftime(date, sizeof(date), "%Y-%m-%dT%H:%M:%S", std::localtime(&now));
+    std::ofstream out(resultfile.native());
+    WriteJSON(out, {{"date", JSONString(date)}, {"seed", JSONNumber(seed)}, {"particles", JSONNumber(particles)}}, results);
+    std::cout << "Results written to " << resultfile << "\n";
+    return 0;
+}
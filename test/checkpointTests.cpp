@@ -0,0 +1,58 @@
+/**
+ * This file contains unit tests for checkpoints of particle simulations
+ */
+
+#include <boost/test/unit_test.hpp>
+
+#include "checkpoint.h"
+
+// check that particles completed out of order are tracked correctly
+BOOST_AUTO_TEST_CASE(TCheckpointCompleteTest){
+    TCheckpoint c;
+    BOOST_CHECK(not c.Done(1));
+    c.Complete(2);
+    c.Complete(4);
+    BOOST_CHECK_EQUAL(c.completed, 0);
+    BOOST_CHECK(c.Done(2) and c.Done(4) and not c.Done(1) and not c.Done(3));
+    c.Complete(1);
+    BOOST_CHECK_EQUAL(c.completed, 2);
+    BOOST_CHECK_EQUAL(c.done.size(), 1);
+    c.Complete(3);
+    BOOST_CHECK_EQUAL(c.completed, 4);
+    BOOST_CHECK(c.done.empty());
+}
+
+// check that a checkpoint read from file is identical to the written one and continues the same random-number sequence
+BOOST_AUTO_TEST_CASE(TCheckpointFileTest){
+    TCheckpoint c1;
+    c1.seed = 18446744073709551557ULL;
+    c1.parallel = true;
+    c1.Complete(1);
+    c1.Complete(5);
+    c1.Complete(7);
+    c1.mc.seed(42);
+    c1.mc.discard(1000);
+    c1.ID_counter["neutron"][-2] = 3;
+    c1.ID_counter["proton"][1] = 7;
+    c1.ntotalsteps = 123456;
+    c1.logpositions["neutronend"] = 1234;
+    c1.logpositions["neutronhit"] = 5678901234LL;
+
+    boost::filesystem::path file = boost::filesystem::temp_directory_path() / boost::filesystem::unique_path();
+    c1.Write(file);
+    TCheckpoint c2;
+    c2.Read(file);
+    boost::filesystem::remove(file);
+
+    BOOST_CHECK_EQUAL(c1.seed, c2.seed);
+    BOOST_CHECK_EQUAL(c1.parallel, c2.parallel);
+    BOOST_CHECK_EQUAL(c1.completed, c2.completed);
+    BOOST_CHECK(c1.done == c2.done);
+    BOOST_CHECK(c1.ID_counter == c2.ID_counter);
+    BOOST_CHECK_EQUAL(c1.ntotalsteps, c2.ntotalsteps);
+    BOOST_CHECK(c1.logpositions == c2.logpositions);
+    BOOST_CHECK(c1.mc == c2.mc);
+    BOOST_CHECK_EQUAL(c1.mc(), c2.mc());
+
+    BOOST_CHECK_THROW(c2.Read(file), std::runtime_error); // file does not exist anymore
+}
@@ -0,0 +1,49 @@
+# compare results of two benchmark runs written by runBenchmarks
+# run with
+# python compareBenchmarks.py old.json new.json
+
+import sys
+import json
+import argparse
+
+def Compare(old, new, threshold):
+  # print ratio new/old of all throughput values (entries ending in "_per_second") and return number of regressions
+  regressions = 0
+  for category in sorted(set(old) | set(new)):
+    if not isinstance(new.get(category, old.get(category)), dict):
+      continue
+    print(category)
+    for name in sorted(set(old.get(category, {})) | set(new.get(category, {}))):
+      o = old.get(category, {}).get(name, {})
+      n = new.get(category, {}).get(name, {})
+      for key in sorted(k for k in set(o) | set(n) if k.endswith('_per_second')):
+        if key not in o or key not in n:
+          print('  {0} {1}: only in {2} run'.format(name, key, 'old' if key in o else 'new'))
+          continue
+        ratio = n[key]/o[key]
+        flag = ''
+        if ratio < 1. - threshold:
+          flag = '  <-- slower'
+          regressions += 1
+        elif ratio > 1. + threshold:
+          flag = '  <-- faster'
+        print('  {0} {1}: {2:.4g} -> {3:.4g} ({4:+.1f}%){5}'.format(name, key, o[key], n[key], 100.*(ratio - 1.), flag))
+      for key in ('error', 'field_error'):
+        if key in n:
+          print('  {0} {1}: {2}'.format(name, key, n[key]))
+  return regressions
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description = 'Compare throughput of two benchmark runs written by runBenchmarks.')
+  parser.add_argument('old', help = 'JSON file of reference run')
+  parser.add_argument('new', help = 'JSON file of new run')
+  parser.add_argument('-t', '--threshold', type = float, default = 0.1, help = 'relative change reported as regression (default: 0.1)')
+  args = parser.parse_args()
+  with open(args.old) as f:
+    old = json.load(f)
+  with open(args.new) as f:
+    new = json.load(f)
+  for key in ('particles', 'seed'):
+    if old.get(key) != new.get(key):
+      print('Warning: runs used different {0} ({1} and {2})'.format(key, old.get(key), new.get(key)))
+  sys.exit(1 if Compare(old, new, args.threshold) > 0 else 0)
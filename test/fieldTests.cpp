@@ -3,6 +3,7 @@
  */
 
 #include <random>
+#include <thread>
 
 #include <boost/test/unit_test.hpp>
 #include <boost/format.hpp>
@@ -12,6 +13,7 @@
 #include "globals.h"
 #include "edmfields.h"
 #include "fields.h"
+#include "field_3d.h"
 #include "config.h"
 
 #include <iostream>
@@ -202,6 +204,77 @@ BOOST_AUTO_TEST_CASE(TCustomBFieldTest){
     checkMagneticFieldZero(f, 1., 2., 3.);
 }
 
+// compare symbolic derivatives of TCustomBField to analytical derivatives of TExponentialFieldX and to numerical derivatives, check that unsupported formulas fall back to numerical derivatives
+BOOST_AUTO_TEST_CASE(TCustomBFieldSymbolicTest){
+    int nTests = 100;
+    for (int n = 0; n < nTests; ++n){
+        double a1 = uni(rng), a2 = uni(rng), a3 = uni(rng), c1 = uni(rng), c2 = uni(rng);
+        TExponentialFieldX f1(a1, a2, a3, c1, c2);
+        auto Bx = boost::format("%1$.20g * exp(- %2$.20g * x + %3$.20g) + %4$.20g") % a1 % a2 % a3 % c1;
+        auto By = boost::format("y * %1$.20g * %2$.20g / 2 * exp(- %2$.20g*x + %3$.20g) + %4$.20g") % a1 % a2 % a3 % c2;
+        auto Bz = boost::format("z * %1$.20g * %2$.20g / 2 * exp(- %2$.20g*x + %3$.20g) + %4$.20g") % a1 % a2 % a3 % c2;
+        TCustomBField f2(Bx.str(), By.str(), Bz.str(), true);
+        double x = uni(rng), y = uni(rng), z = uni(rng);
+        double B1[3], dB1[3][3], B2[3], dB2[3][3];
+        f1.BField(x, y, z, 0., B1, dB1);
+        f2.BField(x, y, z, 0., B2, dB2);
+        for (int i = 0; i < 3; ++i){
+            BOOST_CHECK_SMALL(B1[i] - B2[i], 1e-10);
+            for (int j = 0; j < 3; ++j)
+                BOOST_CHECK_SMALL(dB1[i][j] - dB2[i][j], 1e-10); // symbolic derivatives are exact up to rounding errors
+        }
+    }
+
+    TCustomBField f3("sin(x*y)/(1 + z^2)*t", "sqrt(x^2 + y^2)*cos(t)", "pow(x, 3)*atan2(y, z) - log(1 + abs(z))", true);
+    TCustomBField f4("sin(x*y)/(1 + z^2)*t", "sqrt(x^2 + y^2)*cos(t)", "pow(x, 3)*atan2(y, z) - log(1 + abs(z))");
+    compareMagneticFields(f3, f4, 0.3, -0.7, 0.5, 2.);
+
+    TCustomBField f5("x < 0 ? 0 : x", "y", "z", true); // conditional is not supported by symbolic differentiation, field has to be calculated with numerical derivatives
+    TCustomBField f6("x < 0 ? 0 : x", "y", "z");
+    compareMagneticFields(f5, f6, 0.3, -0.7, 0.5);
+}
+
+// check that TCustomBField gives the same results when evaluated from several threads at once
+BOOST_AUTO_TEST_CASE(TCustomBFieldThreadsTest){
+    for (bool symbolic: {false, true}){
+        TCustomBField f("sin(x*y)/(1 + z^2)*t", "sqrt(x^2 + y^2)*cos(t)", "pow(x, 3)*atan2(y, z) - log(1 + abs(z))", symbolic);
+        const int nThreads = 4, nPoints = 1000;
+        std::vector<std::array<double, 4> > points(nPoints);
+        std::vector<std::array<double, 12> > expected(nPoints);
+        for (int i = 0; i < nPoints; ++i){
+            points[i] = {uni(rng), uni(rng), uni(rng), uni(rng)};
+            f.BField(points[i][0], points[i][1], points[i][2], points[i][3], &expected[i][0], reinterpret_cast<double(*)[3]>(&expected[i][3]));
+        }
+        std::vector<int> mismatches(nThreads, 0);
+        std::vector<std::thread> threads;
+        for (int n = 0; n < nThreads; ++n){
+            threads.emplace_back([&, n](){
+                for (int i = n; i < n + nPoints; ++i){ // each thread starts at a different point
+                    const std::array<double, 4> &p = points[i % nPoints];
+                    std::array<double, 12> B;
+                    f.BField(p[0], p[1], p[2], p[3], &B[0], reinterpret_cast<double(*)[3]>(&B[3]));
+                    if (B != expected[i % nPoints])
+                        ++mismatches[n];
+                }
+            });
+        }
+        for (auto &t: threads)
+            t.join();
+        for (int n = 0; n < nThreads; ++n)
+            BOOST_CHECK_EQUAL(mismatches[n], 0);
+    }
+}
+
+// check symbolic differentiation of formulas
+BOOST_AUTO_TEST_CASE(DifferentiateFormulaTest){
+    BOOST_CHECK_EQUAL(DifferentiateFormula("x^2", "y"), "0");
+    BOOST_CHECK_EQUAL(DifferentiateFormula("3*y", "y"), "3");
+    BOOST_CHECK_NO_THROW(DifferentiateFormula("exp(-x/2)*sin(pi*t) + 1.5e-3*z", "x"));
+    BOOST_CHECK_THROW(DifferentiateFormula("x < 0 ? 0 : x", "x"), std::runtime_error);
+    BOOST_CHECK_THROW(DifferentiateFormula("2x", "x"), std::runtime_error);
+    BOOST_CHECK_THROW(DifferentiateFormula("sin(x", "x"), std::runtime_error);
+}
+
 // check that TFieldScaler correctly identifies invalid formulas and returns expected scaling factor
 BOOST_AUTO_TEST_CASE(TFieldScalerTest){
     BOOST_CHECK_THROW(TFieldScaler("asgd"), std::runtime_error);
@@ -212,6 +285,7 @@ BOOST_AUTO_TEST_CASE(TFieldScalerTest){
     TFieldScaler scaler2("10*t + 1");
     BOOST_CHECK_EQUAL(scaler2.scalingFactor(0.), 1.);
     BOOST_CHECK_EQUAL(scaler2.scalingFactor(1.), 11.);
+    BOOST_CHECK_EQUAL(scaler2.scalingFactor(0.), 1.); // cached scaling factor has to be updated when time changes
     double F[3] = {1., 1., 1.};
     double dFidxj[3][3] = {{1., 1., 1.}, {1., 1., 1.}, {1., 1., 1.}};
     scaler2.scaleVectorField(1., F, dFidxj);
@@ -221,6 +295,29 @@ BOOST_AUTO_TEST_CASE(TFieldScalerTest){
             BOOST_CHECK_EQUAL(dFidxj[i][j], scaler2.scalingFactor(1.));
         }
     }
+    TFieldScaler scaler3("10*t + 1"); // scalers with same formula share cached value
+    BOOST_CHECK_EQUAL(scaler3.scalingFactor(2.), 21.);
+    BOOST_CHECK_EQUAL(scaler2.scalingFactor(2.), 21.);
+    BOOST_CHECK_EQUAL(scaler2.scalingFactor(0.), 1.);
+    BOOST_CHECK_EQUAL(scaler3.scalingFactor(1.), 11.);
+
+    // threads at different times must not see each other's cached values
+    const int nThreads = 4;
+    std::vector<int> mismatches(nThreads, 0);
+    std::vector<std::thread> threads;
+    for (int n = 0; n < nThreads; ++n){
+        threads.emplace_back([&, n](){
+            for (int i = 0; i < 10000; ++i){
+                double t = n + 0.001*i;
+                if (scaler2.scalingFactor(t) != 10*t + 1 or scaler3.scalingFactor(t) != 10*t + 1)
+                    ++mismatches[n];
+            }
+        });
+    }
+    for (auto &t: threads)
+        t.join();
+    for (int n = 0; n < nThreads; ++n)
+        BOOST_CHECK_EQUAL(mismatches[n], 0);
 }
 
 // check that TFieldBoundaryBox correctly identifies invalid parameters and correctly scales within and outside of boundary (without smoothing)
@@ -353,7 +450,7 @@ BOOST_AUTO_TEST_CASE(TEDMStaticEFieldTest){
 
 // integration test checking that TFieldManager properly handles scaling and boundaries
 BOOST_AUTO_TEST_CASE(TFieldManagerTest){
-    TConfig config({{"FIELDS", {{"0", "LinearFieldZ 0 1 1 -1 1 -1 1 -1 sin(t)"}}}}); // homogeneous, oscillating field with hard boundaries at +/-1
+    TConfig config({{"FIELDS", {{"0", "LinearFieldZ 0 1 1 -1 1 -1 1 -1 sin(t)"}}}, {"FORMULAS", {}}}); // homogeneous, oscillating field with hard boundaries at +/-1
     TFieldManager m(config);
     int nTests = 100;
     for (int n = 0; n < nTests; ++n){
@@ -374,6 +471,253 @@ BOOST_AUTO_TEST_CASE(TFieldManagerTest){
 }
 
 
+// check that TFieldManager only adds up fields whose bounding boxes contain the position, independent of how the boxes overlap
+BOOST_AUTO_TEST_CASE(TFieldManagerIndexTest){
+    TConfig config({{"FIELDS", {{"0", "LinearFieldZ 0 1 1 -1 1 -1 1 -1 1"},
+                                {"1", "LinearFieldZ 0 2 2 0 2 0 2 0 1"},
+                                {"2", "LinearFieldZ 0 4 1.5 -1.5 0.5 -1.5 1 -2 2*t"},
+                                {"3", "EDMStaticEField 1 2 3 1"}}},
+                    {"FORMULAS", {}}});
+    TFieldManager m(config);
+    auto inBox = [](const double x, const double y, const double z, const double xmax, const double xmin, const double ymax, const double ymin, const double zmax, const double zmin){
+        return x >= xmin and x < xmax and y >= ymin and y < ymax and z >= zmin and z < zmax;
+    };
+    int nTests = 1000;
+    for (int n = 0; n < nTests; ++n){
+        double x = uni(rng), y = uni(rng), z = uni(rng), t = uni(rng);
+        double Bz = 0.;
+        if (inBox(x, y, z, 1, -1, 1, -1, 1, -1)) Bz += 1.;
+        if (inBox(x, y, z, 2, 0, 2, 0, 2, 0)) Bz += 2.;
+        if (inBox(x, y, z, 1.5, -1.5, 0.5, -1.5, 1, -2)) Bz += 4.*2.*t;
+        double B[3], dBidxj[3][3], V, Ei[3];
+        m.BField(x, y, z, t, B, dBidxj);
+        m.EField(x, y, z, t, V, Ei);
+        BOOST_TEST_CONTEXT("Parameters: x = " << x << ", y = " << y << ", z = " << z << ", t = " << t){
+            BOOST_CHECK_EQUAL(B[0], 0.);
+            BOOST_CHECK_EQUAL(B[1], 0.);
+            BOOST_CHECK_SMALL(B[2] - Bz, 1e-14);
+            for (int i = 0; i < 3; ++i){
+                for (int j = 0; j < 3; ++j){
+                    BOOST_CHECK_EQUAL(dBidxj[i][j], 0.);
+                }
+            }
+            BOOST_CHECK_EQUAL(Ei[0], 1.);
+            BOOST_CHECK_EQUAL(Ei[1], 2.);
+            BOOST_CHECK_EQUAL(Ei[2], 3.);
+        }
+    }
+}
+
+// compare linear field interpolated by TabField3 on uniform and non-uniform grids to a TCustomBField with the same field calculation formula
+BOOST_AUTO_TEST_CASE(TabField3Test){
+    std::array<std::vector<double>, 2> grids{{{-2., -1., 0., 1., 2.}, {-2., -1.5, -0.2, 0.1, 1.3, 2.}}}; // uniform and non-uniform grid
+    for (auto &grid: grids){
+        double a[4] = {uni(rng), uni(rng), uni(rng), uni(rng)};
+        auto linear = boost::format("%1$.20g + %2$.20g*x + %3$.20g*y + %4$.20g*z");
+        std::array<std::vector<double>, 3> xyzTab, BTab;
+        std::vector<double> VTab;
+        for (auto x: grid){
+            for (auto y: grid){
+                for (auto z: grid){
+                    xyzTab[0].push_back(x);
+                    xyzTab[1].push_back(y);
+                    xyzTab[2].push_back(z);
+                    BTab[0].push_back(a[0] + a[1]*x + a[2]*y + a[3]*z);
+                    BTab[1].push_back(a[1] + a[2]*x + a[3]*y + a[0]*z);
+                    BTab[2].push_back(a[2] + a[3]*x + a[0]*y + a[1]*z);
+                    VTab.push_back(a[3] + a[0]*x + a[1]*y + a[2]*z);
+                }
+            }
+        }
+        TabField3 f1(xyzTab, BTab, VTab);
+        TCustomBField f2((linear % a[0] % a[1] % a[2] % a[3]).str(), (linear % a[1] % a[2] % a[3] % a[0]).str(), (linear % a[2] % a[3] % a[0] % a[1]).str());
+        int nTests = 100;
+        for (int n = 0; n < nTests; ++n){
+            double x = uni(rng), y = uni(rng), z = uni(rng);
+            BOOST_TEST_CONTEXT("Parameters: x = " << x << ", y = " << y << ", z = " << z << ", grid size = " << grid.size()){
+                compareMagneticFields(f1, f2, x, y, z);
+                double V, Ei[3];
+                f1.EField(x, y, z, 0., V, Ei);
+                BOOST_CHECK_SMALL(V - (a[3] + a[0]*x + a[1]*y + a[2]*z), 1e-10);
+                BOOST_CHECK_SMALL(Ei[0] + a[0], 1e-10);
+                BOOST_CHECK_SMALL(Ei[1] + a[1], 1e-10);
+                BOOST_CHECK_SMALL(Ei[2] + a[2], 1e-10);
+            }
+        }
+
+        double B[3] = {0., 0., 0.};
+        f1.BField(2.5, 0., 0., 0., B, nullptr); // field outside of grid should be left untouched
+        BOOST_CHECK_EQUAL(B[0], 0.);
+        BOOST_CHECK_EQUAL(B[1], 0.);
+        BOOST_CHECK_EQUAL(B[2], 0.);
+    }
+}
+
+
+// check that TabField3 gives the same results when calculating interpolation coefficients on demand with a small coefficient cache
+BOOST_AUTO_TEST_CASE(TabField3CacheTest){
+    std::array<std::vector<double>, 3> xyzTab, BTab;
+    std::vector<double> VTab;
+    for (int ix = 0; ix <= 10; ++ix){
+        for (int iy = 0; iy <= 10; ++iy){
+            for (int iz = 0; iz <= 10; ++iz){
+                double x = -2. + 0.4*ix, y = -2. + 0.4*iy, z = -2. + 0.4*iz;
+                xyzTab[0].push_back(x);
+                xyzTab[1].push_back(y);
+                xyzTab[2].push_back(z);
+                BTab[0].push_back(sin(x)*cos(y));
+                BTab[1].push_back(x*y*z);
+                BTab[2].push_back(exp(-z*z));
+                VTab.push_back(cos(x + y + z));
+            }
+        }
+    }
+    TabField3 f1(xyzTab, BTab, VTab); // precalculated coefficients
+    TabField3 f2(xyzTab, BTab, VTab, 8); // coefficients calculated on demand, cache smaller than number of grid cells
+    TabField3 f3(xyzTab, BTab, VTab, 8, true); // single-precision storage
+    BOOST_CHECK_THROW(TabField3(xyzTab, BTab, VTab, 0, true), std::runtime_error);
+
+    int nTests = 100;
+    for (int n = 0; n < nTests; ++n){
+        double x = uni(rng)*0.99, y = uni(rng)*0.99, z = uni(rng)*0.99;
+        BOOST_TEST_CONTEXT("Parameters: x = " << x << ", y = " << y << ", z = " << z){
+            compareMagneticFields(f1, f2, x, y, z);
+            double B1[3], dB1idxj[3][3], B3[3], dB3idxj[3][3];
+            f1.BField(x, y, z, 0., B1, dB1idxj);
+            f3.BField(x, y, z, 0., B3, dB3idxj);
+            for (int i = 0; i < 3; ++i){
+                BOOST_CHECK_SMALL(B1[i] - B3[i], 1e-6);
+                for (int j = 0; j < 3; ++j)
+                    BOOST_CHECK_SMALL(dB1idxj[i][j] - dB3idxj[i][j], 1e-5);
+            }
+            double V1, Ei1[3], V2, Ei2[3];
+            f1.EField(x, y, z, 0., V1, Ei1);
+            f2.EField(x, y, z, 0., V2, Ei2);
+            BOOST_CHECK_EQUAL(V1, V2);
+            for (int i = 0; i < 3; ++i)
+                BOOST_CHECK_EQUAL(Ei1[i], Ei2[i]);
+        }
+    }
+
+    // each thread uses its own cache, results have to be identical to precalculated coefficients
+    const int nThreads = 4;
+    std::vector<int> mismatches(nThreads, 0);
+    std::vector<std::thread> threads;
+    for (int n = 0; n < nThreads; ++n){
+        threads.emplace_back([&, n](){
+            std::mt19937 threadrng(n);
+            for (int i = 0; i < 1000; ++i){
+                double x = uni(threadrng)*0.99, y = uni(threadrng)*0.99, z = uni(threadrng)*0.99;
+                double B1[3], dB1idxj[3][3], B2[3], dB2idxj[3][3];
+                f1.BField(x, y, z, 0., B1, dB1idxj);
+                f2.BField(x, y, z, 0., B2, dB2idxj);
+                for (int j = 0; j < 3; ++j){
+                    if (B1[j] != B2[j] or dB1idxj[j][0] != dB2idxj[j][0] or dB1idxj[j][1] != dB2idxj[j][1] or dB1idxj[j][2] != dB2idxj[j][2])
+                        ++mismatches[n];
+                }
+            }
+        });
+    }
+    for (auto &t: threads)
+        t.join();
+    for (int n = 0; n < nThreads; ++n)
+        BOOST_CHECK_EQUAL(mismatches[n], 0);
+}
+
+
+// check that TabField3 loaded from a cache file gives exactly the same results as the original field
+BOOST_AUTO_TEST_CASE(TabField3WriteCacheTest){
+    std::array<std::vector<double>, 3> xyzTab, BTab;
+    std::vector<double> VTab;
+    for (double x = -2.; x <= 2.; x += 0.5){
+        for (double y = -2.; y <= 2.; y += 0.8){
+            for (double z = -2.; z <= 2.; z += 1.){
+                xyzTab[0].push_back(x);
+                xyzTab[1].push_back(y);
+                xyzTab[2].push_back(z);
+                BTab[1].push_back(sin(x)*cos(y)*z);
+                VTab.push_back(x*y + z);
+            }
+        }
+    }
+
+    for (unsigned long cachesize: {0, 4}){
+        BOOST_TEST_CONTEXT("Cache size: " << cachesize){
+            TabField3 f1(xyzTab, BTab, VTab, cachesize, cachesize > 0);
+            boost::filesystem::path cachefile = boost::filesystem::temp_directory_path() / boost::filesystem::unique_path();
+            WriteFieldCache(cachefile, [&f1](std::ostream &out){ f1.WriteCache(out); });
+            BOOST_CHECK_THROW(TabField3(cachefile, cachesize > 0 ? 0 : 4), std::runtime_error); // cache file does not match requested storage
+            {
+                TabField3 f2(cachefile, cachesize);
+                BOOST_CHECK(f1.GetGrid() == f2.GetGrid());
+                int nTests = 100;
+                for (int n = 0; n < nTests; ++n){
+                    double x = uni(rng), y = uni(rng), z = uni(rng);
+                    BOOST_TEST_CONTEXT("Parameters: x = " << x << ", y = " << y << ", z = " << z){
+                        double B1[3] = {}, dB1idxj[3][3] = {}, B2[3] = {}, dB2idxj[3][3] = {}, V1 = 0., Ei1[3] = {}, V2 = 0., Ei2[3] = {};
+                        f1.BField(x, y, z, 0., B1, dB1idxj);
+                        f2.BField(x, y, z, 0., B2, dB2idxj);
+                        f1.EField(x, y, z, 0., V1, Ei1);
+                        f2.EField(x, y, z, 0., V2, Ei2);
+                        BOOST_CHECK_EQUAL(B1[0], B2[0]);
+                        BOOST_CHECK_EQUAL(B1[1], B2[1]);
+                        BOOST_CHECK_EQUAL(dB1idxj[1][2], dB2idxj[1][2]);
+                        BOOST_CHECK_EQUAL(V1, V2);
+                        BOOST_CHECK_EQUAL(Ei1[0], Ei2[0]);
+                    }
+                }
+            }
+            boost::filesystem::remove(cachefile);
+        }
+    }
+}
+
+
+// check that a tabulated field approximates the analytic field within the grid, keeps its scaling formula, vanishes outside the grid, is reloaded from its cache file, and rejects boundaries outside the grid
+BOOST_AUTO_TEST_CASE(TabulatedFieldTest){
+    boost::filesystem::path cachedir = boost::filesystem::temp_directory_path() / boost::filesystem::unique_path();
+    TConfig config({{"GLOBAL", {{"fieldcache", cachedir.string()}}},
+                    {"FIELDS", {{"0", "Tabulate 1 -1 1 -1 1 -1 31 31 31 CustomBField Bx By Bz 0 0 0 0 0 0 0 2*t"}}},
+                    {"FORMULAS", {{"Bx", "sin(x)*y"}, {"By", "exp(-y^2)"}, {"Bz", "x*y*z"}}}});
+    TCustomBField f("sin(x)*y", "exp(-y^2)", "x*y*z");
+    for (int run = 0; run < 2; ++run){ // second run loads field from cache file
+        TFieldManager m(config);
+        BOOST_CHECK_EQUAL(std::distance(boost::filesystem::directory_iterator(cachedir), boost::filesystem::directory_iterator()), 1);
+        int nTests = 100;
+        for (int n = 0; n < nTests; ++n){
+            double x = uni(rng), y = uni(rng), z = uni(rng), t = uni(rng);
+            BOOST_TEST_CONTEXT("Parameters: x = " << x << ", y = " << y << ", z = " << z << ", t = " << t){
+                double B1[3] = {}, dB1[3][3] = {}, B2[3], dB2[3][3];
+                if (abs(x) < 1 and abs(y) < 1 and abs(z) < 1){
+                    f.BField(x, y, z, t, B1, dB1);
+                    for (int i = 0; i < 3; ++i){
+                        B1[i] *= 2*t;
+                        for (int j = 0; j < 3; ++j)
+                            dB1[i][j] *= 2*t;
+                    }
+                }
+                m.BField(x, y, z, t, B2, dB2);
+                for (int i = 0; i < 3; ++i){
+                    BOOST_CHECK_SMALL(B1[i] - B2[i], 2e-4);
+                    for (int j = 0; j < 3; ++j)
+                        BOOST_CHECK_SMALL(dB1[i][j] - dB2[i][j], 2e-2);
+                }
+            }
+        }
+    }
+    boost::filesystem::remove_all(cachedir);
+
+    TConfig tables({{"GLOBAL", {}}, {"FIELDS", {{"0", "Tabulate 1 -1 1 -1 1 -1 11 11 11 COMSOL comsol.txt 1 0 1"}}}, {"FORMULAS", {}}});
+    BOOST_CHECK_THROW(TFieldManager m(tables), std::runtime_error); // field tables cannot be tabulated again
+    TConfig grid({{"GLOBAL", {}}, {"FIELDS", {{"0", "Tabulate 1 -1 1 -1 1 -1 1 11 11 Conductor 1 0 0 -1 0 0 1 1"}}}, {"FORMULAS", {}}});
+    BOOST_CHECK_THROW(TFieldManager m(grid), std::runtime_error); // grid needs at least two points in each dimension
+    TConfig inside({{"GLOBAL", {}}, {"FIELDS", {{"0", "Tabulate 1 -1 1 -1 1 -1 11 11 11 LinearFieldZ 0 1 1 -1 0.5 -0.5 1 0 1"}}}, {"FORMULAS", {}}});
+    BOOST_CHECK_NO_THROW(TFieldManager m(inside));
+    TConfig outside({{"GLOBAL", {}}, {"FIELDS", {{"0", "Tabulate 1 -1 1 -1 1 -1 11 11 11 LinearFieldZ 0 1 1 -1 0.5 -0.5 2 0 1"}}}, {"FORMULAS", {}}});
+    BOOST_CHECK_THROW(TFieldManager m(outside), std::runtime_error); // field boundary extends past the grid and would be cut off
+}
+
+
 /*****************************************************************************
- * MORE TO COME --- tests for TabField, TabField3, HarmonicExpandedBField, ...
+ * MORE TO COME --- tests for TabField, HarmonicExpandedBField, ...
  ****************************************************************************/
\ No newline at end of file
@@ -3,7 +3,11 @@
  */
 
 #include <cmath>
+#include <array>
 #include <chrono>
+#include <random>
+#include <thread>
+#include <vector>
 #include <boost/test/unit_test.hpp>
 
 #include "globals.h"
@@ -93,4 +97,95 @@ BOOST_AUTO_TEST_CASE(microroughnessDistributionTest){
     nickelReflection = MR::MRProb(false, &v[0], &normal[0], FermiNi, bNi, wNi);
     nickelTransmission = MR::MRProb(true, &v[0], &normal[0], FermiNi, bNi, wNi);
 */
-}
\ No newline at end of file
+}
+
+// compare tabulated MicroRoughness probabilities and maxima to exact calculation at random velocities
+BOOST_AUTO_TEST_CASE(microroughnessTableTest){
+    double FermiCu = 168e-9;
+    double bCu = 3e-9;
+    double wCu = 20e-9;
+    array<double, 3> normal = {0., 0., -1.};
+    MR::SetMRTables(51, 500e-9);
+
+    mt19937 rng(1);
+    uniform_real_distribution<double> Edist(0., 400e-9), costhetadist(0., 1.);
+    int nTests = 200, tabulated = 0;
+    for (int n = 0; n < nTests; ++n){
+        double E = Edist(rng), costheta = costhetadist(rng);
+        double vabs = sqrt(2.*E/m_n);
+        array<double, 3> v = {vabs*sqrt(1. - costheta*costheta), 0., vabs*costheta};
+        MR::TMRValues values;
+        if (MR::MRTabulated(&v[0], &normal[0], FermiCu, bCu, wCu, values)){
+            ++tabulated;
+            BOOST_TEST_CONTEXT("Parameters: E = " << E << ", costheta = " << costheta){
+                BOOST_CHECK_CLOSE_FRACTION(values.reflprob, MR::MRProb(false, &v[0], &normal[0], FermiCu, bCu, wCu), 0.02);
+                BOOST_CHECK_CLOSE_FRACTION(values.transprob, MR::MRProb(true, &v[0], &normal[0], FermiCu, bCu, wCu), 0.02);
+                BOOST_CHECK_CLOSE_FRACTION(values.distmax, MR::MRDistMax(true, &v[0], &normal[0], FermiCu, bCu, wCu), 0.02);
+            }
+        }
+    }
+    BOOST_CHECK(tabulated > 0);
+
+    // cells crossed by the transmission threshold at the Fermi potential must not be used, interpolated transmission below it has to be exactly zero
+    uniform_real_distribution<double> thresholddist(FermiCu - 20e-9, FermiCu);
+    for (int n = 0; n < nTests; ++n){
+        double E = thresholddist(rng), costheta = costhetadist(rng);
+        double vabs = sqrt(2.*E/m_n);
+        array<double, 3> v = {vabs*sqrt(1. - costheta*costheta), 0., vabs*costheta};
+        MR::TMRValues values;
+        if (MR::MRTabulated(&v[0], &normal[0], FermiCu, bCu, wCu, values)){
+            BOOST_TEST_CONTEXT("Parameters: E = " << E << ", costheta = " << costheta){
+                BOOST_CHECK_EQUAL(values.transprob, 0.);
+            }
+        }
+    }
+    MR::SetMRTables(0, 0.);
+}
+
+// check that threads filling the same table concurrently interpolate the same values as a single thread
+BOOST_AUTO_TEST_CASE(microroughnessTableThreadTest){
+    double FermiCu = 168e-9;
+    double bCu = 3e-9;
+    double wCu = 20e-9;
+    array<double, 3> normal = {0., 0., -1.};
+    mt19937 rng(2);
+    uniform_real_distribution<double> Edist(0., 400e-9), costhetadist(0., 1.);
+    const int nTests = 50, nThreads = 4;
+    vector<array<double, 3> > velocities;
+    for (int n = 0; n < nTests; ++n){
+        double E = Edist(rng), costheta = costhetadist(rng);
+        double vabs = sqrt(2.*E/m_n);
+        velocities.push_back({vabs*sqrt(1. - costheta*costheta), 0., vabs*costheta});
+    }
+
+    MR::SetMRTables(21, 500e-9);
+    vector<vector<char> > tabulated(nThreads, vector<char>(nTests));
+    vector<vector<MR::TMRValues> > values(nThreads, vector<MR::TMRValues>(nTests));
+    vector<thread> threads;
+    for (int i = 0; i < nThreads; ++i){
+        threads.emplace_back([&, i]{
+            for (int n = 0; n < nTests; ++n)
+                tabulated[i][n] = MR::MRTabulated(&velocities[n][0], &normal[0], FermiCu, bCu, wCu, values[i][n]);
+        });
+    }
+    for (auto &t: threads)
+        t.join();
+
+    MR::SetMRTables(21, 500e-9);
+    int nTabulated = 0;
+    for (int n = 0; n < nTests; ++n){
+        MR::TMRValues reference;
+        bool referencetabulated = MR::MRTabulated(&velocities[n][0], &normal[0], FermiCu, bCu, wCu, reference);
+        nTabulated += referencetabulated;
+        for (int i = 0; i < nThreads; ++i){
+            if (tabulated[i][n]){ // thread may fall back to exact calculation while another thread checks the cell
+                BOOST_CHECK(referencetabulated);
+                BOOST_CHECK_EQUAL(values[i][n].reflprob, reference.reflprob);
+                BOOST_CHECK_EQUAL(values[i][n].transprob, reference.transprob);
+                BOOST_CHECK_EQUAL(values[i][n].distmax, reference.distmax);
+            }
+        }
+    }
+    BOOST_CHECK(nTabulated > 0);
+    MR::SetMRTables(0, 0.);
+}
@@ -0,0 +1,76 @@
+# smoke test of the pentrack Python module, run by ctest if PENTrack is built with the BUILD_PYTHON and BUILD_TESTS options
+# run manually with
+# PYTHONPATH=<directory containing pentrack module> python3 pythonModuleTest.py
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy
+
+import pentrack
+
+class FieldManagerTest(unittest.TestCase):
+  def setUp(self):
+    # homogeneous, oscillating field with hard boundaries at +/-1
+    self.directory = tempfile.mkdtemp()
+    self.config = os.path.join(self.directory, 'config.in')
+    with open(self.config, 'w') as f:
+      f.write('[FIELDS]\n0 LinearFieldZ 0 1 1 -1 1 -1 1 -1 sin(t)\n[FORMULAS]\n')
+    self.field = pentrack.FieldManager(self.config)
+    rng = numpy.random.RandomState(1)
+    self.points = rng.uniform(-2., 2., (1000, 3))
+    self.t = rng.uniform(0., 10., 1000)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testBField(self):
+    B, dBidxj = self.field.BField(self.points, self.t)
+    self.assertEqual(B.shape, (1000, 3))
+    self.assertEqual(dBidxj.shape, (1000, 3, 3))
+    inside = numpy.all(numpy.abs(self.points) < 1, axis = 1)
+    numpy.testing.assert_allclose(B[inside, 2], numpy.sin(self.t[inside]), rtol = 1e-14)
+    self.assertTrue(numpy.all(B[~inside] == 0))
+    self.assertTrue(numpy.all(B[:, :2] == 0))
+    self.assertTrue(numpy.all(dBidxj == 0))
+
+    B2, dBidxj2 = self.field.BField(self.points, 1., gradient = False)
+    self.assertIsNone(dBidxj2)
+    numpy.testing.assert_allclose(B2[inside, 2], numpy.sin(1.), rtol = 1e-14)
+
+  def testEField(self):
+    V, E = self.field.EField(self.points)
+    self.assertEqual(V.shape, (1000,))
+    self.assertEqual(E.shape, (1000, 3))
+    self.assertTrue(numpy.all(V == 0) and numpy.all(E == 0))
+
+  def testInvalidArguments(self):
+    with self.assertRaises(ValueError):
+      self.field.BField(self.points[:, :2])
+    with self.assertRaises(ValueError):
+      self.field.EField(self.points, self.t[:10])
+    with self.assertRaises(RuntimeError):
+      pentrack.FieldManager(os.path.join(self.directory, 'missing.in'))
+    with self.assertRaises(RuntimeError): # fields could be in use by other threads
+      self.field.__init__(self.config)
+    with self.assertRaises(RuntimeError):
+      pentrack.FieldManager.__new__(pentrack.FieldManager).BField(self.points)
+
+  def testThreads(self):
+    expected, _ = self.field.BField(self.points, self.t)
+    results = [None]*4
+    def Evaluate(i):
+      results[i], _ = self.field.BField(self.points, self.t)
+    threads = [threading.Thread(target = Evaluate, args = (i,)) for i in range(len(results))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    for B in results:
+      self.assertTrue(numpy.array_equal(B, expected))
+
+if __name__ == '__main__':
+  unittest.main()
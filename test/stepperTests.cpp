@@ -0,0 +1,80 @@
+/**
+ * This file contains unit tests for ballistic steps of the trajectory stepper
+ */
+
+#include <cmath>
+#include <array>
+#include <boost/test/unit_test.hpp>
+
+#include "particle.h"
+#include "globals.h"
+
+using namespace std;
+
+/**
+ * Equation of motion with constant gravity, including proper time and trajectory length like TParticle::EquationOfMotion
+ */
+void gravity(const state_type &y, state_type &dydx, const value_type x){
+    double v2 = y[3]*y[3] + y[4]*y[4] + y[5]*y[5];
+    dydx[0] = y[3];
+    dydx[1] = y[4];
+    dydx[2] = y[5];
+    dydx[3] = 0;
+    dydx[4] = 0;
+    dydx[5] = -gravconst;
+    dydx[6] = sqrt(1 - v2/c_0/c_0);
+    dydx[7] = 0;
+    dydx[8] = sqrt(v2);
+}
+
+BOOST_AUTO_TEST_CASE(BallisticStepTest){
+    const array<double, 3> g = {0., 0., -static_cast<double>(gravconst)};
+    const double dt = 1.;
+    for (auto v: {array<double, 3>{{3., -1., 2.}}, array<double, 3>{{0., 0., 4.}}, array<double, 3>{{0.5, 0., 0.}}}){ // vertical throw changes direction
+        state_type y0 = {0.1, 0.2, 0.3, v[0], v[1], v[2], 1., -1., 0.5};
+        dense_stepper_type ballistic = boost::numeric::odeint::make_dense_output(1e-13, 1e-13, stepper_type());
+        ballistic.do_ballistic_step(y0, 0., dt, g);
+        BOOST_CHECK(ballistic.is_ballistic());
+        BOOST_CHECK_EQUAL(ballistic.current_time(), dt);
+        BOOST_CHECK_THROW(ballistic.do_step(gravity), std::runtime_error); // numerical integration has to be initialized first
+
+        double boxmin[3], boxmax[3];
+        dense_stepper_type::calc_ballistic_box(y0, dt, g, boxmin, boxmax);
+        double maxdeviation = 0;
+        dense_stepper_type numeric = boost::numeric::odeint::make_dense_output(1e-13, 1e-13, stepper_type());
+        numeric.initialize(y0, 0., 1e-3);
+        while (true){ // compare to numerical integration at the end of each step
+            numeric.do_step(gravity);
+            double t = numeric.current_time();
+            if (t > dt)
+                break;
+            const state_type &yn = numeric.current_state();
+            state_type yb(STATE_VARIABLES);
+            ballistic.calc_state(t, yb);
+            for (int i = 0; i < STATE_VARIABLES; ++i){
+                BOOST_TEST_INFO("t = " << t << ", i = " << i);
+                BOOST_CHECK_SMALL(yn[i] - yb[i], 1e-9);
+            }
+            for (int i = 0; i < 3; ++i){
+                BOOST_CHECK_LE(boxmin[i], yb[i]);
+                BOOST_CHECK_GE(boxmax[i], yb[i]);
+            }
+
+            // distance of point from chord between start and end of step
+            const state_type &y1 = ballistic.current_state();
+            double chord[3] = {y1[0] - y0[0], y1[1] - y0[1], y1[2] - y0[2]};
+            double r[3] = {yb[0] - y0[0], yb[1] - y0[1], yb[2] - y0[2]};
+            double cross[3] = {r[1]*chord[2] - r[2]*chord[1], r[2]*chord[0] - r[0]*chord[2], r[0]*chord[1] - r[1]*chord[0]};
+            maxdeviation = max(maxdeviation, sqrt(cross[0]*cross[0] + cross[1]*cross[1] + cross[2]*cross[2])/sqrt(chord[0]*chord[0] + chord[1]*chord[1] + chord[2]*chord[2]));
+        }
+        BOOST_CHECK_LE(maxdeviation, ballistic.calc_ballistic_deviation(0., dt)*(1 + 1e-12));
+
+        // plane z = 0.25 below start point is crossed on the way down
+        const double normal[3] = {0., 0., 1.};
+        const double point[3] = {0., 0., 0.25};
+        double t;
+        BOOST_REQUIRE(ballistic.calc_ballistic_crossing(0., dt, normal, point, t));
+        BOOST_CHECK_CLOSE(t, (v[2] + sqrt(v[2]*v[2] + 2*gravconst*0.05))/gravconst, 1e-10);
+        BOOST_CHECK(not ballistic.calc_ballistic_crossing(0., 0.5*t, normal, point, t));
+    }
+}
@@ -0,0 +1,98 @@
+/**
+ * This file contains unit tests for spin tracking
+ */
+
+#include <cmath>
+#include <array>
+#include <boost/test/unit_test.hpp>
+
+#include "tracking.h"
+#include "neutron.h"
+#include "globals.h"
+
+using namespace std;
+
+const double SPIN_STEP = 0.1; ///< duration of trajectory step over which spin is integrated [s]
+
+/**
+ * Integrate spin of a neutron over one ballistic trajectory step through a field defined by formulas
+ *
+ * @param Bx Formula of x component of magnetic field, may depend on time t
+ * @param By Formula of y component of magnetic field
+ * @param Bz Formula of z component of magnetic field
+ * @param spin Initial spin vector, returns spin vector at end of step
+ * @param analyticspin Use analytic spin propagator, with ODE stepper as fallback
+ * @param omega Returns precession axis at start of step
+ *
+ * @return Returns time up to which the analytic spin propagator alone propagates the spin
+ */
+double IntegrateSpin(const string &Bx, const string &By, const string &Bz, array<double, 3> &spin, const bool analyticspin, array<double, 3> &omega){
+    TConfig config({{"GLOBAL", {{"scenetree", "0"}, {"distancefield", "0"}}},
+                    {"MATERIALS", {{"default", "0 0 0 0 0 0 0 0 0"}}},
+                    {"GEOMETRY", {{"1", "ignored default"}}},
+                    {"FIELDS", {{"1", "CustomBField Bx By Bz 10 -10 10 -10 10 -10 0 1"}}},
+                    {"FORMULAS", {{"Bx", Bx}, {"By", By}, {"Bz", Bz}}},
+                    {"neutron", {}}}); // no logs
+    TFieldManager field(config);
+    TGeometry geom(config);
+    TMCGenerator mc(1);
+    unique_ptr<TParticle> p(new TNeutron(1, 0., 0., 0., 0., 1e-7, 0., 0.5*pi, 1., mc, geom, field));
+    TTracker tracker(unique_ptr<TLogger>(new TTextLogger(config)));
+
+    dense_stepper_type stepper = boost::numeric::odeint::make_dense_output(1e-9, 1e-9, stepper_type());
+    stepper.do_ballistic_step(p->GetInitialState(), 0., SPIN_STEP, {0., 0., -static_cast<double>(gravconst)});
+    p->SpinPrecessionAxis(0., stepper, field, omega[0], omega[1], omega[2]);
+
+    state_type S = {spin[0], spin[1], spin[2], 0., 0.};
+    state_type S2 = S;
+    double t = tracker.PropagateSpin(p, S2, stepper, 0., SPIN_STEP, field, {});
+
+    state_type y2 = stepper.current_state();
+    tracker.IntegrateSpin(p, S, stepper, SPIN_STEP, y2, {0., 1.}, field, false, 1., mc, false, analyticspin);
+    copy(S.begin(), S.begin() + 3, spin.begin());
+    return t;
+}
+
+// compare analytic spin propagator to ODE stepper in constant, slowly rotating, and quickly rotating fields
+BOOST_AUTO_TEST_CASE(SpinPropagatorTest){
+    const double tolerance = 1e-8;
+    array<double, 3> omega;
+
+    // constant field along z, spin precesses around z by a fixed angle
+    array<double, 3> analytic = {1., 0., 0.}, ode = analytic;
+    BOOST_CHECK_EQUAL(IntegrateSpin("0", "0", "1e-6", analytic, true, omega), SPIN_STEP);
+    IntegrateSpin("0", "0", "1e-6", ode, false, omega);
+    double angle = omega[2]*SPIN_STEP;
+    BOOST_CHECK_GT(abs(angle), 10.);
+    for (auto &spin: {analytic, ode}){
+        BOOST_CHECK_SMALL(spin[0] - cos(angle), tolerance);
+        BOOST_CHECK_SMALL(spin[1] - sin(angle), tolerance);
+        BOOST_CHECK_SMALL(spin[2], tolerance);
+    }
+
+    // field rotating slowly in the xy plane, spin follows adiabatically
+    const double adiabatic = 2.; // rotation frequency [rad/s], much smaller than precession frequency
+    string Bx = "1e-6*cos(" + to_string(adiabatic) + "*t)", By = "1e-6*sin(" + to_string(adiabatic) + "*t)";
+    analytic = {0.8, 0., 0.6};
+    ode = analytic;
+    BOOST_CHECK_EQUAL(IntegrateSpin(Bx, By, "0", analytic, true, omega), SPIN_STEP);
+    IntegrateSpin(Bx, By, "0", ode, false, omega);
+    for (int i = 0; i < 3; ++i)
+        BOOST_CHECK_SMALL(analytic[i] - ode[i], tolerance);
+    double projection = analytic[0]*cos(adiabatic*SPIN_STEP) + analytic[1]*sin(adiabatic*SPIN_STEP);
+    BOOST_CHECK_SMALL(projection - 0.8, 0.01); // spin projection onto field is an adiabatic invariant
+
+    // constant field that starts rotating faster than spin precesses in the middle of the step
+    // analytic propagator has to hand over to ODE stepper there
+    const double nonadiabatic = 500.;
+    Bx = "1e-6*cos(" + to_string(nonadiabatic) + "*max(t - 0.05, 0))";
+    By = "1e-6*sin(" + to_string(nonadiabatic) + "*max(t - 0.05, 0))";
+    analytic = {0.8, 0., 0.6};
+    ode = analytic;
+    double t = IntegrateSpin(Bx, By, "0", analytic, true, omega);
+    BOOST_CHECK_GT(t, 0.02);
+    BOOST_CHECK_LE(t, 0.05);
+    IntegrateSpin(Bx, By, "0", ode, false, omega);
+    for (int i = 0; i < 3; ++i)
+        BOOST_CHECK_SMALL(analytic[i] - ode[i], tolerance);
+}
@@ -0,0 +1,252 @@
+/**
+ * This file contains unit tests for the triangle mesh
+ */
+
+#include <cmath>
+#include <array>
+#include <random>
+#include <fstream>
+#include <cstdint>
+#include <sstream>
+#include <memory>
+#include <set>
+#include <boost/test/unit_test.hpp>
+#include <boost/filesystem.hpp>
+#include <CGAL/AABB_triangle_primitive.h>
+
+#include "trianglemesh.h"
+
+#ifndef PENTRACK_SOURCE_DIR
+#define PENTRACK_SOURCE_DIR "."
+#endif
+
+using namespace std;
+
+/**
+ * Write binary STL file containing cube with given edge length centered on origin
+ *
+ * @param filename File name
+ * @param a Edge length
+ * @param hole Leave out one triangle of the face at z = a/2, so the cube is not closed
+ */
+void WriteCube(const boost::filesystem::path &filename, const float a, const bool hole = false){
+    ofstream f(filename.native(), fstream::binary);
+    char header[80] = "cube";
+    f.write(header, 80);
+    uint32_t count = hole ? 11 : 12;
+    f.write(reinterpret_cast<char*>(&count), 4);
+    for (int axis = 0; axis < 3; ++axis){
+        for (float side: {-0.5f*a, 0.5f*a}){
+            array<array<float, 3>, 4> corners;
+            for (int c = 0; c < 4; ++c){
+                corners[c][axis] = side;
+                corners[c][(axis + 1) % 3] = (c == 1 or c == 2) ? 0.5f*a : -0.5f*a;
+                corners[c][(axis + 2) % 3] = (c >= 2) ? 0.5f*a : -0.5f*a;
+            }
+            for (auto triangle: {array<int, 3>{{0, 1, 2}}, array<int, 3>{{0, 2, 3}}}){
+                if (hole and axis == 2 and side > 0 and triangle[1] == 2)
+                    continue;
+                float normal[3] = {0, 0, 0};
+                f.write(reinterpret_cast<char*>(normal), 12);
+                for (int v: triangle)
+                    f.write(reinterpret_cast<char*>(corners[v].data()), 12);
+                uint16_t attribute = 0;
+                f.write(reinterpret_cast<char*>(&attribute), 2);
+            }
+        }
+    }
+}
+
+typedef CGAL::AABB_tree<CGAL::AABB_traits<CKernel, CGAL::AABB_triangle_primitive<CKernel, vector<CKernel::Triangle_3>::const_iterator> > > CTriangleTree;
+
+/**
+ * Read triangles from binary STL file without any repairs, to compare TTriangleMesh with a plain AABB tree
+ *
+ * @param filename File name
+ *
+ * @return Returns list of triangles
+ */
+vector<CKernel::Triangle_3> ReadTriangles(const boost::filesystem::path &filename){
+    ifstream f(filename.native(), fstream::binary);
+    f.seekg(80);
+    uint32_t count;
+    f.read(reinterpret_cast<char*>(&count), 4);
+    vector<CKernel::Triangle_3> triangles;
+    for (uint32_t i = 0; i < count; ++i){
+        float v[12];
+        f.read(reinterpret_cast<char*>(v), 48);
+        f.seekg(2, fstream::cur);
+        triangles.emplace_back(CPoint(v[3], v[4], v[5]), CPoint(v[6], v[7], v[8]), CPoint(v[9], v[10], v[11]));
+    }
+    return triangles;
+}
+
+BOOST_AUTO_TEST_CASE(InSolidTest){
+    boost::filesystem::path tmpdir = boost::filesystem::temp_directory_path();
+    vector<boost::filesystem::path> STLfiles = {tmpdir / boost::filesystem::unique_path("%%%%-%%%%.STL"),
+                                                boost::filesystem::path(PENTRACK_SOURCE_DIR) / "test" / "HollowUnitCube.STL",
+                                                tmpdir / boost::filesystem::unique_path("%%%%-%%%%.STL")};
+    WriteCube(STLfiles[0], 2.);
+    WriteCube(STLfiles[2], 1., true);
+    TTriangleMesh mesh;
+    vector<vector<CKernel::Triangle_3> > triangles;
+    vector<unique_ptr<CTriangleTree> > trees;
+    vector<CGAL::Bbox_3> boxes;
+    for (unsigned ID = 0; ID < STLfiles.size(); ++ID){
+        ostringstream output;
+        auto coutbuf = cout.rdbuf(output.rdbuf());
+        mesh.ReadFile(STLfiles[ID].native(), ID);
+        cout.rdbuf(coutbuf);
+        bool closed = ID < 2;
+        BOOST_CHECK_EQUAL(output.str().find("Classified") != string::npos, closed); // mesh with hole must not use voxels
+        triangles.push_back(ReadTriangles(STLfiles[ID]));
+        boxes.push_back(CGAL::bbox_3(triangles.back().begin(), triangles.back().end()));
+    }
+    boost::filesystem::remove(STLfiles[0]);
+    boost::filesystem::remove(STLfiles[2]);
+    for (auto &t: triangles)
+        trees.emplace_back(new CTriangleTree(t.begin(), t.end()));
+
+    // exact test, counting intersections of a ray in +z direction
+    auto check = [&mesh, &trees](const array<double, 3> &p){
+        vector<unsigned> solids;
+        for (unsigned ID = 0; ID < trees.size(); ++ID){
+            if (trees[ID]->number_of_intersected_primitives(CKernel::Ray_3(CPoint(p[0], p[1], p[2]), CVector(0., 0., 1.))) % 2 != 0)
+                solids.push_back(ID);
+        }
+        BOOST_REQUIRE_MESSAGE(mesh.GetSolids(p) == solids, "Wrong solids at " << p[0] << " " << p[1] << " " << p[2]);
+        BOOST_REQUIRE_EQUAL(mesh.InSolid(p), not solids.empty());
+        return solids.size();
+    };
+
+    mt19937 rng(1);
+    uniform_real_distribution<double> unidist(-1.5, 1.5);
+    size_t inside = 0;
+    for (int i = 0; i < 100000; ++i)
+        inside += check({unidist(rng), unidist(rng), unidist(rng)});
+    BOOST_CHECK_GT(inside, 30000); // roughly 8/27 of the points are inside the large cube
+
+    // points on faces of bounding boxes and on faces of any grid with up to MAX_VOXELS_PER_AXIS cells spanning them
+    for (auto &box: boxes){
+        const double min[3] = {box.xmin(), box.ymin(), box.zmin()};
+        const double max[3] = {box.xmax(), box.ymax(), box.zmax()};
+        for (int axis = 0; axis < 3; ++axis){
+            for (size_t n = 1; n <= MAX_VOXELS_PER_AXIS; ++n){
+                uniform_int_distribution<size_t> nodedist(0, n);
+                for (size_t node: {nodedist(rng), n}){
+                    array<double, 3> p;
+                    for (int i = 0; i < 3; ++i){
+                        uniform_real_distribution<double> boxdist(min[i], max[i]);
+                        p[i] = boxdist(rng);
+                    }
+                    p[axis] = node == n ? max[axis] : min[axis] + node*(max[axis] - min[axis])/n;
+                    check(p);
+                }
+            }
+        }
+    }
+}
+
+BOOST_AUTO_TEST_CASE(SceneTreeTest){
+    boost::filesystem::path tmpdir = boost::filesystem::temp_directory_path();
+    vector<boost::filesystem::path> STLfiles = {tmpdir / boost::filesystem::unique_path("%%%%-%%%%.STL"),
+                                                boost::filesystem::path(PENTRACK_SOURCE_DIR) / "test" / "HollowUnitCube.STL",
+                                                tmpdir / boost::filesystem::unique_path("%%%%-%%%%.STL")};
+    WriteCube(STLfiles[0], 2.);
+    WriteCube(STLfiles[2], 2.6);
+    TTriangleMesh mesh, reference; // reference always searches the tree of each file
+    for (unsigned ID = 1; ID <= 2; ++ID){
+        mesh.ReadFile(STLfiles[ID - 1].native(), ID);
+        reference.ReadFile(STLfiles[ID - 1].native(), ID);
+    }
+
+    mt19937 rng(1);
+    uniform_real_distribution<double> unidist(-1.5, 1.5);
+    auto compare = [&mesh, &reference, &rng, &unidist](){
+        set<unsigned> IDs;
+        for (int i = 0; i < 10000; ++i){
+            double p1[3] = {unidist(rng), unidist(rng), unidist(rng)};
+            double p2[3] = {unidist(rng), unidist(rng), unidist(rng)};
+            vector<TCollision> colls = mesh.Collision(p1, p2);
+            vector<TCollision> refcolls = reference.Collision(p1, p2);
+            BOOST_REQUIRE_EQUAL(colls.size(), refcolls.size());
+            for (size_t j = 0; j < colls.size(); ++j){
+                BOOST_REQUIRE_EQUAL(colls[j].s, refcolls[j].s);
+                BOOST_REQUIRE_EQUAL(colls[j].ID, refcolls[j].ID);
+                BOOST_REQUIRE_EQUAL(colls[j].distnormal, refcolls[j].distnormal);
+                for (int k = 0; k < 3; ++k)
+                    BOOST_REQUIRE_EQUAL(colls[j].normal[k], refcolls[j].normal[k]);
+                IDs.insert(colls[j].ID);
+            }
+        }
+        return IDs;
+    };
+
+    mesh.BuildSceneTree();
+    BOOST_CHECK(compare() == set<unsigned>({1, 2}));
+
+    mesh.ReadFile(STLfiles[2].native(), 3); // scene tree does not contain this file, so it has to be dropped
+    reference.ReadFile(STLfiles[2].native(), 3);
+    boost::filesystem::remove(STLfiles[0]);
+    boost::filesystem::remove(STLfiles[2]);
+    BOOST_CHECK(compare() == set<unsigned>({1, 2, 3}));
+
+    mesh.BuildSceneTree();
+    BOOST_CHECK(compare() == set<unsigned>({1, 2, 3}));
+}
+
+BOOST_AUTO_TEST_CASE(DistanceBoundTest){
+    boost::filesystem::path STLfile = boost::filesystem::temp_directory_path() / boost::filesystem::unique_path("%%%%-%%%%.STL");
+    const double a = 2.;
+    WriteCube(STLfile, a);
+    TTriangleMesh mesh;
+    mesh.ReadFile(STLfile.native(), 2);
+    boost::filesystem::remove(STLfile);
+
+    double p[3] = {0., 0., 0.};
+    BOOST_CHECK_EQUAL(mesh.DistanceBound(p), 0.); // distance field not calculated yet
+
+    mesh.BuildDistanceField();
+    BOOST_CHECK_CLOSE(mesh.DistanceBound(p), 0.5*a, 1e-4); // center is a grid node, bound is only reduced by REFLECT_TOLERANCE
+
+    mt19937 rng(1);
+    uniform_real_distribution<double> unidist(-a, a);
+    double maxdeviation = 0;
+    for (int i = 0; i < 10000; ++i){
+        double outside2 = 0, inside = 0.5*a;
+        for (int j = 0; j < 3; ++j){
+            p[j] = unidist(rng);
+            outside2 += pow(max(0., abs(p[j]) - 0.5*a), 2);
+            inside = min(inside, 0.5*a - abs(p[j]));
+        }
+        double distance = outside2 > 0 ? sqrt(outside2) : inside; // exact distance to cube surface
+        double bound = mesh.DistanceBound(p);
+        BOOST_REQUIRE_LE(bound, distance);
+        BOOST_REQUIRE_GE(bound, 0.);
+        maxdeviation = max(maxdeviation, distance - bound);
+
+        double p2[3] = {p[0], p[1], p[2]};
+        p2[i % 3] += 0.99*bound;
+        BOOST_REQUIRE(mesh.Collision(p, p2).empty()); // segments shorter than bound can not collide with surface
+    }
+    BOOST_CHECK_LT(maxdeviation, 0.1*a); // grid with 31 nodes along each axis should give bound close to actual distance
+}
+
+BOOST_AUTO_TEST_CASE(IntersectsBoxTest){
+    boost::filesystem::path STLfile = boost::filesystem::temp_directory_path() / boost::filesystem::unique_path("%%%%-%%%%.STL");
+    WriteCube(STLfile, 2.);
+    TTriangleMesh mesh;
+    mesh.ReadFile(STLfile.native(), 2);
+    boost::filesystem::remove(STLfile);
+
+    for (bool scenetree: {false, true}){
+        if (scenetree)
+            mesh.BuildSceneTree();
+        const double inner[2][3] = {{-0.9, -0.9, -0.9}, {0.9, 0.9, 0.9}}; // box inside the cube
+        const double crossing[2][3] = {{0.5, -0.1, -0.1}, {1.5, 0.1, 0.1}}; // box crossing the face at x = 1
+        const double outside[2][3] = {{1.1, 1.1, 1.1}, {2., 2., 2.}};
+        BOOST_CHECK(not mesh.IntersectsBox(inner[0], inner[1]));
+        BOOST_CHECK(mesh.IntersectsBox(crossing[0], crossing[1]));
+        BOOST_CHECK(not mesh.IntersectsBox(outside[0], outside[1]));
+    }
+}